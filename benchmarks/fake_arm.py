@@ -0,0 +1,276 @@
+import itertools
+import threading
+import time
+
+
+# Resource path segments for every SDK operation group used by the modules.
+# Child resources (subnets, rules, routes) list their parent segment first.
+OPERATION_GROUPS = {
+    'virtual_networks': ('Microsoft.Network', ['virtualNetworks']),
+    'subnets': ('Microsoft.Network', ['virtualNetworks', 'subnets']),
+    'network_security_groups': ('Microsoft.Network', ['networkSecurityGroups']),
+    'security_rules': ('Microsoft.Network', ['networkSecurityGroups', 'securityRules']),
+    'route_tables': ('Microsoft.Network', ['routeTables']),
+    'routes': ('Microsoft.Network', ['routeTables', 'routes']),
+    'virtual_network_gateways': ('Microsoft.Network', ['virtualNetworkGateways']),
+    'public_ip_addresses': ('Microsoft.Network', ['publicIPAddresses']),
+    'network_interfaces': ('Microsoft.Network', ['networkInterfaces']),
+    'virtual_machines': ('Microsoft.Compute', ['virtualMachines']),
+    'virtual_machine_scale_sets': ('Microsoft.Compute', ['virtualMachineScaleSets']),
+    'virtual_machine_scale_set_vms': ('Microsoft.Compute', ['virtualMachineScaleSets', 'virtualMachines']),
+}
+
+# Parent collections embedded in the parent body, as ARM does on GET/list.
+EMBEDDED_CHILDREN = {
+    'virtual_networks': ('subnets', 'subnets'),
+    'network_security_groups': ('security_rules', 'security_rules'),
+    'route_tables': ('routes', 'routes'),
+}
+
+
+class FakeModel:
+    """Attribute-style stand-in for an SDK model built from a parameters dict."""
+
+    def __init__(self, values):
+        for key, value in values.items():
+            # Tags stay a plain dict, as in the SDK models.
+            setattr(self, key, dict(value) if key == 'tags' else _to_model(value))
+
+    def as_dict(self):
+        return {key: _from_model(value) for key, value in vars(self).items()}
+
+    def __repr__(self):
+        return f"FakeModel({self.as_dict()!r})"
+
+
+def _to_model(value):
+    if isinstance(value, dict):
+        return FakeModel(value)
+    if isinstance(value, list):
+        return [_to_model(item) for item in value]
+    return value
+
+
+def _from_model(value):
+    if isinstance(value, FakeModel):
+        return value.as_dict()
+    if isinstance(value, list):
+        return [_from_model(item) for item in value]
+    return value
+
+
+class FakePoller:
+    """Minimal LROPoller stand-in that completes after a fixed latency."""
+
+    def __init__(self, arm, operation, finish):
+        self._arm = arm
+        self._operation = operation
+        self._finish = finish
+        self._started = time.perf_counter()
+        self._result = None
+        self._done = False
+        self._callbacks = []
+        self._lock = threading.Lock()
+
+    def _elapsed(self):
+        return time.perf_counter() - self._started
+
+    def _complete(self):
+        with self._lock:
+            if self._done:
+                return
+            self._result = self._finish()
+            self._done = True
+            callbacks, self._callbacks = self._callbacks, []
+        for callback in callbacks:
+            callback(self)
+
+    def done(self):
+        if not self._done and self._elapsed() >= self._arm.lro_latency:
+            self._complete()
+        return self._done
+
+    def status(self):
+        return 'Succeeded' if self.done() else 'InProgress'
+
+    def wait(self, timeout=None):
+        deadline = None if timeout is None else time.perf_counter() + timeout
+        while not self.done():
+            if deadline is not None and time.perf_counter() >= deadline:
+                return
+            self._arm.record(self._operation + '.poll')
+            time.sleep(self._arm.poll_interval)
+
+    def result(self, timeout=None):
+        self.wait(timeout)
+        return self._result
+
+    def add_done_callback(self, func):
+        with self._lock:
+            if not self._done:
+                self._callbacks.append(func)
+                return
+        func(self)
+
+    def continuation_token(self):
+        return f"{self._operation}:{id(self)}"
+
+
+class FakeOperationGroup:
+    """Serves begin_*/get/list calls for one SDK operation group from memory."""
+
+    def __init__(self, arm, group_name):
+        self._arm = arm
+        self._group = group_name
+        self._provider, self._segments = OPERATION_GROUPS[group_name]
+        self._depth = len(self._segments)
+
+    def _resource_id(self, resource_group_name, names):
+        path = '/'.join(f"{segment}/{name}" for segment, name in zip(self._segments, names))
+        return (f"/subscriptions/{self._arm.subscription_id}/resourceGroups/{resource_group_name}"
+                f"/providers/{self._provider}/{path}")
+
+    def _store(self):
+        return self._arm.resources.setdefault(self._group, {})
+
+    def _split(self, args):
+        return args[0], tuple(args[1:1 + self._depth])
+
+    def _body(self, resource_group_name, names, resource):
+        body = dict(resource)
+        embedded = EMBEDDED_CHILDREN.get(self._group)
+        if embedded:
+            attribute, child_group = embedded
+            children = self._arm.resources.get(child_group, {})
+            body[attribute] = [
+                child for key, child in children.items()
+                if key[0] == resource_group_name and key[1] == names[0]
+            ]
+        return FakeModel(body)
+
+    def begin_create_or_update(self, *args, **kwargs):
+        resource_group_name, names = self._split(args)
+        parameters = args[1 + self._depth] if len(args) > 1 + self._depth else {}
+        operation = f"{self._group}.begin_create_or_update"
+        self._arm.record(operation)
+
+        def finish():
+            store = self._store()
+            resource = dict(store.get((resource_group_name,) + names, {}))
+            resource.update(parameters if isinstance(parameters, dict) else {})
+            resource.update({
+                'id': self._resource_id(resource_group_name, names),
+                'name': names[-1],
+                'etag': f'W/"{next(self._arm.etags)}"',
+                'provisioning_state': 'Succeeded',
+            })
+            store[(resource_group_name,) + names] = resource
+            return self._body(resource_group_name, names, resource)
+
+        return FakePoller(self._arm, operation, finish)
+
+    def begin_delete(self, *args, **kwargs):
+        resource_group_name, names = self._split(args)
+        operation = f"{self._group}.begin_delete"
+        self._arm.record(operation)
+        return FakePoller(self._arm, operation,
+                          lambda: self._store().pop((resource_group_name,) + names, None) and None)
+
+    def _patch(self, resource_group_name, names, parameters):
+        resource = self._store().get((resource_group_name,) + names)
+        if resource is None:
+            raise KeyError(f"{self._group} '{'/'.join(names)}' not found")
+        resource.update(parameters)
+        resource['etag'] = f'W/"{next(self._arm.etags)}"'
+        return self._body(resource_group_name, names, resource)
+
+    def update_tags(self, resource_group_name, name, parameters, **kwargs):
+        self._arm.record(f"{self._group}.update_tags")
+        return self._patch(resource_group_name, (name,), parameters)
+
+    def _begin_patch(self, method, resource_group_name, name, parameters):
+        operation = f"{self._group}.{method}"
+        self._arm.record(operation)
+        return FakePoller(self._arm, operation, lambda: self._patch(resource_group_name, (name,), parameters))
+
+    def begin_update(self, resource_group_name, name, parameters, **kwargs):
+        return self._begin_patch('begin_update', resource_group_name, name, parameters)
+
+    def begin_update_tags(self, resource_group_name, name, parameters, **kwargs):
+        return self._begin_patch('begin_update_tags', resource_group_name, name, parameters)
+
+    def get(self, *args, **kwargs):
+        resource_group_name, names = self._split(args)
+        self._arm.record(f"{self._group}.get")
+        resource = self._store().get((resource_group_name,) + names)
+        if resource is None:
+            raise KeyError(f"{self._group} '{'/'.join(names)}' not found")
+        return self._body(resource_group_name, names, resource)
+
+    def list(self, *args, **kwargs):
+        resource_group_name = args[0]
+        parents = tuple(args[1:self._depth])
+        self._arm.record(f"{self._group}.list")
+        for key, resource in list(self._store().items()):
+            if key[0] == resource_group_name and key[1:1 + len(parents)] == parents:
+                yield self._body(resource_group_name, key[1:], resource)
+
+    def list_all(self, **kwargs):
+        self._arm.record(f"{self._group}.list_all")
+        for key, resource in list(self._store().items()):
+            yield self._body(key[0], key[1:], resource)
+
+    def __getattr__(self, name):
+        # begin_start, begin_power_off, begin_reimage, ... are no-op LROs.
+        if not name.startswith('begin_'):
+            raise AttributeError(name)
+        operation = f"{self._group}.{name}"
+
+        def begin(*args, **kwargs):
+            self._arm.record(operation)
+            return FakePoller(self._arm, operation, lambda: None)
+
+        return begin
+
+
+class FakeARM:
+    """In-memory ARM stand-in shared by fake network and compute clients."""
+
+    def __init__(self, subscription_id='bench-subscription', request_latency=0.0, lro_latency=0.0,
+                 poll_interval=0.001):
+        self.subscription_id = subscription_id
+        self.request_latency = request_latency
+        self.lro_latency = lro_latency
+        self.poll_interval = poll_interval
+        self.resources = {}
+        self.request_counts = {}
+        self.etags = itertools.count(1)
+        self._lock = threading.Lock()
+
+    def record(self, operation):
+        with self._lock:
+            self.request_counts[operation] = self.request_counts.get(operation, 0) + 1
+        if self.request_latency:
+            time.sleep(self.request_latency)
+
+    def reset_counts(self):
+        with self._lock:
+            self.request_counts = {}
+
+    def client(self):
+        return FakeClient(self)
+
+
+class FakeClient:
+    """Exposes one FakeOperationGroup per attribute, like the SDK clients."""
+
+    def __init__(self, arm):
+        self._arm = arm
+        self._groups = {}
+
+    def __getattr__(self, name):
+        if name not in OPERATION_GROUPS:
+            raise AttributeError(name)
+        if name not in self._groups:
+            self._groups[name] = FakeOperationGroup(self._arm, name)
+        return self._groups[name]
@@ -0,0 +1,843 @@
+"""Benchmark suite for the Azure modules, run against the in-memory ARM stand-in.
+
+Usage:
+    python -m benchmarks.run_benchmarks --output bench_results.json
+    python -m benchmarks.run_benchmarks --compare bench_results.json
+"""
+import argparse
+import contextlib
+import io
+import logging
+import os
+import random
+import shutil
+import tempfile
+import threading
+import json
+import platform
+import subprocess
+import sys
+import time
+import tracemalloc
+from types import SimpleNamespace
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import requests
+
+from benchmarks.fake_arm import FakeARM, FakeModel
+from modules.azure_vnet_module import AzureVNetModule
+from modules.azure_vm_module import AzureVMModule
+from modules.azure_nsg_module import AzureNSGModule
+from modules.azure_subnet_module import AzureSubnetModule
+from modules.azure_vng_module import AzureVNGModule
+from modules.azure_route_table_module import AzureRouteTableModule
+from modules.azure_scale_set_module import AzureScaleSetModule
+from modules.azure_provisioning_module import AzureProvisioningWatcher
+from modules.azure_tagging_module import AzureTaggingModule
+from modules.azure_transport_module import AzureTransportModule
+from modules.azure_nsg_impact_module import AzureNSGImpactModule, Flow
+from modules.azure_reachability_module import AzureReachabilityModule, Query
+from modules.azure_route_compaction_module import RouteSpec, compact_routes, find_difference
+from modules.azure_nsg_priority_module import AzureNSGPriorityModule
+from modules.azure_export_module import AzureExportModule, EXPORT_SOURCES, pyarrow
+from modules.azure_job_queue_module import AzureJobQueue, AzureJobWorker
+from modules.azure_service_module import AzureServiceModule
+from modules.azure_coalescing_module import AzureCoalescingModule
+from modules.azure_deadline_module import AzureDeadline
+from modules.azure_profiling_module import AzureProfilingModule, PROFILE_MODES
+from modules.azure_projection_module import list_projected
+from modules.azure_compute_catalog_module import AzureComputeCatalog
+from azure.core.pipeline.policies import SansIOHTTPPolicy
+from azure.mgmt.network import NetworkManagementClient
+
+RESOURCE_GROUP = 'bench-rg'
+LOCATION = 'switzerlandnorth'
+
+
+def build_modules(arm):
+    """Create one instance of each module with its SDK client replaced by the stand-in."""
+    modules = {
+        'vnet': AzureVNetModule(arm.subscription_id),
+        'vm': AzureVMModule(arm.subscription_id),
+        'nsg': AzureNSGModule(arm.subscription_id),
+        'subnet': AzureSubnetModule(arm.subscription_id),
+        'vng': AzureVNGModule(arm.subscription_id),
+        'route_table': AzureRouteTableModule(arm.subscription_id),
+        'scale_set': AzureScaleSetModule(arm.subscription_id),
+    }
+    for module in modules.values():
+        if hasattr(module, 'network_client'):
+            module.network_client = arm.client()
+        if hasattr(module, 'compute_client'):
+            module.compute_client = arm.client()
+    return modules
+
+
+def provision_topology(modules, index):
+    """Provision the same resources as main(), in the same order."""
+    suffix = f"-{index}"
+    vnet_name = 'bench-vnet' + suffix
+    modules['vnet'].create_vnet(RESOURCE_GROUP, vnet_name, LOCATION, "10.0.0.0/16")
+    modules['subnet'].create_subnet(RESOURCE_GROUP, vnet_name, 'bench-subnet' + suffix, "10.0.1.0/24")
+    modules['nsg'].create_nsg(RESOURCE_GROUP, 'bench-nsg' + suffix, LOCATION)
+    modules['vng'].create_virtual_network_gateway(
+        RESOURCE_GROUP, 'bench-vng' + suffix, LOCATION, "Vpn", "RouteBased", "subnet_id", "public_ip_id")
+    modules['route_table'].create_route_table(RESOURCE_GROUP, 'bench-rt' + suffix, LOCATION)
+    modules['scale_set'].create_scale_set(
+        RESOURCE_GROUP, 'bench-scale-set' + suffix, LOCATION, "Standard_DS1_v2", 2, "subnet_id")
+    modules['vm'].create_vm(RESOURCE_GROUP, 'bench-vm' + suffix, LOCATION, "nic_id", "Standard_DS1_v2")
+
+
+def bench_provisioning(scales, request_latency):
+    """Wall time to provision the main() topology `scale` times over."""
+    results = []
+    for scale in scales:
+        arm = FakeARM(request_latency=request_latency)
+        modules = build_modules(arm)
+        start = time.perf_counter()
+        for index in range(scale):
+            provision_topology(modules, index)
+        elapsed = time.perf_counter() - start
+        results.append({
+            'scale': scale,
+            'wall_seconds': elapsed,
+            'seconds_per_topology': elapsed / scale,
+            'requests': sum(arm.request_counts.values()),
+        })
+    return results
+
+
+def _populate(modules, count):
+    for index in range(count):
+        provision_topology(modules, index)
+        modules['nsg'].add_nsg_rule(RESOURCE_GROUP, f'bench-nsg-{index}', 'rule', 100, 'Inbound',
+                                    'Allow', 'Tcp', '*', '*', '*', '443')
+        modules['route_table'].add_route(RESOURCE_GROUP, f'bench-rt-{index}', 'route',
+                                         '10.1.0.0/16', 'VnetLocal')
+
+
+def crawl_inventory(modules, count):
+    """List every resource type the modules expose and return the snapshot."""
+    snapshot = {
+        'vnets': modules['vnet'].list_vnets(RESOURCE_GROUP),
+        'nsgs': modules['nsg'].list_nsgs(RESOURCE_GROUP),
+        'route_tables': modules['route_table'].list_route_tables(RESOURCE_GROUP),
+        'vngs': modules['vng'].list_virtual_network_gateways(RESOURCE_GROUP),
+        'scale_sets': modules['scale_set'].list_scale_sets(RESOURCE_GROUP),
+        'subnets': [], 'nsg_rules': [], 'routes': [],
+    }
+    for index in range(count):
+        snapshot['subnets'] += modules['subnet'].list_subnets(RESOURCE_GROUP, f'bench-vnet-{index}')
+        snapshot['nsg_rules'] += modules['nsg'].list_nsg_rules(RESOURCE_GROUP, f'bench-nsg-{index}')
+        snapshot['routes'] += modules['route_table'].list_routes(RESOURCE_GROUP, f'bench-rt-{index}')
+    return snapshot
+
+
+def bench_crawl(count, request_latency):
+    """Items per second for a full list crawl of `count` topologies."""
+    arm = FakeARM(request_latency=request_latency)
+    modules = build_modules(arm)
+    _populate(modules, count)
+    arm.reset_counts()
+    start = time.perf_counter()
+    snapshot = crawl_inventory(modules, count)
+    elapsed = time.perf_counter() - start
+    items = sum(len(items) for items in snapshot.values())
+    return {
+        'topologies': count,
+        'items': items,
+        'wall_seconds': elapsed,
+        'items_per_second': items / elapsed if elapsed else None,
+        'requests': sum(arm.request_counts.values()),
+    }
+
+
+def bench_sync(count, request_latency):
+    """Operations per second for NSG rule and route writes."""
+    arm = FakeARM(request_latency=request_latency)
+    modules = build_modules(arm)
+    modules['nsg'].create_nsg(RESOURCE_GROUP, 'bench-nsg', LOCATION)
+    modules['route_table'].create_route_table(RESOURCE_GROUP, 'bench-rt', LOCATION)
+
+    start = time.perf_counter()
+    for index in range(count):
+        modules['nsg'].add_nsg_rule(RESOURCE_GROUP, 'bench-nsg', f'rule-{index}', 100 + index, 'Inbound',
+                                    'Allow', 'Tcp', f'10.{index // 256}.{index % 256}.0/24', '*', '*', '443')
+    rule_elapsed = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for index in range(count):
+        modules['route_table'].add_route(RESOURCE_GROUP, 'bench-rt', f'route-{index}',
+                                         f'10.{index // 256}.{index % 256}.0/24', 'VnetLocal')
+    route_elapsed = time.perf_counter() - start
+    return {
+        'count': count,
+        'nsg_rules_per_second': count / rule_elapsed if rule_elapsed else None,
+        'routes_per_second': count / route_elapsed if route_elapsed else None,
+    }
+
+
+def bench_polling(lro_latency, poll_interval):
+    """Request counts, including LRO poll requests, for one topology."""
+    arm = FakeARM(poll_interval=poll_interval)
+    modules = build_modules(arm)
+    # The VNet module polls every 5 seconds; keep it out of the LRO-latency measurement.
+    modules['vnet'].create_vnet(RESOURCE_GROUP, 'bench-vnet-0', LOCATION, "10.0.0.0/16")
+    arm.lro_latency = lro_latency
+    arm.reset_counts()
+    start = time.perf_counter()
+    modules['subnet'].create_subnet(RESOURCE_GROUP, 'bench-vnet-0', 'bench-subnet-0', "10.0.1.0/24")
+    modules['nsg'].create_nsg(RESOURCE_GROUP, 'bench-nsg-0', LOCATION)
+    modules['vng'].create_virtual_network_gateway(
+        RESOURCE_GROUP, 'bench-vng-0', LOCATION, "Vpn", "RouteBased", "subnet_id", "public_ip_id")
+    modules['route_table'].create_route_table(RESOURCE_GROUP, 'bench-rt-0', LOCATION)
+    modules['scale_set'].create_scale_set(
+        RESOURCE_GROUP, 'bench-scale-set-0', LOCATION, "Standard_DS1_v2", 2, "subnet_id")
+    elapsed = time.perf_counter() - start
+    polls = {op: n for op, n in arm.request_counts.items() if op.endswith('.poll')}
+    return {
+        'lro_latency': lro_latency,
+        'poll_interval': poll_interval,
+        'wall_seconds': elapsed,
+        'poll_requests': sum(polls.values()),
+        'total_requests': sum(arm.request_counts.values()),
+        'requests_by_operation': dict(sorted(arm.request_counts.items())),
+    }
+
+
+def bench_watcher(count):
+    """Requests per polling tick for `count` pending resources: per-resource GETs vs one batched list."""
+    arm = FakeARM()
+    modules = build_modules(arm)
+    for index in range(count):
+        modules['nsg'].create_nsg(RESOURCE_GROUP, f'bench-nsg-{index}', LOCATION)
+    arm.reset_counts()
+    for index in range(count):
+        modules['nsg'].get_nsg(RESOURCE_GROUP, f'bench-nsg-{index}')
+    per_resource = sum(arm.request_counts.values())
+
+    watcher = AzureProvisioningWatcher(arm.subscription_id, RESOURCE_GROUP)
+    watcher.network_client = arm.client()
+    watcher.compute_client = arm.client()
+    for index in range(count):
+        watcher.watch('nsg', f'bench-nsg-{index}')
+    arm.reset_counts()
+    watcher.poll_once()
+    batched = sum(arm.request_counts.values())
+    return {
+        'pending_resources': count,
+        'per_resource_requests_per_tick': per_resource,
+        'batched_requests_per_tick': batched,
+    }
+
+
+def bench_vm_fleet(count, lro_latency, poll_interval, concurrency=10):
+    """Wall time to create `count` VMs with their NICs, serially and pipelined."""
+    results = {'vms': count, 'lro_latency': lro_latency}
+    for label, workers in (('serial', 1), ('pipelined', concurrency)):
+        arm = FakeARM(lro_latency=lro_latency, poll_interval=poll_interval)
+        modules = build_modules(arm)
+        vm_names = [f'bench-fleet-vm-{index}' for index in range(count)]
+        start = time.perf_counter()
+        created = sum(result.error is None for result in modules['vm'].create_vm_fleet(
+            RESOURCE_GROUP, vm_names, LOCATION, 'subnet_id', max_concurrency=workers))
+        results[f'{label}_wall_seconds'] = time.perf_counter() - start
+        results[f'{label}_created'] = created
+    return results
+
+
+def bench_tagging(count, request_latency):
+    """Wall time and writes to retag `count` NSGs and route tables, then to re-run the same retag."""
+    arm = FakeARM(request_latency=request_latency)
+    modules = build_modules(arm)
+    for index in range(count):
+        modules['nsg'].create_nsg(RESOURCE_GROUP, f'bench-nsg-{index}', LOCATION)
+        modules['route_table'].create_route_table(RESOURCE_GROUP, f'bench-rt-{index}', LOCATION)
+    tagging = AzureTaggingModule(arm.subscription_id, writes_per_second=0)
+    tagging.network_client = arm.client()
+    tagging.compute_client = arm.client()
+    results = {'resources': 2 * count}
+
+    arm.reset_counts()
+    start = time.perf_counter()
+    for index in range(count):
+        modules['nsg'].update_nsg_tags(RESOURCE_GROUP, f'bench-nsg-{index}', {'CostCenter': '42'})
+        modules['route_table'].update_route_table_tags(RESOURCE_GROUP, f'bench-rt-{index}', {'CostCenter': '42'})
+    results['one_by_one_wall_seconds'] = time.perf_counter() - start
+    results['one_by_one_requests'] = sum(arm.request_counts.values())
+
+    for label in ('bulk', 'bulk_repeat'):
+        arm.reset_counts()
+        start = time.perf_counter()
+        tagging.apply_tags(RESOURCE_GROUP, {'CostCenter': '43'}, ['nsg', 'route_table'])
+        results[f'{label}_wall_seconds'] = time.perf_counter() - start
+        results[f'{label}_requests'] = sum(arm.request_counts.values())
+    return results
+
+
+class _KeepAliveHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        self.send_response(200)
+        self.send_header('Content-Length', '2')
+        self.end_headers()
+        self.wfile.write(b'{}')
+
+    def log_message(self, *args):
+        pass
+
+
+def bench_connection_pool(count, concurrency=32):
+    """Connections opened for `count` GETs fanned out in bursts of `concurrency`: default pool vs shared transport.
+
+    Between bursts every connection is returned, so a pool smaller than the burst
+    discards the surplus and has to open it again on the next burst.
+    """
+    server = ThreadingHTTPServer(('127.0.0.1', 0), _KeepAliveHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = f'http://127.0.0.1:{server.server_address[1]}/'
+    results = {'requests': max(count // concurrency, 1) * concurrency, 'concurrency': concurrency}
+    # The default pool logs a warning for every connection it discards.
+    pool_logger = logging.getLogger('urllib3.connectionpool')
+    pool_logger_disabled, pool_logger.disabled = pool_logger.disabled, True
+    try:
+        default_session = requests.Session()
+        transport = AzureTransportModule(max_concurrency=concurrency)
+        for label, session in (('default', default_session), ('shared', transport.session)):
+            start = time.perf_counter()
+            with ThreadPoolExecutor(max_workers=concurrency) as executor:
+                for _ in range(max(count // concurrency, 1)):
+                    list(executor.map(lambda _: session.get(url).close(), range(concurrency)))
+            results[f'{label}_wall_seconds'] = time.perf_counter() - start
+        pools = default_session.get_adapter(url).poolmanager.pools
+        results['default_connections'] = sum(pools[key].num_connections for key in pools.keys())
+        results['shared_connections'] = transport.pool_stats()['pool_misses']
+        default_session.close()
+        transport.close()
+    finally:
+        pool_logger.disabled = pool_logger_disabled
+        server.shutdown()
+        server.server_close()
+    return results
+
+
+def bench_nsg_impact(flow_count, rule_count=200):
+    """Seconds to preview one rule change over `flow_count` recorded flows: indexed vs full re-evaluation."""
+    rng = random.Random(0)
+    rules = [{
+        'name': f'rule-{index}', 'priority': 100 + index, 'direction': 'Inbound',
+        'access': rng.choice(['Allow', 'Deny']), 'protocol': 'Tcp',
+        'source_address_prefix': '*', 'destination_address_prefix': f'10.{index % 50}.0.0/16',
+        'source_port_range': '*', 'destination_port_range': str(rng.choice([22, 80, 443, 3389, 8080])),
+    } for index in range(rule_count)]
+    flows = [Flow('Inbound', 'Tcp', f'172.16.{rng.randrange(256)}.{rng.randrange(256)}', rng.randrange(1024, 65536),
+                  f'10.{rng.randrange(60)}.{rng.randrange(256)}.{rng.randrange(256)}',
+                  rng.choice([22, 80, 443, 3389, 8080, 5432]))
+             for _ in range(flow_count)]
+    change = dict(rules[3], name='block-ssh', priority=90, access='Deny', destination_port_range='22')
+
+    full = AzureNSGImpactModule(rules)
+    start = time.perf_counter()
+    after = AzureNSGImpactModule(rules + [change])
+    full_changed = sum(full.evaluate(flow)[0] != after.evaluate(flow)[0] for flow in flows)
+    full_seconds = time.perf_counter() - start
+
+    analyzer = AzureNSGImpactModule(rules)
+    analyzer.record_flows(flows)
+    start = time.perf_counter()
+    report = analyzer.analyze(add=[change])
+    return {
+        'flows': flow_count,
+        'rules': rule_count,
+        'full_seconds': full_seconds,
+        'indexed_seconds': time.perf_counter() - start,
+        'indexed_evaluated': report.evaluated,
+        'changed': len(report.changed),
+        'full_changed': full_changed,
+    }
+
+
+def bench_reachability(subnet_count, query_count=2000):
+    """Seconds to answer a batch of reachability queries cold, memoized, and after one NSG rule change."""
+    rng = random.Random(0)
+    prefix = '/subscriptions/bench/resourceGroups/bench-rg/providers/Microsoft.Network'
+    nsgs = [FakeModel({
+        'id': f'{prefix}/networkSecurityGroups/nsg-{index}',
+        'security_rules': [{
+            'name': f'allow-{port}', 'priority': 100 + offset, 'direction': 'Inbound', 'access': 'Allow',
+            'protocol': 'Tcp', 'source_address_prefix': 'VirtualNetwork', 'destination_address_prefix': '*',
+            'source_port_range': '*', 'destination_port_range': str(port),
+        } for offset, port in enumerate((22, 443, 1433))],
+        'default_security_rules': [{
+            'name': 'AllowVnetOutBound', 'priority': 65000, 'direction': 'Outbound', 'access': 'Allow',
+            'protocol': '*', 'source_address_prefix': 'VirtualNetwork', 'destination_address_prefix': 'VirtualNetwork',
+            'source_port_range': '*', 'destination_port_range': '*',
+        }],
+    }) for index in range(subnet_count)]
+    vnet = FakeModel({
+        'id': f'{prefix}/virtualNetworks/bench-vnet',
+        'address_space': {'address_prefixes': ['10.0.0.0/8']},
+        'virtual_network_peerings': [],
+        'subnets': [{
+            'id': f'{prefix}/virtualNetworks/bench-vnet/subnets/subnet-{index}',
+            'address_prefix': f'10.{index // 256}.{index % 256}.0/24',
+            'network_security_group': {'id': nsg.id},
+        } for index, nsg in enumerate(nsgs)],
+    })
+    graph = AzureReachabilityModule([vnet], [], nsgs)
+
+    def address():
+        index = rng.randrange(subnet_count)
+        return f'10.{index // 256}.{index % 256}.{rng.randrange(4, 250)}'
+
+    queries = [Query(address(), address(), rng.choice([22, 443, 1433, 8080])) for _ in range(query_count)]
+    # Make sure the changed rule decides at least one cached answer.
+    queries[0] = Query(address(), '10.0.0.10', 22)
+    start = time.perf_counter()
+    graph.reach_many(queries)
+    cold_seconds = time.perf_counter() - start
+    start = time.perf_counter()
+    graph.reach_many(queries)
+    warm_seconds = time.perf_counter() - start
+    invalidated = graph.remove_security_rule(nsgs[0].id, 'allow-22')
+    start = time.perf_counter()
+    graph.reach_many(queries)
+    return {
+        'subnets': subnet_count,
+        'queries': query_count,
+        'cold_seconds': cold_seconds,
+        'warm_seconds': warm_seconds,
+        'invalidated': invalidated,
+        'after_change_seconds': time.perf_counter() - start,
+    }
+
+
+def bench_route_compaction(route_count):
+    """Routes left and seconds spent compacting `route_count` fragmented routes and verifying the result."""
+    rng = random.Random(0)
+    hops = [('VirtualAppliance', '10.255.0.4'), ('VirtualAppliance', '10.255.0.5'), ('Internet', None)]
+    routes = [RouteSpec(f'route-{index}', f'10.{index // 64}.{index % 64 * 4}.0/22', *hops[index // 16 % 2])
+              for index in range(route_count)]
+    routes += [RouteSpec(f'override-{index}', f'10.{rng.randrange(route_count // 64 + 1)}.{rng.randrange(256)}.0/24',
+                         *rng.choice(hops)) for index in range(route_count // 10)]
+    start = time.perf_counter()
+    compacted = compact_routes(routes)
+    compact_seconds = time.perf_counter() - start
+    start = time.perf_counter()
+    difference = find_difference(routes, compacted)
+    return {
+        'routes': len(routes),
+        'compacted_routes': len(compacted),
+        'compact_seconds': compact_seconds,
+        'verify_seconds': time.perf_counter() - start,
+        'equivalent': difference is None,
+    }
+
+
+def bench_priority_allocation(rule_count, batches=500):
+    """Single-rule inserts directly after random rules: gap index vs a linear scan of the listed rules.
+
+    The scan can only place a rule where a free priority precedes the next rule; the
+    index also renumbers neighbours, so every insert is placed.
+    """
+    rng = random.Random(0)
+    priorities = sorted(rng.sample(range(100, 4097), rule_count))
+    rules = [{'name': f'rule-{priority}', 'priority': priority, 'direction': 'Inbound'} for priority in priorities]
+    targets = [rng.choice(rules)['name'] for _ in range(batches)]
+
+    used = list(priorities)
+    start = time.perf_counter()
+    scan_placed = 0
+    for name in targets:
+        after = int(name.split('-')[1])
+        free = next((priority for priority in range(after + 1, 4097) if priority not in used), None)
+        if free is not None and all(not after < other < free for other in used):
+            used.append(free)
+            scan_placed += 1
+    scan_seconds = time.perf_counter() - start
+
+    allocator = AzureNSGPriorityModule(rules)
+    start = time.perf_counter()
+    moves = 0
+    for index, name in enumerate(targets):
+        moves += len(allocator.allocate('Inbound', after=name, names=[f'new-{index}']).moves)
+    return {
+        'rules': rule_count,
+        'inserts': batches,
+        'scan_seconds': scan_seconds,
+        'scan_placed': scan_placed,
+        'index_seconds': time.perf_counter() - start,
+        'renumbered_rules': moves,
+    }
+
+
+def bench_export(count):
+    """Seconds and bytes on disk to export an inventory of `count` topologies: JSON dump vs Parquet."""
+    if pyarrow is None:
+        return {'skipped': 'pyarrow is not installed'}
+    arm = FakeARM()
+    modules = build_modules(arm)
+    _populate(modules, count)
+    exporter = AzureExportModule(arm.subscription_id)
+    exporter.network_client = arm.client()
+    exporter.compute_client = arm.client()
+    root = tempfile.mkdtemp()
+    try:
+        json_path = os.path.join(root, 'inventory.json')
+        start = time.perf_counter()
+        with open(json_path, 'w') as f:
+            json.dump({resource_type: [item.as_dict() for _, item, _ in exporter._stream(RESOURCE_GROUP, [resource_type])]
+                       for resource_type in EXPORT_SOURCES}, f, default=str)
+        json_seconds = time.perf_counter() - start
+        start = time.perf_counter()
+        result = exporter.export(os.path.join(root, 'parquet'), [RESOURCE_GROUP])
+        parquet_seconds = time.perf_counter() - start
+        return {
+            'topologies': count,
+            'rows': sum(result.rows.values()),
+            'json_seconds': json_seconds,
+            'json_bytes': os.path.getsize(json_path),
+            'parquet_seconds': parquet_seconds,
+            'parquet_bytes': sum(os.path.getsize(path) for path in result.files),
+        }
+    finally:
+        shutil.rmtree(root)
+
+
+def bench_job_queue(count, job_latency=0.005, workers=4, subscription_limit=2):
+    """Seconds to drain `count` jobs over two subscriptions with one worker vs `workers` workers on a SQLite queue.
+
+    Also reports the most jobs that ever ran at once for a subscription, which must not exceed its limit.
+    """
+    root = tempfile.mkdtemp()
+    try:
+        results = {'jobs': count, 'subscription_limit': subscription_limit}
+        for label, worker_count in (('one_worker', 1), ('workers', workers)):
+            queue = AzureJobQueue(os.path.join(root, f'{label}.sqlite'), default_subscription_limit=subscription_limit)
+            for index in range(count):
+                queue.enqueue('provision', f'sub-{index % 2}', {'index': index}, idempotency_key=f'job-{index}')
+            lock = threading.Lock()
+            running, peak = {}, {}
+
+            def handler(job, checkpoint):
+                with lock:
+                    running[job.subscription_id] = running.get(job.subscription_id, 0) + 1
+                    peak[job.subscription_id] = max(peak.get(job.subscription_id, 0), running[job.subscription_id])
+                time.sleep(job_latency)
+                with lock:
+                    running[job.subscription_id] -= 1
+                return None
+
+            pool = [AzureJobWorker(queue, {'provision': handler}, worker_id=f'w{index}', poll_interval=0.001)
+                    for index in range(worker_count)]
+            start = time.perf_counter()
+            threads = [threading.Thread(target=worker.run) for worker in pool]
+            for thread in threads:
+                thread.start()
+            while queue.counts().get('succeeded', 0) < count:
+                time.sleep(0.005)
+            results[f'{label}_wall_seconds'] = time.perf_counter() - start
+            for worker in pool:
+                worker.stop()
+            for thread in threads:
+                thread.join()
+            results[f'{label}_peak_per_subscription'] = max(peak.values())
+            queue.close()
+        return results
+    finally:
+        shutil.rmtree(root)
+
+
+def bench_service(count, request_latency):
+    """Seconds for `count` list requests: a cold module set per request vs the warm service."""
+    arm = FakeARM(request_latency=request_latency)
+    build_modules(arm)['nsg'].create_nsg(RESOURCE_GROUP, 'bench-nsg', LOCATION)
+    start = time.perf_counter()
+    for _ in range(count):
+        build_modules(arm)['nsg'].list_nsgs(RESOURCE_GROUP)
+    cold_seconds = time.perf_counter() - start
+
+    service = AzureServiceModule(arm.subscription_id)
+    service.module('nsg').network_client = arm.client()
+    start = time.perf_counter()
+    for _ in range(count):
+        service.handle('GET', f'/resource_groups/{RESOURCE_GROUP}/nsgs')
+    warm_seconds = time.perf_counter() - start
+    service.close()
+    return {
+        'requests': count,
+        'cold_seconds': cold_seconds,
+        'warm_seconds': warm_seconds,
+        'cold_ms_per_request': cold_seconds / count * 1000,
+        'warm_ms_per_request': warm_seconds / count * 1000,
+    }
+
+
+def bench_coalescing(count, request_latency, fan_out=50):
+    """ARM requests and seconds for `fan_out` concurrent readers of each of `count` parents, with and without coalescing."""
+    arm = FakeARM(request_latency=max(request_latency, 0.002))
+    modules = build_modules(arm)
+    parents = [f'bench-nsg-{index}' for index in range(max(count // 20, 1))]
+    for name in parents:
+        modules['nsg'].create_nsg(RESOURCE_GROUP, name, LOCATION)
+    results = {'parents': len(parents), 'fan_out': fan_out}
+    for label, module in (('direct', modules['nsg']),
+                          ('coalesced', AzureCoalescingModule().coalesce(build_modules(arm)['nsg'], 'nsg'))):
+        module.network_client = arm.client()
+        arm.reset_counts()
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=fan_out) as executor:
+            list(executor.map(lambda name: module.list_nsg_rules(RESOURCE_GROUP, name),
+                              [name for name in parents for _ in range(fan_out)]))
+        results[f'{label}_wall_seconds'] = time.perf_counter() - start
+        results[f'{label}_requests'] = sum(arm.request_counts.values())
+    return results
+
+
+def bench_deadline(count, budget=0.5, lro_latency=60.0, poll_interval=0.01):
+    """How far past a `budget`-second deadline a run with stuck LROs overruns, blocking and with `count` detached LROs."""
+    arm = FakeARM(lro_latency=lro_latency, poll_interval=poll_interval)
+    modules = build_modules(arm)
+    with AzureDeadline(budget, name='bench') as deadline:
+        start = time.perf_counter()
+        operations = [modules['nsg'].create_nsg(RESOURCE_GROUP, f'bench-nsg-{index}', LOCATION, wait=False)
+                      for index in range(count)]
+        modules['vng'].create_virtual_network_gateway(
+            RESOURCE_GROUP, 'bench-vng', LOCATION, "Vpn", "RouteBased", "subnet_id", "public_ip_id")
+        blocked_seconds = time.perf_counter() - start
+    deadline.wait()
+    detached_seconds = time.perf_counter() - start
+    return {
+        'budget_seconds': budget,
+        'lro_latency': lro_latency,
+        'blocking_overrun_seconds': max(blocked_seconds - budget, 0),
+        'detached_operations': sum(operation.cancelled() for operation in operations),
+        'detach_overrun_seconds': max(detached_seconds - budget, 0),
+    }
+
+
+def bench_profiling(count):
+    """Overhead of each profiling mode on a full list crawl of `count` topologies, and the report size."""
+    arm = FakeARM()
+    modules = build_modules(arm)
+    _populate(modules, count)
+    results = {'topologies': count}
+    for mode in ('off',) + PROFILE_MODES:
+        profiler = AzureProfilingModule(mode=mode if mode != 'off' else 'cprofile', enabled=mode != 'off')
+        crawled = {name: profiler.instrument(module, name) for name, module in build_modules(arm).items()}
+        start = time.perf_counter()
+        with profiler.phase('crawl'):
+            crawl_inventory(crawled, count)
+        results[f'{mode}_wall_seconds'] = time.perf_counter() - start
+        profiler.stop()
+        if mode != 'off':
+            results[f'{mode}_report_bytes'] = len(json.dumps(profiler.report(), separators=(',', ':')))
+    return results
+
+
+def _nsg_json(index, rule_count):
+    def rule(number):
+        return {'id': f'/nsgs/bench-nsg-{index}/securityRules/rule-{number}', 'name': f'rule-{number}', 'etag': 'W/"1"',
+                'type': 'Microsoft.Network/networkSecurityGroups/securityRules',
+                'properties': {'provisioningState': 'Succeeded', 'priority': 100 + number, 'access': 'Allow',
+                               'direction': 'Inbound', 'protocol': 'Tcp', 'sourcePortRange': '*',
+                               'destinationPortRange': '443', 'sourceAddressPrefix': f'10.{number}.0.0/16',
+                               'destinationAddressPrefix': '*'}}
+    return {'id': f'/nsgs/bench-nsg-{index}', 'name': f'bench-nsg-{index}', 'location': LOCATION, 'etag': 'W/"1"',
+            'tags': {'Environment': 'Bench'},
+            'properties': {'provisioningState': 'Succeeded',
+                           'securityRules': [rule(number) for number in range(rule_count)],
+                           'defaultSecurityRules': [rule(number) for number in range(6)]}}
+
+
+def bench_projection(count, rule_count=100):
+    """Seconds to list `count` NSGs of `rule_count` rules each as SDK models vs as projected records."""
+    body = json.dumps({'value': [_nsg_json(index, rule_count) for index in range(count)]}).encode()
+
+    class Handler(_KeepAliveHandler):
+        def do_GET(self):
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    # A plain HTTP endpoint needs no credential, so the bearer-token policy is replaced with a no-op.
+    client = NetworkManagementClient(object(), 'bench-subscription',
+                                     base_url=f'http://127.0.0.1:{server.server_address[1]}',
+                                     authentication_policy=SansIOHTTPPolicy())
+    fields = ('name', 'provisioning_state')
+    results = {'nsgs': count, 'rules_per_nsg': rule_count, 'response_bytes': len(body)}
+    try:
+        for label, read in (('models', lambda: [(nsg.name, nsg.provisioning_state)
+                                                for nsg in client.network_security_groups.list(RESOURCE_GROUP)]),
+                            ('projected', lambda: list_projected(client, 'bench-subscription', 'nsg',
+                                                                 RESOURCE_GROUP, fields))):
+            start = time.perf_counter()
+            read()
+            results[f'{label}_wall_seconds'] = time.perf_counter() - start
+    finally:
+        client.close()
+        server.shutdown()
+        server.server_close()
+    return results
+
+
+def bench_compute_catalog(count, request_latency, concurrency=10):
+    """Size and image lookups and seconds to resolve `count` concurrent VM creates, uncached and cached."""
+    latency = max(request_latency, 0.02)
+    lookups = []
+
+    def lookup(result):
+        def call(*args, **kwargs):
+            lookups.append(args)
+            time.sleep(latency)
+            return result
+        return call
+
+    skus = [SimpleNamespace(name=f'Standard_D{index}s_v5', resource_type='virtualMachines', restrictions=[],
+                            location_info=[SimpleNamespace(location=LOCATION, zones=['1', '2', '3'])])
+            for index in range(200)]
+    versions = [SimpleNamespace(name=f'18.04.2024{index:05d}') for index in range(100)]
+    results = {'creates': count, 'lookup_latency': latency}
+    for label, ttl in (('uncached', 0), ('cached', 3600)):
+        catalog = AzureComputeCatalog('bench-subscription', credential=object(), ttl=ttl)
+        catalog.compute_client = SimpleNamespace(resource_skus=SimpleNamespace(list=lookup(skus)),
+                                                 virtual_machine_images=SimpleNamespace(list=lookup(versions)))
+        del lookups[:]
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            resolved = list(executor.map(lambda _: catalog.resolve(LOCATION, 'Standard_D1s_v5'), range(count)))
+        results[f'{label}_wall_seconds'] = time.perf_counter() - start
+        results[f'{label}_lookups'] = len(lookups)
+        results[f'{label}_versions'] = len({image['version'] for image in resolved})
+    return results
+
+
+def bench_snapshot_memory(count):
+    """Peak traced memory while building an inventory snapshot of `count` topologies."""
+    arm = FakeARM()
+    modules = build_modules(arm)
+    _populate(modules, count)
+    tracemalloc.start()
+    try:
+        snapshot = crawl_inventory(modules, count)
+        current, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    items = sum(len(items) for items in snapshot.values())
+    return {
+        'topologies': count,
+        'items': items,
+        'current_bytes': current,
+        'peak_bytes': peak,
+        'bytes_per_item': current / items if items else None,
+    }
+
+
+def _git_commit():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', 'HEAD'], text=True,
+                                       stderr=subprocess.DEVNULL).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run(args):
+    """Run every benchmark and return the machine-readable results."""
+    with contextlib.redirect_stdout(io.StringIO()):
+        results = {
+            'provisioning': bench_provisioning(args.scales, args.request_latency),
+            'crawl': bench_crawl(args.count, args.request_latency),
+            'sync': bench_sync(args.count, args.request_latency),
+            'polling': bench_polling(args.lro_latency, args.poll_interval),
+            'watcher': bench_watcher(args.count),
+            'vm_fleet': bench_vm_fleet(args.fleet_size, args.lro_latency, args.poll_interval),
+            'tagging': bench_tagging(args.count, args.request_latency),
+            'connection_pool': bench_connection_pool(args.count),
+            'nsg_impact': bench_nsg_impact(args.count * 100),
+            'reachability': bench_reachability(args.count * 10),
+            'route_compaction': bench_route_compaction(args.count * 5),
+            'priority_allocation': bench_priority_allocation(min(args.count * 10, 3000)),
+            'export': bench_export(args.count),
+            'job_queue': bench_job_queue(args.count),
+            'service': bench_service(args.count, args.request_latency),
+            'coalescing': bench_coalescing(args.count, args.request_latency),
+            'deadline': bench_deadline(args.count),
+            'profiling': bench_profiling(args.count),
+            'projection': bench_projection(args.count),
+            'compute_catalog': bench_compute_catalog(args.count, args.request_latency),
+            'snapshot_memory': bench_snapshot_memory(args.count),
+        }
+    return {
+        'commit': _git_commit(),
+        'timestamp': time.time(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'results': results,
+    }
+
+
+def _flatten(value, prefix=''):
+    if isinstance(value, dict):
+        for key, item in value.items():
+            yield from _flatten(item, f"{prefix}.{key}" if prefix else key)
+    elif isinstance(value, list):
+        for item in value:
+            label = f"scale={item['scale']}" if isinstance(item, dict) and 'scale' in item else None
+            yield from _flatten(item, f"{prefix}[{label}]" if label else prefix)
+    elif isinstance(value, (int, float)) and not isinstance(value, bool):
+        yield prefix, value
+
+
+def compare(baseline, current):
+    """Return (metric, baseline, current, percent change) rows for shared numeric metrics."""
+    before = dict(_flatten(baseline['results']))
+    rows = []
+    for metric, value in _flatten(current['results']):
+        if metric in before and before[metric]:
+            rows.append((metric, before[metric], value, (value - before[metric]) / before[metric] * 100))
+    return rows
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the Azure modules against a local ARM stand-in.")
+    parser.add_argument('--scales', type=lambda s: [int(n) for n in s.split(',')], default=[1, 10, 50],
+                        help="Comma-separated topology counts for the provisioning benchmark.")
+    parser.add_argument('--count', type=int, default=200,
+                        help="Resource count for the crawl, sync and memory benchmarks.")
+    parser.add_argument('--fleet-size', type=int, default=20,
+                        help="VM count for the fleet creation benchmark.")
+    parser.add_argument('--request-latency', type=float, default=0.0,
+                        help="Simulated latency of every ARM request, in seconds.")
+    parser.add_argument('--lro-latency', type=float, default=0.05,
+                        help="Simulated duration of each long-running operation, in seconds.")
+    parser.add_argument('--poll-interval', type=float, default=0.005,
+                        help="Simulated LRO polling interval, in seconds.")
+    parser.add_argument('--output', help="Write the JSON results to this file instead of stdout.")
+    parser.add_argument('--compare', help="Compare against a previous JSON results file.")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    report = run(args)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+    else:
+        json.dump(report, sys.stdout, indent=2)
+        print()
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        for metric, before, after, change in compare(baseline, report):
+            print(f"{metric}: {before:.6g} -> {after:.6g} ({change:+.1f}%)", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
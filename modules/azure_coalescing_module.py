@@ -0,0 +1,140 @@
+import functools
+import threading
+import time
+
+# Module methods treated as reads; every other public method counts as a write.
+READ_PREFIXES = ('get_', 'list_')
+# Reads whose result callers mutate, so it must never be shared.
+UNSHARED_READS = ('get_impact_analyzer',)
+
+
+class _Flight:
+    """One in-flight read that later identical callers wait on."""
+
+    def __init__(self, generation):
+        self.generation = generation
+        self.event = threading.Event()
+        self.result = None
+        self.error = None
+
+
+def _freeze(value):
+    if isinstance(value, dict):
+        return tuple(sorted((key, _freeze(item)) for key, item in value.items()))
+    if isinstance(value, (list, tuple, set, frozenset)):
+        return tuple(_freeze(item) for item in value)
+    hash(value)
+    return value
+
+
+class AzureCoalescingModule:
+    def __init__(self, ttl=0, max_entries=10000):
+        """Initialize a single-flight layer for module reads.
+
+        Identical concurrent reads (same module, method and arguments) share one ARM
+        request and its result. With `ttl` > 0, successful results are also reused for
+        that many seconds. A write through a coalesced module drops the cached and
+        in-flight reads of that module, so later reads see it. Shared results must be
+        treated as read-only.
+        """
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._flights = {}
+        self._results = {}
+        self._generations = {}
+        self._stats = {'calls': 0, 'requests': 0, 'coalesced': 0, 'cache_hits': 0}
+
+    def call(self, key, func, *args, **kwargs):
+        """Return `func(*args, **kwargs)`, sharing the call with concurrent callers of the same `key`.
+
+        `key` is a tuple whose first item names the resource type that writes invalidate.
+        """
+        now = time.monotonic()
+        with self._lock:
+            self._stats['calls'] += 1
+            cached = self._results.get(key)
+            if cached is not None and cached[0] > now:
+                self._stats['cache_hits'] += 1
+                return cached[1]
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[key] = _Flight(self._generations.get(key[0], 0))
+                self._stats['requests'] += 1
+            else:
+                self._stats['coalesced'] += 1
+        if not leader:
+            flight.event.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.result
+        try:
+            flight.result = func(*args, **kwargs)
+        except BaseException as e:
+            flight.error = e
+            raise
+        finally:
+            with self._lock:
+                if self._flights.get(key) is flight:
+                    del self._flights[key]
+                # Module reads return None on failure; only real results are reused.
+                if (self.ttl and flight.error is None and flight.result is not None
+                        and flight.generation == self._generations.get(key[0], 0)):
+                    if len(self._results) >= self.max_entries:
+                        self._results.clear()
+                    self._results[key] = (time.monotonic() + self.ttl, flight.result)
+            flight.event.set()
+        return flight.result
+
+    def invalidate(self, resource_type=None):
+        """Drop cached and in-flight reads of one resource type, or of all of them."""
+        with self._lock:
+            for store in (self._results, self._flights):
+                for key in [key for key in store if resource_type is None or key[0] == resource_type]:
+                    del store[key]
+            for key in ([resource_type] if resource_type is not None else list(self._generations)):
+                self._generations[key] = self._generations.get(key, 0) + 1
+
+    def stats(self):
+        """Return counts of calls, ARM requests actually sent, coalesced callers and cache hits."""
+        with self._lock:
+            return dict(self._stats)
+
+    def coalesce(self, module, resource_type, read_prefixes=READ_PREFIXES):
+        """Route the read methods of a module instance through the single-flight layer.
+
+        Other public methods run unchanged and then invalidate `resource_type`.
+        """
+        for name in dir(type(module)):
+            method = getattr(module, name)
+            if name.startswith('_') or not callable(method) or name in UNSHARED_READS:
+                continue
+            if name.startswith(read_prefixes):
+                setattr(module, name, self._wrap_read(method, name, resource_type))
+            else:
+                setattr(module, name, self._wrap_write(method, resource_type))
+        return module
+
+    def _wrap_read(self, method, name, resource_type):
+        @functools.wraps(method)
+        def wrapper(*args, **kwargs):
+            try:
+                key = (resource_type, name, _freeze(args), _freeze(kwargs))
+            except TypeError:
+                return method(*args, **kwargs)
+            return self.call(key, method, *args, **kwargs)
+        return wrapper
+
+    def _wrap_write(self, method, resource_type):
+        @functools.wraps(method)
+        def wrapper(*args, **kwargs):
+            try:
+                result = method(*args, **kwargs)
+            finally:
+                self.invalidate(resource_type)
+            if hasattr(result, 'add_done_callback'):
+                # A write started with wait=False changes the resource again when its LRO finishes.
+                result.add_done_callback(lambda _: self.invalidate(resource_type))
+            return result
+        return wrapper
@@ -0,0 +1,213 @@
+from azure.mgmt.compute import ComputeManagementClient
+from azure.core.exceptions import ResourceNotFoundError
+from collections import namedtuple
+from modules.azure_credential_module import shared_credential
+from modules.azure_nsg_impact_module import enum_value
+import threading
+import time
+
+# The image VMs and scale sets are created from unless another one is given.
+DEFAULT_IMAGE = {
+    'publisher': 'Canonical',
+    'offer': 'UbuntuServer',
+    'sku': '18.04-LTS',
+    'version': 'latest'
+}
+
+# One VM size as offered in a location; `restriction` is the reason code when the whole location is restricted.
+VMSizeAvailability = namedtuple('VMSizeAvailability', ['name', 'zones', 'restricted_zones', 'restriction'])
+
+
+class ComputeNotAvailableError(ValueError):
+    """Raised before a create is submitted when its VM size or image cannot be deployed where requested."""
+
+
+def _version_key(version):
+    """Sort key for image versions such as '18.04.202401161', comparing numeric parts as numbers."""
+    return tuple((0, int(part), '') if part.isdigit() else (1, 0, part) for part in version.split('.'))
+
+
+class AzureComputeCatalog:
+    def __init__(self, subscription_id, credential=None, ttl=3600, **client_kwargs):
+        """Initialize a cache of VM size availability and image versions for one subscription.
+
+        Entries are loaded on first use per location (and per image) and reused for `ttl`
+        seconds; concurrent callers of the same entry share one lookup. With start(), a
+        background thread reloads every known entry before it expires, so creates never
+        wait on a lookup. If a lookup fails, the previous entry keeps being served.
+        """
+        self.subscription_id = subscription_id
+        self.ttl = ttl
+        self.compute_client = ComputeManagementClient(
+            credential=credential or shared_credential(),
+            subscription_id=self.subscription_id,
+            **client_kwargs
+        )
+        self._lock = threading.Lock()
+        self._entries = {}
+        self._loading = {}
+        self._refresher = None
+        self._stop = threading.Event()
+
+    # Cache
+
+    def _cached(self, key, load):
+        """Return the entry `key`, loading it with `load()` when missing or older than the TTL."""
+        while True:
+            with self._lock:
+                entry = self._entries.get(key)
+                if entry is not None and time.monotonic() - entry[0] < self.ttl:
+                    return entry[1]
+                loading = self._loading.get(key)
+                if loading is None:
+                    loading = self._loading[key] = threading.Event()
+                    break
+            loading.wait()
+            with self._lock:
+                if key in self._entries:
+                    return self._entries[key][1]
+            # The load failed and cached nothing, so this caller loads it itself.
+        try:
+            return self._store(key, load())
+        except Exception:
+            if entry is None:
+                raise
+            print(f"Failed to refresh {key[0]} for '{key[1]}'; serving the cached entry.")
+            return entry[1]
+        finally:
+            with self._lock:
+                del self._loading[key]
+            loading.set()
+
+    def _store(self, key, value):
+        with self._lock:
+            self._entries[key] = (time.monotonic(), value)
+        return value
+
+    def _loader(self, key):
+        if key[0] == 'vm sizes':
+            return lambda: self._load_vm_sizes(key[1])
+        return lambda: self._load_latest_version(*key[1:])
+
+    # VM sizes
+
+    def _load_vm_sizes(self, location):
+        sizes = {}
+        wanted = location.lower()
+        for sku in self.compute_client.resource_skus.list(filter=f"location eq '{location}'"):
+            if sku.resource_type != 'virtualMachines':
+                continue
+            zones = set()
+            for info in sku.location_info or []:
+                if (info.location or '').lower() == wanted:
+                    zones.update(info.zones or [])
+            restricted_zones = set()
+            restriction = None
+            for restricted in sku.restrictions or []:
+                info = restricted.restriction_info
+                kind = enum_value(restricted.type)
+                if kind == 'Location' and wanted in [name.lower() for name in (info and info.locations) or []]:
+                    restriction = enum_value(restricted.reason_code or 'NotAvailableForSubscription')
+                elif kind == 'Zone' and info is not None:
+                    restricted_zones.update(info.zones or [])
+            sizes[sku.name.lower()] = VMSizeAvailability(sku.name, frozenset(zones), frozenset(restricted_zones),
+                                                         restriction)
+        print(f"Loaded {len(sizes)} VM sizes for location '{location}'.")
+        return sizes
+
+    def vm_sizes(self, location):
+        """Return the VM sizes offered in `location`, as VMSizeAvailability by lowercase size name."""
+        key = ('vm sizes', location.lower())
+        return self._cached(key, self._loader(key))
+
+    def check_size(self, location, vm_size, zones=None):
+        """Return a VM size's availability; raise ComputeNotAvailableError if it cannot be deployed there.
+
+        When the sizes of the location cannot be listed at all, the check is skipped
+        and ARM remains the judge.
+        """
+        try:
+            sizes = self.vm_sizes(location)
+        except Exception as e:
+            print(f"Failed to list VM sizes for location '{location}'; not validating '{vm_size}'. Error: {e}")
+            return None
+        size = sizes.get(vm_size.lower())
+        if size is None:
+            raise ComputeNotAvailableError(f"VM size '{vm_size}' is not offered in location '{location}'.")
+        if size.restriction:
+            raise ComputeNotAvailableError(
+                f"VM size '{vm_size}' is restricted in location '{location}' ({size.restriction}).")
+        for zone in zones or []:
+            if str(zone) not in size.zones or str(zone) in size.restricted_zones:
+                raise ComputeNotAvailableError(
+                    f"VM size '{vm_size}' is not available in zone '{zone}' of location '{location}'.")
+        return size
+
+    # Images
+
+    def _load_latest_version(self, location, publisher, offer, sku):
+        try:
+            versions = [image.name for image in self.compute_client.virtual_machine_images.list(
+                location, publisher, offer, sku)]
+        except ResourceNotFoundError:
+            versions = []
+        if not versions:
+            raise ComputeNotAvailableError(
+                f"Image '{publisher}:{offer}:{sku}' has no versions in location '{location}'.")
+        return max(versions, key=_version_key)
+
+    def resolve_image(self, location, image=None):
+        """Return an image reference with version 'latest' replaced by the concrete version it currently means.
+
+        Every create in the TTL gets the same version, so a fleet is built from one
+        image even when a new version is published meanwhile.
+        """
+        image = dict(image or DEFAULT_IMAGE)
+        if 'id' in image or str(image.get('version', 'latest')).lower() != 'latest':
+            return image
+        key = ('latest image', location.lower(), image['publisher'], image['offer'], image['sku'])
+        try:
+            image['version'] = self._cached(key, self._loader(key))
+        except ComputeNotAvailableError:
+            raise
+        except Exception as e:
+            print(f"Failed to resolve the latest version of image '{image['sku']}'; leaving it to ARM. Error: {e}")
+        return image
+
+    def resolve(self, location, vm_size, image=None, zones=None):
+        """Check that `vm_size` can be deployed and return the resolved image reference to create it from."""
+        self.check_size(location, vm_size, zones)
+        return self.resolve_image(location, image)
+
+    # Background refresh
+
+    def refresh(self):
+        """Reload every cached entry now; failed reloads keep their previous entry."""
+        with self._lock:
+            keys = list(self._entries)
+        for key in keys:
+            try:
+                self._store(key, self._loader(key)())
+            except Exception as e:
+                print(f"Failed to refresh {key[0]} for '{key[1]}'. Error: {e}")
+
+    def start(self, interval=None):
+        """Refresh the cache in a background thread every `interval` seconds (default: half the TTL)."""
+        interval = interval or self.ttl / 2
+        if self._refresher is None:
+            self._stop.clear()
+
+            def run():
+                while not self._stop.wait(interval):
+                    self.refresh()
+
+            self._refresher = threading.Thread(target=run, name='compute-catalog', daemon=True)
+            self._refresher.start()
+        return self
+
+    def stop(self):
+        """Stop the background refresh."""
+        if self._refresher is not None:
+            self._stop.set()
+            self._refresher.join()
+            self._refresher = None
@@ -0,0 +1,219 @@
+from azure.core.credentials import AccessToken
+from azure.core.exceptions import ClientAuthenticationError
+from azure.identity import (
+    AzureCliCredential,
+    AzureDeveloperCliCredential,
+    AzurePowerShellCredential,
+    EnvironmentCredential,
+    ManagedIdentityCredential,
+    WorkloadIdentityCredential,
+)
+import json
+import os
+import threading
+import time
+
+try:
+    from msal_extensions import CrossPlatLock, FilePersistence, build_encrypted_persistence
+except ImportError:
+    CrossPlatLock = FilePersistence = build_encrypted_persistence = None
+
+# Tried in the same order as DefaultAzureCredential; the first one that returns a token is remembered.
+CREDENTIAL_TYPES = {
+    'environment': EnvironmentCredential,
+    'workload_identity': WorkloadIdentityCredential,
+    'managed_identity': ManagedIdentityCredential,
+    'azure_cli': AzureCliCredential,
+    'azure_powershell': AzurePowerShellCredential,
+    'azure_developer_cli': AzureDeveloperCliCredential,
+}
+
+DEFAULT_CACHE_DIR = os.path.join(os.path.expanduser('~'), '.cache', 'azure-networking-management')
+
+_shared_credential = None
+_shared_credential_lock = threading.Lock()
+
+
+def shared_credential():
+    """Return the process-wide AzureCredentialModule that every module uses by default."""
+    global _shared_credential
+    with _shared_credential_lock:
+        if _shared_credential is None:
+            _shared_credential = AzureCredentialModule(
+                cache_dir=os.getenv('AZURE_CREDENTIAL_CACHE_DIR', DEFAULT_CACHE_DIR),
+                credential_type=os.getenv('AZURE_CREDENTIAL_TYPE'),
+                allow_unencrypted_storage=os.getenv('AZURE_TOKEN_CACHE_UNENCRYPTED', '').lower() in ('1', 'true'),
+            )
+        return _shared_credential
+
+
+class AzureCredentialModule:
+    def __init__(self, cache_dir=DEFAULT_CACHE_DIR, credential_type=None, refresh_margin=300,
+                 allow_unencrypted_storage=False):
+        """Initialize a token credential that detects a working credential type once and caches tokens.
+
+        Nothing is probed until the first token is requested. The detected credential
+        type is stored in `cache_dir`, so later processes skip the detection chain and
+        its managed-identity probe. Tokens are cached in memory and, when the platform
+        can encrypt them (DPAPI, Keychain or libsecret), on disk, and reused until they
+        are within `refresh_margin` seconds of expiry. With `allow_unencrypted_storage`
+        tokens are also persisted where encryption is unavailable, readable only by the
+        current user.
+        """
+        if credential_type is not None and credential_type not in CREDENTIAL_TYPES:
+            raise ValueError(f"Unsupported credential type '{credential_type}'.")
+        self.cache_dir = cache_dir
+        self.refresh_margin = refresh_margin
+        self.allow_unencrypted_storage = allow_unencrypted_storage
+        self.credential_type = credential_type
+        self._forced = credential_type is not None
+        self._credential = None
+        self._tokens = {}
+        self._lock = threading.Lock()
+        self._persistence = None
+        self._persistence_checked = False
+
+    def _path(self, name):
+        return os.path.join(self.cache_dir, name)
+
+    def _token_persistence(self):
+        """Return the on-disk token store, or None when tokens stay in memory only."""
+        if not self._persistence_checked:
+            self._persistence_checked = True
+            if build_encrypted_persistence is not None:
+                os.makedirs(self.cache_dir, mode=0o700, exist_ok=True)
+                try:
+                    self._persistence = build_encrypted_persistence(self._path('tokens.bin'))
+                except Exception:
+                    if self.allow_unencrypted_storage:
+                        # Create the file owner-only before the first write.
+                        os.close(os.open(self._path('tokens.json'), os.O_CREAT | os.O_WRONLY, 0o600))
+                        self._persistence = FilePersistence(self._path('tokens.json'))
+                    else:
+                        print("Token encryption is unavailable on this platform; tokens are cached in memory only.")
+        return self._persistence
+
+    def _load_choice(self):
+        try:
+            with open(self._path('credential.json')) as f:
+                credential_type = json.load(f).get('credential_type')
+        except (OSError, ValueError):
+            return None
+        return credential_type if credential_type in CREDENTIAL_TYPES else None
+
+    def _save_choice(self, credential_type):
+        try:
+            os.makedirs(self.cache_dir, mode=0o700, exist_ok=True)
+            with open(self._path('credential.json'), 'w') as f:
+                json.dump({'credential_type': credential_type}, f)
+        except OSError as e:
+            print(f"Failed to cache credential type '{credential_type}'. Error: {e}")
+
+    def _forget_choice(self):
+        try:
+            os.remove(self._path('credential.json'))
+        except OSError:
+            pass
+
+    def _detect(self, scopes, get_token_kwargs):
+        """Try each credential type in order and return (type, credential, token) for the first that works."""
+        errors = []
+        for credential_type, credential_class in CREDENTIAL_TYPES.items():
+            try:
+                credential = credential_class()
+                token = credential.get_token(*scopes, **get_token_kwargs)
+            except (ClientAuthenticationError, ValueError) as e:
+                errors.append(f"{credential_type}: {e}")
+                continue
+            print(f"Using the '{credential_type}' credential.")
+            return credential_type, credential, token
+        raise ClientAuthenticationError("No credential type could authenticate. " + ' | '.join(errors))
+
+    def _fetch(self, scopes, get_token_kwargs):
+        """Request a token from the chosen credential, detecting it first when no choice is known."""
+        if self._credential is None:
+            credential_type = self.credential_type or self._load_choice()
+            if credential_type is not None:
+                self._credential = CREDENTIAL_TYPES[credential_type]()
+                self.credential_type = credential_type
+        if self._credential is not None:
+            try:
+                return self._credential.get_token(*scopes, **get_token_kwargs)
+            except (ClientAuthenticationError, ValueError):
+                # A remembered choice may go stale (e.g. after `az logout`); a forced one is never replaced.
+                if self._forced:
+                    raise
+                self._credential = None
+                self._forget_choice()
+        credential_type, self._credential, token = self._detect(scopes, get_token_kwargs)
+        self.credential_type = credential_type
+        self._save_choice(credential_type)
+        return token
+
+    def _fresh(self, token):
+        return token is not None and token.expires_on - time.time() > self.refresh_margin
+
+    def _read_disk_tokens(self, persistence):
+        try:
+            data = json.loads(persistence.load() or '{}')
+        except Exception:
+            return {}
+        if data.get('credential_type') != self.credential_type:
+            return {}
+        return {key: AccessToken(token, expires_on) for key, (token, expires_on) in data.get('tokens', {}).items()}
+
+    def _write_disk_tokens(self, persistence):
+        tokens = {key: [token.token, token.expires_on] for key, token in self._tokens.items()
+                  if token.expires_on > time.time()}
+        try:
+            persistence.save(json.dumps({'credential_type': self.credential_type, 'tokens': tokens}))
+        except Exception as e:
+            print(f"Failed to persist the token cache. Error: {e}")
+
+    def get_token(self, *scopes, claims=None, tenant_id=None, enable_cae=False, **kwargs):
+        """Return a cached access token for `scopes`, requesting a new one when it is close to expiry."""
+        get_token_kwargs = dict(kwargs)
+        if tenant_id:
+            get_token_kwargs['tenant_id'] = tenant_id
+        if enable_cae:
+            get_token_kwargs['enable_cae'] = True
+        if claims:
+            # Claims challenges must bypass every cache.
+            with self._lock:
+                return self._fetch(scopes, dict(get_token_kwargs, claims=claims))
+        key = f"{tenant_id or ''}|{int(bool(enable_cae))}|{' '.join(sorted(scopes))}"
+        token = self._tokens.get(key)
+        if self._fresh(token):
+            return token
+        with self._lock:
+            token = self._tokens.get(key)
+            if self._fresh(token):
+                return token
+            if self.credential_type is None:
+                self.credential_type = self._load_choice()
+            persistence = self._token_persistence() if self.credential_type else None
+            if persistence is not None:
+                # Another process or worker may already have refreshed the token.
+                with CrossPlatLock(self._path('tokens.lock')):
+                    self._tokens.update(self._read_disk_tokens(persistence))
+                token = self._tokens.get(key)
+                if self._fresh(token):
+                    return token
+            token = self._fetch(scopes, get_token_kwargs)
+            self._tokens[key] = token
+            persistence = self._token_persistence()
+            if persistence is not None:
+                with CrossPlatLock(self._path('tokens.lock')):
+                    self._write_disk_tokens(persistence)
+            return token
+
+    def close(self):
+        """Close the underlying credential."""
+        if self._credential is not None and hasattr(self._credential, 'close'):
+            self._credential.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
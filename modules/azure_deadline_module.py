@@ -0,0 +1,249 @@
+from azure.core.pipeline.policies import SansIOHTTPPolicy
+import contextvars
+import functools
+import threading
+import time
+
+# Longest single wait while polling an LRO, so cancellation is noticed promptly.
+POLL_SLICE = 1.0
+
+_current = contextvars.ContextVar('azure_deadline', default=None)
+
+
+class DeadlineExceeded(TimeoutError):
+    """Raised when work runs past its deadline or the deadline is cancelled."""
+
+
+def current_deadline():
+    """Return the AzureDeadline active in this context, or None."""
+    return _current.get()
+
+
+def remaining_timeout(timeout=None):
+    """Return `timeout` capped by the current deadline's remaining seconds; None if neither bounds it."""
+    deadline = current_deadline()
+    remaining = deadline.remaining() if deadline is not None else None
+    if remaining is None:
+        return timeout
+    return remaining if timeout is None else min(timeout, remaining)
+
+
+def check_deadline():
+    """Raise DeadlineExceeded if the current deadline expired or was cancelled."""
+    deadline = current_deadline()
+    if deadline is not None:
+        deadline.check()
+
+
+def sleep(seconds):
+    """Sleep like time.sleep, but wake and raise DeadlineExceeded as soon as the current deadline ends."""
+    deadline = current_deadline()
+    if deadline is None:
+        time.sleep(seconds)
+        return
+    deadline.check()
+    deadline.wait(seconds)
+    deadline.check()
+
+
+def wait_for(poller, timeout=None):
+    """Return an LRO poller's result, waiting at most `timeout` seconds and never past the current deadline.
+
+    Raises DeadlineExceeded if the operation is still running when the time is up; the
+    operation itself keeps running in Azure.
+    """
+    timeout = remaining_timeout(timeout)
+    if timeout is None:
+        return poller.result()
+    deadline = current_deadline()
+    expires_at = time.monotonic() + timeout
+    while not poller.done():
+        left = expires_at - time.monotonic()
+        if left <= 0 or (deadline is not None and deadline.expired()):
+            raise DeadlineExceeded(f"Operation did not finish within {timeout:.0f} seconds.")
+        poller.wait(min(left, POLL_SLICE))
+    return poller.result()
+
+
+def bind(func):
+    """Return `func` bound to a copy of the current context, so threads it runs on see the same deadline."""
+    return functools.partial(contextvars.copy_context().run, func)
+
+
+class AzureDeadline:
+    def __init__(self, seconds=None, name='run', parent=None):
+        """Initialize a deadline `seconds` from now (None for no time limit), never later than `parent`'s.
+
+        Entering it with `with` makes it current for module operations in this context:
+        LRO waits and SDK requests are cut off when it ends, and operations started with
+        wait=False are detached from. Cancelling a deadline cancels its children.
+        """
+        self.name = name
+        self.parent = parent
+        now = time.monotonic()
+        limits = [limit for limit in (now + seconds if seconds is not None else None,
+                                      parent.expires_at if parent is not None else None) if limit is not None]
+        self.expires_at = min(limits) if limits else None
+        self.reason = None
+        self._event = threading.Event()
+        self._lock = threading.Lock()
+        self._operations = []
+        self._callbacks = []
+        self._children = []
+        self._timer = None
+        self._tokens = threading.local()
+        if parent is not None:
+            parent._adopt(self)
+
+    def remaining(self):
+        """Return the seconds left, 0 once ended, or None without a time limit."""
+        if self._event.is_set():
+            return 0
+        if self.expires_at is None:
+            return None
+        return max(self.expires_at - time.monotonic(), 0)
+
+    def expired(self):
+        """Return True once the deadline has passed or was cancelled."""
+        return self._event.is_set() or (self.expires_at is not None and time.monotonic() >= self.expires_at)
+
+    def check(self):
+        """Raise DeadlineExceeded if the deadline has ended."""
+        if self.expired():
+            raise DeadlineExceeded(f"Deadline '{self.name}' {self.reason or 'expired'}.")
+
+    def wait(self, seconds=None):
+        """Wait up to `seconds`, returning early when the deadline ends; return True if it has ended."""
+        remaining = self.remaining()
+        if remaining is not None:
+            seconds = remaining if seconds is None else min(seconds, remaining)
+        self._event.wait(seconds)
+        return self.expired()
+
+    def child(self, seconds=None, name=None, share=None):
+        """Return a per-step deadline of at most `seconds`, or `share` of the time left, inside this one."""
+        if share is not None and self.remaining() is not None:
+            seconds = min(seconds, self.remaining() * share) if seconds is not None else self.remaining() * share
+        return AzureDeadline(seconds, name or self.name, parent=self)
+
+    def _adopt(self, child):
+        with self._lock:
+            ended = self.reason is not None
+            if not ended:
+                self._children.append(child)
+        if ended:
+            child.cancel(self.reason)
+
+    def _arm(self):
+        """Start the timer that ends the deadline on time; called once something needs cancelling."""
+        if self._timer is None and self.expires_at is not None and self.reason is None:
+            self._timer = threading.Timer(self.remaining(), self.cancel, args=('expired',))
+            self._timer.daemon = True
+            self._timer.start()
+
+    def track(self, operation):
+        """Cancel (or detach from) `operation` if the deadline ends before it finishes; returns the operation."""
+        with self._lock:
+            ended = self.reason is not None
+            if not ended:
+                self._operations = [tracked for tracked in self._operations if not tracked.done()]
+                self._operations.append(operation)
+                self._arm()
+        if ended:
+            operation.cancel(f"Deadline '{self.name}' {self.reason}")
+        return operation
+
+    def on_cancel(self, callback):
+        """Call `callback(deadline)` when the deadline expires or is cancelled."""
+        with self._lock:
+            ended = self.reason is not None
+            if not ended:
+                self._callbacks.append(callback)
+                self._arm()
+        if ended:
+            callback(self)
+
+    def cancel(self, reason='was cancelled'):
+        """End the deadline now: detach from its pending operations and cancel its children."""
+        with self._lock:
+            if self.reason is not None:
+                return
+            self.reason = reason
+            operations, self._operations = self._operations, []
+            callbacks, self._callbacks = self._callbacks, []
+            children, self._children = self._children, []
+            timer = self._timer
+        self._event.set()
+        if timer is not None and timer is not threading.current_thread():
+            timer.cancel()
+        for operation in operations:
+            if not operation.done():
+                print(f"Deadline '{self.name}' {reason}; detaching from {operation.description}.")
+                operation.cancel(f"Deadline '{self.name}' {reason}")
+        for child in children:
+            child.cancel(reason)
+        for callback in callbacks:
+            try:
+                callback(self)
+            except Exception as e:
+                print(f"Cancellation callback for deadline '{self.name}' failed. Error: {e}")
+
+    def close(self):
+        """Stop the expiry timer of a deadline whose work finished in time."""
+        with self._lock:
+            timer, self._timer = self._timer, None
+        if timer is not None:
+            timer.cancel()
+
+    def __enter__(self):
+        tokens = getattr(self._tokens, 'stack', None)
+        if tokens is None:
+            tokens = self._tokens.stack = []
+        tokens.append(_current.set(self))
+        return self
+
+    def __exit__(self, *exc_info):
+        _current.reset(self._tokens.stack.pop())
+        if not self._tokens.stack and self.parent is not None:
+            self.close()
+        return False
+
+    def __repr__(self):
+        return f"AzureDeadline({self.name!r}, remaining={self.remaining()!r}, reason={self.reason!r})"
+
+
+class _DeadlineCallPolicy(SansIOHTTPPolicy):
+    """Runs once per logical request: refuses to start after the deadline and caps the retry policy's total time."""
+
+    def on_request(self, request):
+        deadline = current_deadline()
+        if deadline is None:
+            return
+        deadline.check()
+        remaining = deadline.remaining()
+        if remaining is not None:
+            options = request.context.options
+            options['timeout'] = min(options.get('timeout') or remaining, remaining)
+
+
+class _DeadlineRetryPolicy(SansIOHTTPPolicy):
+    """Runs on every attempt: bounds the connect and read timeouts by the time left."""
+
+    def on_request(self, request):
+        deadline = current_deadline()
+        if deadline is None:
+            return
+        deadline.check()
+        remaining = deadline.remaining()
+        if remaining is not None:
+            options = request.context.options
+            for option in ('connection_timeout', 'read_timeout'):
+                options[option] = min(options.get(option) or remaining, max(remaining, 0.001))
+
+
+def client_kwargs(base=None):
+    """Return SDK client keyword arguments `base` with the deadline policies added to its policy lists."""
+    kwargs = dict(base or {})
+    kwargs['per_call_policies'] = list(kwargs.get('per_call_policies', [])) + [_DeadlineCallPolicy()]
+    kwargs['per_retry_policies'] = list(kwargs.get('per_retry_policies', [])) + [_DeadlineRetryPolicy()]
+    return kwargs
@@ -0,0 +1,303 @@
+from azure.mgmt.network import NetworkManagementClient
+from azure.mgmt.compute import ComputeManagementClient
+from collections import namedtuple
+from modules.azure_credential_module import shared_credential
+from modules.azure_nsg_impact_module import enum_value
+import os
+
+try:
+    import pyarrow
+    import pyarrow.parquet as parquet
+except ImportError:
+    pyarrow = None
+    parquet = None
+
+DEFAULT_BATCH_SIZE = 10000
+
+# `files` lists the Parquet files written, `rows` counts rows per resource type.
+ExportResult = namedtuple('ExportResult', ['files', 'rows'])
+
+
+def _get(item, path):
+    """Follow a dotted attribute path, returning None where any step is missing."""
+    for name in path.split('.'):
+        if item is None:
+            return None
+        item = item.get(name) if isinstance(item, dict) else getattr(item, name, None)
+    return item
+
+
+def _text(value):
+    return None if value is None else enum_value(value)
+
+
+def _ids(items):
+    return [item.id for item in items or [] if getattr(item, 'id', None)]
+
+
+def _plural(item, singular, plural):
+    values = _get(item, plural) or []
+    return [str(value) for value in values] if values else ([str(_get(item, singular))] if _get(item, singular) else [])
+
+
+COMMON_COLUMNS = [
+    ('id', 'string', lambda item, parent: item.id),
+    ('name', 'string', lambda item, parent: item.name),
+    ('location', 'string', lambda item, parent: _get(item, 'location') or _get(parent, 'location')),
+    ('provisioning_state', 'string', lambda item, parent: _text(_get(item, 'provisioning_state'))),
+    ('etag', 'string', lambda item, parent: _get(item, 'etag')),
+    ('tags', 'map', lambda item, parent: dict(_get(item, 'tags') or {})),
+]
+
+# Resource type -> extra columns as (name, type, extractor(item, parent)).
+TYPE_COLUMNS = {
+    'vnet': [
+        ('address_prefixes', 'list', lambda item, parent: list(_get(item, 'address_space.address_prefixes') or [])),
+        ('dns_servers', 'list', lambda item, parent: list(_get(item, 'dhcp_options.dns_servers') or [])),
+        ('subnet_count', 'int64', lambda item, parent: len(_get(item, 'subnets') or [])),
+        ('peering_count', 'int64', lambda item, parent: len(_get(item, 'virtual_network_peerings') or [])),
+    ],
+    'subnet': [
+        ('vnet_name', 'string', lambda item, parent: parent.name),
+        ('address_prefixes', 'list', lambda item, parent: _plural(item, 'address_prefix', 'address_prefixes')),
+        ('nsg_id', 'string', lambda item, parent: _get(item, 'network_security_group.id')),
+        ('route_table_id', 'string', lambda item, parent: _get(item, 'route_table.id')),
+        ('delegations', 'list', lambda item, parent: [_get(delegation, 'service_name')
+                                                      for delegation in _get(item, 'delegations') or []]),
+    ],
+    'nsg': [
+        ('rule_count', 'int64', lambda item, parent: len(_get(item, 'security_rules') or [])),
+        ('subnet_ids', 'list', lambda item, parent: _ids(_get(item, 'subnets'))),
+        ('nic_ids', 'list', lambda item, parent: _ids(_get(item, 'network_interfaces'))),
+    ],
+    'nsg_rule': [
+        ('nsg_name', 'string', lambda item, parent: parent.name),
+        ('priority', 'int64', lambda item, parent: _get(item, 'priority')),
+        ('direction', 'string', lambda item, parent: _text(_get(item, 'direction'))),
+        ('access', 'string', lambda item, parent: _text(_get(item, 'access'))),
+        ('protocol', 'string', lambda item, parent: _text(_get(item, 'protocol'))),
+        ('source_address_prefixes', 'list',
+         lambda item, parent: _plural(item, 'source_address_prefix', 'source_address_prefixes')),
+        ('source_port_ranges', 'list', lambda item, parent: _plural(item, 'source_port_range', 'source_port_ranges')),
+        ('destination_address_prefixes', 'list',
+         lambda item, parent: _plural(item, 'destination_address_prefix', 'destination_address_prefixes')),
+        ('destination_port_ranges', 'list',
+         lambda item, parent: _plural(item, 'destination_port_range', 'destination_port_ranges')),
+        ('description', 'string', lambda item, parent: _get(item, 'description')),
+    ],
+    'route_table': [
+        ('route_count', 'int64', lambda item, parent: len(_get(item, 'routes') or [])),
+        ('disable_bgp_route_propagation', 'bool', lambda item, parent: _get(item, 'disable_bgp_route_propagation')),
+        ('subnet_ids', 'list', lambda item, parent: _ids(_get(item, 'subnets'))),
+    ],
+    'route': [
+        ('route_table_name', 'string', lambda item, parent: parent.name),
+        ('address_prefix', 'string', lambda item, parent: _get(item, 'address_prefix')),
+        ('next_hop_type', 'string', lambda item, parent: _text(_get(item, 'next_hop_type'))),
+        ('next_hop_ip_address', 'string', lambda item, parent: _get(item, 'next_hop_ip_address')),
+    ],
+    'vm': [
+        ('vm_size', 'string', lambda item, parent: _text(_get(item, 'hardware_profile.vm_size'))),
+        ('os_type', 'string', lambda item, parent: _text(_get(item, 'storage_profile.os_disk.os_type'))),
+        ('image', 'string', lambda item, parent: ':'.join(
+            str(_get(item, f'storage_profile.image_reference.{field}') or '')
+            for field in ('publisher', 'offer', 'sku', 'version')).strip(':') or None),
+        ('nic_ids', 'list', lambda item, parent: _ids(_get(item, 'network_profile.network_interfaces'))),
+        ('zones', 'list', lambda item, parent: list(_get(item, 'zones') or [])),
+    ],
+    'scale_set': [
+        ('sku_name', 'string', lambda item, parent: _get(item, 'sku.name')),
+        ('capacity', 'int64', lambda item, parent: _get(item, 'sku.capacity')),
+        ('upgrade_mode', 'string', lambda item, parent: _text(_get(item, 'upgrade_policy.mode'))),
+        ('zones', 'list', lambda item, parent: list(_get(item, 'zones') or [])),
+    ],
+    'vng': [
+        ('gateway_type', 'string', lambda item, parent: _text(_get(item, 'gateway_type'))),
+        ('vpn_type', 'string', lambda item, parent: _text(_get(item, 'vpn_type'))),
+        ('sku_name', 'string', lambda item, parent: _text(_get(item, 'sku.name'))),
+        ('active_active', 'bool', lambda item, parent: _get(item, 'active')),
+        ('bgp_enabled', 'bool', lambda item, parent: _get(item, 'enable_bgp')),
+    ],
+}
+
+# Listing that yields each type: (client attribute, operations group, child attribute or None).
+# Child types are read from their parents, so a VNet and its subnets come from one list call.
+EXPORT_SOURCES = {
+    'vnet': ('network_client', 'virtual_networks', None),
+    'subnet': ('network_client', 'virtual_networks', 'subnets'),
+    'nsg': ('network_client', 'network_security_groups', None),
+    'nsg_rule': ('network_client', 'network_security_groups', 'security_rules'),
+    'route_table': ('network_client', 'route_tables', None),
+    'route': ('network_client', 'route_tables', 'routes'),
+    'vm': ('compute_client', 'virtual_machines', None),
+    'scale_set': ('compute_client', 'virtual_machine_scale_sets', None),
+    'vng': ('network_client', 'virtual_network_gateways', None),
+}
+
+
+def _arrow_type(kind):
+    return {
+        'string': pyarrow.string(),
+        'int64': pyarrow.int64(),
+        'bool': pyarrow.bool_(),
+        'list': pyarrow.list_(pyarrow.string()),
+        'map': pyarrow.map_(pyarrow.string(), pyarrow.string()),
+    }[kind]
+
+
+def export_schema(resource_type):
+    """Return the Arrow schema of a resource type's rows; partition columns are not stored in the files."""
+    if pyarrow is None:
+        raise ImportError("Columnar export requires the 'pyarrow' package.")
+    return pyarrow.schema([(name, _arrow_type(kind)) for name, kind, _ in COMMON_COLUMNS + TYPE_COLUMNS[resource_type]])
+
+
+class _PartitionWriter:
+    """Buffers one partition's rows column by column and writes a Parquet row group per batch."""
+
+    def __init__(self, path, resource_type, batch_size, compression):
+        self.path = path
+        self.columns = COMMON_COLUMNS + TYPE_COLUMNS[resource_type]
+        self.schema = export_schema(resource_type)
+        self.batch_size = batch_size
+        self.compression = compression
+        self.buffer = {name: [] for name, _, _ in self.columns}
+        self.pending = 0
+        self.rows = 0
+        self.writer = None
+
+    def add(self, item, parent):
+        for name, _, extract in self.columns:
+            self.buffer[name].append(extract(item, parent))
+        self.pending += 1
+        if self.pending >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        if not self.pending:
+            return
+        batch = pyarrow.RecordBatch.from_pydict(
+            {name: [list(value.items()) if isinstance(value, dict) else value for value in values]
+             for name, values in self.buffer.items()}, schema=self.schema)
+        if self.writer is None:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            self.writer = parquet.ParquetWriter(self.path + '.tmp', self.schema, compression=self.compression)
+        self.writer.write_batch(batch)
+        self.rows += self.pending
+        self.buffer = {name: [] for name in self.buffer}
+        self.pending = 0
+
+    def close(self):
+        """Flush the last batch and move the file into place; returns the path, or None if no rows."""
+        self.flush()
+        if self.writer is None:
+            # The type is now empty here; drop the file of a previous export.
+            if os.path.exists(self.path):
+                os.remove(self.path)
+            return None
+        self.writer.close()
+        os.replace(self.path + '.tmp', self.path)
+        return self.path
+
+
+class AzureExportModule:
+    def __init__(self, subscription_id, batch_size=DEFAULT_BATCH_SIZE, compression='zstd', credential=None,
+                 **client_kwargs):
+        """Initialize the AzureExportModule with Azure credentials and subscription ID.
+
+        Listings are streamed page by page from the SDK pagers into Arrow record batches
+        of `batch_size` rows, so memory stays bounded by one batch per resource type.
+        Writing requires the optional `pyarrow` package.
+        """
+        self.subscription_id = subscription_id
+        self.batch_size = batch_size
+        self.compression = compression
+        credential = credential or shared_credential()
+        self.network_client = NetworkManagementClient(
+            credential=credential,
+            subscription_id=self.subscription_id,
+            **client_kwargs
+        )
+        self.compute_client = ComputeManagementClient(
+            credential=credential,
+            subscription_id=self.subscription_id,
+            **client_kwargs
+        )
+
+    def _stream(self, resource_group_name, resource_types):
+        """Yield (resource_type, item, parent) with one list call per listing, shared by parent and child types."""
+        for resource_type in resource_types:
+            if resource_type not in EXPORT_SOURCES:
+                raise ValueError(f"Unsupported resource type '{resource_type}'.")
+        listings = {}
+        for resource_type in resource_types:
+            client_attribute, group, child = EXPORT_SOURCES[resource_type]
+            listings.setdefault((client_attribute, group), []).append((resource_type, child))
+        for (client_attribute, group), wanted in listings.items():
+            operations = getattr(getattr(self, client_attribute), group)
+            for resource in operations.list(resource_group_name):
+                for resource_type, child in wanted:
+                    if child is None:
+                        yield resource_type, resource, None
+                    else:
+                        for item in getattr(resource, child, None) or []:
+                            yield resource_type, item, resource
+
+    def rows(self, resource_group_name, resource_type):
+        """Yield one resource type's rows as dicts with the export columns."""
+        if resource_type not in EXPORT_SOURCES:
+            raise ValueError(f"Unsupported resource type '{resource_type}'.")
+        columns = COMMON_COLUMNS + TYPE_COLUMNS[resource_type]
+        for _, item, parent in self._stream(resource_group_name, [resource_type]):
+            yield {name: extract(item, parent) for name, _, extract in columns}
+
+    def record_batches(self, resource_group_name, resource_type, batch_size=None):
+        """Yield a resource type's rows as Arrow record batches of at most `batch_size` rows."""
+        schema = export_schema(resource_type)
+        batch_size = batch_size or self.batch_size
+        rows = []
+        for row in self.rows(resource_group_name, resource_type):
+            rows.append(dict(row, tags=list(row['tags'].items())))
+            if len(rows) >= batch_size:
+                yield pyarrow.RecordBatch.from_pylist(rows, schema=schema)
+                rows = []
+        if rows:
+            yield pyarrow.RecordBatch.from_pylist(rows, schema=schema)
+
+    def partition_path(self, root, resource_group_name, resource_type):
+        """Return the Parquet file of a partition, laid out Hive-style for dataset readers."""
+        return os.path.join(root, f'subscription_id={self.subscription_id}', f'resource_group={resource_group_name}',
+                            f'type={resource_type}', 'part-00000.parquet')
+
+    def export(self, root, resource_group_names, resource_types=None):
+        """Write Parquet files partitioned by subscription, resource group and type, and return an ExportResult.
+
+        A resource group that fails to list is reported and skipped; its previous files
+        are left untouched because each file is only moved into place once complete.
+        """
+        if pyarrow is None:
+            raise ImportError("Columnar export requires the 'pyarrow' package.")
+        resource_types = list(resource_types or EXPORT_SOURCES)
+        files = []
+        rows = dict.fromkeys(resource_types, 0)
+        for resource_group_name in resource_group_names:
+            writers = {resource_type: _PartitionWriter(self.partition_path(root, resource_group_name, resource_type),
+                                                       resource_type, self.batch_size, self.compression)
+                       for resource_type in resource_types}
+            try:
+                for resource_type, item, parent in self._stream(resource_group_name, resource_types):
+                    writers[resource_type].add(item, parent)
+            except Exception as e:
+                print(f"Failed to export resource group '{resource_group_name}'. Error: {e}")
+                for writer in writers.values():
+                    if writer.writer is not None:
+                        writer.writer.close()
+                        os.remove(writer.path + '.tmp')
+                continue
+            for resource_type, writer in writers.items():
+                path = writer.close()
+                if path is not None:
+                    files.append(path)
+                    rows[resource_type] += writer.rows
+            print(f"Exported resource group '{resource_group_name}' to '{root}'.")
+        return ExportResult(files, rows)
@@ -0,0 +1,595 @@
+from collections import namedtuple
+from modules.azure_journal_module import continuation_token_of, summarize_result
+from modules.azure_operation_module import capture_failures
+import inspect
+import json
+import os
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+
+try:
+    import redis
+except ImportError:
+    redis = None
+
+PENDING = 'pending'
+LEASED = 'leased'
+SUCCEEDED = 'succeeded'
+FAILED = 'failed'
+
+# Job kinds run by the default worker; each maps to module method calls (see ModuleJobHandler).
+JOB_KINDS = ('provision', 'sync', 'teardown')
+
+# `checkpoint` is the JSON state a handler saved on an earlier attempt, e.g. an LRO continuation token.
+Job = namedtuple('Job', ['job_id', 'kind', 'subscription_id', 'payload', 'status', 'attempts', 'max_attempts',
+                         'idempotency_key', 'lease_token', 'checkpoint', 'result', 'error'])
+
+
+def _loads(value):
+    return json.loads(value) if value else None
+
+
+def job_result(value):
+    """Return a JSON-serializable form of a module method's result, summarizing each SDK model in it."""
+    if hasattr(value, 'id'):
+        return summarize_result(value)
+    if hasattr(value, 'as_dict'):
+        return value.as_dict()
+    if hasattr(value, '_asdict'):
+        return {key: job_result(item) for key, item in value._asdict().items()}
+    if isinstance(value, dict):
+        return {key: job_result(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple, set)):
+        return [job_result(item) for item in value]
+    return value
+
+
+class AzureJobQueue:
+    def __init__(self, path, lease_seconds=60, max_attempts=5, retry_delay=30, subscription_limits=None,
+                 default_subscription_limit=None):
+        """Initialize a durable job queue backed by a SQLite file at `path`, shared by worker processes on one node.
+
+        A leased job belongs to its worker until the lease expires; heartbeats extend it.
+        Completing, failing or checkpointing a job requires the lease token, so a worker
+        that lost its lease cannot overwrite the new owner's work. `subscription_limits`
+        caps the jobs leased at once per subscription (`default_subscription_limit` for
+        the others; None means unlimited). Failed attempts are retried after `retry_delay`
+        seconds, doubling each time, up to `max_attempts` attempts.
+        """
+        self.path = path
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        self.retry_delay = retry_delay
+        self.subscription_limits = dict(subscription_limits or {})
+        self.default_subscription_limit = default_subscription_limit
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(path, timeout=30, check_same_thread=False, isolation_level=None)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute("PRAGMA synchronous=FULL")
+        self._connection.execute(
+            """CREATE TABLE IF NOT EXISTS jobs (
+                job_id INTEGER PRIMARY KEY AUTOINCREMENT,
+                idempotency_key TEXT UNIQUE,
+                kind TEXT NOT NULL,
+                subscription_id TEXT NOT NULL,
+                payload TEXT,
+                status TEXT NOT NULL,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                max_attempts INTEGER NOT NULL,
+                available_at REAL NOT NULL,
+                lease_token TEXT,
+                leased_by TEXT,
+                lease_expires REAL,
+                checkpoint TEXT,
+                result TEXT,
+                error TEXT,
+                updated_at REAL NOT NULL
+            )"""
+        )
+        self._connection.execute("CREATE INDEX IF NOT EXISTS jobs_ready ON jobs (status, available_at)")
+
+    def close(self):
+        """Close the underlying SQLite connection."""
+        self._connection.close()
+
+    def _transaction(self, work):
+        """Run `work(cursor)` in a write transaction; BEGIN IMMEDIATE serializes it across processes."""
+        with self._lock:
+            cursor = self._connection.cursor()
+            cursor.execute("BEGIN IMMEDIATE")
+            try:
+                result = work(cursor)
+            except Exception:
+                cursor.execute("ROLLBACK")
+                raise
+            cursor.execute("COMMIT")
+            return result
+
+    _COLUMNS = ('job_id, kind, subscription_id, payload, status, attempts, max_attempts, idempotency_key, '
+                'lease_token, checkpoint, result, error')
+
+    @staticmethod
+    def _job(row):
+        if row is None:
+            return None
+        values = list(row)
+        for index in (3, 9, 10):
+            values[index] = _loads(values[index])
+        return Job(*values)
+
+    def enqueue(self, kind, subscription_id, payload=None, idempotency_key=None, max_attempts=None, delay=0):
+        """Add a job and return its ID.
+
+        A job whose `idempotency_key` is already queued, running or done is not added
+        again; its ID is returned. A failed one is reset for another round of attempts.
+        """
+        now = time.time()
+
+        def work(cursor):
+            if idempotency_key is not None:
+                row = cursor.execute("SELECT job_id, status FROM jobs WHERE idempotency_key = ?",
+                                     (idempotency_key,)).fetchone()
+                if row is not None:
+                    if row[1] == FAILED:
+                        cursor.execute("UPDATE jobs SET status = ?, attempts = 0, available_at = ?, error = NULL, "
+                                       "updated_at = ? WHERE job_id = ?", (PENDING, now + delay, now, row[0]))
+                    return row[0]
+            cursor.execute(
+                "INSERT INTO jobs (idempotency_key, kind, subscription_id, payload, status, max_attempts, "
+                "available_at, updated_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (idempotency_key, kind, subscription_id, json.dumps(payload), PENDING,
+                 max_attempts or self.max_attempts, now + delay, now))
+            return cursor.lastrowid
+        return self._transaction(work)
+
+    def _limit(self, subscription_id):
+        return self.subscription_limits.get(subscription_id, self.default_subscription_limit)
+
+    def lease(self, worker_id, scan=100):
+        """Lease the oldest ready job whose subscription is under its limit, or return None.
+
+        Jobs whose lease expired are taken back first, or marked failed when that was
+        their last attempt.
+        """
+        now = time.time()
+        token = uuid.uuid4().hex
+
+        def work(cursor):
+            cursor.execute("UPDATE jobs SET status = ?, lease_token = NULL, error = 'Lease expired on the last attempt.', "
+                           "updated_at = ? WHERE status = ? AND lease_expires < ? AND attempts >= max_attempts",
+                           (FAILED, now, LEASED, now))
+            cursor.execute("UPDATE jobs SET status = ?, lease_token = NULL, available_at = ?, updated_at = ? "
+                           "WHERE status = ? AND lease_expires < ?", (PENDING, now, now, LEASED, now))
+            active = dict(cursor.execute("SELECT subscription_id, COUNT(*) FROM jobs WHERE status = ? "
+                                         "GROUP BY subscription_id", (LEASED,)).fetchall())
+            candidates = cursor.execute("SELECT job_id, subscription_id FROM jobs WHERE status = ? AND available_at <= ? "
+                                        "ORDER BY available_at, job_id LIMIT ?", (PENDING, now, scan)).fetchall()
+            for job_id, subscription_id in candidates:
+                limit = self._limit(subscription_id)
+                if limit is not None and active.get(subscription_id, 0) >= limit:
+                    continue
+                cursor.execute("UPDATE jobs SET status = ?, lease_token = ?, leased_by = ?, lease_expires = ?, "
+                               "attempts = attempts + 1, updated_at = ? WHERE job_id = ?",
+                               (LEASED, token, worker_id, now + self.lease_seconds, now, job_id))
+                return self._job(cursor.execute(f"SELECT {self._COLUMNS} FROM jobs WHERE job_id = ?",
+                                                (job_id,)).fetchone())
+            return None
+        return self._transaction(work)
+
+    def _fenced(self, job_id, lease_token, sql, params):
+        def work(cursor):
+            cursor.execute(f"{sql} WHERE job_id = ? AND status = ? AND lease_token = ?",
+                           (*params, job_id, LEASED, lease_token))
+            return cursor.rowcount == 1
+        return self._transaction(work)
+
+    def heartbeat(self, job_id, lease_token):
+        """Extend a lease; returns False if the lease was lost."""
+        now = time.time()
+        return self._fenced(job_id, lease_token, "UPDATE jobs SET lease_expires = ?, updated_at = ?",
+                            (now + self.lease_seconds, now))
+
+    def checkpoint(self, job_id, lease_token, data):
+        """Save JSON progress that a retry of the job receives as `job.checkpoint`."""
+        return self._fenced(job_id, lease_token, "UPDATE jobs SET checkpoint = ?, updated_at = ?",
+                            (json.dumps(data), time.time()))
+
+    def complete(self, job_id, lease_token, result=None):
+        """Mark a leased job succeeded; `result` must be JSON serializable."""
+        return self._fenced(job_id, lease_token, "UPDATE jobs SET status = ?, lease_token = NULL, result = ?, "
+                            "error = NULL, updated_at = ?", (SUCCEEDED, json.dumps(result), time.time()))
+
+    def fail(self, job_id, lease_token, error, retry=True):
+        """Record a failed attempt; the job is retried with backoff unless it was the last attempt or `retry` is False."""
+        now = time.time()
+
+        def work(cursor):
+            row = cursor.execute("SELECT attempts, max_attempts FROM jobs WHERE job_id = ? AND status = ? "
+                                 "AND lease_token = ?", (job_id, LEASED, lease_token)).fetchone()
+            if row is None:
+                return False
+            attempts, max_attempts = row
+            if retry and attempts < max_attempts:
+                cursor.execute("UPDATE jobs SET status = ?, lease_token = NULL, available_at = ?, error = ?, "
+                               "updated_at = ? WHERE job_id = ?",
+                               (PENDING, now + self.retry_delay * 2 ** (attempts - 1), str(error), now, job_id))
+            else:
+                cursor.execute("UPDATE jobs SET status = ?, lease_token = NULL, error = ?, updated_at = ? "
+                               "WHERE job_id = ?", (FAILED, str(error), now, job_id))
+            return True
+        return self._transaction(work)
+
+    def get(self, job_id):
+        """Return a Job, or None."""
+        with self._lock:
+            return self._job(self._connection.execute(f"SELECT {self._COLUMNS} FROM jobs WHERE job_id = ?",
+                                                      (job_id,)).fetchone())
+
+    def counts(self):
+        """Return the number of jobs per status."""
+        with self._lock:
+            return dict(self._connection.execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall())
+
+
+# Reclaims expired leases, then leases the first ready job whose subscription is under its limit.
+_LEASE_SCRIPT = """
+local ns, now, lease_seconds, token, worker = ARGV[1], tonumber(ARGV[2]), tonumber(ARGV[3]), ARGV[4], ARGV[5]
+local limits, default_limit, scan = cjson.decode(ARGV[6]), tonumber(ARGV[7]), tonumber(ARGV[8])
+for _, id in ipairs(redis.call('ZRANGEBYSCORE', ns .. ':leased', '-inf', '(' .. now)) do
+    local job = ns .. ':job:' .. id
+    local sub = redis.call('HGET', job, 'subscription_id')
+    redis.call('ZREM', ns .. ':leased', id)
+    redis.call('ZREM', ns .. ':active:' .. sub, id)
+    if tonumber(redis.call('HGET', job, 'attempts')) >= tonumber(redis.call('HGET', job, 'max_attempts')) then
+        redis.call('HSET', job, 'status', 'failed', 'lease_token', '', 'error', 'Lease expired on the last attempt.')
+    else
+        redis.call('HSET', job, 'status', 'pending', 'lease_token', '')
+        redis.call('ZADD', ns .. ':pending', now, id)
+    end
+end
+for _, id in ipairs(redis.call('ZRANGEBYSCORE', ns .. ':pending', '-inf', now, 'LIMIT', 0, scan)) do
+    local job = ns .. ':job:' .. id
+    local sub = redis.call('HGET', job, 'subscription_id')
+    local limit = limits[sub] or default_limit
+    if limit < 0 or redis.call('ZCARD', ns .. ':active:' .. sub) < limit then
+        local expires = now + lease_seconds
+        redis.call('ZREM', ns .. ':pending', id)
+        redis.call('ZADD', ns .. ':leased', expires, id)
+        redis.call('ZADD', ns .. ':active:' .. sub, expires, id)
+        redis.call('HSET', job, 'status', 'leased', 'lease_token', token, 'leased_by', worker,
+                   'lease_expires', tostring(expires))
+        redis.call('HINCRBY', job, 'attempts', 1)
+        return id
+    end
+end
+return false
+"""
+
+_ENQUEUE_SCRIPT = """
+local ns, key, kind, sub, payload = ARGV[1], ARGV[2], ARGV[3], ARGV[4], ARGV[5]
+local max_attempts, available_at = ARGV[6], ARGV[7]
+if key ~= '' then
+    local existing = redis.call('HGET', ns .. ':keys', key)
+    if existing then
+        local job = ns .. ':job:' .. existing
+        if redis.call('HGET', job, 'status') == 'failed' then
+            redis.call('HSET', job, 'status', 'pending', 'attempts', 0, 'error', '')
+            redis.call('ZADD', ns .. ':pending', available_at, existing)
+        end
+        return tonumber(existing)
+    end
+end
+local id = redis.call('INCR', ns .. ':seq')
+redis.call('HSET', ns .. ':job:' .. id, 'kind', kind, 'subscription_id', sub, 'payload', payload, 'status', 'pending',
+           'attempts', 0, 'max_attempts', max_attempts, 'idempotency_key', key)
+if key ~= '' then
+    redis.call('HSET', ns .. ':keys', key, id)
+end
+redis.call('ZADD', ns .. ':pending', available_at, id)
+return id
+"""
+
+# Operations that require the current lease token: heartbeat, checkpoint, complete and fail.
+_FENCED_SCRIPT = """
+local ns, id, token, action, now = ARGV[1], ARGV[2], ARGV[3], ARGV[4], tonumber(ARGV[5])
+local job = ns .. ':job:' .. id
+if redis.call('HGET', job, 'status') ~= 'leased' or redis.call('HGET', job, 'lease_token') ~= token then
+    return 0
+end
+local sub = redis.call('HGET', job, 'subscription_id')
+if action == 'heartbeat' then
+    local expires = now + tonumber(ARGV[6])
+    redis.call('ZADD', ns .. ':leased', expires, id)
+    redis.call('ZADD', ns .. ':active:' .. sub, expires, id)
+    redis.call('HSET', job, 'lease_expires', tostring(expires))
+    return 1
+end
+if action == 'checkpoint' then
+    redis.call('HSET', job, 'checkpoint', ARGV[6])
+    return 1
+end
+redis.call('ZREM', ns .. ':leased', id)
+redis.call('ZREM', ns .. ':active:' .. sub, id)
+if action == 'complete' then
+    redis.call('HSET', job, 'status', 'succeeded', 'lease_token', '', 'result', ARGV[6], 'error', '')
+    return 1
+end
+local attempts = tonumber(redis.call('HGET', job, 'attempts'))
+if ARGV[8] == '1' and attempts < tonumber(redis.call('HGET', job, 'max_attempts')) then
+    redis.call('HSET', job, 'status', 'pending', 'lease_token', '', 'error', ARGV[6])
+    redis.call('ZADD', ns .. ':pending', now + tonumber(ARGV[7]) * 2 ^ (attempts - 1), id)
+else
+    redis.call('HSET', job, 'status', 'failed', 'lease_token', '', 'error', ARGV[6])
+end
+return 1
+"""
+
+
+class AzureRedisJobQueue:
+    def __init__(self, client, namespace='azure-jobs', lease_seconds=60, max_attempts=5, retry_delay=30,
+                 subscription_limits=None, default_subscription_limit=None):
+        """Initialize a job queue on a Redis-compatible server, for workers spread over several nodes.
+
+        `client` is a redis-py style client; any server or stand-in that runs Lua scripts
+        works. Every state change is one script, so leases stay atomic across workers.
+        Behaves like AzureJobQueue.
+        """
+        self.client = client
+        self.namespace = namespace
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        self.retry_delay = retry_delay
+        self.subscription_limits = dict(subscription_limits or {})
+        self.default_subscription_limit = default_subscription_limit
+        self._lease = client.register_script(_LEASE_SCRIPT)
+        self._enqueue = client.register_script(_ENQUEUE_SCRIPT)
+        self._fenced = client.register_script(_FENCED_SCRIPT)
+
+    @classmethod
+    def from_url(cls, url, **kwargs):
+        """Connect to `url` (redis://host:port/db); requires the optional redis package."""
+        if redis is None:
+            raise ImportError("The Redis job queue requires the 'redis' package.")
+        return cls(redis.Redis.from_url(url), **kwargs)
+
+    def close(self):
+        """Close the client's connections."""
+        self.client.close()
+
+    def enqueue(self, kind, subscription_id, payload=None, idempotency_key=None, max_attempts=None, delay=0):
+        """Add a job and return its ID; see AzureJobQueue.enqueue."""
+        return int(self._enqueue(args=[self.namespace, idempotency_key or '', kind, subscription_id,
+                                       json.dumps(payload), max_attempts or self.max_attempts, time.time() + delay]))
+
+    def lease(self, worker_id, scan=100):
+        """Lease the oldest ready job whose subscription is under its limit, or return None."""
+        token = uuid.uuid4().hex
+        default_limit = -1 if self.default_subscription_limit is None else self.default_subscription_limit
+        job_id = self._lease(args=[self.namespace, time.time(), self.lease_seconds, token, worker_id,
+                                   json.dumps(self.subscription_limits), default_limit, scan])
+        return self.get(int(job_id)) if job_id else None
+
+    def _call(self, job_id, lease_token, action, *args):
+        return bool(self._fenced(args=[self.namespace, job_id, lease_token, action, time.time(), *args]))
+
+    def heartbeat(self, job_id, lease_token):
+        """Extend a lease; returns False if the lease was lost."""
+        return self._call(job_id, lease_token, 'heartbeat', self.lease_seconds)
+
+    def checkpoint(self, job_id, lease_token, data):
+        """Save JSON progress that a retry of the job receives as `job.checkpoint`."""
+        return self._call(job_id, lease_token, 'checkpoint', json.dumps(data))
+
+    def complete(self, job_id, lease_token, result=None):
+        """Mark a leased job succeeded; `result` must be JSON serializable."""
+        return self._call(job_id, lease_token, 'complete', json.dumps(result))
+
+    def fail(self, job_id, lease_token, error, retry=True):
+        """Record a failed attempt; see AzureJobQueue.fail."""
+        return self._call(job_id, lease_token, 'fail', str(error), self.retry_delay, '1' if retry else '0')
+
+    def get(self, job_id):
+        """Return a Job, or None."""
+        fields = self.client.hgetall(f"{self.namespace}:job:{job_id}")
+        if not fields:
+            return None
+        fields = {(key.decode() if isinstance(key, bytes) else key): (value.decode() if isinstance(value, bytes) else value)
+                  for key, value in fields.items()}
+        return Job(
+            job_id=int(job_id),
+            kind=fields['kind'],
+            subscription_id=fields['subscription_id'],
+            payload=_loads(fields.get('payload')),
+            status=fields['status'],
+            attempts=int(fields['attempts']),
+            max_attempts=int(fields['max_attempts']),
+            idempotency_key=fields.get('idempotency_key') or None,
+            lease_token=fields.get('lease_token') or None,
+            checkpoint=_loads(fields.get('checkpoint')),
+            result=_loads(fields.get('result')),
+            error=fields.get('error') or None,
+        )
+
+    def counts(self):
+        """Return the number of jobs per status."""
+        counts = {}
+        for key in self.client.scan_iter(match=f"{self.namespace}:job:*"):
+            status = self.client.hget(key, 'status')
+            status = status.decode() if isinstance(status, bytes) else status
+            counts[status] = counts.get(status, 0) + 1
+        return counts
+
+
+def open_queue(url, **kwargs):
+    """Open a Redis queue for redis:// and rediss:// URLs, otherwise a SQLite queue at the given path."""
+    if url.startswith(('redis://', 'rediss://', 'unix://')):
+        return AzureRedisJobQueue.from_url(url, **kwargs)
+    return AzureJobQueue(url, **kwargs)
+
+
+class ModuleJobHandler:
+    """Runs a job by calling one module method, e.g. {'module': 'vnet', 'method': 'create_vnet', 'kwargs': {...}}.
+
+    Long-running methods are started with wait=False and their continuation token is
+    checkpointed, so a retry on any node reattaches to the running operation instead of
+    submitting it again.
+    """
+
+    def __init__(self, timeout=3600, credential=None, **client_kwargs):
+        self.timeout = timeout
+        self.credential = credential
+        self.client_kwargs = client_kwargs
+        self.modules = {}
+        self._lock = threading.Lock()
+
+    def _module(self, name, subscription_id):
+        from modules.azure_nsg_module import AzureNSGModule
+        from modules.azure_route_table_module import AzureRouteTableModule
+        from modules.azure_scale_set_module import AzureScaleSetModule
+        from modules.azure_subnet_module import AzureSubnetModule
+        from modules.azure_tagging_module import AzureTaggingModule
+        from modules.azure_vm_module import AzureVMModule
+        from modules.azure_vnet_module import AzureVNetModule
+        from modules.azure_vng_module import AzureVNGModule
+        classes = {
+            'vnet': AzureVNetModule, 'subnet': AzureSubnetModule, 'nsg': AzureNSGModule,
+            'route_table': AzureRouteTableModule, 'vng': AzureVNGModule, 'vm': AzureVMModule,
+            'scale_set': AzureScaleSetModule, 'tagging': AzureTaggingModule,
+        }
+        if name not in classes:
+            raise ValueError(f"Unsupported module '{name}'.")
+        with self._lock:
+            if (name, subscription_id) not in self.modules:
+                self.modules[(name, subscription_id)] = classes[name](
+                    subscription_id, credential=self.credential, **self.client_kwargs)
+            return self.modules[(name, subscription_id)]
+
+    def __call__(self, job, checkpoint):
+        payload = job.payload or {}
+        method = getattr(self._module(payload['module'], job.subscription_id), payload['method'])
+        args, kwargs = list(payload.get('args', [])), dict(payload.get('kwargs', {}))
+        parameters = inspect.signature(method).parameters
+        if 'wait' not in parameters:
+            with capture_failures() as failures:
+                result = method(*args, **kwargs)
+            if failures:
+                raise failures[-1]
+            return job_result(result)
+        token = (job.checkpoint or {}).get('continuation_token')
+        if token and 'continuation_token' in parameters:
+            kwargs['continuation_token'] = token
+        with capture_failures() as failures:
+            operation = method(*args, wait=False, **kwargs)
+        if failures:
+            if token:
+                checkpoint({})  # The token could not be resumed; the retry submits the operation again
+            raise failures[-1]
+        if operation is None:
+            raise RuntimeError(f"{payload['module']}.{payload['method']} could not be started.")
+        if not token:
+            token = continuation_token_of(operation)
+            if token:
+                checkpoint({'continuation_token': token})
+        try:
+            result = operation.result(self.timeout)
+        except TimeoutError:
+            raise  # Still running; the retry reattaches through the checkpointed token
+        except Exception:
+            checkpoint({})  # The operation itself failed; the retry submits it again
+            raise
+        return job_result(result)
+
+
+class AzureJobWorker:
+    def __init__(self, queue, handlers, worker_id=None, poll_interval=1.0, heartbeat_interval=None):
+        """Initialize a worker that leases jobs from `queue` and runs `handlers[job.kind](job, checkpoint)`.
+
+        `checkpoint(data)` saves JSON progress for a retry. The lease is renewed every
+        `heartbeat_interval` seconds (a third of the lease by default) while a handler runs.
+        """
+        self.queue = queue
+        self.handlers = handlers
+        self.worker_id = worker_id or f"{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex[:6]}"
+        self.poll_interval = poll_interval
+        self.heartbeat_interval = heartbeat_interval or max(queue.lease_seconds / 3, 0.01)
+        self._stop = threading.Event()
+
+    def _heartbeat(self, job, done, lost):
+        while not done.wait(self.heartbeat_interval):
+            if not self.queue.heartbeat(job.job_id, job.lease_token):
+                lost.set()
+                return
+
+    def run_once(self):
+        """Lease and run one job; returns the Job it ran, or None when nothing was ready."""
+        job = self.queue.lease(self.worker_id)
+        if job is None:
+            return None
+        handler = self.handlers.get(job.kind)
+        if handler is None:
+            self.queue.fail(job.job_id, job.lease_token, f"No handler for job kind '{job.kind}'.", retry=False)
+            return job
+        done, lost = threading.Event(), threading.Event()
+        heartbeat = threading.Thread(target=self._heartbeat, args=(job, done, lost), daemon=True)
+        heartbeat.start()
+        try:
+            result = handler(job, lambda data: self.queue.checkpoint(job.job_id, job.lease_token, data))
+        except Exception as e:
+            print(f"Job {job.job_id} ({job.kind}) failed on attempt {job.attempts}. Error: {e}")
+            self.queue.fail(job.job_id, job.lease_token, e)
+            return job
+        finally:
+            done.set()
+            heartbeat.join()
+        try:
+            completed = not lost.is_set() and self.queue.complete(job.job_id, job.lease_token, result)
+        except Exception as e:
+            # E.g. a result that is not JSON serializable; retrying would not change it.
+            print(f"Failed to complete job {job.job_id} ({job.kind}). Error: {e}")
+            self.queue.fail(job.job_id, job.lease_token, e, retry=False)
+            return job
+        if not completed:
+            print(f"Job {job.job_id} ({job.kind}) finished after its lease was lost; another worker owns it.")
+        else:
+            print(f"Job {job.job_id} ({job.kind}) succeeded.")
+        return job
+
+    def run(self, max_jobs=None):
+        """Run jobs until stop() is called, or until `max_jobs` jobs have run."""
+        ran = 0
+        while not self._stop.is_set() and (max_jobs is None or ran < max_jobs):
+            if self.run_once() is None:
+                self._stop.wait(self.poll_interval)
+            else:
+                ran += 1
+        return ran
+
+    def stop(self):
+        """Stop after the current job."""
+        self._stop.set()
+
+
+def main():
+    """Run a worker against AZURE_JOB_QUEUE (a SQLite path or redis:// URL) with the default module handlers."""
+    limits = json.loads(os.getenv('AZURE_JOB_SUBSCRIPTION_LIMITS', '{}'))
+    default_limit = os.getenv('AZURE_JOB_SUBSCRIPTION_LIMIT')
+    queue = open_queue(os.getenv('AZURE_JOB_QUEUE', 'azure_jobs.sqlite'),
+                       lease_seconds=int(os.getenv('AZURE_JOB_LEASE_SECONDS', '60')),
+                       subscription_limits=limits,
+                       default_subscription_limit=int(default_limit) if default_limit else None)
+    handler = ModuleJobHandler()
+    worker = AzureJobWorker(queue, {kind: handler for kind in JOB_KINDS})
+    print(f"Worker '{worker.worker_id}' started.")
+    try:
+        worker.run()
+    except KeyboardInterrupt:
+        worker.stop()
+    finally:
+        queue.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,169 @@
+import json
+import sqlite3
+import threading
+import time
+
+SUBMITTED = 'submitted'
+SUCCEEDED = 'succeeded'
+FAILED = 'failed'
+
+
+class AzureOperationJournal:
+    def __init__(self, path):
+        """Initialize the AzureOperationJournal backed by a SQLite file at `path`."""
+        self.path = path
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        # WAL plus synchronous=FULL keeps every committed step across a crash or power loss.
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute("PRAGMA synchronous=FULL")
+        self._connection.execute(
+            """CREATE TABLE IF NOT EXISTS operations (
+                step TEXT PRIMARY KEY,
+                resource_type TEXT NOT NULL,
+                resource_name TEXT NOT NULL,
+                status TEXT NOT NULL,
+                continuation_token TEXT,
+                async_operation_url TEXT,
+                result TEXT,
+                error TEXT,
+                updated_at REAL NOT NULL
+            )"""
+        )
+
+    def close(self):
+        """Close the underlying SQLite connection."""
+        self._connection.close()
+
+    def _execute(self, sql, params=()):
+        with self._lock:
+            return self._connection.execute(sql, params).fetchall()
+
+    def get(self, step):
+        """Return the journal entry for `step` as a dict, or None."""
+        rows = self._execute(
+            "SELECT step, resource_type, resource_name, status, continuation_token, async_operation_url, "
+            "result, error, updated_at FROM operations WHERE step = ?", (step,))
+        if not rows:
+            return None
+        keys = ('step', 'resource_type', 'resource_name', 'status', 'continuation_token',
+                'async_operation_url', 'result', 'error', 'updated_at')
+        entry = dict(zip(keys, rows[0]))
+        entry['result'] = json.loads(entry['result']) if entry['result'] else None
+        return entry
+
+    def entries(self):
+        """Return every journal entry, oldest first."""
+        steps = self._execute("SELECT step FROM operations ORDER BY updated_at")
+        return [self.get(step) for (step,) in steps]
+
+    def record_submitted(self, step, resource_type, resource_name, continuation_token=None,
+                         async_operation_url=None):
+        """Record that the LRO for `step` was submitted, with what is needed to reattach to it."""
+        self._execute(
+            "INSERT INTO operations (step, resource_type, resource_name, status, continuation_token, "
+            "async_operation_url, result, error, updated_at) VALUES (?, ?, ?, ?, ?, ?, NULL, NULL, ?) "
+            "ON CONFLICT(step) DO UPDATE SET resource_type = excluded.resource_type, "
+            "resource_name = excluded.resource_name, status = excluded.status, "
+            "continuation_token = excluded.continuation_token, "
+            "async_operation_url = excluded.async_operation_url, result = NULL, error = NULL, "
+            "updated_at = excluded.updated_at",
+            (step, resource_type, resource_name, SUBMITTED, continuation_token, async_operation_url, time.time()))
+
+    def record_operation(self, step, resource_type, resource_name, operation):
+        """Record a submitted AzureOperation with its continuation token and async-operation URL."""
+        self.record_submitted(step, resource_type, resource_name, continuation_token_of(operation),
+                              _async_operation_url(operation))
+
+    def is_completed(self, step):
+        """Return True if `step` succeeded in this or an earlier run."""
+        entry = self.get(step)
+        return bool(entry) and entry['status'] == SUCCEEDED
+
+    def pending_token(self, step):
+        """Return the continuation token of a submitted but unfinished step, or None."""
+        entry = self.get(step)
+        return entry['continuation_token'] if entry and entry['status'] == SUBMITTED else None
+
+    def record_succeeded(self, step, result=None):
+        """Record that `step` completed; `result` must be JSON serializable."""
+        self._execute("UPDATE operations SET status = ?, result = ?, error = NULL, updated_at = ? WHERE step = ?",
+                      (SUCCEEDED, json.dumps(result), time.time(), step))
+
+    def record_failed(self, step, error):
+        """Record that `step` failed so the next run submits it again."""
+        self._execute("UPDATE operations SET status = ?, error = ?, updated_at = ? WHERE step = ?",
+                      (FAILED, str(error), time.time(), step))
+
+    def forget(self, step):
+        """Remove `step` from the journal, e.g. once its resource has been deleted."""
+        self._execute("DELETE FROM operations WHERE step = ?", (step,))
+
+    def clear(self):
+        """Remove every entry from the journal."""
+        self._execute("DELETE FROM operations")
+
+    def run_step(self, step, resource_type, resource_name, submit, timeout=None):
+        """Run one journaled step and return (result, resumed).
+
+        `submit(continuation_token)` must start the LRO without waiting and return an
+        AzureOperation; it receives the stored continuation token when an earlier run
+        submitted the step but died before it finished, so the step reattaches to the
+        running LRO instead of starting over. Completed steps are skipped and their
+        recorded result is returned.
+        """
+        entry = self.get(step)
+        if entry and entry['status'] == SUCCEEDED:
+            print(f"Step '{step}' already completed; skipping.")
+            return entry['result'], True
+
+        token = self.pending_token(step)
+        operation = submit(token)
+        if operation is None:
+            self.record_submitted(step, resource_type, resource_name)
+            self.record_failed(step, f"Submitting '{resource_name}' failed.")
+            raise RuntimeError(f"Failed to submit step '{step}' for '{resource_name}'.")
+        if token:
+            print(f"Reattached to in-flight operation for step '{step}'.")
+        else:
+            self.record_operation(step, resource_type, resource_name, operation)
+        try:
+            result = operation.result(timeout)
+        except TimeoutError:
+            # Leave the step as submitted so the next run reattaches to it.
+            raise
+        except Exception as e:
+            self.record_failed(step, e)
+            raise
+        self.record_succeeded(step, summarize_result(result))
+        return result, bool(token)
+
+
+def continuation_token_of(operation):
+    """Return the continuation token of an AzureOperation's poller, or None."""
+    try:
+        token = operation.poller.continuation_token()
+    except Exception:
+        return None
+    return token if isinstance(token, str) else None
+
+
+def _async_operation_url(operation):
+    try:
+        # The SDK keeps the polling URL on its private operation strategy object.
+        url = operation.poller.polling_method()._operation.get_polling_url()
+    except Exception:
+        return None
+    return url if isinstance(url, str) else None
+
+
+def summarize_result(result):
+    """Keep the identifying fields of an SDK model so the journal stays small and JSON serializable."""
+    if result is None:
+        return None
+    summary = {}
+    for attribute in ('id', 'name', 'provisioning_state'):
+        value = getattr(result, attribute, None)
+        if isinstance(value, str):
+            summary[attribute] = value
+    return summary or None
@@ -0,0 +1,395 @@
+from azure.core.pipeline.policies import SansIOHTTPPolicy
+import contextlib
+import functools
+import inspect
+import json
+import threading
+import time
+
+try:
+    from opentelemetry import trace
+except ImportError:  # OpenTelemetry is optional; spans are skipped without it.
+    trace = None
+
+DEFAULT_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600, 1800, 3600)
+RATELIMIT_HEADER_PREFIX = 'x-ms-ratelimit-remaining-'
+TERMINAL_LRO_STATES = ('succeeded', 'failed', 'canceled', 'cancelled')
+# LROs whose polling stops without a terminal response (abandoned pollers) are forgotten after this long.
+LRO_TRACKING_SECONDS = 24 * 3600
+# SDK client attributes that are methods rather than operation groups.
+CLIENT_METHODS = ('send_request', 'close')
+
+
+def _resource_type_from_url(url):
+    """Return the last ARM resource type segment of a request URL, e.g. 'securityRules'."""
+    path = url.split('?', 1)[0]
+    marker = path.rfind('/providers/')
+    if marker == -1:
+        return 'unknown'
+    # After the provider namespace, segments alternate between type and name.
+    types = path[marker + len('/providers/'):].split('/')[1::2]
+    return types[-1] if types else 'unknown'
+
+
+class _Histogram:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.total = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        for index, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[index] += 1
+        self.total += 1
+        self.sum += value
+
+
+class _OperationContext(threading.local):
+    def __init__(self):
+        self.stack = []
+
+
+class AzureMetricsModule:
+    def __init__(self, buckets=DEFAULT_BUCKETS, tracer=None):
+        """Initialize the AzureMetricsModule with histogram buckets and an optional OpenTelemetry tracer."""
+        self.buckets = tuple(buckets)
+        self.tracer = tracer if tracer is not None else (trace.get_tracer(__name__) if trace else None)
+        self._lock = threading.Lock()
+        self._histograms = {}
+        self._counters = {}
+        self._gauges = {}
+        self._context = _OperationContext()
+        self._pending_lros = {}
+
+    # Recording
+
+    def observe(self, name, value, **labels):
+        """Record a value in the histogram `name` for the given labels."""
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = _Histogram(self.buckets)
+            histogram.observe(value)
+
+    def increment(self, name, amount=1, **labels):
+        """Increment the counter `name` for the given labels."""
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + amount
+
+    def set_gauge(self, name, value, **labels):
+        """Set the gauge `name` for the given labels."""
+        with self._lock:
+            self._gauges[(name, tuple(sorted(labels.items())))] = value
+
+    def counter_value(self, name, **labels):
+        """Return the current value of a counter, 0 if it was never incremented."""
+        return self._counters.get((name, tuple(sorted(labels.items()))), 0)
+
+    def gauge_value(self, name, **labels):
+        """Return the current value of a gauge, or None."""
+        return self._gauges.get((name, tuple(sorted(labels.items()))))
+
+    def histogram_count(self, name, **labels):
+        """Return the number of observations in a histogram."""
+        histogram = self._histograms.get((name, tuple(sorted(labels.items()))))
+        return histogram.total if histogram else 0
+
+    def _mark_error(self):
+        if self._context.stack:
+            self._context.stack[-1]['errors'] += 1
+
+    # Pipeline policies
+
+    def client_kwargs(self):
+        """Return keyword arguments that attach the metrics policies to an SDK client."""
+        return {
+            'per_call_policies': [_MetricsCallPolicy(self)],
+            'per_retry_policies': [_MetricsRetryPolicy(self)],
+        }
+
+    def _on_attempt(self, request):
+        context = request.context
+        attempts = context.get('azure_metrics_attempts', 0) + 1
+        context['azure_metrics_attempts'] = attempts
+        http_request = request.http_request
+        resource_type = _resource_type_from_url(http_request.url)
+        with self._lock:
+            pending = self._pending_lros.get(http_request.url)
+        if pending and http_request.method == 'GET':
+            resource_type = pending['resource_type']
+            self.increment('azure_poll_requests_total', resource_type=resource_type)
+        if attempts > 1:
+            self.increment('azure_retries_total', resource_type=resource_type)
+        context['azure_metrics_resource_type'] = resource_type
+
+    def _on_attempt_response(self, request, response):
+        http_response = response.http_response
+        headers = http_response.headers
+        resource_type = request.context.get('azure_metrics_resource_type', 'unknown')
+        if http_response.status_code == 429:
+            self.increment('azure_throttled_requests_total', resource_type=resource_type)
+        for header, value in headers.items():
+            if header.lower().startswith(RATELIMIT_HEADER_PREFIX):
+                try:
+                    self.set_gauge('azure_ratelimit_remaining', int(value),
+                                   header=header.lower()[len(RATELIMIT_HEADER_PREFIX):])
+                except ValueError:
+                    pass
+        self._track_lro(request.http_request, http_response, resource_type)
+
+    def _track_lro(self, http_request, http_response, resource_type):
+        url = http_request.url
+        with self._lock:
+            pending = self._pending_lros.get(url)
+        if pending:
+            if self._lro_finished(http_response, pending['header']):
+                with self._lock:
+                    self._pending_lros.pop(url, None)
+            return
+        if http_request.method not in ('PUT', 'PATCH', 'POST', 'DELETE'):
+            return
+        for header in ('azure-asyncoperation', 'location'):
+            polling_url = http_response.headers.get(header)
+            if polling_url:
+                now = time.monotonic()
+                with self._lock:
+                    for url, pending in list(self._pending_lros.items()):
+                        if now - pending['started'] > LRO_TRACKING_SECONDS:
+                            del self._pending_lros[url]
+                    self._pending_lros[polling_url] = {'resource_type': resource_type, 'header': header,
+                                                       'started': now}
+                return
+
+    @staticmethod
+    def _lro_finished(http_response, header):
+        if http_response.status_code >= 400:
+            return True
+        if header == 'location':
+            return http_response.status_code != 202
+        try:
+            status = json.loads(http_response.text() or '{}').get('status', '')
+        except ValueError:
+            return False
+        return str(status).lower() in TERMINAL_LRO_STATES
+
+    def _on_call_exception(self, request):
+        # A poll that failed for good (after retries) ends its poller, so no terminal response will follow.
+        with self._lock:
+            self._pending_lros.pop(request.http_request.url, None)
+
+    def _on_call_response(self, request, response):
+        http_request = request.http_request
+        status_code = response.http_response.status_code
+        if status_code >= 400:
+            self._mark_error()
+        self.increment('azure_requests_total', method=http_request.method,
+                       resource_type=request.context.get('azure_metrics_resource_type', 'unknown'),
+                       status=str(status_code))
+
+    # Module instrumentation
+
+    def instrument(self, module, resource_type):
+        """Wrap every public operation of a module instance and its SDK clients with metrics."""
+        for attribute in ('network_client', 'compute_client'):
+            client = getattr(module, attribute, None)
+            if client is not None and not isinstance(client, _InstrumentedClient):
+                setattr(module, attribute, _InstrumentedClient(client, self, resource_type))
+        for name in dir(type(module)):
+            method = getattr(module, name)
+            if name.startswith('_') or not callable(method):
+                continue
+            setattr(module, name, self._wrap_operation(method, name, resource_type))
+        return module
+
+    def _wrap_operation(self, method, operation, resource_type):
+        if inspect.isgeneratorfunction(method):
+            # Generators do their work while iterated, so the operation spans the iteration.
+            @functools.wraps(method)
+            def generator_wrapper(*args, **kwargs):
+                with self._operation_scope(operation, resource_type):
+                    return (yield from method(*args, **kwargs))
+            return generator_wrapper
+
+        @functools.wraps(method)
+        def wrapper(*args, **kwargs):
+            with self._operation_scope(operation, resource_type):
+                return method(*args, **kwargs)
+        return wrapper
+
+    @contextlib.contextmanager
+    def _operation_scope(self, operation, resource_type):
+        frame = {'operation': operation, 'errors': 0}
+        self._context.stack.append(frame)
+        span = None
+        if self.tracer:
+            span = self.tracer.start_span(f"{resource_type}.{operation}",
+                                          attributes={'azure.resource_type': resource_type,
+                                                      'azure.operation': operation})
+        start = time.perf_counter()
+        result = 'success'
+        try:
+            yield
+        except Exception:
+            result = 'error'
+            raise
+        finally:
+            stack = self._context.stack
+            for index in range(len(stack) - 1, -1, -1):
+                if stack[index] is frame:
+                    del stack[index]
+                    break
+            if result == 'success' and frame['errors']:
+                result = 'failure'
+            elapsed = time.perf_counter() - start
+            self.observe('azure_operation_duration_seconds', elapsed,
+                         operation=operation, resource_type=resource_type, result=result)
+            self.increment('azure_operations_total', operation=operation,
+                           resource_type=resource_type, result=result)
+            if span is not None:
+                span.set_attribute('azure.result', result)
+                span.end()
+
+    # Export
+
+    def render_prometheus(self):
+        """Render every metric in the Prometheus text exposition format."""
+        lines = []
+        with self._lock:
+            histograms = sorted(self._histograms.items())
+            counters = sorted(self._counters.items())
+            gauges = sorted(self._gauges.items())
+        seen = set()
+        for (name, labels), histogram in histograms:
+            if name not in seen:
+                seen.add(name)
+                lines.append(f"# TYPE {name} histogram")
+            for bound, count in zip(histogram.buckets, histogram.counts):
+                lines.append(f"{name}_bucket{_format_labels(labels + (('le', _format_value(bound)),))} {count}")
+            lines.append(f"{name}_bucket{_format_labels(labels + (('le', '+Inf'),))} {histogram.total}")
+            lines.append(f"{name}_sum{_format_labels(labels)} {_format_value(histogram.sum)}")
+            lines.append(f"{name}_count{_format_labels(labels)} {histogram.total}")
+        for kind, metrics in (('counter', counters), ('gauge', gauges)):
+            for (name, labels), value in metrics:
+                if name not in seen:
+                    seen.add(name)
+                    lines.append(f"# TYPE {name} {kind}")
+                lines.append(f"{name}{_format_labels(labels)} {_format_value(value)}")
+        return '\n'.join(lines) + '\n'
+
+
+def _format_labels(labels):
+    if not labels:
+        return ''
+    escaped = (
+        f'{key}="' + str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') + '"'
+        for key, value in labels
+    )
+    return '{' + ','.join(escaped) + '}'
+
+
+def _format_value(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _MetricsCallPolicy(SansIOHTTPPolicy):
+    """Runs once per logical request, before the retry policy."""
+
+    def __init__(self, metrics):
+        self._metrics = metrics
+
+    def on_response(self, request, response):
+        self._metrics._on_call_response(request, response)
+
+    def on_exception(self, request):
+        self._metrics._on_call_exception(request)
+
+
+class _MetricsRetryPolicy(SansIOHTTPPolicy):
+    """Runs on every attempt, after the retry policy."""
+
+    def __init__(self, metrics):
+        self._metrics = metrics
+
+    def on_request(self, request):
+        self._metrics._on_attempt(request)
+
+    def on_response(self, request, response):
+        self._metrics._on_attempt_response(request, response)
+
+
+class _InstrumentedClient:
+    """Proxy over an SDK client that instruments each operation group."""
+
+    def __init__(self, client, metrics, resource_type):
+        self._client = client
+        self._metrics = metrics
+        self._resource_type = resource_type
+
+    def __getattr__(self, name):
+        if name in CLIENT_METHODS:
+            # Raw requests already pass through the metrics policies; only operation groups are proxied.
+            return getattr(self._client, name)
+        return _InstrumentedOperations(getattr(self._client, name), self._metrics, self._resource_type)
+
+
+class _InstrumentedOperations:
+    """Proxy over an SDK operation group that records errors and LRO durations."""
+
+    def __init__(self, operations, metrics, resource_type):
+        self._operations = operations
+        self._metrics = metrics
+        self._resource_type = resource_type
+
+    def __getattr__(self, name):
+        call = getattr(self._operations, name)
+        if not callable(call):
+            return call
+
+        @functools.wraps(call)
+        def wrapper(*args, **kwargs):
+            try:
+                result = call(*args, **kwargs)
+            except Exception:
+                self._metrics._mark_error()
+                raise
+            if name.startswith('begin_'):
+                return _InstrumentedPoller(result, self._metrics, name, self._resource_type)
+            return result
+        return wrapper
+
+
+class _InstrumentedPoller:
+    """Proxy over an LROPoller that records the LRO duration when its result is collected."""
+
+    def __init__(self, poller, metrics, operation, resource_type):
+        self._poller = poller
+        self._metrics = metrics
+        self._operation = operation
+        self._resource_type = resource_type
+        self._started = time.perf_counter()
+        self._recorded = False
+
+    def _record(self, result):
+        if self._recorded:
+            return
+        self._recorded = True
+        self._metrics.observe('azure_lro_duration_seconds', time.perf_counter() - self._started,
+                              operation=self._operation, resource_type=self._resource_type, result=result)
+
+    def result(self, *args, **kwargs):
+        try:
+            value = self._poller.result(*args, **kwargs)
+        except Exception:
+            self._metrics._mark_error()
+            self._record('error')
+            raise
+        if self._poller.done():
+            self._record('success')
+        return value
+
+    def __getattr__(self, name):
+        return getattr(self._poller, name)
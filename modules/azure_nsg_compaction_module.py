@@ -0,0 +1,181 @@
+from collections import namedtuple
+from modules.azure_nsg_impact_module import ADDRESS_SPACE, enum_value, parse_addresses, parse_ports
+
+# Azure's default limit on security rules per NSG.
+RULES_PER_NSG_LIMIT = 1000
+
+# The four match dimensions of a rule; a merge unions exactly one of them.
+DIMENSIONS = ('source_address_prefixes', 'source_port_ranges', 'destination_address_prefixes', 'destination_port_ranges')
+
+# `merged` maps each surviving rule name to the names folded into it.
+RuleCompactionReport = namedtuple('RuleCompactionReport', ['original', 'compacted', 'removed', 'merged'])
+
+
+def _field(rule, name):
+    return rule.get(name) if isinstance(rule, dict) else getattr(rule, name, None)
+
+
+def _values(rule, singular, plural):
+    values = _field(rule, plural) or []
+    single = _field(rule, singular)
+    return frozenset(values if values else ([single] if single else []))
+
+
+def _group_ids(rule, name):
+    groups = _field(rule, name) or []
+    return frozenset(group['id'] if isinstance(group, dict) else group.id for group in groups)
+
+
+def security_rule_params(protocol, access, direction, priority, source_address_prefix=None,
+                         destination_address_prefix=None, source_port_range=None, destination_port_range=None,
+                         source_address_prefixes=None, destination_address_prefixes=None, source_port_ranges=None,
+                         destination_port_ranges=None, source_application_security_groups=None,
+                         destination_application_security_groups=None):
+    """Return security rule parameters, using the plural or ASG field for each side that is given as a list."""
+    params = {'protocol': protocol, 'access': access, 'direction': direction, 'priority': priority}
+    sides = (
+        ('source_address_prefix', source_address_prefix, source_address_prefixes,
+         'source_application_security_groups', source_application_security_groups),
+        ('destination_address_prefix', destination_address_prefix, destination_address_prefixes,
+         'destination_application_security_groups', destination_application_security_groups),
+        ('source_port_range', source_port_range, source_port_ranges, None, None),
+        ('destination_port_range', destination_port_range, destination_port_ranges, None, None),
+    )
+    for singular, single, plural, groups_field, groups in sides:
+        if groups:
+            params[groups_field] = [{'id': group_id} for group_id in sorted(groups)]
+        elif plural:
+            params[singular.replace('prefix', 'prefixes').replace('range', 'ranges')] = sorted(plural)
+        else:
+            params[singular] = single or '*'
+    return params
+
+
+class _Rule:
+    """Mutable working copy of a security rule during compaction."""
+
+    def __init__(self, rule, service_tags):
+        self.name = _field(rule, 'name')
+        self.priority = int(_field(rule, 'priority'))
+        self.direction = enum_value(_field(rule, 'direction')).lower()
+        self.access = enum_value(_field(rule, 'access')).capitalize()
+        self.protocol = enum_value(_field(rule, 'protocol') or '*')
+        self.source_groups = _group_ids(rule, 'source_application_security_groups')
+        self.destination_groups = _group_ids(rule, 'destination_application_security_groups')
+        self.values = {
+            'source_address_prefixes': _values(rule, 'source_address_prefix', 'source_address_prefixes'),
+            'source_port_ranges': _values(rule, 'source_port_range', 'source_port_ranges'),
+            'destination_address_prefixes': _values(rule, 'destination_address_prefix', 'destination_address_prefixes'),
+            'destination_port_ranges': _values(rule, 'destination_port_range', 'destination_port_ranges'),
+        }
+        self.service_tags = service_tags
+        self.merged = []
+        self._intervals()
+
+    def _intervals(self):
+        """Match intervals per dimension; unknown tags and ASG members are assumed to match everything."""
+        self.intervals = {}
+        for dimension, values in self.values.items():
+            groups = self.source_groups if dimension.startswith('source') else self.destination_groups
+            if dimension.endswith('port_ranges'):
+                self.intervals[dimension] = parse_ports(values or ['*'])
+            elif groups:
+                self.intervals[dimension] = (ADDRESS_SPACE,)
+            else:
+                unresolved = set()
+                intervals = parse_addresses(values or ['*'], self.service_tags, unresolved)
+                self.intervals[dimension] = (ADDRESS_SPACE,) if unresolved else intervals
+
+    def key(self, dimension):
+        """Everything but `dimension` must be equal for two rules to merge along it."""
+        return (self.direction, self.access, self.protocol.lower(), self.source_groups, self.destination_groups,
+                tuple(self.values[other] for other in DIMENSIONS if other != dimension))
+
+    def merge(self, other, dimension):
+        values = self.values[dimension] | other.values[dimension]
+        self.values[dimension] = frozenset(['*']) if values & {'*', 'Any', 'any'} else values
+        self.merged += [other.name] + other.merged
+        self._intervals()
+
+    def overlaps(self, other):
+        if self.direction != other.direction:
+            return False
+        if '*' not in (self.protocol, other.protocol) and self.protocol.lower() != other.protocol.lower():
+            return False
+        return all(any(low <= other_high and other_low <= high
+                       for low, high in self.intervals[dimension]
+                       for other_low, other_high in other.intervals[dimension])
+                   for dimension in DIMENSIONS)
+
+    def params(self):
+        values = self.values
+        params = security_rule_params(
+            self.protocol, self.access, self.direction.capitalize(), self.priority,
+            source_address_prefixes=values['source_address_prefixes'] if len(values['source_address_prefixes']) > 1 else None,
+            source_address_prefix=next(iter(values['source_address_prefixes']), None),
+            destination_address_prefixes=values['destination_address_prefixes']
+            if len(values['destination_address_prefixes']) > 1 else None,
+            destination_address_prefix=next(iter(values['destination_address_prefixes']), None),
+            source_port_ranges=values['source_port_ranges'] if len(values['source_port_ranges']) > 1 else None,
+            source_port_range=next(iter(values['source_port_ranges']), None),
+            destination_port_ranges=values['destination_port_ranges'] if len(values['destination_port_ranges']) > 1 else None,
+            destination_port_range=next(iter(values['destination_port_ranges']), None),
+            source_application_security_groups=self.source_groups,
+            destination_application_security_groups=self.destination_groups,
+        )
+        return dict(params, name=self.name)
+
+
+def _safe_to_merge(anchor, rule, ordered):
+    """Moving `rule` up to `anchor`'s priority is safe if no rule in between with the opposite access overlaps it."""
+    return not any(anchor.priority < other.priority < rule.priority and other.access != rule.access
+                   and other.overlaps(rule) for other in ordered)
+
+
+def _compact(rules, service_tags):
+    """Return working copies of the fewest security rules with the same first-match behavior.
+
+    Two rules with the same direction, access, protocol and application security groups
+    that differ in a single dimension (source prefixes, source ports, destination
+    prefixes or destination ports) are merged into the higher-priority one, whose list
+    for that dimension becomes the union. A merge moves the lower-priority rule's traffic
+    up to the higher priority, so it is only made when no rule in between with the
+    opposite access overlaps it. Merging repeats across dimensions until nothing changes.
+    Priorities are never renumbered.
+    """
+    ordered = sorted((_Rule(rule, service_tags) for rule in rules), key=lambda rule: rule.priority)
+    changed = True
+    while changed:
+        changed = False
+        for dimension in DIMENSIONS:
+            anchors = {}
+            survivors = []
+            for rule in ordered:
+                candidates = anchors.setdefault(rule.key(dimension), [])
+                target = next((anchor for anchor in candidates if _safe_to_merge(anchor, rule, ordered)), None)
+                if target is None:
+                    candidates.append(rule)
+                    survivors.append(rule)
+                    continue
+                target.merge(rule, dimension)
+                changed = True
+                # Later safety checks must see the merged rule at its new priority only.
+                ordered = [other for other in ordered if other is not rule]
+            ordered = survivors
+    return ordered
+
+
+def compact_rules(rules, service_tags=None):
+    """Return the compacted rules as add_nsg_rule parameter dicts with a 'name'."""
+    return [rule.params() for rule in _compact(rules, service_tags)]
+
+
+def compaction_report(rules, service_tags=None):
+    """Compact `rules` and return a RuleCompactionReport with parameter dicts for the surviving rules."""
+    compacted = _compact(rules, service_tags)
+    return RuleCompactionReport(
+        original=[_field(rule, 'name') for rule in rules],
+        compacted=[rule.params() for rule in compacted],
+        removed=[name for rule in compacted for name in rule.merged],
+        merged={rule.name: list(rule.merged) for rule in compacted if rule.merged},
+    )
@@ -0,0 +1,259 @@
+from collections import namedtuple
+from enum import Enum
+import ipaddress
+
+ADDRESS_SPACE = (0, 2 ** 128 - 1)
+PORT_SPACE = (0, 65535)
+# IPv4 addresses are mapped into the IPv6 space (::ffff:a.b.c.d) so both share one integer range.
+IPV4_MAPPED_BASE = 0xFFFF << 32
+# Flows are indexed by destination port block and destination address block (a /16 for IPv4).
+PORT_BUCKET_BITS = 10
+ADDRESS_BUCKET_BITS = 16
+# Deciding rule reported for flows no rule matches, like the DenyAll default rules.
+DEFAULT_DENY_RULE = 'DenyAll'
+
+Flow = namedtuple('Flow', ['direction', 'protocol', 'source_ip', 'source_port', 'destination_ip', 'destination_port'])
+# Address and port fields are tuples of inclusive (low, high) integer intervals.
+NormalizedRule = namedtuple('NormalizedRule', [
+    'name', 'priority', 'direction', 'access', 'protocol',
+    'sources', 'source_ports', 'destinations', 'destination_ports',
+])
+FlowImpact = namedtuple('FlowImpact', ['flow', 'old_access', 'new_access', 'old_rule', 'new_rule'])
+# `evaluated` counts the flows in overlapping buckets that a changed rule matches; only these are re-evaluated.
+ImpactReport = namedtuple('ImpactReport', ['evaluated', 'changed', 'unresolved_tags'])
+
+
+def enum_value(value):
+    """Return the plain string of an SDK enum such as SecurityRuleDirection.INBOUND ('Inbound')."""
+    return value.value if isinstance(value, Enum) else str(value)
+
+
+def ip_to_int(address):
+    """Return an IPv4 or IPv6 address as an integer in the shared IPv6 space."""
+    ip = ipaddress.ip_address(address)
+    return IPV4_MAPPED_BASE + int(ip) if ip.version == 4 else int(ip)
+
+
+def prefix_interval(prefix):
+    """Return the (low, high) integer interval covered by a CIDR prefix or a single address."""
+    network = ipaddress.ip_network(prefix, strict=False)
+    offset = IPV4_MAPPED_BASE if network.version == 4 else 0
+    return offset + int(network.network_address), offset + int(network.broadcast_address)
+
+
+def _field(rule, name):
+    return rule.get(name) if isinstance(rule, dict) else getattr(rule, name, None)
+
+
+def _prefixes(rule, singular, plural):
+    values = _field(rule, plural) or []
+    single = _field(rule, singular)
+    return list(values) if values else ([single] if single else ['*'])
+
+
+def parse_addresses(prefixes, service_tags=None, unresolved=None):
+    """Return address intervals for NSG address prefixes; service tags resolve through `service_tags`.
+
+    Tags missing from `service_tags` match nothing and are added to `unresolved`.
+    """
+    intervals = []
+    for prefix in prefixes:
+        if prefix in ('*', 'Any', 'any', '0.0.0.0/0'):
+            return (ADDRESS_SPACE,)
+        try:
+            intervals.append(prefix_interval(prefix))
+        except ValueError:
+            resolved = (service_tags or {}).get(prefix)
+            if resolved is None:
+                if unresolved is not None:
+                    unresolved.add(prefix)
+                continue
+            intervals.extend(parse_addresses(resolved))
+    return tuple(intervals)
+
+
+def parse_ports(ranges):
+    """Return port intervals for NSG port ranges such as '*', '443' or '1024-65535'."""
+    intervals = []
+    for port_range in ranges:
+        port_range = str(port_range)
+        if port_range in ('*', 'Any', 'any'):
+            return (PORT_SPACE,)
+        low, _, high = port_range.partition('-')
+        intervals.append((int(low), int(high or low)))
+    return tuple(intervals)
+
+
+def normalize_rule(rule, service_tags=None, unresolved=None):
+    """Return a NormalizedRule from an SDK SecurityRule or an add_nsg_rule parameter dict."""
+    return NormalizedRule(
+        name=_field(rule, 'name'),
+        priority=int(_field(rule, 'priority')),
+        direction=enum_value(_field(rule, 'direction')).lower(),
+        access=enum_value(_field(rule, 'access')).capitalize(),
+        protocol=enum_value(_field(rule, 'protocol') or '*').lower(),
+        sources=parse_addresses(_prefixes(rule, 'source_address_prefix', 'source_address_prefixes'),
+                                service_tags, unresolved),
+        source_ports=parse_ports(_prefixes(rule, 'source_port_range', 'source_port_ranges')),
+        destinations=parse_addresses(_prefixes(rule, 'destination_address_prefix', 'destination_address_prefixes'),
+                                     service_tags, unresolved),
+        destination_ports=parse_ports(_prefixes(rule, 'destination_port_range', 'destination_port_ranges')),
+    )
+
+
+def _in_intervals(value, intervals):
+    return any(low <= value <= high for low, high in intervals)
+
+
+def rule_matches(rule, flow):
+    """Return True if a NormalizedRule matches a Flow whose addresses are already integers."""
+    return (rule.direction == flow.direction
+            and rule.protocol in ('*', flow.protocol)
+            and _in_intervals(flow.destination_port, rule.destination_ports)
+            and _in_intervals(flow.destination_ip, rule.destinations)
+            and _in_intervals(flow.source_ip, rule.sources)
+            and _in_intervals(flow.source_port, rule.source_ports))
+
+
+def _normalize_flow(flow):
+    return Flow(
+        direction=enum_value(flow.direction).lower(),
+        protocol=enum_value(flow.protocol).lower(),
+        source_ip=ip_to_int(flow.source_ip) if isinstance(flow.source_ip, str) else flow.source_ip,
+        source_port=int(flow.source_port),
+        destination_ip=ip_to_int(flow.destination_ip) if isinstance(flow.destination_ip, str) else flow.destination_ip,
+        destination_port=int(flow.destination_port),
+    )
+
+
+class AzureNSGImpactModule:
+    def __init__(self, rules=(), service_tags=None):
+        """Initialize the analyzer with an NSG's security rules and optional service tag prefixes.
+
+        `service_tags` maps tags such as 'VirtualNetwork' to their address prefixes.
+        """
+        self.service_tags = service_tags or {}
+        self.unresolved_tags = set()
+        self._rules = {}
+        for rule in rules:
+            normalized = normalize_rule(rule, self.service_tags, self.unresolved_tags)
+            self._rules[normalized.name] = normalized
+        self._ordered = self._order(self._rules)
+        self._flows = []
+        self._recorded = []
+        self._verdicts = []
+        # direction -> port bucket -> address bucket -> flow ids
+        self._index = {}
+
+    @classmethod
+    def from_nsg(cls, nsg, service_tags=None):
+        """Build an analyzer from an SDK NetworkSecurityGroup, including its default rules."""
+        return cls(list(nsg.security_rules or []) + list(nsg.default_security_rules or []), service_tags)
+
+    @staticmethod
+    def _order(rules):
+        ordered = {}
+        for rule in sorted(rules.values(), key=lambda rule: rule.priority):
+            ordered.setdefault(rule.direction, []).append(rule)
+        return ordered
+
+    def _evaluate(self, flow, ordered):
+        for rule in ordered.get(flow.direction, ()):
+            if rule_matches(rule, flow):
+                return rule.access, rule.name
+        return 'Deny', DEFAULT_DENY_RULE
+
+    def get_rule(self, name):
+        """Return the NormalizedRule currently named `name`, or None."""
+        return self._rules.get(name)
+
+    def evaluate(self, flow):
+        """Return (access, deciding rule name) for a flow under the current rules."""
+        return self._evaluate(_normalize_flow(flow), self._ordered)
+
+    def _verdict(self, flow_id):
+        """Return the cached verdict of a flow under the current rules, evaluating it on first use."""
+        verdict = self._verdicts[flow_id]
+        if verdict is None:
+            verdict = self._verdicts[flow_id] = self._evaluate(self._flows[flow_id], self._ordered)
+        return verdict
+
+    def record_flows(self, flows):
+        """Add observed flows to the index; their verdicts are evaluated lazily and then cached."""
+        for recorded in flows:
+            flow = _normalize_flow(recorded)
+            flow_id = len(self._flows)
+            self._flows.append(flow)
+            self._recorded.append(recorded)
+            self._verdicts.append(None)
+            port_buckets = self._index.setdefault(flow.direction, {})
+            address_buckets = port_buckets.setdefault(flow.destination_port >> PORT_BUCKET_BITS, {})
+            address_buckets.setdefault(flow.destination_ip >> ADDRESS_BUCKET_BITS, []).append(flow_id)
+
+    def _candidates(self, rule):
+        """Return ids of flows in buckets that overlap the rule's destination ports and addresses."""
+        candidates = []
+        port_buckets = self._index.get(rule.direction, {})
+        wanted_ports = set()
+        for low, high in rule.destination_ports:
+            wanted_ports.update(range(low >> PORT_BUCKET_BITS, (high >> PORT_BUCKET_BITS) + 1))
+        for port_bucket in wanted_ports & port_buckets.keys():
+            address_buckets = port_buckets[port_bucket]
+            for low, high in rule.destinations:
+                first, last = low >> ADDRESS_BUCKET_BITS, high >> ADDRESS_BUCKET_BITS
+                if last - first + 1 > len(address_buckets):
+                    keys = [key for key in address_buckets if first <= key <= last]
+                else:
+                    keys = [key for key in range(first, last + 1) if key in address_buckets]
+                for key in keys:
+                    candidates.extend(address_buckets[key])
+        return candidates
+
+    def _changed_rules(self, add, remove):
+        unresolved = set()
+        added = [normalize_rule(rule, self.service_tags, unresolved) for rule in add]
+        removed = [self._rules[name] for name in remove if name in self._rules]
+        rules = {name: rule for name, rule in self._rules.items() if name not in remove}
+        for rule in added:
+            if rule.name in self._rules:
+                removed.append(self._rules[rule.name])
+            rules[rule.name] = rule
+        return added + removed, rules, unresolved
+
+    def analyze(self, add=(), remove=()):
+        """Return an ImpactReport of the recorded flows whose verdict a rule change would flip.
+
+        `add` holds new or replaced rules (SDK models or add_nsg_rule parameter dicts
+        with a 'name'), `remove` the names of deleted rules. A flow can only change
+        verdict if an added or removed rule matches it, so only flows in buckets
+        overlapping those rules are evaluated.
+        """
+        changed_rules, rules, unresolved = self._changed_rules(add, remove)
+        ordered = self._order(rules)
+        candidate_ids = set()
+        for rule in changed_rules:
+            candidate_ids.update(self._candidates(rule))
+        changed = []
+        evaluated = 0
+        for flow_id in sorted(candidate_ids):
+            flow = self._flows[flow_id]
+            if not any(rule_matches(rule, flow) for rule in changed_rules):
+                continue
+            evaluated += 1
+            old_access, old_rule = self._verdict(flow_id)
+            new_access, new_rule = self._evaluate(flow, ordered)
+            if new_access != old_access:
+                changed.append(FlowImpact(self._recorded[flow_id], old_access, new_access, old_rule, new_rule))
+        return ImpactReport(evaluated, changed, sorted(unresolved))
+
+    def apply(self, add=(), remove=()):
+        """Commit a rule change to the analyzer and drop the cached verdicts it may affect."""
+        changed_rules, rules, unresolved = self._changed_rules(add, remove)
+        self.unresolved_tags |= unresolved
+        self._rules = rules
+        self._ordered = self._order(rules)
+        candidate_ids = set()
+        for rule in changed_rules:
+            candidate_ids.update(self._candidates(rule))
+        for flow_id in candidate_ids:
+            self._verdicts[flow_id] = None
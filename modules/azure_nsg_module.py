@@ -1,98 +1,155 @@
-from azure.identity import DefaultAzureCredential
 from azure.mgmt.network import NetworkManagementClient
+from modules.azure_operation_module import AzureOperation, record_failure
+from modules.azure_nsg_impact_module import AzureNSGImpactModule
+from modules.azure_credential_module import shared_credential
+from modules.azure_deadline_module import wait_for
+from modules.azure_projection_module import get_projected, iter_projected
+from modules.azure_nsg_compaction_module import RULES_PER_NSG_LIMIT, compaction_report, security_rule_params
+from modules.azure_nsg_priority_module import AzureNSGPriorityModule
+from azure.core.exceptions import HttpResponseError
+from azure.mgmt.network.models import ApplicationSecurityGroup, SecurityRule
 import os
 
 class AzureNSGModule:
-    def __init__(self, subscription_id):
+    def __init__(self, subscription_id, credential=None, **client_kwargs):
         """Initialize the AzureNSGModule with Azure credentials and subscription ID."""
         self.subscription_id = subscription_id
         self.network_client = NetworkManagementClient(
-            credential=DefaultAzureCredential(),
-            subscription_id=self.subscription_id
+            credential=credential or shared_credential(),
+            subscription_id=self.subscription_id,
+            **client_kwargs
         )
 
-    def create_nsg(self, resource_group_name, nsg_name, location):
+    def create_nsg(self, resource_group_name, nsg_name, location, tags=None, wait=True, continuation_token=None):
         """Create a new Network Security Group (NSG) in Azure."""
         nsg_params = {
             'location': location
         }
+        if tags:
+            nsg_params['tags'] = tags
         try:
+            lro_kwargs = {'continuation_token': continuation_token} if continuation_token else {}
             nsg_poller = self.network_client.network_security_groups.begin_create_or_update(
-                resource_group_name, nsg_name, nsg_params)
-            nsg_result = nsg_poller.result()
+                resource_group_name, nsg_name, nsg_params, **lro_kwargs)
+            if not wait:
+                print(f"Creation of NSG '{nsg_name}' started.")
+                return AzureOperation(nsg_poller, f"Creation of NSG '{nsg_name}'")
+            nsg_result = wait_for(nsg_poller)
             print(f"NSG '{nsg_name}' created successfully.")
             return nsg_result
         except Exception as e:
             print(f"Failed to create NSG '{nsg_name}'. Error: {e}")
+            record_failure(e)
 
-    def add_nsg_rule(self, resource_group_name, nsg_name, rule_name, priority, direction, access, protocol, source_address_prefix, destination_address_prefix, source_port_range, destination_port_range):
-        """Add a security rule to an existing Network Security Group (NSG) in Azure."""
-        nsg_rule_params = {
-            'protocol': protocol,
-            'source_address_prefix': source_address_prefix,
-            'destination_address_prefix': destination_address_prefix,
-            'access': access,
-            'direction': direction,
-            'priority': priority,
-            'source_port_range': source_port_range,
-            'destination_port_range': destination_port_range
-        }
+    def add_nsg_rule(self, resource_group_name, nsg_name, rule_name, priority, direction, access, protocol,
+                     source_address_prefix=None, destination_address_prefix=None, source_port_range=None,
+                     destination_port_range=None, source_address_prefixes=None, destination_address_prefixes=None,
+                     source_port_ranges=None, destination_port_ranges=None,
+                     source_application_security_groups=None, destination_application_security_groups=None):
+        """Add a security rule to an existing Network Security Group (NSG) in Azure.
+
+        Each side takes either a single prefix or range, a list of them through the plural
+        argument, or for addresses a list of application security group IDs. A side left
+        unset matches anything ('*').
+        """
+        nsg_rule_params = security_rule_params(
+            protocol=protocol, access=access, direction=direction, priority=priority,
+            source_address_prefix=source_address_prefix, destination_address_prefix=destination_address_prefix,
+            source_port_range=source_port_range, destination_port_range=destination_port_range,
+            source_address_prefixes=source_address_prefixes, destination_address_prefixes=destination_address_prefixes,
+            source_port_ranges=source_port_ranges, destination_port_ranges=destination_port_ranges,
+            source_application_security_groups=source_application_security_groups,
+            destination_application_security_groups=destination_application_security_groups,
+        )
         try:
             rule_poller = self.network_client.security_rules.begin_create_or_update(
                 resource_group_name, nsg_name, rule_name, nsg_rule_params)
-            rule_result = rule_poller.result()
+            rule_result = wait_for(rule_poller)
             print(f"NSG rule '{rule_name}' added successfully.")
             return rule_result
         except Exception as e:
             print(f"Failed to add NSG rule '{rule_name}'. Error: {e}")
+            record_failure(e)
 
-    def delete_nsg(self, resource_group_name, nsg_name):
+    def delete_nsg(self, resource_group_name, nsg_name, wait=True):
         """Delete an existing Network Security Group (NSG) in Azure."""
         try:
             delete_poller = self.network_client.network_security_groups.begin_delete(
                 resource_group_name, nsg_name)
-            delete_poller.result()
+            if not wait:
+                print(f"Deletion of NSG '{nsg_name}' started.")
+                return AzureOperation(delete_poller, f"Deletion of NSG '{nsg_name}'")
+            wait_for(delete_poller)
             print(f"NSG '{nsg_name}' deleted successfully.")
         except Exception as e:
             print(f"Failed to delete NSG '{nsg_name}'. Error: {e}")
-    def get_nsg(self, resource_group_name, nsg_name):
-        """Get details of a specific Network Security Group (NSG)."""
+            record_failure(e)
+    def get_nsg(self, resource_group_name, nsg_name, fields=None):
+        """Get details of a specific Network Security Group (NSG), or just `fields` of it as a lightweight record."""
         try:
-            nsg = self.network_client.network_security_groups.get(resource_group_name, nsg_name)
+            if fields:
+                nsg = get_projected(self.network_client, self.subscription_id, 'nsg', resource_group_name, nsg_name, fields)
+            else:
+                nsg = self.network_client.network_security_groups.get(resource_group_name, nsg_name)
             print(f"Retrieved NSG '{nsg_name}' details successfully.")
             return nsg
         except Exception as e:
             print(f"Failed to retrieve NSG '{nsg_name}'. Error: {e}")
+            record_failure(e)
 
-    def list_nsgs(self, resource_group_name):
-        """List all NSGs in a specific resource group."""
+    def list_nsgs(self, resource_group_name, fields=None):
+        """List all NSGs in a specific resource group, as lightweight records of `fields` when given."""
         try:
-            nsg_list = self.network_client.network_security_groups.list(resource_group_name)
+            if fields:
+                nsg_list = iter_projected(self.network_client, self.subscription_id, 'nsg', resource_group_name, fields)
+            else:
+                nsg_list = self.network_client.network_security_groups.list(resource_group_name)
             nsgs = list(nsg_list)
             print(f"Retrieved {len(nsgs)} NSGs from resource group '{resource_group_name}'.")
             return nsgs
         except Exception as e:
             print(f"Failed to list NSGs. Error: {e}")
+            record_failure(e)
+
+    def get_impact_analyzer(self, resource_group_name, nsg_name, service_tags=None):
+        """Load an NSG's rules into an AzureNSGImpactModule to preview rule changes against recorded flows."""
+        try:
+            nsg = self.network_client.network_security_groups.get(resource_group_name, nsg_name)
+            analyzer = AzureNSGImpactModule.from_nsg(nsg, service_tags)
+            print(f"Loaded {len(nsg.security_rules or [])} rules of NSG '{nsg_name}' for impact analysis.")
+            return analyzer
+        except Exception as e:
+            print(f"Failed to load NSG '{nsg_name}' for impact analysis. Error: {e}")
+            record_failure(e)
 
-    def list_nsg_rules(self, resource_group_name, nsg_name):
-        """List all security rules in a specific Network Security Group (NSG)."""
+    def list_nsg_rules(self, resource_group_name, nsg_name, fields=None):
+        """List all security rules in a specific Network Security Group (NSG), as records of `fields` when given."""
         try:
-            rules = self.network_client.security_rules.list(resource_group_name, nsg_name)
+            if fields:
+                rules = iter_projected(self.network_client, self.subscription_id, 'nsg_rule', resource_group_name, fields,
+                                       nsg_name)
+            else:
+                rules = self.network_client.security_rules.list(resource_group_name, nsg_name)
             rule_list = list(rules)
             print(f"Retrieved {len(rule_list)} rules from NSG '{nsg_name}'.")
             return rule_list
         except Exception as e:
             print(f"Failed to list rules for NSG '{nsg_name}'. Error: {e}")
+            record_failure(e)
 
-    def delete_nsg_rule(self, resource_group_name, nsg_name, rule_name):
+    def delete_nsg_rule(self, resource_group_name, nsg_name, rule_name, wait=True):
         """Delete a specific security rule from a Network Security Group (NSG)."""
         try:
             delete_poller = self.network_client.security_rules.begin_delete(
                 resource_group_name, nsg_name, rule_name)
-            delete_poller.result()
+            if not wait:
+                print(f"Deletion of rule '{rule_name}' from NSG '{nsg_name}' started.")
+                return AzureOperation(delete_poller, f"Deletion of rule '{rule_name}' from NSG '{nsg_name}'")
+            wait_for(delete_poller)
             print(f"Deleted rule '{rule_name}' from NSG '{nsg_name}' successfully.")
         except Exception as e:
             print(f"Failed to delete rule '{rule_name}' from NSG '{nsg_name}'. Error: {e}")
+            record_failure(e)
 
     def update_nsg_tags(self, resource_group_name, nsg_name, tags):
         """Update tags for an existing Network Security Group (NSG)."""
@@ -102,9 +159,107 @@ class AzureNSGModule:
             }
             nsg_poller = self.network_client.network_security_groups.begin_create_or_update(
                 resource_group_name, nsg_name, nsg_params)
-            nsg_result = nsg_poller.result()
+            nsg_result = wait_for(nsg_poller)
             print(f"Updated tags for NSG '{nsg_name}' successfully.")
             return nsg_result
         except Exception as e:
             print(f"Failed to update tags for NSG '{nsg_name}'. Error: {e}")
-            
\ No newline at end of file
+            record_failure(e)
+
+    def compact_nsg_rules(self, resource_group_name, nsg_name, service_tags=None, dry_run=False, wait=True):
+        """Merge an NSG's security rules into the fewest multi-prefix, multi-port rules in one update.
+
+        Rules are only merged where first-match evaluation stays the same (see
+        `compact_rules`); surviving rules keep their names, priorities and descriptions.
+        `service_tags` maps tags to prefixes so overlap checks are exact; unknown tags and
+        application security groups are treated as matching everything. Returns a
+        RuleCompactionReport.
+        """
+        try:
+            nsg = self.network_client.network_security_groups.get(resource_group_name, nsg_name)
+            rules = list(nsg.security_rules or [])
+            report = compaction_report(rules, service_tags)
+            if len(report.compacted) > RULES_PER_NSG_LIMIT:
+                print(f"NSG '{nsg_name}' still has {len(report.compacted)} rules after compaction, "
+                      f"above the limit of {RULES_PER_NSG_LIMIT}.")
+            if not report.removed:
+                print(f"NSG '{nsg_name}' is already compact.")
+                return report
+            if dry_run:
+                print(f"Compaction would reduce NSG '{nsg_name}' from {len(report.original)} "
+                      f"to {len(report.compacted)} rules.")
+                return report
+            existing = {rule.name: rule for rule in rules}
+            compacted = []
+            for params in report.compacted:
+                rule = existing[params['name']]
+                if params['name'] in report.merged:
+                    for side in ('source', 'destination'):
+                        for field in ('address_prefix', 'address_prefixes', 'port_range', 'port_ranges',
+                                      'application_security_groups'):
+                            setattr(rule, f'{side}_{field}', None)
+                    for field, value in params.items():
+                        if field.endswith('application_security_groups'):
+                            value = [ApplicationSecurityGroup(id=group['id']) for group in value]
+                        setattr(rule, field, value)
+                compacted.append(rule)
+            nsg.security_rules = compacted
+            nsg_poller = self.network_client.network_security_groups.begin_create_or_update(
+                resource_group_name, nsg_name, nsg)
+            if not wait:
+                print(f"Compaction of NSG '{nsg_name}' started.")
+                return AzureOperation(nsg_poller, f"Compaction of NSG '{nsg_name}'")
+            wait_for(nsg_poller)
+            print(f"Compacted NSG '{nsg_name}' from {len(report.original)} to {len(report.compacted)} rules.")
+            return report
+        except Exception as e:
+            print(f"Failed to compact NSG '{nsg_name}'. Error: {e}")
+            record_failure(e)
+
+    def insert_nsg_rules(self, resource_group_name, nsg_name, direction, rules, after=None, before=None,
+                         max_attempts=3):
+        """Insert rules with allocated priorities in one update of the NSG.
+
+        `rules` are add_nsg_rule keyword dicts with a 'name' and without 'priority' or
+        'direction'. Priorities come from an AzureNSGPriorityModule: appended after the
+        last rule, or directly after rule `after` and/or before rule `before`, renumbering
+        the fewest existing rules when there is no room. The update is conditional on the
+        NSG's ETag, so a concurrent writer makes it fail with 412; the NSG is then re-read
+        and the allocation retried, up to `max_attempts` times. Returns the PriorityAllocation.
+        """
+        for attempt in range(1, max_attempts + 1):
+            try:
+                nsg = self.network_client.network_security_groups.get(resource_group_name, nsg_name)
+                allocator = AzureNSGPriorityModule.from_nsg(nsg)
+                allocation = allocator.allocate(direction, len(rules), after=after, before=before,
+                                                names=[rule['name'] for rule in rules])
+                existing = {rule.name: rule for rule in nsg.security_rules or []}
+                for name, _, priority in allocation.moves:
+                    existing[name].priority = priority
+                for rule, priority in zip(rules, allocation.priorities):
+                    params = dict(rule)
+                    name = params.pop('name')
+                    params = security_rule_params(priority=priority, direction=direction, **params)
+                    for field in ('source_application_security_groups', 'destination_application_security_groups'):
+                        if field in params:
+                            params[field] = [ApplicationSecurityGroup(id=group['id']) for group in params[field]]
+                    existing[name] = SecurityRule(name=name, **params)
+                nsg.security_rules = list(existing.values())
+                kwargs = {'headers': {'If-Match': nsg.etag}} if nsg.etag else {}
+                nsg_poller = self.network_client.network_security_groups.begin_create_or_update(
+                    resource_group_name, nsg_name, nsg, **kwargs)
+                wait_for(nsg_poller)
+                print(f"Inserted {len(rules)} rules into NSG '{nsg_name}' at priorities {allocation.priorities}"
+                      f" after moving {len(allocation.moves)} rules.")
+                return allocation
+            except HttpResponseError as e:
+                if e.status_code == 412 and attempt < max_attempts:
+                    print(f"NSG '{nsg_name}' changed concurrently; retrying rule insertion (attempt {attempt + 1}).")
+                    continue
+                print(f"Failed to insert rules into NSG '{nsg_name}'. Error: {e}")
+                record_failure(e)
+                return None
+            except Exception as e:
+                print(f"Failed to insert rules into NSG '{nsg_name}'. Error: {e}")
+                record_failure(e)
+                return None
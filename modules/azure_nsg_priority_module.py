@@ -0,0 +1,277 @@
+from collections import namedtuple
+from modules.azure_nsg_impact_module import enum_value
+import bisect
+import threading
+
+MIN_PRIORITY = 100
+MAX_PRIORITY = 4096
+# Gap left between rules appended after the last rule, so later inserts fit without renumbering.
+DEFAULT_SPACING = 10
+
+# `moves` lists (rule name, old priority, new priority) in an order that never collides when applied one by one.
+PriorityAllocation = namedtuple('PriorityAllocation', ['priorities', 'moves'])
+# A segment tree node over slots [start, start + length); runs count consecutive free slots.
+_Node = namedtuple('_Node', ['start', 'length', 'prefix', 'suffix', 'best', 'best_start', 'free'])
+
+
+def _combine(left, right):
+    best, best_start = max((left.best, -left.best_start), (right.best, -right.best_start),
+                           (left.suffix + right.prefix, -(left.start + left.length - left.suffix)))
+    return _Node(
+        start=left.start,
+        length=left.length + right.length,
+        prefix=left.prefix if left.prefix < left.length else left.length + right.prefix,
+        suffix=right.suffix if right.suffix < right.length else right.length + left.suffix,
+        best=best,
+        best_start=-best_start,
+        free=left.free + right.free,
+    )
+
+
+class _FreeRunTree:
+    """Segment tree over a priority range answering "longest free run in [low, high]" in O(log n)."""
+
+    def __init__(self, low, high):
+        self.low, self.high = low, high
+        self.size = 1
+        while self.size < high - low + 1:
+            self.size *= 2
+        self.nodes = [None] * (2 * self.size)
+        for offset in range(self.size):
+            # Padding slots past `high` are permanently used.
+            free = int(offset <= high - low)
+            self.nodes[self.size + offset] = _Node(low + offset, 1, free, free, free, low + offset, free)
+        for index in range(self.size - 1, 0, -1):
+            self.nodes[index] = _combine(self.nodes[2 * index], self.nodes[2 * index + 1])
+
+    def set(self, priority, used):
+        index = self.size + priority - self.low
+        free = int(not used)
+        self.nodes[index] = _Node(priority, 1, free, free, free, priority, free)
+        index //= 2
+        while index:
+            self.nodes[index] = _combine(self.nodes[2 * index], self.nodes[2 * index + 1])
+            index //= 2
+
+    def query(self, low, high):
+        """Return the combined node for [low, high]."""
+        low, high = low - self.low + self.size, high - self.low + self.size + 1
+        left, right = [], []
+        while low < high:
+            if low & 1:
+                left.append(self.nodes[low])
+                low += 1
+            if high & 1:
+                high -= 1
+                right.append(self.nodes[high])
+            low //= 2
+            high //= 2
+        result = None
+        for node in left + right[::-1]:
+            result = node if result is None else _combine(result, node)
+        return result
+
+    def free_before(self, priority):
+        """Return the number of free slots below `priority`."""
+        if priority <= self.low:
+            return 0
+        if priority > self.high:
+            return self.nodes[1].free
+        return self.query(self.low, priority - 1).free
+
+    def nth_free(self, rank):
+        """Return the free slot with `rank` free slots below it, or None."""
+        if rank < 0 or rank >= self.nodes[1].free:
+            return None
+        index = 1
+        while index < self.size:
+            left = self.nodes[2 * index]
+            if rank < left.free:
+                index = 2 * index
+            else:
+                rank -= left.free
+                index = 2 * index + 1
+        return self.low + index - self.size
+
+
+class AzureNSGPriorityModule:
+    def __init__(self, rules=(), min_priority=MIN_PRIORITY, max_priority=MAX_PRIORITY, spacing=DEFAULT_SPACING):
+        """Initialize a priority allocator from an NSG's security rules (SDK models or parameter dicts with 'name').
+
+        Inbound and outbound rules have separate priority spaces. Free slots are indexed
+        per direction, so each priority handed out, and each rule shifted to make room,
+        costs O(log n) regardless of how many rules the NSG has.
+        """
+        self.min_priority = min_priority
+        self.max_priority = max_priority
+        self.spacing = spacing
+        self._lock = threading.Lock()
+        self._trees = {}
+        self._used = {}
+        self._names = {}
+        self._by_priority = {}
+        for rule in rules:
+            get = rule.get if isinstance(rule, dict) else lambda name: getattr(rule, name, None)
+            self._mark(enum_value(get('direction')).lower(), int(get('priority')), get('name'))
+
+    @classmethod
+    def from_nsg(cls, nsg, **kwargs):
+        """Build an allocator from an SDK NetworkSecurityGroup's custom rules."""
+        return cls(nsg.security_rules or [], **kwargs)
+
+    def _tree(self, direction):
+        if direction not in self._trees:
+            self._trees[direction] = _FreeRunTree(self.min_priority, self.max_priority)
+            self._used[direction] = []
+        return self._trees[direction]
+
+    def _mark(self, direction, priority, name=None):
+        self._tree(direction).set(priority, True)
+        bisect.insort(self._used[direction], priority)
+        if name is not None:
+            self._names[name] = (direction, priority)
+            self._by_priority[(direction, priority)] = name
+
+    def _unmark(self, direction, priority):
+        self._tree(direction).set(priority, False)
+        used = self._used[direction]
+        del used[bisect.bisect_left(used, priority)]
+        name = self._by_priority.pop((direction, priority), None)
+        if name is not None:
+            del self._names[name]
+        return name
+
+    def priority_of(self, rule_name):
+        """Return the priority of a known rule, or None."""
+        entry = self._names.get(rule_name)
+        return entry[1] if entry else None
+
+    def free_count(self, direction, low=None, high=None):
+        """Return the number of free priorities in [low, high] for a direction."""
+        return self._tree(enum_value(direction).lower()).query(low or self.min_priority, high or self.max_priority).free
+
+    def _window(self, direction, after, before):
+        """Return the [low, high] range a constrained insert may use: directly after `after` and/or before `before`."""
+        used = self._used[direction]
+        low, high = self.min_priority, self.max_priority
+        for name, side in ((after, 'after'), (before, 'before')):
+            if name is None:
+                continue
+            entry = self._names.get(name)
+            if entry is None or entry[0] != direction:
+                raise ValueError(f"Rule '{name}' is not a known {direction} rule.")
+            if side == 'after':
+                low = entry[1] + 1
+                if before is None:
+                    index = bisect.bisect_right(used, entry[1])
+                    high = used[index] - 1 if index < len(used) else self.max_priority
+            else:
+                high = entry[1] - 1
+                if after is None:
+                    index = bisect.bisect_left(used, entry[1])
+                    low = used[index - 1] + 1 if index else self.min_priority
+        if low > high + 1:
+            raise ValueError(f"Rule '{after}' does not come before rule '{before}'.")
+        return low, high
+
+    def _spread(self, direction, low, high, count):
+        """Pick `count` free priorities in [low, high], spaced evenly so later inserts still fit."""
+        if low > high:
+            return None
+        node = self._tree(direction).query(low, high)
+        if node.free < count:
+            return None
+        if node.best >= count:
+            return [node.best_start + (index + 1) * node.best // (count + 1) for index in range(count)]
+        tree = self._tree(direction)
+        first = tree.free_before(low)
+        return [tree.nth_free(first + (index + 1) * node.free // (count + 1)) for index in range(count)]
+
+    def _shift(self, direction, low, high, count):
+        """Plan the fewest moves that open `count` slots in [low, high] by pushing neighbouring rules outward.
+
+        Rules above the range are pushed up and rules below it down, and the missing
+        slots may come from both sides. Opening `u` slots above `high` moves every rule
+        up to the u-th free slot above it, so each split is costed with two rank lookups.
+        Returns (priorities, moves) or None if the direction runs out of room.
+        """
+        tree = self._tree(direction)
+        used = self._used[direction]
+        window_free = [] if low > high else [tree.nth_free(tree.free_before(low) + index)
+                                             for index in range(tree.query(low, high).free)]
+        need = count - len(window_free)
+        below = tree.free_before(low)
+        free_to_high = tree.free_before(high + 1)
+        above = tree.nodes[1].free - free_to_high
+        if need > below + above:
+            return None
+
+        def up_cost(up):
+            return tree.nth_free(free_to_high + up - 1) - high - up if up else 0
+
+        def down_cost(down):
+            return low - tree.nth_free(below - down) - down if down else 0
+
+        up = min(range(min(need, above), max(0, need - below) - 1, -1),
+                 key=lambda up: up_cost(up) + down_cost(need - up))
+        down = need - up
+        moves = []
+        if down:
+            # Rules from the down-th free slot below `low` pack downward; nearest to that slot first
+            start = tree.nth_free(below - down)
+            moves += [(priority, start + index) for index, priority in
+                      enumerate(used[bisect.bisect_left(used, start):bisect.bisect_left(used, low)])]
+        if up:
+            # Rules up to the up-th free slot above `high` pack upward; farthest rule first
+            end = tree.nth_free(free_to_high + up - 1)
+            pushed = used[bisect.bisect_right(used, high):bisect.bisect_right(used, end)]
+            moves += [(priority, end - len(pushed) + 1 + index) for index, priority in reversed(list(enumerate(pushed)))]
+        extra_below = list(range(low - down, low))
+        extra_above = list(range(high + 1, high + 1 + up))
+        return extra_below + window_free + extra_above, moves
+
+    def allocate(self, direction, count=1, after=None, before=None, names=None):
+        """Reserve `count` ascending priorities and return a PriorityAllocation.
+
+        Without constraints the rules are appended after the last rule of the direction,
+        `spacing` apart. `after` places them directly after that rule and `before`
+        directly before it; with both, anywhere between the two. The largest free run
+        in that range is used, spread evenly. When the range is full, the fewest
+        neighbouring rules are shifted outward, on one or both sides, and listed in `moves`. `names` records
+        the new rules so later calls can refer to them.
+        """
+        direction = enum_value(direction).lower()
+        with self._lock:
+            self._tree(direction)
+            used = self._used[direction]
+            priorities, moves = None, []
+            if after is None and before is None:
+                base = used[-1] if used else self.min_priority - self.spacing
+                if base + self.spacing * count <= self.max_priority:
+                    priorities = [base + self.spacing * (index + 1) for index in range(count)]
+                low, high = (used[-1] + 1 if used else self.min_priority), self.max_priority
+            else:
+                low, high = self._window(direction, after, before)
+            if priorities is None:
+                priorities = self._spread(direction, low, high, count)
+            if priorities is None:
+                plan = self._shift(direction, low, high, count)
+                if plan is None:
+                    raise ValueError(f"No room for {count} more {direction} rules between priorities "
+                                     f"{self.min_priority} and {self.max_priority}.")
+                priorities, moves = plan
+            named_moves = []
+            for old, new in moves:
+                name = self._unmark(direction, old)
+                self._mark(direction, new, name)
+                named_moves.append((name, old, new))
+            for index, priority in enumerate(priorities):
+                self._mark(direction, priority, names[index] if names else None)
+            return PriorityAllocation(priorities, named_moves)
+
+    def release(self, direction, priorities):
+        """Free priorities that were allocated but never written."""
+        direction = enum_value(direction).lower()
+        with self._lock:
+            for priority in priorities:
+                self._unmark(direction, priority)
@@ -0,0 +1,211 @@
+from concurrent.futures import CancelledError, FIRST_COMPLETED, FIRST_EXCEPTION, ALL_COMPLETED
+from modules.azure_deadline_module import (POLL_SLICE, DeadlineExceeded, check_deadline, current_deadline,
+                                          remaining_timeout)
+import contextlib
+import contextvars
+import threading
+import time
+
+# Shared by every operation so wait_all() can sleep until any of them finishes.
+_completion = threading.Condition()
+# Errors that module methods caught and reported within the current capture_failures() block.
+_failures = contextvars.ContextVar('azure_failures', default=None)
+
+
+class AzureOperation:
+    """Non-blocking handle over an Azure long-running operation (LRO) poller."""
+
+    def __init__(self, poller, description, cancel_func=None):
+        self.poller = poller
+        self.description = description
+        self.started_at = time.time()
+        self._cancel_func = cancel_func
+        self._callbacks = []
+        self._lock = threading.Lock()
+        self._finished = False
+        self._cancelled = False
+        self._detached_reason = None
+        try:
+            poller.add_done_callback(lambda _: self._finish())
+        except Exception:
+            # Pollers without a background thread are picked up by done() instead.
+            pass
+        deadline = current_deadline()
+        if deadline is not None:
+            # Detach from the LRO if the run's deadline ends before it finishes.
+            deadline.track(self)
+
+    def _finish(self):
+        with self._lock:
+            if self._finished:
+                return
+            self._finished = True
+            callbacks, self._callbacks = self._callbacks, []
+        with _completion:
+            _completion.notify_all()
+        for callback in callbacks:
+            self._run_callback(callback)
+
+    def _run_callback(self, callback):
+        try:
+            callback(self)
+        except Exception as e:
+            print(f"Completion callback for '{self.description}' failed. Error: {e}")
+
+    def status(self):
+        """Return the current LRO status, e.g. 'InProgress', 'Succeeded' or 'Cancelled'."""
+        if self._cancelled:
+            return 'Cancelled'
+        return self.poller.status()
+
+    def done(self):
+        """Return True once the operation has finished or was cancelled."""
+        if self._cancelled:
+            return True
+        if not self._finished and self.poller.done():
+            self._finish()
+        return self._finished
+
+    def cancelled(self):
+        """Return True if the operation was cancelled through this handle."""
+        return self._cancelled
+
+    def progress(self):
+        """Return the status, elapsed time and, when ARM reports it, the percentage complete."""
+        percent_complete = None
+        try:
+            # ARM async-operation bodies may carry 'percentComplete'; the SDK keeps the last one.
+            last_response = self.poller.polling_method()._pipeline_response.http_response
+            percent_complete = last_response.json().get('percentComplete')
+        except Exception:
+            pass
+        return {
+            'description': self.description,
+            'status': self.status(),
+            'elapsed_seconds': time.time() - self.started_at,
+            'percent_complete': percent_complete,
+        }
+
+    def wait(self, timeout=None):
+        """Block until the operation finishes, is cancelled or `timeout` seconds pass; return True if it is done.
+
+        The poller is waited on in slices, so a cancel from another thread is noticed promptly.
+        """
+        expires_at = None if timeout is None else time.monotonic() + timeout
+        while not self.done():
+            left = None if expires_at is None else expires_at - time.monotonic()
+            if left is not None and left <= 0:
+                return False
+            self.poller.wait(POLL_SLICE if left is None else min(left, POLL_SLICE))
+        return True
+
+    def _raise_cancelled(self):
+        if self._detached_reason is not None:
+            # A TimeoutError, so journaled steps stay submitted and the next run reattaches.
+            raise DeadlineExceeded(f"{self._detached_reason}; detached from '{self.description}'.")
+        raise CancelledError(f"Operation '{self.description}' was cancelled.")
+
+    def result(self, timeout=None):
+        """Wait for the operation and return its result.
+
+        Raises TimeoutError if it is still running, DeadlineExceeded if the current
+        deadline ended first, and CancelledError if it was cancelled.
+        """
+        if self._cancelled:
+            self._raise_cancelled()
+        timeout = remaining_timeout(timeout)
+        if not self.wait(timeout):
+            check_deadline()
+            raise TimeoutError(f"Operation '{self.description}' did not finish within {timeout} seconds.")
+        if self._cancelled:
+            self._raise_cancelled()
+        return self.poller.result()
+
+    def exception(self, timeout=None):
+        """Return the exception raised by the operation, or None if it succeeded."""
+        try:
+            self.result(timeout)
+        except TimeoutError:
+            raise
+        except Exception as e:
+            return e
+        return None
+
+    def cancel(self, reason=None):
+        """Stop tracking the operation and run the cancel function, if one was given.
+
+        Most ARM operations cannot be aborted server-side; without a cancel function
+        the resource keeps provisioning and only this handle is detached. A deadline
+        passes its `reason`, and result() then raises DeadlineExceeded instead of CancelledError.
+        """
+        if self.done():
+            return False
+        self._detached_reason = reason
+        self._cancelled = True
+        if self._cancel_func is not None:
+            try:
+                self._cancel_func()
+            except Exception as e:
+                print(f"Failed to cancel '{self.description}'. Error: {e}")
+        with self._lock:
+            self._callbacks = []
+        with _completion:
+            _completion.notify_all()
+        return True
+
+    def add_done_callback(self, callback):
+        """Call `callback(operation)` when the operation finishes; immediately if it already has."""
+        with self._lock:
+            if not self._finished and not self._cancelled:
+                self._callbacks.append(callback)
+                return
+        if not self._cancelled:
+            self._run_callback(callback)
+
+    def __repr__(self):
+        return f"AzureOperation({self.description!r}, status={self.status()!r})"
+
+
+def wait_all(operations, timeout=None, return_when=ALL_COMPLETED, poll_interval=1.0):
+    """Wait on many operations together, like concurrent.futures.wait; return (done, not_done) sets."""
+    timeout = remaining_timeout(timeout)
+    operations = set(operations)
+    deadline = None if timeout is None else time.monotonic() + timeout
+    while True:
+        done = {operation for operation in operations if operation.done()}
+        not_done = operations - done
+        if not not_done:
+            break
+        if return_when == FIRST_COMPLETED and done:
+            break
+        if return_when == FIRST_EXCEPTION and any(
+                not operation.cancelled() and operation.exception(0) is not None for operation in done):
+            break
+        remaining = None if deadline is None else deadline - time.monotonic()
+        if remaining is not None and remaining <= 0:
+            break
+        with _completion:
+            _completion.wait(poll_interval if remaining is None else min(poll_interval, remaining))
+    return done, not_done
+
+
+def record_failure(error):
+    """Record an error a module method caught and reported, for the caller's capture_failures() block."""
+    failures = _failures.get()
+    if failures is not None:
+        failures.append(error)
+
+
+@contextlib.contextmanager
+def capture_failures():
+    """Collect, in the yielded list, the errors module methods catch and report within the block.
+
+    Module methods print their errors and return None instead of raising, and several
+    also return None on success; callers that must tell the two apart check this list.
+    """
+    failures = []
+    token = _failures.set(failures)
+    try:
+        yield failures
+    finally:
+        _failures.reset(token)
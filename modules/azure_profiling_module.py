@@ -0,0 +1,371 @@
+from azure.core.pipeline.transport import HttpTransport, RequestsTransport
+from collections import Counter
+import contextlib
+import cProfile
+import functools
+import json
+import os
+import pstats
+import sys
+import threading
+import time
+import tracemalloc
+
+PROFILE_MODES = ('cprofile', 'sampling')
+# Operations that materialize many SDK models, so their allocations are traced.
+MEMORY_OPERATIONS = ('list_', 'export', 'poll_once')
+# Where CPU time goes, by the file a function lives in; the first match wins.
+PACKAGE_GROUPS = (
+    ('modules', os.sep + 'modules' + os.sep),
+    ('sdk_models', os.sep + os.path.join('azure', 'mgmt') + os.sep),
+    ('azure_core', os.sep + os.path.join('azure', 'core') + os.sep),
+    ('http', os.sep + 'requests' + os.sep),
+    ('http', os.sep + 'urllib3' + os.sep),
+    ('http', os.sep + 'ssl.py'),
+    ('http', os.sep + 'socket.py'),
+    ('http', os.sep + os.path.join('http', 'client.py')),
+    ('json', os.sep + 'json' + os.sep),
+)
+
+
+def package_group(filename):
+    """Return the PACKAGE_GROUPS label of a source file, or 'other'."""
+    for group, marker in PACKAGE_GROUPS:
+        if marker in filename:
+            return group
+    return 'other'
+
+
+def _function_label(filename, lineno, name):
+    return f"{os.path.basename(filename)}:{lineno}({name})"
+
+
+class _Phase:
+    def __init__(self, name, counters):
+        self.name = name
+        self.started = time.perf_counter()
+        self.cpu_started = time.process_time()
+        self.counters_started = counters
+        self.profile = None
+        self.samples = Counter()
+        self.leaf_samples = Counter()
+
+
+class _ProfiledTransport(HttpTransport):
+    """Transport proxy that times every request sent and every SDK sleep (retry backoff, LRO poll delay)."""
+
+    def __init__(self, transport, profiler):
+        self._transport = transport
+        self._profiler = profiler
+
+    def __enter__(self):
+        self._transport.__enter__()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._transport.__exit__(*exc_info)
+
+    def open(self):
+        self._transport.open()
+
+    def close(self):
+        self._transport.close()
+
+    def send(self, request, **kwargs):
+        start = time.perf_counter()
+        try:
+            return self._transport.send(request, **kwargs)
+        finally:
+            self._profiler._add('network_seconds', time.perf_counter() - start, requests=1)
+
+    def sleep(self, duration):
+        start = time.perf_counter()
+        try:
+            self._transport.sleep(duration)
+        finally:
+            self._profiler._add('sleep_seconds', time.perf_counter() - start)
+
+
+class AzureProfilingModule:
+    def __init__(self, mode='cprofile', enabled=True, top=20, sample_interval=0.005, stats_dir=None):
+        """Initialize an opt-in run profiler; every method is a no-op unless `enabled`.
+
+        `mode` is 'cprofile' (deterministic; before Python 3.12 it only sees the thread that
+        opens a phase) or 'sampling' (stack samples of every thread each `sample_interval`
+        seconds). `top` bounds the functions and allocation sites kept per report entry, and
+        `stats_dir` additionally receives one pstats file per cProfile phase.
+        """
+        if mode not in PROFILE_MODES:
+            raise ValueError(f"Unknown profiling mode '{mode}', expected one of {PROFILE_MODES}.")
+        self.mode = mode
+        self.enabled = enabled
+        self.top = top
+        self.sample_interval = sample_interval
+        self.stats_dir = stats_dir
+        self._lock = threading.Lock()
+        self._counters = {'network_seconds': 0.0, 'sleep_seconds': 0.0, 'requests': 0}
+        self._stack = []
+        self._marked = None
+        self._phases = []
+        self._memory = {}
+        self._tracing = 0
+        self._sampler = None
+        self._stop_sampling = threading.Event()
+        self._started = time.perf_counter()
+        self._cpu_started = time.process_time()
+
+    # Network and sleep accounting
+
+    def client_kwargs(self, base=None):
+        """Return SDK client keyword arguments `base` with its transport timed by the profiler."""
+        kwargs = dict(base or {})
+        if self.enabled:
+            transport = kwargs.get('transport') or RequestsTransport()
+            if not isinstance(transport, _ProfiledTransport):
+                kwargs['transport'] = _ProfiledTransport(transport, self)
+        return kwargs
+
+    def _add(self, counter, seconds, requests=0):
+        with self._lock:
+            self._counters[counter] += seconds
+            self._counters['requests'] += requests
+
+    def _snapshot_counters(self):
+        with self._lock:
+            return dict(self._counters)
+
+    # Phases
+
+    @contextlib.contextmanager
+    def phase(self, name):
+        """Profile the enclosed code as the phase `name`; phases nest, and can also decorate a function."""
+        if not self.enabled:
+            yield
+            return
+        phase = self._begin(name)
+        try:
+            yield
+        finally:
+            self._end(phase)
+
+    def mark(self, name):
+        """End the phase started by the previous mark() and start the phase `name`, for linear scripts."""
+        if not self.enabled:
+            return
+        if self._marked is not None:
+            self._end(self._marked)
+        self._marked = self._begin(name)
+
+    def _begin(self, name):
+        phase = _Phase(name, self._snapshot_counters())
+        if self.mode == 'cprofile':
+            # Only one profiler may be active at a time, so a nested phase pauses its parent's.
+            if self._stack and self._stack[-1].profile is not None:
+                self._stack[-1].profile.disable()
+            try:
+                phase.profile = cProfile.Profile()
+                phase.profile.enable()
+            except ValueError:
+                phase.profile = None
+        else:
+            self._start_sampler()
+        with self._lock:
+            self._stack.append(phase)
+        return phase
+
+    def _end(self, phase):
+        if phase.profile is not None:
+            phase.profile.disable()
+        with self._lock:
+            if phase in self._stack:
+                self._stack.remove(phase)
+            parent = self._stack[-1] if self._stack else None
+        if phase is self._marked:
+            self._marked = None
+        if parent is not None and parent.profile is not None:
+            parent.profile.enable()
+        self._phases.append(self._summarize(phase))
+
+    def _summarize(self, phase):
+        wall = time.perf_counter() - phase.started
+        counters = self._snapshot_counters()
+        network = counters['network_seconds'] - phase.counters_started['network_seconds']
+        sleep = counters['sleep_seconds'] - phase.counters_started['sleep_seconds']
+        cpu = time.process_time() - phase.cpu_started
+        summary = {
+            'name': phase.name,
+            'wall_seconds': round(wall, 6),
+            'cpu_seconds': round(cpu, 6),
+            'network_seconds': round(network, 6),
+            'sleep_seconds': round(sleep, 6),
+            'other_wait_seconds': round(max(wall - cpu - network - sleep, 0), 6),
+            'requests': counters['requests'] - phase.counters_started['requests'],
+        }
+        if phase.profile is not None:
+            summary.update(self._profile_summary(phase))
+        elif self.mode == 'sampling':
+            summary.update(self._sample_summary(phase))
+        return summary
+
+    def _profile_summary(self, phase):
+        stats = pstats.Stats(phase.profile)
+        if self.stats_dir:
+            os.makedirs(self.stats_dir, exist_ok=True)
+            stats.dump_stats(os.path.join(self.stats_dir, f"{len(self._phases):02d}-{phase.name}.pstats"))
+        by_group = Counter()
+        functions = []
+        for (filename, lineno, name), (_, calls, self_time, cumulative, _) in stats.stats.items():
+            by_group[package_group(filename)] += self_time
+            functions.append((cumulative, self_time, calls, _function_label(filename, lineno, name)))
+        functions.sort(reverse=True)
+        return {
+            'cpu_by_package': {group: round(seconds, 6) for group, seconds in by_group.most_common()},
+            'top_functions': [
+                {'function': label, 'calls': calls, 'self_seconds': round(self_time, 6),
+                 'cumulative_seconds': round(cumulative, 6)}
+                for cumulative, self_time, calls, label in functions[:self.top]
+            ],
+        }
+
+    # Sampling
+
+    def _start_sampler(self):
+        if self._sampler is None:
+            self._stop_sampling.clear()
+            self._sampler = threading.Thread(target=self._sample_loop, name='azure-profiler', daemon=True)
+            self._sampler.start()
+
+    def _sample_loop(self):
+        own = threading.get_ident()
+        while not self._stop_sampling.wait(self.sample_interval):
+            with self._lock:
+                phase = self._stack[-1] if self._stack else None
+            if phase is None:
+                continue
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own:
+                    continue
+                phase.leaf_samples[(frame.f_code.co_filename, frame.f_lineno, frame.f_code.co_name)] += 1
+                seen = set()
+                while frame is not None:
+                    code = frame.f_code
+                    key = (code.co_filename, code.co_firstlineno, code.co_name)
+                    if key not in seen:
+                        seen.add(key)
+                        phase.samples[key] += 1
+                    frame = frame.f_back
+
+    def _sample_summary(self, phase):
+        by_group = Counter()
+        for (filename, _, _), count in phase.leaf_samples.items():
+            by_group[package_group(filename)] += count
+        return {
+            'samples': sum(phase.leaf_samples.values()),
+            'samples_by_package': dict(by_group.most_common()),
+            'top_functions': [
+                {'function': _function_label(*key), 'samples': count}
+                for key, count in phase.samples.most_common(self.top)
+            ],
+        }
+
+    # Memory
+
+    @contextlib.contextmanager
+    def memory(self, name):
+        """Trace the allocations of the enclosed code under `name`; overlapping traces make the numbers approximate."""
+        if not self.enabled:
+            yield
+            return
+        with self._lock:
+            if self._tracing == 0 and not tracemalloc.is_tracing():
+                tracemalloc.start()
+                self._tracing = 1
+            elif self._tracing:
+                self._tracing += 1
+        before = tracemalloc.take_snapshot()
+        traced_before, _ = tracemalloc.get_traced_memory()
+        tracemalloc.reset_peak()
+        try:
+            yield
+        finally:
+            traced_after, peak = tracemalloc.get_traced_memory()
+            after = tracemalloc.take_snapshot()
+            with self._lock:
+                if self._tracing:
+                    self._tracing -= 1
+                    if self._tracing == 0:
+                        tracemalloc.stop()
+            self._record_memory(name, traced_after - traced_before, peak - traced_before, before, after)
+
+    def _record_memory(self, name, retained, peak, before, after):
+        ignore = [tracemalloc.Filter(False, tracemalloc.__file__), tracemalloc.Filter(False, __file__)]
+        with self._lock:
+            entry = self._memory.setdefault(name, {'calls': 0, 'retained_bytes': 0, 'peak_bytes': 0, 'top': []})
+            entry['calls'] += 1
+            entry['retained_bytes'] += retained
+            if peak < entry['peak_bytes']:
+                return
+            entry['peak_bytes'] = peak
+        differences = after.filter_traces(ignore).compare_to(before.filter_traces(ignore), 'lineno')
+        top = [
+            {'location': f"{os.path.basename(stat.traceback[0].filename)}:{stat.traceback[0].lineno}",
+             'bytes': stat.size_diff, 'blocks': stat.count_diff}
+            for stat in differences[:self.top] if stat.size_diff > 0
+        ]
+        with self._lock:
+            if entry['peak_bytes'] == peak:
+                entry['top'] = top
+
+    def instrument(self, module, resource_type):
+        """Trace the allocations of a module instance's list and snapshot operations."""
+        if not self.enabled:
+            return module
+        for name in dir(type(module)):
+            method = getattr(module, name)
+            if name.startswith(MEMORY_OPERATIONS) and callable(method):
+                setattr(module, name, self._wrap_memory(method, f"{resource_type}.{name}"))
+        return module
+
+    def _wrap_memory(self, method, name):
+        @functools.wraps(method)
+        def wrapper(*args, **kwargs):
+            with self.memory(name):
+                return method(*args, **kwargs)
+        return wrapper
+
+    # Report
+
+    def stop(self):
+        """End the marked phase and stop sampling."""
+        if self._marked is not None:
+            self._end(self._marked)
+        if self._sampler is not None:
+            self._stop_sampling.set()
+            self._sampler.join()
+            self._sampler = None
+
+    def report(self):
+        """Return the profile of the run so far as a JSON-serializable dict."""
+        wall = time.perf_counter() - self._started
+        cpu = time.process_time() - self._cpu_started
+        counters = self._snapshot_counters()
+        with self._lock:
+            memory = {name: dict(entry) for name, entry in sorted(self._memory.items())}
+        return {
+            'mode': self.mode,
+            'wall_seconds': round(wall, 6),
+            'cpu_seconds': round(cpu, 6),
+            'network_seconds': round(counters['network_seconds'], 6),
+            'sleep_seconds': round(counters['sleep_seconds'], 6),
+            'other_wait_seconds': round(max(wall - cpu - counters['network_seconds'] - counters['sleep_seconds'], 0), 6),
+            'requests': counters['requests'],
+            'phases': list(self._phases),
+            'memory': memory,
+        }
+
+    def write_report(self, path):
+        """Stop profiling and write the compact JSON report to `path`."""
+        self.stop()
+        with open(path, 'w') as f:
+            json.dump(self.report(), f, separators=(',', ':'))
+        print(f"Profile written to '{path}'.")
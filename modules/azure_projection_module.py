@@ -0,0 +1,132 @@
+from azure.core.exceptions import ResourceNotFoundError
+from azure.core.rest import HttpRequest
+from collections import namedtuple
+import functools
+import json
+
+try:
+    import orjson
+except ImportError:  # orjson is optional; the standard library parser is used without it.
+    orjson = None
+
+# ARM's network and compute list/get endpoints do not support $select, so projection
+# happens client-side on the raw JSON, skipping SDK model deserialization entirely.
+API_VERSIONS = {
+    'Microsoft.Network': '2023-09-01',
+    'Microsoft.Compute': '2023-09-01',
+}
+
+# Resource type -> (provider type path, child collection or None).
+RESOURCE_PATHS = {
+    'vnet': ('Microsoft.Network/virtualNetworks', None),
+    'subnet': ('Microsoft.Network/virtualNetworks', 'subnets'),
+    'nsg': ('Microsoft.Network/networkSecurityGroups', None),
+    'nsg_rule': ('Microsoft.Network/networkSecurityGroups', 'securityRules'),
+    'route_table': ('Microsoft.Network/routeTables', None),
+    'route': ('Microsoft.Network/routeTables', 'routes'),
+    'vng': ('Microsoft.Network/virtualNetworkGateways', None),
+    'vm': ('Microsoft.Compute/virtualMachines', None),
+    'scale_set': ('Microsoft.Compute/virtualMachineScaleSets', None),
+}
+
+# Envelope fields every ARM resource carries outside its `properties` bag.
+ARM_TOP_LEVEL = ('id', 'name', 'type', 'location', 'etag', 'tags', 'sku', 'zones', 'identity', 'plan')
+
+
+def _camel(name):
+    head, *rest = name.split('_')
+    return head + ''.join(word[:1].upper() + word[1:] for word in rest)
+
+
+def json_path(field):
+    """Return the raw JSON keys of a snake_case field path, e.g. 'address_space.address_prefixes'."""
+    head, *rest = field.split('.')
+    keys = [head] if head in ARM_TOP_LEVEL else ['properties', _camel(head)]
+    return keys + [_camel(name) for name in rest]
+
+
+@functools.lru_cache(maxsize=256)
+def record_type(resource_type, fields):
+    """Return the namedtuple type of a resource type's projected records; dots in fields become underscores."""
+    name = ''.join(word.capitalize() for word in resource_type.split('_')) + 'Record'
+    return namedtuple(name, [field.replace('.', '_') for field in fields])
+
+
+def _plan(resource_type, fields):
+    if resource_type not in RESOURCE_PATHS:
+        raise ValueError(f"Unsupported resource type '{resource_type}'.")
+    fields = tuple(fields)
+    return record_type(resource_type, fields), [json_path(field) for field in fields]
+
+
+def _project(item, record, paths):
+    values = []
+    for keys in paths:
+        value = item
+        for key in keys:
+            value = value.get(key) if isinstance(value, dict) else None
+        values.append(value)
+    return record._make(values)
+
+
+def project(resource_type, item, fields):
+    """Return the `fields` of one raw ARM JSON resource as a record."""
+    record, paths = _plan(resource_type, fields)
+    return _project(item, record, paths)
+
+
+def resource_url(subscription_id, resource_group_name, resource_type, name=None, parent_name=None):
+    """Return the ARM URL of a resource, or of its collection when `name` is None."""
+    type_path, child = RESOURCE_PATHS[resource_type]
+    url = f"/subscriptions/{subscription_id}/resourceGroups/{resource_group_name}/providers/{type_path}"
+    if child is not None:
+        if parent_name is None:
+            raise ValueError(f"Resource type '{resource_type}' needs the name of its parent.")
+        url += f"/{parent_name}/{child}"
+    if name is not None:
+        url += f"/{name}"
+    return url
+
+
+def _loads(content):
+    return orjson.loads(content) if orjson is not None else json.loads(content)
+
+
+def _get_json(client, url, api_version=None):
+    params = {'api-version': api_version} if api_version else None
+    response = client.send_request(HttpRequest('GET', url, params=params))
+    if response.status_code == 404:
+        raise ResourceNotFoundError(response=response)
+    response.raise_for_status()
+    return _loads(response.content)
+
+
+def _api_version(resource_type):
+    return API_VERSIONS[RESOURCE_PATHS[resource_type][0].split('/')[0]]
+
+
+def get_projected(client, subscription_id, resource_type, resource_group_name, name, fields, parent_name=None):
+    """GET one resource through `client`'s pipeline and return only `fields` of it as a record."""
+    record, paths = _plan(resource_type, fields)
+    url = resource_url(subscription_id, resource_group_name, resource_type, name, parent_name)
+    return _project(_get_json(client, url, _api_version(resource_type)), record, paths)
+
+
+def iter_projected(client, subscription_id, resource_type, resource_group_name, fields, parent_name=None):
+    """Yield `fields` of every resource of a type as records, following nextLink page by page."""
+    record, paths = _plan(resource_type, fields)
+    page = _get_json(client, resource_url(subscription_id, resource_group_name, resource_type, None, parent_name),
+                     _api_version(resource_type))
+    while True:
+        for item in page.get('value', []):
+            yield _project(item, record, paths)
+        next_link = page.get('nextLink')
+        if not next_link:
+            return
+        # nextLink is absolute and already carries the api-version and skip token.
+        page = _get_json(client, next_link)
+
+
+def list_projected(client, subscription_id, resource_type, resource_group_name, fields, parent_name=None):
+    """Return `fields` of every resource of a type as a list of records."""
+    return list(iter_projected(client, subscription_id, resource_type, resource_group_name, fields, parent_name))
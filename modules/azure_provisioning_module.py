@@ -0,0 +1,147 @@
+from azure.mgmt.network import NetworkManagementClient
+from azure.mgmt.compute import ComputeManagementClient
+from modules.azure_credential_module import shared_credential
+from modules.azure_deadline_module import remaining_timeout
+import threading
+import time
+
+SUCCEEDED_STATES = ('Succeeded',)
+FAILED_STATES = ('Failed', 'Canceled')
+
+# One list call per resource type covers every pending waiter of that type.
+# Subnets are read from their parent VNet, so VNet and subnet waiters share a call.
+RESOURCE_LISTERS = {
+    'vnet': ('network_client', 'virtual_networks'),
+    'subnet': ('network_client', 'virtual_networks'),
+    'nsg': ('network_client', 'network_security_groups'),
+    'route_table': ('network_client', 'route_tables'),
+    'vng': ('network_client', 'virtual_network_gateways'),
+    'public_ip': ('network_client', 'public_ip_addresses'),
+    'nic': ('network_client', 'network_interfaces'),
+    'vm': ('compute_client', 'virtual_machines'),
+    'scale_set': ('compute_client', 'virtual_machine_scale_sets'),
+}
+LISTED_TYPES = {lister: resource_type for resource_type, lister in RESOURCE_LISTERS.items()
+                if resource_type != 'subnet'}
+
+
+class ProvisioningWaiter:
+    """Tracks the provisioning state of one resource until it reaches a terminal state."""
+
+    def __init__(self, resource_type, resource_name):
+        self.resource_type = resource_type
+        self.resource_name = resource_name
+        self.state = None
+        self.polled = False
+        self.event = threading.Event()
+
+    @property
+    def succeeded(self):
+        return self.state in SUCCEEDED_STATES
+
+    def update(self, state):
+        self.state = state
+        if state in SUCCEEDED_STATES or state in FAILED_STATES:
+            self.event.set()
+
+
+class AzureProvisioningWatcher:
+    def __init__(self, subscription_id, resource_group_name, interval=10, credential=None, **client_kwargs):
+        """Initialize the AzureProvisioningWatcher for one resource group."""
+        self.subscription_id = subscription_id
+        self.resource_group_name = resource_group_name
+        self.interval = interval
+        credential = credential or shared_credential()
+        self.network_client = NetworkManagementClient(
+            credential=credential,
+            subscription_id=self.subscription_id,
+            **client_kwargs
+        )
+        self.compute_client = ComputeManagementClient(
+            credential=credential,
+            subscription_id=self.subscription_id,
+            **client_kwargs
+        )
+        self._waiters = {}
+        self._lock = threading.Lock()
+        self._poll_lock = threading.Lock()
+        self._last_poll = None
+
+    def watch(self, resource_type, resource_name):
+        """Register a resource to watch; subnets are named 'vnet_name/subnet_name'."""
+        if resource_type not in RESOURCE_LISTERS:
+            raise ValueError(f"Unsupported resource type '{resource_type}'.")
+        key = (resource_type, resource_name)
+        with self._lock:
+            waiter = self._waiters.get(key)
+            if waiter is None or waiter.event.is_set():
+                waiter = self._waiters[key] = ProvisioningWaiter(resource_type, resource_name)
+        return waiter
+
+    def _list_states(self, listers):
+        """Run one list call per distinct lister and map (resource_type, name) to provisioning state."""
+        states = {}
+        for client_attribute, group in listers:
+            operations = getattr(getattr(self, client_attribute), group)
+            for resource in operations.list(self.resource_group_name):
+                if group == 'virtual_networks':
+                    states[('vnet', resource.name)] = resource.provisioning_state
+                    for subnet in resource.subnets or []:
+                        states[('subnet', f"{resource.name}/{subnet.name}")] = subnet.provisioning_state
+                else:
+                    states[(LISTED_TYPES[(client_attribute, group)], resource.name)] = resource.provisioning_state
+        return states
+
+    def poll_once(self):
+        """Poll the resource group once and fan the states out to every pending waiter."""
+        with self._lock:
+            pending = {key: waiter for key, waiter in self._waiters.items() if not waiter.event.is_set()}
+        self._last_poll = time.monotonic()
+        if not pending:
+            return 0
+        listers = {RESOURCE_LISTERS[resource_type] for resource_type, _ in pending}
+        try:
+            states = self._list_states(listers)
+        except Exception as e:
+            print(f"Failed to poll provisioning states in resource group '{self.resource_group_name}'. Error: {e}")
+            return 0
+        for key, waiter in pending.items():
+            waiter.polled = True
+            # Resources that are not listed yet keep waiting; the PUT may still be in flight.
+            if key in states:
+                waiter.update(states[key])
+        with self._lock:
+            for key, waiter in pending.items():
+                if waiter.event.is_set() and self._waiters.get(key) is waiter:
+                    del self._waiters[key]
+        return len(listers)
+
+    def wait_for(self, resource_type, resource_name, timeout=300):
+        """Block until the resource is provisioned; return the waiter with its final or last seen state.
+
+        Concurrent callers share the polling: one of them runs poll_once() per
+        interval and the others sleep on their waiter until the state arrives. A new
+        waiter is polled right away rather than at the next interval. `timeout` None
+        waits without limit, or until the current deadline.
+        """
+        waiter = self.watch(resource_type, resource_name)
+        timeout = remaining_timeout(timeout)
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while not waiter.event.is_set():
+            remaining = None if deadline is None else deadline - time.monotonic()
+            if remaining is not None and remaining <= 0:
+                break
+            if self._poll_lock.acquire(blocking=False):
+                try:
+                    if (not waiter.polled or self._last_poll is None
+                            or time.monotonic() - self._last_poll >= self.interval):
+                        self.poll_once()
+                finally:
+                    self._poll_lock.release()
+            if not waiter.event.is_set():
+                waiter.event.wait(self.interval if remaining is None else min(self.interval, max(remaining, 0)))
+        if not waiter.event.is_set():
+            with self._lock:
+                if self._waiters.get((resource_type, resource_name)) is waiter:
+                    del self._waiters[(resource_type, resource_name)]
+        return waiter
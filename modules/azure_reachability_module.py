@@ -0,0 +1,272 @@
+from collections import namedtuple
+from modules.azure_nsg_impact_module import AzureNSGImpactModule, Flow, enum_value, ip_to_int, normalize_rule, prefix_interval, rule_matches
+import threading
+
+# Next hops that leave the modeled VNets; a path that takes one ends there.
+EXIT_NEXT_HOPS = ('internet', 'virtualnetworkgateway')
+MAX_HOPS = 8
+# Well-known service tag prefixes; 'VirtualNetwork' is filled in with the loaded VNet address spaces.
+DEFAULT_SERVICE_TAGS = {'AzureLoadBalancer': ['168.63.129.16/32']}
+
+Query = namedtuple('Query', ['source_ip', 'destination_ip', 'port', 'protocol', 'source_port'])
+Query.__new__.__defaults__ = ('Tcp', 49152)
+# `path` lists hops as (kind, resource, detail); kind is 'subnet', 'nsg' or 'route'.
+ReachResult = namedtuple('ReachResult', ['reachable', 'path', 'reason'])
+Hop = namedtuple('Hop', ['kind', 'resource', 'detail'])
+
+
+def _id(value):
+    return value.lower() if value else None
+
+
+def _ref_id(reference):
+    if reference is None:
+        return None
+    return _id(reference.get('id') if isinstance(reference, dict) else getattr(reference, 'id', None))
+
+
+def _address_prefixes(item):
+    prefixes = list(getattr(item, 'address_prefixes', None) or [])
+    prefix = getattr(item, 'address_prefix', None)
+    return prefixes or ([prefix] if prefix else [])
+
+
+class _Route(namedtuple('_Route', ['name', 'interval', 'prefix_length', 'next_hop_type', 'next_hop_ip', 'user_defined'])):
+    def contains(self, address):
+        return self.interval[0] <= address <= self.interval[1]
+
+
+def _route(name, prefix, next_hop_type, next_hop_ip=None, user_defined=True):
+    low, high = prefix_interval(prefix)
+    # Prefix length in the shared IPv6 space, so IPv4 and IPv6 routes compare consistently.
+    prefix_length = 128 - (high - low).bit_length()
+    return _Route(name, (low, high), prefix_length, enum_value(next_hop_type or 'none').lower(), next_hop_ip,
+                  user_defined)
+
+
+class AzureReachabilityModule:
+    def __init__(self, vnets, route_tables=(), nsgs=(), service_tags=None):
+        """Build the reachability graph from SDK VNets (with subnets), route tables and NSGs.
+
+        Answers are memoized per query and invalidated only when a route or rule that
+        could change them is updated.
+        """
+        self._lock = threading.RLock()
+        self._subnets = {}
+        # Prefix size -> network address -> subnet ID, for longest-prefix match by lookup instead of a scan.
+        self._subnet_index = {}
+        self._system_routes = {}
+        vnet_spaces = []
+        for vnet in vnets:
+            vnet_id = _id(vnet.id)
+            space = list(getattr(getattr(vnet, 'address_space', None), 'address_prefixes', None) or [])
+            vnet_spaces += space
+            routes = [_route(f'VnetLocal {prefix}', prefix, 'vnetlocal', user_defined=False) for prefix in space]
+            for peering in getattr(vnet, 'virtual_network_peerings', None) or []:
+                if enum_value(getattr(peering, 'peering_state', None) or 'Connected').lower() != 'connected':
+                    continue
+                remote_space = getattr(getattr(peering, 'remote_address_space', None), 'address_prefixes', None)
+                routes += [_route(f'VNetPeering {prefix}', prefix, 'vnetpeering', user_defined=False)
+                           for prefix in remote_space or []]
+            routes.append(_route('Default 0.0.0.0/0', '0.0.0.0/0', 'internet', user_defined=False))
+            self._system_routes[vnet_id] = routes
+            for subnet in vnet.subnets or []:
+                subnet_id = _id(subnet.id)
+                self._subnets[subnet_id] = {
+                    'vnet': vnet_id,
+                    'intervals': [prefix_interval(prefix) for prefix in _address_prefixes(subnet)],
+                    'nsg': _ref_id(getattr(subnet, 'network_security_group', None)),
+                    'route_table': _ref_id(getattr(subnet, 'route_table', None)),
+                }
+                for low, high in self._subnets[subnet_id]['intervals']:
+                    self._subnet_index.setdefault(high - low + 1, {}).setdefault(low, subnet_id)
+        self._subnet_sizes = sorted(self._subnet_index)
+        self.service_tags = dict(DEFAULT_SERVICE_TAGS, VirtualNetwork=vnet_spaces)
+        self.service_tags.update(service_tags or {})
+        self._route_tables = {_id(table.id): {route.name: _route(route.name, route.address_prefix, route.next_hop_type,
+                                                                  getattr(route, 'next_hop_ip_address', None))
+                                              for route in table.routes or []}
+                              for table in route_tables}
+        self._nsgs = {_id(nsg.id): AzureNSGImpactModule.from_nsg(nsg, self.service_tags) for nsg in nsgs}
+        self._cache = {}
+        # Reverse indexes from a route table or NSG to the cached queries that consulted it.
+        self._route_dependents = {}
+        self._nsg_dependents = {}
+
+    @classmethod
+    def from_modules(cls, resource_group_name, vnet_module, route_table_module, nsg_module, service_tags=None):
+        """Load every VNet, route table and NSG of a resource group through the modules' list calls."""
+        return cls(vnet_module.list_vnets(resource_group_name) or [],
+                   route_table_module.list_route_tables(resource_group_name) or [],
+                   nsg_module.list_nsgs(resource_group_name) or [],
+                   service_tags)
+
+    def _subnet_of(self, address):
+        """Return the ID of the subnet with the longest prefix containing `address`, or None."""
+        for size in self._subnet_sizes:
+            subnet_id = self._subnet_index[size].get(address - address % size)
+            if subnet_id is not None:
+                return subnet_id
+        return None
+
+    def _next_hop(self, subnet_id, destination):
+        """Longest-prefix match over the subnet's user-defined and system routes; UDRs win ties."""
+        subnet = self._subnets[subnet_id]
+        candidates = list(self._system_routes.get(subnet['vnet'], []))
+        if subnet['route_table'] in self._route_tables:
+            candidates += self._route_tables[subnet['route_table']].values()
+        matches = [route for route in candidates if route.contains(destination)]
+        if not matches:
+            return None
+        return max(matches, key=lambda route: (route.prefix_length, route.user_defined))
+
+    def _nsg_verdict(self, nsg_id, flow, key, hops):
+        self._nsg_dependents.setdefault(nsg_id, {}).setdefault(key, []).append(flow)
+        if nsg_id not in self._nsgs:
+            hops.append(Hop('nsg', nsg_id, 'not loaded; assumed Allow'))
+            return True
+        access, rule = self._nsgs[nsg_id].evaluate(flow)
+        hops.append(Hop('nsg', nsg_id, f"{flow.direction} {access} by '{rule}'"))
+        return access == 'Allow'
+
+    def _trace(self, query, key):
+        source = ip_to_int(query.source_ip)
+        destination = ip_to_int(query.destination_ip)
+        protocol = str(query.protocol).lower()
+        hops = []
+        current = self._subnet_of(source)
+        if current is None:
+            return ReachResult(False, hops, 'Source is not in a known subnet.')
+        destination_subnet = self._subnet_of(destination)
+        appliances = set()
+        for _ in range(MAX_HOPS):
+            hops.append(Hop('subnet', current, 'egress'))
+            subnet = self._subnets[current]
+            if subnet['nsg'] and not self._nsg_verdict(subnet['nsg'], Flow(
+                    'outbound', protocol, source, query.source_port, destination, query.port), key, hops):
+                return ReachResult(False, hops, 'Denied by outbound NSG rule.')
+            self._route_dependents.setdefault(subnet['route_table'] or ('system', subnet['vnet']), {}) \
+                .setdefault(key, []).append(destination)
+            route = self._next_hop(current, destination)
+            if route is None or route.next_hop_type == 'none':
+                hops.append(Hop('route', subnet['route_table'], f"{route.name if route else 'no route'} -> None"))
+                return ReachResult(False, hops, 'Dropped by a route with next hop None.')
+            hops.append(Hop('route', subnet['route_table'] if route.user_defined else 'system',
+                            f"{route.name} -> {route.next_hop_type}"))
+            if route.next_hop_type in EXIT_NEXT_HOPS:
+                return ReachResult(False, hops, f"Traffic leaves the modeled network via {route.next_hop_type}.")
+            appliance = route.next_hop_type == 'virtualappliance'
+            if appliance:
+                if route.next_hop_ip in appliances:
+                    return ReachResult(False, hops, 'Routing loop between virtual appliances.')
+                appliances.add(route.next_hop_ip)
+                next_subnet = self._subnet_of(ip_to_int(route.next_hop_ip)) if route.next_hop_ip else None
+                if next_subnet is None:
+                    return ReachResult(False, hops, 'Virtual appliance is not in a known subnet.')
+            else:
+                # VnetLocal stays inside the VNet; VNetPeering crosses into a loaded peered VNet.
+                same_vnet = destination_subnet is not None and self._subnets[destination_subnet]['vnet'] == subnet['vnet']
+                if destination_subnet is None or same_vnet != (route.next_hop_type == 'vnetlocal'):
+                    return ReachResult(False, hops, 'Destination is not in a known subnet.')
+                next_subnet = destination_subnet
+            hops.append(Hop('subnet', next_subnet, 'appliance' if appliance else 'ingress'))
+            nsg = self._subnets[next_subnet]['nsg']
+            if nsg and not self._nsg_verdict(nsg, Flow(
+                    'inbound', protocol, source, query.source_port, destination, query.port), key, hops):
+                return ReachResult(False, hops, 'Denied by inbound NSG rule.')
+            if not appliance:
+                return ReachResult(True, hops, 'Reachable.')
+            # The appliance forwards the packet using its own subnet's NSG and routes.
+            current = next_subnet
+        return ReachResult(False, hops, 'Too many hops.')
+
+    def reach(self, source_ip, destination_ip, port, protocol='Tcp', source_port=49152):
+        """Answer whether `source_ip` can reach `destination_ip` on `port`, and along which path."""
+        return self.reach_many([Query(source_ip, destination_ip, port, protocol, source_port)])[0]
+
+    def reach_many(self, queries):
+        """Answer a batch of Query tuples, reusing memoized answers for repeated questions."""
+        results = []
+        with self._lock:
+            for query in queries:
+                query = Query(*query)
+                key = (query.source_ip, query.destination_ip, int(query.port), str(query.protocol).lower(),
+                       int(query.source_port))
+                if key not in self._cache:
+                    self._cache[key] = self._trace(query, key)
+                results.append(self._cache[key])
+        return results
+
+    def cache_size(self):
+        """Return the number of memoized answers."""
+        return len(self._cache)
+
+    def _invalidate(self, keys):
+        for key in keys:
+            self._cache.pop(key, None)
+        for dependents in (self._route_dependents, self._nsg_dependents):
+            for entries in dependents.values():
+                for key in keys:
+                    entries.pop(key, None)
+        return len(keys)
+
+    def update_route(self, route_table_id, route):
+        """Add or replace a route (SDK Route or dict) and invalidate the answers it can change.
+
+        Only cached queries that used this route table with a destination inside the old
+        or new prefix are dropped; longest-prefix match ignores routes that do not contain
+        the destination.
+        """
+        route_table_id = _id(route_table_id)
+        get = route.get if isinstance(route, dict) else lambda name: getattr(route, name, None)
+        new = _route(get('name'), get('address_prefix'), get('next_hop_type'), get('next_hop_ip_address'))
+        with self._lock:
+            routes = self._route_tables.setdefault(route_table_id, {})
+            old = routes.get(new.name)
+            routes[new.name] = new
+            return self._invalidate_routes(route_table_id, [old, new])
+
+    def remove_route(self, route_table_id, route_name):
+        """Remove a route and invalidate the answers it can change."""
+        route_table_id = _id(route_table_id)
+        with self._lock:
+            old = self._route_tables.get(route_table_id, {}).pop(route_name, None)
+            return self._invalidate_routes(route_table_id, [old])
+
+    def _invalidate_routes(self, route_table_id, routes):
+        routes = [route for route in routes if route is not None]
+        dependents = self._route_dependents.get(route_table_id, {})
+        keys = [key for key, destinations in dependents.items()
+                if any(route.contains(destination) for route in routes for destination in destinations)]
+        return self._invalidate(keys)
+
+    def update_security_rule(self, nsg_id, rule):
+        """Add or replace an NSG rule (SDK SecurityRule or add_nsg_rule dict with 'name') and invalidate its answers.
+
+        Only cached queries whose flow through this NSG matches the old or new rule are dropped.
+        """
+        nsg_id = _id(nsg_id)
+        with self._lock:
+            analyzer = self._nsgs.setdefault(nsg_id, AzureNSGImpactModule(service_tags=self.service_tags))
+            new = normalize_rule(rule, self.service_tags)
+            changed = [new, analyzer.get_rule(new.name)]
+            analyzer.apply(add=[rule])
+            return self._invalidate_rules(nsg_id, changed)
+
+    def remove_security_rule(self, nsg_id, rule_name):
+        """Remove an NSG rule and invalidate the answers it can change."""
+        nsg_id = _id(nsg_id)
+        with self._lock:
+            analyzer = self._nsgs.get(nsg_id)
+            if analyzer is None:
+                return 0
+            changed = [analyzer.get_rule(rule_name)]
+            analyzer.apply(remove=[rule_name])
+            return self._invalidate_rules(nsg_id, changed)
+
+    def _invalidate_rules(self, nsg_id, rules):
+        rules = [rule for rule in rules if rule is not None]
+        dependents = self._nsg_dependents.get(nsg_id, {})
+        keys = [key for key, flows in dependents.items()
+                if any(rule_matches(rule, flow) for rule in rules for flow in flows)]
+        return self._invalidate(keys)
@@ -0,0 +1,177 @@
+from collections import namedtuple
+from modules.azure_nsg_impact_module import enum_value
+import ipaddress
+
+# Azure's default limit on user-defined routes per route table.
+ROUTES_PER_TABLE_LIMIT = 400
+
+RouteSpec = namedtuple('RouteSpec', ['name', 'address_prefix', 'next_hop_type', 'next_hop_ip_address'])
+# `removed` names the routes that leave the table, `added` holds the RouteSpecs written with a widened prefix.
+CompactionReport = namedtuple('CompactionReport', ['original', 'compacted', 'removed', 'added'])
+
+# System routes Azure creates in every subnet, besides one VnetLocal route per VNet address space.
+DEFAULT_SYSTEM_ROUTES = [
+    RouteSpec(None, '0.0.0.0/0', 'Internet', None),
+    RouteSpec(None, '10.0.0.0/8', 'None', None),
+    RouteSpec(None, '172.16.0.0/12', 'None', None),
+    RouteSpec(None, '192.168.0.0/16', 'None', None),
+    RouteSpec(None, '100.64.0.0/10', 'None', None),
+]
+
+
+def _field(route, name):
+    return route.get(name) if isinstance(route, dict) else getattr(route, name, None)
+
+
+def _spec(route):
+    return RouteSpec(_field(route, 'name'), _field(route, 'address_prefix'),
+                     _field(route, 'next_hop_type'), _field(route, 'next_hop_ip_address'))
+
+
+def _hop(route):
+    """Next hop identity; the type is case-insensitive, and only virtual appliances carry an IP."""
+    return enum_value(route.next_hop_type).lower(), route.next_hop_ip_address or None
+
+
+def _network(prefix):
+    try:
+        return ipaddress.ip_network(prefix, strict=False)
+    except ValueError:
+        return None  # Service tag prefixes are kept as they are
+
+
+def system_routes(address_spaces=()):
+    """Return the system routes of a subnet in a VNet with `address_spaces`, as RouteSpecs."""
+    return [RouteSpec(None, prefix, 'VnetLocal', None) for prefix in address_spaces] + DEFAULT_SYSTEM_ROUTES
+
+
+def compact_routes(routes, system_routes=()):
+    """Return the smallest equivalent route set as RouteSpecs.
+
+    A route is dropped when the nearest route containing it has the same next hop, so
+    longest-prefix match gives its addresses the same hop without it. Two sibling
+    halves of a CIDR block with the same next hop are merged into the block, unless a
+    route for the block itself already exists. Both steps repeat until nothing changes.
+    Neither step removes a route that overrides one of `system_routes` lying between
+    it and the wider route, since that system route would then win its addresses.
+    Routes keep their names; a merged block takes the name of its lower half.
+    """
+    specs = [_spec(route) for route in routes]
+    system = {network for network in (_network(_field(route, 'address_prefix')) for route in system_routes)
+              if network is not None}
+    table = {}
+    passthrough = []
+    for spec in specs:
+        network = _network(spec.address_prefix)
+        if network is None or network in table:
+            passthrough.append(spec)
+        else:
+            table[network] = spec
+
+    def parent(network):
+        for prefix_length in range(network.prefixlen - 1, -1, -1):
+            supernet = network.supernet(new_prefix=prefix_length)
+            if supernet in table:
+                return table[supernet]
+        return None
+
+    def shadows_system_route(network, wider):
+        """Whether a system route longer than `wider` contains `network`, so only `network` overrides it."""
+        return any(network.supernet(new_prefix=prefix_length) in system
+                   for prefix_length in range(wider.prefixlen + 1, network.prefixlen + 1))
+
+    changed = True
+    while changed:
+        changed = False
+        for network in sorted(table, key=lambda network: -network.prefixlen):
+            covering = parent(network)
+            if covering is not None and _hop(covering) == _hop(table[network]) \
+                    and not shadows_system_route(network, _network(covering.address_prefix)):
+                del table[network]
+                changed = True
+        for network in sorted(table, key=lambda network: (-network.prefixlen, network.version, network)):
+            if network not in table or network.prefixlen == 0:
+                continue
+            supernet = network.supernet()
+            lower, upper = supernet.subnets()
+            if lower not in table or upper not in table or supernet in table:
+                continue
+            if _hop(table[lower]) != _hop(table[upper]) or lower in system or upper in system:
+                continue
+            first = table.pop(lower)
+            table.pop(upper)
+            table[supernet] = first._replace(address_prefix=str(supernet))
+            changed = True
+    return passthrough + sorted(table.values(), key=lambda spec: (_network(spec.address_prefix).version,
+                                                                  _network(spec.address_prefix)))
+
+
+def _lookup_table(routes):
+    """Return {version: {prefix length: {network int: hop}}} for longest-prefix lookups.
+
+    The first route for a prefix wins, so list user-defined routes before the system routes they override.
+    """
+    table = {}
+    for route in routes:
+        network = _network(route.address_prefix)
+        if network is not None:
+            table.setdefault(network.version, {}).setdefault(network.prefixlen, {}) \
+                .setdefault(int(network.network_address), _hop(route))
+    return table
+
+
+def _service_tag_hops(routes):
+    return {route.address_prefix: _hop(route) for route in routes if _network(route.address_prefix) is None}
+
+
+def _longest_match(lengths, bits, address):
+    for prefix_length in sorted(lengths, reverse=True):
+        hop = lengths[prefix_length].get(address >> (bits - prefix_length) << (bits - prefix_length))
+        if hop is not None:
+            return hop
+    return None
+
+
+def find_difference(original, compacted, system_routes=()):
+    """Return (address, original hop, compacted hop) for an address routed differently, or None.
+
+    Route boundaries split the address space into elementary intervals within which
+    longest-prefix match cannot change, so checking one address per interval proves
+    the two route sets equivalent. Both sets are evaluated together with `system_routes`,
+    which a user-defined route for the same prefix overrides. A hop of None means no route applies.
+    """
+    system = [_spec(route) for route in system_routes]
+    original = [_spec(route) for route in original] + system
+    compacted = [_spec(route) for route in compacted] + system
+    tags_before, tags_after = _service_tag_hops(original), _service_tag_hops(compacted)
+    for prefix in sorted(tags_before.keys() | tags_after.keys()):
+        if tags_before.get(prefix) != tags_after.get(prefix):
+            return prefix, tags_before.get(prefix), tags_after.get(prefix)
+    before, after = _lookup_table(original), _lookup_table(compacted)
+    for version, bits in ((4, 32), (6, 128)):
+        boundaries = {0}
+        for routes in (original, compacted):
+            for route in routes:
+                network = _network(route.address_prefix)
+                if network is not None and network.version == version:
+                    boundaries.add(int(network.network_address))
+                    boundaries.add(int(network.broadcast_address) + 1)
+        for address in sorted(boundary for boundary in boundaries if boundary < 2 ** bits):
+            old = _longest_match(before.get(version, {}), bits, address)
+            new = _longest_match(after.get(version, {}), bits, address)
+            if old != new:
+                return str(ipaddress.ip_address(address)), old, new
+    return None
+
+
+def compaction_report(routes, system_routes=()):
+    """Compact `routes` around `system_routes` and return a CompactionReport describing the change."""
+    original = [_spec(route) for route in routes]
+    compacted = compact_routes(original, system_routes)
+    kept = {spec.name for spec in compacted}
+    return CompactionReport(
+        original=original,
+        compacted=compacted,
+        removed=[spec.name for spec in original if spec.name not in kept],
+        added=[spec for spec in compacted if spec not in original],
+    )
@@ -1,29 +1,43 @@
-from azure.identity import DefaultAzureCredential
 from azure.mgmt.network import NetworkManagementClient
+from modules.azure_operation_module import AzureOperation, record_failure
+from modules.azure_credential_module import shared_credential
+from modules.azure_deadline_module import wait_for
+from modules.azure_projection_module import get_projected, iter_projected
+from modules.azure_route_compaction_module import (ROUTES_PER_TABLE_LIMIT, compaction_report, find_difference,
+                                                   system_routes)
+from azure.mgmt.network.models import Route
 import os
 
 class AzureRouteTableModule:
-    def __init__(self, subscription_id):
+    def __init__(self, subscription_id, credential=None, **client_kwargs):
         """Initialize the AzureRouteTableModule with Azure credentials and subscription ID."""
         self.subscription_id = subscription_id
         self.network_client = NetworkManagementClient(
-            credential=DefaultAzureCredential(),
-            subscription_id=self.subscription_id
+            credential=credential or shared_credential(),
+            subscription_id=self.subscription_id,
+            **client_kwargs
         )
 
-    def create_route_table(self, resource_group_name, route_table_name, location):
+    def create_route_table(self, resource_group_name, route_table_name, location, tags=None, wait=True, continuation_token=None):
         """Create a new route table in Azure."""
         route_table_params = {
             'location': location
         }
+        if tags:
+            route_table_params['tags'] = tags
         try:
+            lro_kwargs = {'continuation_token': continuation_token} if continuation_token else {}
             route_table_poller = self.network_client.route_tables.begin_create_or_update(
-                resource_group_name, route_table_name, route_table_params)
-            route_table_result = route_table_poller.result()
+                resource_group_name, route_table_name, route_table_params, **lro_kwargs)
+            if not wait:
+                print(f"Creation of Route Table '{route_table_name}' started.")
+                return AzureOperation(route_table_poller, f"Creation of Route Table '{route_table_name}'")
+            route_table_result = wait_for(route_table_poller)
             print(f"Route Table '{route_table_name}' created successfully.")
             return route_table_result
         except Exception as e:
             print(f"Failed to create Route Table '{route_table_name}'. Error: {e}")
+            record_failure(e)
 
     def add_route(self, resource_group_name, route_table_name, route_name, address_prefix, next_hop_type):
         """Add a route to an existing route table in Azure."""
@@ -34,59 +48,83 @@ class AzureRouteTableModule:
         try:
             route_poller = self.network_client.routes.begin_create_or_update(
                 resource_group_name, route_table_name, route_name, route_params)
-            route_result = route_poller.result()
+            route_result = wait_for(route_poller)
             print(f"Route '{route_name}' added successfully.")
             return route_result
         except Exception as e:
             print(f"Failed to add route '{route_name}'. Error: {e}")
+            record_failure(e)
 
-    def delete_route_table(self, resource_group_name, route_table_name):
+    def delete_route_table(self, resource_group_name, route_table_name, wait=True):
         """Delete an existing route table in Azure."""
         try:
             delete_poller = self.network_client.route_tables.begin_delete(
                 resource_group_name, route_table_name)
-            delete_poller.result()
+            if not wait:
+                print(f"Deletion of Route Table '{route_table_name}' started.")
+                return AzureOperation(delete_poller, f"Deletion of Route Table '{route_table_name}'")
+            wait_for(delete_poller)
             print(f"Route Table '{route_table_name}' deleted successfully.")
         except Exception as e:
             print(f"Failed to delete Route Table '{route_table_name}'. Error: {e}")
-    def get_route_table(self, resource_group_name, route_table_name):
-        """Get details of a specific route table in Azure."""
+            record_failure(e)
+    def get_route_table(self, resource_group_name, route_table_name, fields=None):
+        """Get details of a specific route table in Azure, or just `fields` of it as a lightweight record."""
         try:
-            route_table = self.network_client.route_tables.get(resource_group_name, route_table_name)
+            if fields:
+                route_table = get_projected(self.network_client, self.subscription_id, 'route_table', resource_group_name,
+                                            route_table_name, fields)
+            else:
+                route_table = self.network_client.route_tables.get(resource_group_name, route_table_name)
             print(f"Retrieved Route Table '{route_table_name}' details successfully.")
             return route_table
         except Exception as e:
             print(f"Failed to retrieve Route Table '{route_table_name}'. Error: {e}")
+            record_failure(e)
 
-    def list_route_tables(self, resource_group_name):
-        """List all route tables in a specific resource group."""
+    def list_route_tables(self, resource_group_name, fields=None):
+        """List all route tables in a specific resource group, as lightweight records of `fields` when given."""
         try:
-            route_tables = self.network_client.route_tables.list(resource_group_name)
+            if fields:
+                route_tables = iter_projected(self.network_client, self.subscription_id, 'route_table', resource_group_name,
+                                              fields)
+            else:
+                route_tables = self.network_client.route_tables.list(resource_group_name)
             route_table_list = list(route_tables)
             print(f"Retrieved {len(route_table_list)} route tables from resource group '{resource_group_name}'.")
             return route_table_list
         except Exception as e:
             print(f"Failed to list route tables. Error: {e}")
+            record_failure(e)
 
-    def list_routes(self, resource_group_name, route_table_name):
-        """List all routes in a specific route table in Azure."""
+    def list_routes(self, resource_group_name, route_table_name, fields=None):
+        """List all routes in a specific route table in Azure, as lightweight records of `fields` when given."""
         try:
-            routes = self.network_client.routes.list(resource_group_name, route_table_name)
+            if fields:
+                routes = iter_projected(self.network_client, self.subscription_id, 'route', resource_group_name, fields,
+                                        route_table_name)
+            else:
+                routes = self.network_client.routes.list(resource_group_name, route_table_name)
             route_list = list(routes)
             print(f"Retrieved {len(route_list)} routes from Route Table '{route_table_name}'.")
             return route_list
         except Exception as e:
             print(f"Failed to list routes for Route Table '{route_table_name}'. Error: {e}")
+            record_failure(e)
 
-    def delete_route(self, resource_group_name, route_table_name, route_name):
+    def delete_route(self, resource_group_name, route_table_name, route_name, wait=True):
         """Delete a specific route from a route table in Azure."""
         try:
             delete_poller = self.network_client.routes.begin_delete(
                 resource_group_name, route_table_name, route_name)
-            delete_poller.result()
+            if not wait:
+                print(f"Deletion of route '{route_name}' from Route Table '{route_table_name}' started.")
+                return AzureOperation(delete_poller, f"Deletion of route '{route_name}' from Route Table '{route_table_name}'")
+            wait_for(delete_poller)
             print(f"Route '{route_name}' deleted successfully from Route Table '{route_table_name}'.")
         except Exception as e:
             print(f"Failed to delete route '{route_name}' from Route Table '{route_table_name}'. Error: {e}")
+            record_failure(e)
 
     def update_route_table_tags(self, resource_group_name, route_table_name, tags):
         """Update tags for an existing route table in Azure."""
@@ -96,9 +134,72 @@ class AzureRouteTableModule:
             }
             route_table_poller = self.network_client.route_tables.begin_create_or_update(
                 resource_group_name, route_table_name, route_table_params)
-            route_table_result = route_table_poller.result()
+            route_table_result = wait_for(route_table_poller)
             print(f"Updated tags for Route Table '{route_table_name}' successfully.")
             return route_table_result
         except Exception as e:
             print(f"Failed to update tags for Route Table '{route_table_name}'. Error: {e}")
-            
\ No newline at end of file
+            record_failure(e)
+            
+
+    def _associated_address_spaces(self, route_table):
+        """Return the address spaces of the VNets whose subnets use the route table."""
+        address_spaces = []
+        vnets = set()
+        for subnet in getattr(route_table, 'subnets', None) or []:
+            parts = subnet.id.split('/')
+            vnets.add((parts[parts.index('resourceGroups') + 1], parts[parts.index('virtualNetworks') + 1]))
+        for resource_group_name, vnet_name in sorted(vnets):
+            vnet = self.network_client.virtual_networks.get(resource_group_name, vnet_name)
+            for prefix in vnet.address_space.address_prefixes or []:
+                if prefix not in address_spaces:
+                    address_spaces.append(prefix)
+        return address_spaces
+
+    def compact_route_table(self, resource_group_name, route_table_name, dry_run=False, wait=True,
+                            address_spaces=None):
+        """Replace a route table's routes with the smallest equivalent set in one update.
+
+        Contained routes with the same next hop as their covering route are dropped and
+        sibling prefixes with the same next hop are merged, except where that would let a
+        system route win. System routes come from `address_spaces`, by default those of the
+        VNets of the associated subnets. The result is checked to route every address like
+        the original, system routes included, before it is written. Returns a CompactionReport.
+        """
+        try:
+            route_table = self.network_client.route_tables.get(resource_group_name, route_table_name)
+            routes = list(route_table.routes or [])
+            if address_spaces is None:
+                address_spaces = self._associated_address_spaces(route_table)
+            system = system_routes(address_spaces)
+            report = compaction_report(routes, system)
+            difference = find_difference(report.original, report.compacted, system)
+            if difference is not None:
+                raise ValueError(f"Compacted routes differ for {difference[0]}: {difference[1]} -> {difference[2]}.")
+            if len(report.compacted) > ROUTES_PER_TABLE_LIMIT:
+                print(f"Route Table '{route_table_name}' still has {len(report.compacted)} routes after compaction, "
+                      f"above the limit of {ROUTES_PER_TABLE_LIMIT}.")
+            if not report.removed and not report.added:
+                print(f"Route Table '{route_table_name}' is already compact.")
+                return report
+            if dry_run:
+                print(f"Compaction would reduce Route Table '{route_table_name}' from {len(report.original)} "
+                      f"to {len(report.compacted)} routes.")
+                return report
+            # Unchanged routes keep their models; merged blocks are written as new routes.
+            existing = {route.name: route for route in routes}
+            route_table.routes = [existing[spec.name] if spec in report.original else Route(
+                name=spec.name, address_prefix=spec.address_prefix, next_hop_type=spec.next_hop_type,
+                next_hop_ip_address=spec.next_hop_ip_address) for spec in report.compacted]
+            route_table_poller = self.network_client.route_tables.begin_create_or_update(
+                resource_group_name, route_table_name, route_table)
+            if not wait:
+                print(f"Compaction of Route Table '{route_table_name}' started.")
+                return AzureOperation(route_table_poller, f"Compaction of Route Table '{route_table_name}'")
+            wait_for(route_table_poller)
+            print(f"Compacted Route Table '{route_table_name}' from {len(report.original)} "
+                  f"to {len(report.compacted)} routes.")
+            return report
+        except Exception as e:
+            print(f"Failed to compact Route Table '{route_table_name}'. Error: {e}")
+            record_failure(e)
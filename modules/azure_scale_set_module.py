@@ -1,17 +1,28 @@
-from azure.identity import DefaultAzureCredential
 from azure.mgmt.compute import ComputeManagementClient
+from modules.azure_operation_module import AzureOperation, record_failure
+from modules.azure_credential_module import shared_credential
+from modules.azure_deadline_module import wait_for
+from modules.azure_compute_catalog_module import DEFAULT_IMAGE
+from modules.azure_projection_module import get_projected, iter_projected
 import os
 
 class AzureScaleSetModule:
-    def __init__(self, subscription_id):
-        """Initialize the AzureScaleSetModule with Azure credentials and subscription ID."""
+    def __init__(self, subscription_id, credential=None, image=None, catalog=None, **client_kwargs):
+        """Initialize the AzureScaleSetModule with Azure credentials and subscription ID.
+
+        Instances are created from `image` (DEFAULT_IMAGE if None); an AzureComputeCatalog
+        validates the VM size and pins 'latest' before a create is submitted.
+        """
         self.subscription_id = subscription_id
+        self.image = dict(image or DEFAULT_IMAGE)
+        self.catalog = catalog
         self.compute_client = ComputeManagementClient(
-            credential=DefaultAzureCredential(),
-            subscription_id=self.subscription_id
+            credential=credential or shared_credential(),
+            subscription_id=self.subscription_id,
+            **client_kwargs
         )
 
-    def create_scale_set(self, resource_group_name, scale_set_name, location, vm_size, capacity, subnet_id):
+    def create_scale_set(self, resource_group_name, scale_set_name, location, vm_size, capacity, subnet_id, tags=None, wait=True, continuation_token=None):
         """Create a new Virtual Machine Scale Set in Azure."""
         scale_set_params = {
             'location': location,
@@ -25,12 +36,7 @@ class AzureScaleSetModule:
             },
             'virtual_machine_profile': {
                 'storage_profile': {
-                    'image_reference': {
-                        'publisher': 'Canonical',
-                        'offer': 'UbuntuServer',
-                        'sku': '18.04-LTS',
-                        'version': 'latest'
-                    }
+                    'image_reference': dict(self.image)
                 },
                 'os_profile': {
                     'computer_name_prefix': 'autoscalevm',
@@ -51,47 +57,70 @@ class AzureScaleSetModule:
                 }
             }
         }
+        if tags:
+            scale_set_params['tags'] = tags
         try:
+            if self.catalog is not None:
+                scale_set_params['virtual_machine_profile']['storage_profile']['image_reference'] = \
+                    self.catalog.resolve(location, vm_size, self.image)
+            lro_kwargs = {'continuation_token': continuation_token} if continuation_token else {}
             scale_set_poller = self.compute_client.virtual_machine_scale_sets.begin_create_or_update(
-                resource_group_name, scale_set_name, scale_set_params)
-            scale_set_result = scale_set_poller.result()
+                resource_group_name, scale_set_name, scale_set_params, **lro_kwargs)
+            if not wait:
+                print(f"Creation of Scale Set '{scale_set_name}' started.")
+                return AzureOperation(scale_set_poller, f"Creation of Scale Set '{scale_set_name}'")
+            scale_set_result = wait_for(scale_set_poller)
             print(f"Scale Set '{scale_set_name}' created successfully.")
             return scale_set_result
         except Exception as e:
             print(f"Failed to create Scale Set '{scale_set_name}'. Error: {e}")
+            record_failure(e)
 
-    def delete_scale_set(self, resource_group_name, scale_set_name):
+    def delete_scale_set(self, resource_group_name, scale_set_name, wait=True):
         """Delete an existing Virtual Machine Scale Set in Azure."""
         try:
             delete_poller = self.compute_client.virtual_machine_scale_sets.begin_delete(
                 resource_group_name, scale_set_name)
-            delete_poller.result()
+            if not wait:
+                print(f"Deletion of Scale Set '{scale_set_name}' started.")
+                return AzureOperation(delete_poller, f"Deletion of Scale Set '{scale_set_name}'")
+            wait_for(delete_poller)
             print(f"Scale Set '{scale_set_name}' deleted successfully.")
         except Exception as e:
             print(f"Failed to delete Scale Set '{scale_set_name}'. Error: {e}")
+            record_failure(e)
 
-    def list_scale_sets(self, resource_group_name):
-        """List all Virtual Machine Scale Sets in a specific resource group."""
+    def list_scale_sets(self, resource_group_name, fields=None):
+        """List all Virtual Machine Scale Sets in a specific resource group, as records of `fields` when given."""
         try:
-            scale_sets = self.compute_client.virtual_machine_scale_sets.list(resource_group_name)
+            if fields:
+                scale_sets = iter_projected(self.compute_client, self.subscription_id, 'scale_set', resource_group_name,
+                                            fields)
+            else:
+                scale_sets = self.compute_client.virtual_machine_scale_sets.list(resource_group_name)
             scale_set_list = list(scale_sets)
             print(f"Retrieved {len(scale_set_list)} scale sets from resource group '{resource_group_name}'.")
             return scale_set_list
         except Exception as e:
             print(f"Failed to list scale sets in resource group '{resource_group_name}'. Error: {e}")
+            record_failure(e)
 
-    def get_scale_set(self, resource_group_name, scale_set_name):
-        """Get the details of a specific Virtual Machine Scale Set in Azure."""
+    def get_scale_set(self, resource_group_name, scale_set_name, fields=None):
+        """Get the details of a specific Virtual Machine Scale Set in Azure, or just `fields` of it as a record."""
         try:
-            scale_set = self.compute_client.virtual_machine_scale_sets.get(
-                resource_group_name, scale_set_name)
+            if fields:
+                scale_set = get_projected(self.compute_client, self.subscription_id, 'scale_set', resource_group_name,
+                                          scale_set_name, fields)
+            else:
+                scale_set = self.compute_client.virtual_machine_scale_sets.get(resource_group_name, scale_set_name)
             print(f"Retrieved Scale Set '{scale_set_name}' details successfully.")
             return scale_set
         except Exception as e:
             print(f"Failed to retrieve Scale Set '{scale_set_name}'. Error: {e}")
+            record_failure(e)
 
     def scale_set(self, resource_group_name, scale_set_name, new_capacity):
-        """Scale the Virtual Machine Scale Set by adjusting the number of VMs."""
+        """Scale the Virtual Machine Scale Set by adjusting the number of VMs; return the updated scale set."""
         try:
             scale_set_params = {
                 'sku': {
@@ -100,50 +129,63 @@ class AzureScaleSetModule:
             }
             scale_poller = self.compute_client.virtual_machine_scale_sets.begin_create_or_update(
                 resource_group_name, scale_set_name, scale_set_params)
-            scale_poller.result()
+            scale_set = wait_for(scale_poller)
             print(f"Scaled Scale Set '{scale_set_name}' to {new_capacity} instances.")
+            return scale_set
         except Exception as e:
             print(f"Failed to scale Scale Set '{scale_set_name}'. Error: {e}")
+            record_failure(e)
 
-    def start_scale_set_vms(self, resource_group_name, scale_set_name, instance_ids):
+    def start_scale_set_vms(self, resource_group_name, scale_set_name, instance_ids, wait=True):
         """Start specific VMs in the Virtual Machine Scale Set."""
         try:
             start_poller = self.compute_client.virtual_machine_scale_set_vms.begin_start(
                 resource_group_name, scale_set_name, instance_ids)
-            start_poller.result()
+            if not wait:
+                print(f"Power-on of VMs {instance_ids} in Scale Set '{scale_set_name}' started.")
+                return AzureOperation(start_poller, f"Power-on of VMs {instance_ids} in Scale Set '{scale_set_name}'")
+            wait_for(start_poller)
             print(f"Started VMs in Scale Set '{scale_set_name}' with instance IDs: {instance_ids}.")
         except Exception as e:
             print(f"Failed to start VMs in Scale Set '{scale_set_name}'. Error: {e}")
+            record_failure(e)
 
-    def stop_scale_set_vms(self, resource_group_name, scale_set_name, instance_ids):
+    def stop_scale_set_vms(self, resource_group_name, scale_set_name, instance_ids, wait=True):
         """Stop specific VMs in the Virtual Machine Scale Set."""
         try:
             stop_poller = self.compute_client.virtual_machine_scale_set_vms.begin_power_off(
                 resource_group_name, scale_set_name, instance_ids)
-            stop_poller.result()
+            if not wait:
+                print(f"Power-off of VMs {instance_ids} in Scale Set '{scale_set_name}' started.")
+                return AzureOperation(stop_poller, f"Power-off of VMs {instance_ids} in Scale Set '{scale_set_name}'")
+            wait_for(stop_poller)
             print(f"Stopped VMs in Scale Set '{scale_set_name}' with instance IDs: {instance_ids}.")
         except Exception as e:
             print(f"Failed to stop VMs in Scale Set '{scale_set_name}'. Error: {e}")
+            record_failure(e)
 
     def reimage_scale_set_vms(self, resource_group_name, scale_set_name, instance_ids):
         """Reimage specific VMs in the Virtual Machine Scale Set."""
         try:
             reimage_poller = self.compute_client.virtual_machine_scale_set_vms.begin_reimage(
                 resource_group_name, scale_set_name, instance_ids)
-            reimage_poller.result()
+            wait_for(reimage_poller)
             print(f"Reimaged VMs in Scale Set '{scale_set_name}' with instance IDs: {instance_ids}.")
         except Exception as e:
             print(f"Failed to reimage VMs in Scale Set '{scale_set_name}'. Error: {e}")
+            record_failure(e)
 
     def update_scale_set_tags(self, resource_group_name, scale_set_name, tags):
-        """Update the tags associated with a Virtual Machine Scale Set."""
+        """Update the tags associated with a Virtual Machine Scale Set; return the updated scale set."""
         try:
             scale_set_params = {
                 'tags': tags
             }
             tag_poller = self.compute_client.virtual_machine_scale_sets.begin_create_or_update(
                 resource_group_name, scale_set_name, scale_set_params)
-            tag_poller.result()
+            scale_set = wait_for(tag_poller)
             print(f"Updated tags for Scale Set '{scale_set_name}' successfully.")
+            return scale_set
         except Exception as e:
             print(f"Failed to update tags for Scale Set '{scale_set_name}'. Error: {e}")
+            record_failure(e)
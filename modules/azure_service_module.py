@@ -0,0 +1,346 @@
+from collections import namedtuple
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import unquote, urlsplit
+from modules.azure_coalescing_module import AzureCoalescingModule
+from modules.azure_compute_catalog_module import AzureComputeCatalog
+from modules.azure_credential_module import shared_credential
+from modules.azure_journal_module import summarize_result
+from modules.azure_operation_module import AzureOperation, capture_failures
+from modules.azure_transport_module import AzureTransportModule
+import hmac
+import inspect
+import json
+import os
+import threading
+import time
+import uuid
+
+ARM_SCOPE = 'https://management.azure.com/.default'
+
+# URL segment -> module and method names; `list` is None where the module cannot list.
+ResourceSpec = namedtuple('ResourceSpec', ['module', 'create', 'get', 'list', 'delete'])
+RESOURCES = {
+    'vnets': ResourceSpec('vnet', 'create_vnet', 'get_vnet_details', 'list_vnets', 'delete_vnet'),
+    'subnets': ResourceSpec('subnet', 'create_subnet', 'get_subnet', 'list_subnets', 'delete_subnet'),
+    'nsgs': ResourceSpec('nsg', 'create_nsg', 'get_nsg', 'list_nsgs', 'delete_nsg'),
+    'route_tables': ResourceSpec('route_table', 'create_route_table', 'get_route_table', 'list_route_tables',
+                                 'delete_route_table'),
+    'gateways': ResourceSpec('vng', 'create_virtual_network_gateway', 'get_virtual_network_gateway_details',
+                             'list_virtual_network_gateways', 'delete_virtual_network_gateway'),
+    'vms': ResourceSpec('vm', 'create_vm', 'get_vm_details', None, 'delete_vm'),
+    'scale_sets': ResourceSpec('scale_set', 'create_scale_set', 'get_scale_set', 'list_scale_sets',
+                               'delete_scale_set'),
+}
+
+# POST /resource_groups/{rg}/{type}/{name}/{action}; the JSON body holds the method's remaining arguments.
+ACTIONS = {
+    ('vnets', 'tags'): 'update_vnet_tags',
+    ('nsgs', 'rules'): 'add_nsg_rule',
+    ('nsgs', 'insert_rules'): 'insert_nsg_rules',
+    ('nsgs', 'compact'): 'compact_nsg_rules',
+    ('nsgs', 'tags'): 'update_nsg_tags',
+    ('route_tables', 'routes'): 'add_route',
+    ('route_tables', 'compact'): 'compact_route_table',
+    ('route_tables', 'tags'): 'update_route_table_tags',
+    ('gateways', 'tags'): 'update_virtual_network_gateway_tags',
+    ('vms', 'start'): 'start_vm',
+    ('vms', 'stop'): 'stop_vm',
+    ('vms', 'tags'): 'update_vm_tags',
+    ('scale_sets', 'scale'): 'scale_set',
+    ('scale_sets', 'tags'): 'update_scale_set_tags',
+}
+
+
+def _serialize(value):
+    if hasattr(value, 'as_dict'):
+        return value.as_dict()
+    if hasattr(value, '_asdict'):
+        return {key: _serialize(item) for key, item in value._asdict().items()}
+    if isinstance(value, dict):
+        return {key: _serialize(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple, set)):
+        return [_serialize(item) for item in value]
+    return value
+
+
+class AzureServiceModule:
+    def __init__(self, subscription_id, credential=None, transport=None, operation_ttl=3600, read_ttl=None,
+                 **client_kwargs):
+        """Initialize a long-lived service over the module operations of one subscription.
+
+        Modules, their SDK clients, the shared connection pool and the credential's token
+        cache are created once and reused by every request. Long-running operations are
+        started without waiting; their handles are kept for `operation_ttl` seconds after
+        they finish, so clients can poll them by operation ID. Concurrent identical reads
+        share one ARM request, and results are reused for `read_ttl` seconds
+        (AZURE_READ_CACHE_TTL, default 0). VM sizes and image versions are cached in
+        one catalog shared by the VM and scale-set modules and refreshed in the background.
+        """
+        self.subscription_id = subscription_id
+        self.credential = credential or shared_credential()
+        self.transport = transport or AzureTransportModule(max_concurrency=int(os.getenv('AZURE_HTTP_POOL_SIZE', '32')))
+        self.client_kwargs = dict(client_kwargs, **self.transport.client_kwargs())
+        self.operation_ttl = operation_ttl
+        if read_ttl is None:
+            read_ttl = float(os.getenv('AZURE_READ_CACHE_TTL', '0'))
+        self.coalescer = AzureCoalescingModule(ttl=read_ttl)
+        self.catalog = AzureComputeCatalog(subscription_id, credential=self.credential,
+                                           ttl=float(os.getenv('AZURE_CATALOG_TTL', '3600')), **self.client_kwargs)
+        self.modules = {}
+        self.operations = {}
+        self.started_at = time.time()
+        self._lock = threading.Lock()
+
+    def module(self, name):
+        """Return the warm module instance for `name` ('vnet', 'nsg', ...), creating it on first use."""
+        from modules.azure_nsg_module import AzureNSGModule
+        from modules.azure_route_table_module import AzureRouteTableModule
+        from modules.azure_scale_set_module import AzureScaleSetModule
+        from modules.azure_subnet_module import AzureSubnetModule
+        from modules.azure_tagging_module import AzureTaggingModule
+        from modules.azure_vm_module import AzureVMModule
+        from modules.azure_vnet_module import AzureVNetModule
+        from modules.azure_vng_module import AzureVNGModule
+        classes = {
+            'vnet': AzureVNetModule, 'subnet': AzureSubnetModule, 'nsg': AzureNSGModule,
+            'route_table': AzureRouteTableModule, 'vng': AzureVNGModule, 'vm': AzureVMModule,
+            'scale_set': AzureScaleSetModule, 'tagging': AzureTaggingModule,
+        }
+        with self._lock:
+            if name not in self.modules:
+                kwargs = {'catalog': self.catalog} if name in ('vm', 'scale_set') else {}
+                module = classes[name](self.subscription_id, credential=self.credential, **kwargs,
+                                       **self.client_kwargs)
+                if name != 'tagging':
+                    # Subnet writes change the parent VNet's reads, so both share one invalidation group.
+                    self.coalescer.coalesce(module, 'vnet' if name == 'subnet' else name)
+                self.modules[name] = module
+            return self.modules[name]
+
+    def warm_up(self):
+        """Create every module, fetch an ARM token and start the catalog refresh before the first request arrives."""
+        for spec in RESOURCES.values():
+            self.module(spec.module)
+        self.module('tagging')
+        self.catalog.start()
+        try:
+            self.credential.get_token(ARM_SCOPE)
+            print("Fetched an ARM access token.")
+        except Exception as e:
+            print(f"Failed to fetch an ARM access token. Error: {e}")
+
+    def _track(self, operation):
+        now = time.time()
+        operation_id = uuid.uuid4().hex
+        with self._lock:
+            for key, (tracked, finished_at) in list(self.operations.items()):
+                if finished_at is None and tracked.done():
+                    self.operations[key] = (tracked, now)
+                elif finished_at is not None and now - finished_at > self.operation_ttl:
+                    del self.operations[key]
+            self.operations[operation_id] = (operation, None)
+        return operation_id
+
+    def operation(self, operation_id):
+        """Return the progress of a tracked operation, with its result or error once it finished."""
+        with self._lock:
+            tracked = self.operations.get(operation_id)
+        if tracked is None:
+            return None
+        operation = tracked[0]
+        state = dict(operation.progress(), operation_id=operation_id)
+        if operation.done():
+            with self._lock:
+                if self.operations.get(operation_id, (None, None))[1] is None:
+                    self.operations[operation_id] = (operation, time.time())
+            if not operation.cancelled():
+                error = operation.exception(0)
+                if error is None:
+                    state['result'] = summarize_result(operation.result(0))
+                else:
+                    state['error'] = str(error)
+        return state
+
+    def _call(self, method, *args, **kwargs):
+        """Call a module method and map its outcome to (status, payload); LROs are started with wait=False.
+
+        A method fails when it reports a caught error; a None result on its own is a success.
+        """
+        signature = inspect.signature(method)
+        if 'wait' in signature.parameters:
+            kwargs['wait'] = False
+        try:
+            signature.bind(*args, **kwargs)
+        except TypeError as e:
+            return 400, {'error': str(e)}
+        with capture_failures() as failures:
+            result = method(*args, **kwargs)
+        if failures:
+            return 502, {'error': f"{method.__name__} failed. Error: {failures[-1]}"}
+        if isinstance(result, AzureOperation):
+            operation_id = self._track(result)
+            return 202, {'operation_id': operation_id, 'description': result.description}
+        return 200, _serialize(result)
+
+    def handle(self, method, path, body=None):
+        """Dispatch one request and return (HTTP status, JSON-serializable payload).
+
+        Routes:
+            GET    /health
+            GET    /operations/{id}
+            GET    /resource_groups/{rg}/{type}                list
+            GET    /resource_groups/{rg}/{type}/{name}         get
+            PUT    /resource_groups/{rg}/{type}/{name}         create (202 with an operation ID)
+            DELETE /resource_groups/{rg}/{type}/{name}         teardown (202 with an operation ID)
+            POST   /resource_groups/{rg}/{type}/{name}/{action}
+            POST   /resource_groups/{rg}/tags                  bulk tag sync
+        Subnets live under /resource_groups/{rg}/vnets/{vnet}/subnets.
+        """
+        parts = [unquote(part) for part in urlsplit(path).path.split('/') if part]
+        body = body or {}
+        if not isinstance(body, dict):
+            return 400, {'error': "The request body must be a JSON object."}
+        if parts == ['health'] and method == 'GET':
+            return 200, self.health()
+        if len(parts) == 2 and parts[0] == 'operations' and method == 'GET':
+            state = self.operation(parts[1])
+            return (200, state) if state else (404, {'error': f"Unknown operation '{parts[1]}'."})
+        if len(parts) < 3 or parts[0] != 'resource_groups':
+            return 404, {'error': f"No route for {method} {path}."}
+        resource_group, rest = parts[1], parts[2:]
+        if rest == ['tags'] and method == 'POST':
+            try:
+                return self._call(self.module('tagging').apply_tags, resource_group, **body)
+            finally:
+                self.coalescer.invalidate()
+        parents = []
+        if len(rest) >= 3 and rest[0] == 'vnets' and rest[2] == 'subnets':
+            parents, rest = [rest[1]], rest[2:]
+        spec = RESOURCES.get(rest[0])
+        if spec is None or len(rest) > 3:
+            return 404, {'error': f"No route for {method} {path}."}
+        module = self.module(spec.module)
+        args = [resource_group] + parents + rest[1:2]
+        if len(rest) == 3:
+            action = ACTIONS.get((rest[0], rest[2]))
+            if action is None or method != 'POST':
+                return 404, {'error': f"No route for {method} {path}."}
+            return self._call(getattr(module, action), *args, **body)
+        names = {'GET': spec.get if len(rest) == 2 else spec.list}
+        if len(rest) == 2:
+            names.update(PUT=spec.create, DELETE=spec.delete)
+        name = names.get(method)
+        if name is None:
+            return 405, {'error': f"{method} is not supported on {path}."}
+        if method == 'GET':
+            result = getattr(module, name)(*args)
+            if result is None:
+                return 404, {'error': f"'{path}' was not found or could not be read."}
+            return 200, _serialize(result)
+        if method == 'DELETE':
+            return self._call(getattr(module, name), *args)
+        return self._call(getattr(module, name), *args, **body)
+
+    def health(self):
+        """Return uptime, warm modules, tracked operations and connection pool statistics."""
+        with self._lock:
+            modules, operations = sorted(self.modules), len(self.operations)
+        return {
+            'status': 'ok',
+            'subscription_id': self.subscription_id,
+            'uptime_seconds': time.time() - self.started_at,
+            'modules': modules,
+            'operations': operations,
+            'pool': self.transport.pool_stats(),
+            'reads': self.coalescer.stats(),
+        }
+
+    def make_server(self, host='127.0.0.1', port=5000, token=None):
+        """Return a ThreadingHTTPServer bound to (host, port) that serves this service.
+
+        Every request must carry `token` (AZURE_SERVICE_TOKEN if None) as
+        'Authorization: Bearer <token>' or 'X-API-Key: <token>'; others get 401.
+        """
+        token = token or os.getenv('AZURE_SERVICE_TOKEN')
+        if not token:
+            raise ValueError("Error: The environment variable 'AZURE_SERVICE_TOKEN' is not set or is empty.")
+        service = self
+
+        class RequestHandler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def _authorized(self):
+                authorization = self.headers.get('Authorization') or ''
+                scheme, _, credentials = authorization.partition(' ')
+                if scheme.lower() != 'bearer':
+                    credentials = self.headers.get('X-API-Key') or ''
+                return hmac.compare_digest(credentials.strip().encode(), token.encode())
+
+            def _dispatch(self):
+                length = int(self.headers.get('Content-Length') or 0)
+                raw_body = self.rfile.read(length) if length else b''
+                if not self._authorized():
+                    status, payload = 401, {'error': "Missing or invalid service token."}
+                else:
+                    try:
+                        body = json.loads(raw_body) if raw_body else None
+                    except ValueError:
+                        status, payload = 400, {'error': "The request body is not valid JSON."}
+                    else:
+                        try:
+                            status, payload = service.handle(self.command, self.path, body)
+                        except Exception as e:
+                            print(f"Failed to handle {self.command} {self.path}. Error: {e}")
+                            status, payload = 500, {'error': str(e)}
+                data = json.dumps(payload, default=str).encode()
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(data)))
+                if status == 401:
+                    self.send_header('WWW-Authenticate', 'Bearer')
+                if status == 202:
+                    self.send_header('Location', f"/operations/{payload['operation_id']}")
+                self.end_headers()
+                self.wfile.write(data)
+
+            do_GET = do_PUT = do_POST = do_DELETE = _dispatch
+
+        server = ThreadingHTTPServer((host, port), RequestHandler)
+        server.daemon_threads = True
+        return server
+
+    def close(self):
+        """Stop the catalog refresh and release the shared connection pool."""
+        self.catalog.stop()
+        self.transport.close()
+
+
+def main():
+    """Serve the subscription in AZURE_SUBSCRIPTION_ID on AZURE_SERVICE_HOST:AZURE_SERVICE_PORT (default 127.0.0.1:5000).
+
+    Requests must carry the token in AZURE_SERVICE_TOKEN; the service does not start without one.
+    """
+    from dotenv import load_dotenv
+    load_dotenv()
+    subscription_id = os.getenv('AZURE_SUBSCRIPTION_ID')
+    if not subscription_id:
+        raise ValueError("Error: The environment variable 'AZURE_SUBSCRIPTION_ID' is not set or is empty.")
+    token = os.getenv('AZURE_SERVICE_TOKEN')
+    if not token:
+        raise ValueError("Error: The environment variable 'AZURE_SERVICE_TOKEN' is not set or is empty.")
+    service = AzureServiceModule(subscription_id)
+    service.warm_up()
+    server = service.make_server(os.getenv('AZURE_SERVICE_HOST', '127.0.0.1'), int(os.getenv('AZURE_SERVICE_PORT', '5000')),
+                                 token=token)
+    print(f"Serving subscription '{subscription_id}' on port {server.server_address[1]}.")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        service.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -1,59 +1,146 @@
-from azure.identity import DefaultAzureCredential
 from azure.mgmt.network import NetworkManagementClient
+from azure.mgmt.network.models import Subnet
+from modules.azure_operation_module import AzureOperation, record_failure
+from modules.azure_credential_module import shared_credential
+from modules.azure_deadline_module import wait_for
+from modules.azure_projection_module import get_projected, iter_projected
 import os
+import threading
+
+_vnet_locks = {}
+_vnet_locks_guard = threading.Lock()
+
+
+def vnet_write_lock(subscription_id, resource_group_name, vnet_name):
+    """Return the process-wide lock that serializes writes to one VNet and its subnets.
+
+    Azure rejects overlapping writes to a VNet with AnotherOperationInProgress, so
+    every subnet write in this process queues on the lock of its parent VNet.
+    """
+    key = (subscription_id, resource_group_name.lower(), vnet_name.lower())
+    with _vnet_locks_guard:
+        lock = _vnet_locks.get(key)
+        if lock is None:
+            lock = _vnet_locks[key] = threading.Lock()
+        return lock
+
+
+def _matches(current, desired):
+    """Whether an existing subnet property already has the desired value.
+
+    SDK models are compared as dicts, references by their (case-insensitive) ID, and
+    dicts only on the keys that are asked for.
+    """
+    if hasattr(current, 'as_dict'):
+        current = current.as_dict()
+    if hasattr(desired, 'as_dict'):
+        desired = desired.as_dict()
+    if isinstance(desired, dict) and isinstance(current, dict):
+        if 'id' in desired:
+            return str(current.get('id') or '').lower() == str(desired['id'] or '').lower()
+        return all(_matches(current.get(key), value) for key, value in desired.items())
+    if isinstance(desired, (list, tuple)) and isinstance(current, (list, tuple)):
+        return len(current) == len(desired) and all(map(_matches, current, desired))
+    return current == desired
+
 
 class AzureSubnetModule:
-    def __init__(self, subscription_id):
+    def __init__(self, subscription_id, credential=None, **client_kwargs):
         """Initialize the AzureSubnetModule with Azure credentials and subscription ID."""
         self.subscription_id = subscription_id
         self.network_client = NetworkManagementClient(
-            credential=DefaultAzureCredential(),
-            subscription_id=self.subscription_id
+            credential=credential or shared_credential(),
+            subscription_id=self.subscription_id,
+            **client_kwargs
         )
 
-    def create_subnet(self, resource_group_name, vnet_name, subnet_name, address_prefix):
+    def _serialized_write(self, resource_group_name, vnet_name, begin, wait):
+        """Run `begin()` under the VNet's write lock and return (poller, result).
+
+        With `wait` the lock is held until the result is in; otherwise it is released
+        by the poller's done callback, once ARM has finished the write. `begin()` may
+        return None when there is nothing to write.
+        """
+        lock = vnet_write_lock(self.subscription_id, resource_group_name, vnet_name)
+        lock.acquire()
+        handed_off = False
+        try:
+            poller = begin()
+            if poller is None:
+                return None, None
+            if not wait:
+                poller.add_done_callback(lambda _: lock.release())
+                handed_off = True
+                return poller, None
+            return poller, wait_for(poller)
+        finally:
+            if not handed_off:
+                lock.release()
+
+    def create_subnet(self, resource_group_name, vnet_name, subnet_name, address_prefix, wait=True, continuation_token=None):
         """Create a new subnet in an existing virtual network (VNet) in Azure."""
         subnet_params = {
             'address_prefix': address_prefix
         }
         try:
-            subnet_poller = self.network_client.subnets.begin_create_or_update(
-                resource_group_name, vnet_name, subnet_name, subnet_params)
-            subnet_result = subnet_poller.result()
+            lro_kwargs = {'continuation_token': continuation_token} if continuation_token else {}
+            subnet_poller, subnet_result = self._serialized_write(
+                resource_group_name, vnet_name,
+                lambda: self.network_client.subnets.begin_create_or_update(
+                    resource_group_name, vnet_name, subnet_name, subnet_params, **lro_kwargs),
+                wait)
+            if not wait:
+                print(f"Creation of subnet '{subnet_name}' started.")
+                return AzureOperation(subnet_poller, f"Creation of subnet '{subnet_name}'")
             print(f"Subnet '{subnet_name}' created successfully.")
             return subnet_result
         except Exception as e:
             print(f"Failed to create subnet '{subnet_name}'. Error: {e}")
+            record_failure(e)
 
-    def delete_subnet(self, resource_group_name, vnet_name, subnet_name):
+    def delete_subnet(self, resource_group_name, vnet_name, subnet_name, wait=True):
         """Delete an existing subnet in a virtual network (VNet) in Azure."""
         try:
-            delete_poller = self.network_client.subnets.begin_delete(
-                resource_group_name, vnet_name, subnet_name)
-            delete_poller.result()
+            delete_poller, _ = self._serialized_write(
+                resource_group_name, vnet_name,
+                lambda: self.network_client.subnets.begin_delete(resource_group_name, vnet_name, subnet_name),
+                wait)
+            if not wait:
+                print(f"Deletion of subnet '{subnet_name}' started.")
+                return AzureOperation(delete_poller, f"Deletion of subnet '{subnet_name}'")
             print(f"Subnet '{subnet_name}' deleted successfully.")
         except Exception as e:
             print(f"Failed to delete subnet '{subnet_name}'. Error: {e}")
+            record_failure(e)
 
-    def get_subnet(self, resource_group_name, vnet_name, subnet_name):
-        """Get the details of a specific subnet in a virtual network (VNet) in Azure."""
+    def get_subnet(self, resource_group_name, vnet_name, subnet_name, fields=None):
+        """Get the details of a specific subnet in a virtual network (VNet), or just `fields` of it as a record."""
         try:
-            subnet = self.network_client.subnets.get(
-                resource_group_name, vnet_name, subnet_name)
+            if fields:
+                subnet = get_projected(self.network_client, self.subscription_id, 'subnet', resource_group_name,
+                                       subnet_name, fields, vnet_name)
+            else:
+                subnet = self.network_client.subnets.get(resource_group_name, vnet_name, subnet_name)
             print(f"Details of Subnet '{subnet_name}': {subnet}")
             return subnet
         except Exception as e:
             print(f"Failed to get details for subnet '{subnet_name}'. Error: {e}")
+            record_failure(e)
 
-    def list_subnets(self, resource_group_name, vnet_name):
-        """List all subnets in a specific virtual network (VNet) in Azure."""
+    def list_subnets(self, resource_group_name, vnet_name, fields=None):
+        """List all subnets in a specific virtual network (VNet) in Azure, as records of `fields` when given."""
         try:
-            subnets = self.network_client.subnets.list(resource_group_name, vnet_name)
+            if fields:
+                subnets = iter_projected(self.network_client, self.subscription_id, 'subnet', resource_group_name, fields,
+                                         vnet_name)
+            else:
+                subnets = self.network_client.subnets.list(resource_group_name, vnet_name)
             subnets_list = list(subnets)
-            print(f"List of subnets in VNet '{vnet_name}': {[subnet.name for subnet in subnets_list]}")
+            print(f"List of subnets in VNet '{vnet_name}': {[getattr(subnet, 'name', None) for subnet in subnets_list]}")
             return subnets_list
         except Exception as e:
             print(f"Failed to list subnets in VNet '{vnet_name}'. Error: {e}")
+            record_failure(e)
 
     def update_subnet(self, resource_group_name, vnet_name, subnet_name, address_prefix):
         """Update an existing subnet's address prefix in a virtual network (VNet) in Azure."""
@@ -61,11 +148,60 @@ class AzureSubnetModule:
             'address_prefix': address_prefix
         }
         try:
-            subnet_poller = self.network_client.subnets.begin_create_or_update(
-                resource_group_name, vnet_name, subnet_name, subnet_params)
-            subnet_result = subnet_poller.result()
+            _, subnet_result = self._serialized_write(
+                resource_group_name, vnet_name,
+                lambda: self.network_client.subnets.begin_create_or_update(
+                    resource_group_name, vnet_name, subnet_name, subnet_params),
+                True)
             print(f"Subnet '{subnet_name}' updated successfully.")
             return subnet_result
         except Exception as e:
             print(f"Failed to update subnet '{subnet_name}'. Error: {e}")
-            
\ No newline at end of file
+            record_failure(e)
+            
+
+    def create_subnets(self, resource_group_name, vnet_name, subnets, wait=True):
+        """Create or update many subnets with a single PUT of their parent VNet.
+
+        `subnets` maps subnet names to an address prefix, or to a dict of Subnet
+        properties. Subnets that are not listed, and the associations (NSG, route
+        table, delegations, ...) of listed ones, are kept as they are.
+        """
+        vnet = None
+        changed = []
+
+        def begin():
+            nonlocal vnet
+            vnet = self.network_client.virtual_networks.get(resource_group_name, vnet_name)
+            existing = {subnet.name: subnet for subnet in vnet.subnets or []}
+            for subnet_name, desired in subnets.items():
+                properties = {'address_prefix': desired} if isinstance(desired, str) else dict(desired)
+                subnet = existing.get(subnet_name)
+                if subnet is None:
+                    existing[subnet_name] = Subnet(name=subnet_name, **properties)
+                    changed.append(subnet_name)
+                    continue
+                for attribute, value in properties.items():
+                    if not _matches(getattr(subnet, attribute, None), value):
+                        setattr(subnet, attribute, value)
+                        if subnet_name not in changed:
+                            changed.append(subnet_name)
+            if not changed:
+                return None
+            vnet.subnets = list(existing.values())
+            return self.network_client.virtual_networks.begin_create_or_update(resource_group_name, vnet_name, vnet)
+
+        try:
+            # The GET, the merge and the PUT all run under the VNet's write lock, held until ARM finishes the PUT
+            vnet_poller, vnet_result = self._serialized_write(resource_group_name, vnet_name, begin, wait)
+            if vnet_poller is None:
+                print(f"All {len(subnets)} subnets in VNet '{vnet_name}' are already up to date.")
+                return vnet
+            if not wait:
+                print(f"Update of {len(changed)} subnets in VNet '{vnet_name}' started.")
+                return AzureOperation(vnet_poller, f"Update of {len(changed)} subnets in VNet '{vnet_name}'")
+            print(f"Created or updated {len(changed)} subnets in VNet '{vnet_name}' with one request.")
+            return vnet_result
+        except Exception as e:
+            print(f"Failed to create subnets in VNet '{vnet_name}'. Error: {e}")
+            record_failure(e)
@@ -0,0 +1,189 @@
+from azure.mgmt.network import NetworkManagementClient
+from azure.mgmt.compute import ComputeManagementClient
+from azure.core.exceptions import HttpResponseError
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from modules.azure_credential_module import shared_credential
+from modules.azure_operation_module import record_failure
+from modules.azure_deadline_module import bind, wait_for
+import fnmatch
+import threading
+import time
+
+# Resource type -> (client attribute, operation group, tag PATCH method).
+# Subnets are not ARM resources with tags of their own, so they cannot be selected.
+TAGGABLE_RESOURCES = {
+    'vnet': ('network_client', 'virtual_networks', 'update_tags'),
+    'nsg': ('network_client', 'network_security_groups', 'update_tags'),
+    'route_table': ('network_client', 'route_tables', 'update_tags'),
+    'public_ip': ('network_client', 'public_ip_addresses', 'update_tags'),
+    'nic': ('network_client', 'network_interfaces', 'update_tags'),
+    'vng': ('network_client', 'virtual_network_gateways', 'begin_update_tags'),
+    'vm': ('compute_client', 'virtual_machines', 'begin_update'),
+    'scale_set': ('compute_client', 'virtual_machine_scale_sets', 'begin_update'),
+}
+
+# `failed` holds one (resource_type, resource_name, error) tuple per resource that could not be tagged.
+TaggingResult = namedtuple('TaggingResult', ['matched', 'unchanged', 'updated', 'failed'])
+
+
+def merge_tags(current, patch):
+    """Apply a tag patch to a tag dict; a value of None removes that tag."""
+    merged = dict(current or {})
+    for key, value in patch.items():
+        if value is None:
+            merged.pop(key, None)
+        else:
+            merged[key] = value
+    return merged
+
+
+class AzureTaggingModule:
+    def __init__(self, subscription_id, max_concurrency=16, writes_per_second=10, max_retries=5,
+                 cache_ttl=300, credential=None, **client_kwargs):
+        """Initialize the AzureTaggingModule with Azure credentials and subscription ID."""
+        self.subscription_id = subscription_id
+        self.max_concurrency = max_concurrency
+        self.writes_per_second = writes_per_second
+        self.max_retries = max_retries
+        self.cache_ttl = cache_ttl
+        credential = credential or shared_credential()
+        self.network_client = NetworkManagementClient(
+            credential=credential,
+            subscription_id=self.subscription_id,
+            **client_kwargs
+        )
+        self.compute_client = ComputeManagementClient(
+            credential=credential,
+            subscription_id=self.subscription_id,
+            **client_kwargs
+        )
+        self._cache = {}
+        self._cache_lock = threading.Lock()
+        self._pace_lock = threading.Lock()
+        self._next_write = 0.0
+        self._paused_until = 0.0
+
+    def _operations(self, resource_type):
+        client_attribute, group, method = TAGGABLE_RESOURCES[resource_type]
+        return getattr(getattr(self, client_attribute), group), method
+
+    def _cached_tags(self, resource_group_name, resource_type):
+        """Return {name: tags} for one resource type, listing it at most once per `cache_ttl`."""
+        key = (resource_group_name.lower(), resource_type)
+        with self._cache_lock:
+            entry = self._cache.get(key)
+            if entry is not None and time.monotonic() - entry[0] < self.cache_ttl:
+                return entry[1]
+        operations, _ = self._operations(resource_type)
+        tags = {resource.name: dict(getattr(resource, 'tags', None) or {})
+                for resource in operations.list(resource_group_name)}
+        with self._cache_lock:
+            self._cache[key] = (time.monotonic(), tags)
+        return tags
+
+    def invalidate(self, resource_group_name=None):
+        """Drop cached tags for one resource group, or for all of them."""
+        with self._cache_lock:
+            if resource_group_name is None:
+                self._cache.clear()
+            else:
+                for key in [key for key in self._cache if key[0] == resource_group_name.lower()]:
+                    del self._cache[key]
+
+    def select(self, resource_group_name, resource_types=None, name_pattern='*'):
+        """Return (resource_type, resource_name, tags) for resources matching the selector.
+
+        `name_pattern` is a case-insensitive shell-style pattern such as 'prod-*'.
+        """
+        resource_types = resource_types or list(TAGGABLE_RESOURCES)
+        for resource_type in resource_types:
+            if resource_type not in TAGGABLE_RESOURCES:
+                raise ValueError(f"Unsupported resource type '{resource_type}'.")
+        pattern = name_pattern.lower()
+        selected = []
+        for resource_type in resource_types:
+            for resource_name, tags in self._cached_tags(resource_group_name, resource_type).items():
+                if fnmatch.fnmatchcase(resource_name.lower(), pattern):
+                    selected.append((resource_type, resource_name, tags))
+        return selected
+
+    def _pace(self):
+        """Wait for the next write slot; slots are spaced by `writes_per_second` and held back after a 429."""
+        with self._pace_lock:
+            now = time.monotonic()
+            slot = max(now, self._next_write, self._paused_until)
+            self._next_write = slot + (1.0 / self.writes_per_second if self.writes_per_second else 0)
+        if slot > now:
+            time.sleep(slot - now)
+
+    def _back_off(self, error, attempt):
+        """Pause every worker for the Retry-After of a throttled response, or exponentially without one."""
+        delay = 2 ** attempt
+        response = getattr(error, 'response', None)
+        if response is not None:
+            try:
+                delay = float(response.headers.get('Retry-After', delay))
+            except (TypeError, ValueError):
+                pass
+        with self._pace_lock:
+            self._paused_until = max(self._paused_until, time.monotonic() + delay)
+
+    def _patch_tags(self, resource_group_name, resource_type, resource_name, tags):
+        operations, method = self._operations(resource_type)
+        update = getattr(operations, method)
+        for attempt in range(self.max_retries + 1):
+            self._pace()
+            try:
+                result = update(resource_group_name, resource_name, {'tags': tags})
+                if method.startswith('begin_'):
+                    wait_for(result)
+                break
+            except HttpResponseError as e:
+                if e.status_code != 429 or attempt == self.max_retries:
+                    raise
+                self._back_off(e, attempt)
+        with self._cache_lock:
+            entry = self._cache.get((resource_group_name.lower(), resource_type))
+            if entry is not None:
+                entry[1][resource_name] = dict(tags)
+
+    def apply_tags(self, resource_group_name, tags, resource_types=None, name_pattern='*', dry_run=False):
+        """Merge `tags` into every matching resource and return a TaggingResult.
+
+        Resources whose cached tags already match are skipped without a request; the
+        rest are PATCHed concurrently, at most `writes_per_second` writes per second.
+        """
+        try:
+            selected = self.select(resource_group_name, resource_types, name_pattern)
+        except Exception as e:
+            print(f"Failed to select resources in resource group '{resource_group_name}'. Error: {e}")
+            record_failure(e)
+            return None
+        changes = []
+        for resource_type, resource_name, current in selected:
+            desired = merge_tags(current, tags)
+            if desired != current:
+                changes.append((resource_type, resource_name, desired))
+        unchanged = len(selected) - len(changes)
+        if dry_run or not changes:
+            print(f"{len(changes)} of {len(selected)} resources in resource group '{resource_group_name}' "
+                  f"need new tags.")
+            return TaggingResult(len(selected), unchanged, 0, [])
+
+        failed = []
+        with ThreadPoolExecutor(max_workers=self.max_concurrency, thread_name_prefix='tagging') as executor:
+            futures = {
+                executor.submit(bind(self._patch_tags), resource_group_name, resource_type, resource_name, desired):
+                    (resource_type, resource_name)
+                for resource_type, resource_name, desired in changes
+            }
+            for future, (resource_type, resource_name) in futures.items():
+                error = future.exception()
+                if error is not None:
+                    print(f"Failed to update tags for {resource_type} '{resource_name}'. Error: {error}")
+                    failed.append((resource_type, resource_name, error))
+        updated = len(changes) - len(failed)
+        print(f"Updated tags for {updated} resources in resource group '{resource_group_name}' "
+              f"({unchanged} already up to date, {len(failed)} failed).")
+        return TaggingResult(len(selected), unchanged, updated, failed)
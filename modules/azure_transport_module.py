@@ -0,0 +1,115 @@
+from azure.core.pipeline.transport import RequestsTransport
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+import requests
+import threading
+
+try:
+    import aiohttp
+    from azure.core.pipeline.transport import AioHttpTransport
+except ImportError:
+    aiohttp = None
+    AioHttpTransport = None
+
+# Larger socket reads than the 8 KiB default, as azure-core configures its own sessions.
+SOCKET_BLOCKSIZE = 32768
+
+
+class _PoolTrackingAdapter(HTTPAdapter):
+    """HTTPAdapter that remembers every connection pool it hands out, so pool stats survive eviction."""
+
+    def __init__(self, **kwargs):
+        self.seen_pools = set()
+        self._seen_lock = threading.Lock()
+        super().__init__(**kwargs)
+
+    def init_poolmanager(self, connections, maxsize, block=False, **pool_kwargs):
+        super().init_poolmanager(connections, maxsize, block=block, blocksize=SOCKET_BLOCKSIZE, **pool_kwargs)
+
+    def get_connection_with_tls_context(self, request, verify, proxies=None, cert=None):
+        pool = super().get_connection_with_tls_context(request, verify, proxies=proxies, cert=cert)
+        with self._seen_lock:
+            self.seen_pools.add(pool)
+        return pool
+
+
+class AzureTransportModule:
+    def __init__(self, max_concurrency=32, pool_block=False, connection_timeout=300, read_timeout=300):
+        """Initialize a keep-alive HTTP session sized for `max_concurrency` concurrent requests.
+
+        One instance is meant to be shared by every module, so all SDK clients reuse the
+        same TCP and TLS connections. With `pool_block` a request waits for a pooled
+        connection instead of opening an extra one that is discarded afterwards.
+        """
+        self.max_concurrency = max_concurrency
+        self.connection_timeout = connection_timeout
+        self.read_timeout = read_timeout
+        self.session = requests.Session()
+        # azure-core applies its own retry policy, so urllib3 must not retry underneath it.
+        self._adapter = _PoolTrackingAdapter(
+            pool_connections=4,
+            pool_maxsize=max_concurrency,
+            pool_block=pool_block,
+            max_retries=Retry(total=False, redirect=False, raise_on_status=False),
+        )
+        self.session.mount('https://', self._adapter)
+        self.session.mount('http://', self._adapter)
+        self._aiohttp_session = None
+
+    def client_kwargs(self):
+        """Return SDK client keyword arguments that route requests through the shared session."""
+        return {
+            'transport': RequestsTransport(
+                session=self.session,
+                session_owner=False,
+                connection_timeout=self.connection_timeout,
+                read_timeout=self.read_timeout,
+            )
+        }
+
+    def async_client_kwargs(self):
+        """Return async SDK client keyword arguments backed by one shared aiohttp session.
+
+        Call it from a running event loop; requires the optional aiohttp package.
+        """
+        if aiohttp is None:
+            raise ImportError("The aiohttp transport requires the 'aiohttp' package.")
+        if self._aiohttp_session is None or self._aiohttp_session.closed:
+            connector = aiohttp.TCPConnector(limit=self.max_concurrency, limit_per_host=self.max_concurrency)
+            self._aiohttp_session = aiohttp.ClientSession(connector=connector)
+        return {
+            'transport': AioHttpTransport(
+                session=self._aiohttp_session,
+                session_owner=False,
+                connection_timeout=self.connection_timeout,
+                read_timeout=self.read_timeout,
+            )
+        }
+
+    def pool_stats(self):
+        """Return request and connection counts for the shared pools.
+
+        A hit is a request served on a kept-alive connection; a miss had to open a
+        new connection, with its TCP and TLS handshake.
+        """
+        with self._adapter._seen_lock:
+            pools = list(self._adapter.seen_pools)
+        requests_sent = sum(pool.num_requests for pool in pools)
+        connections = sum(pool.num_connections for pool in pools)
+        return {
+            'pools': len(pools),
+            'requests': requests_sent,
+            'pool_hits': max(requests_sent - connections, 0),
+            'pool_misses': connections,
+            'hit_ratio': (requests_sent - connections) / requests_sent if requests_sent else None,
+        }
+
+    def close(self):
+        """Close the shared session and its pooled connections."""
+        self.session.close()
+
+    async def close_async(self):
+        """Close the shared aiohttp session, if one was opened."""
+        if self._aiohttp_session is not None:
+            await self._aiohttp_session.close()
+            self._aiohttp_session = None
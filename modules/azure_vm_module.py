@@ -1,31 +1,53 @@
-from azure.identity import DefaultAzureCredential
 from azure.mgmt.compute import ComputeManagementClient
+from azure.mgmt.network import NetworkManagementClient
 from azure.core.exceptions import AzureError
+from collections import namedtuple
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait as wait_futures
+from modules.azure_operation_module import AzureOperation, record_failure
+from modules.azure_credential_module import shared_credential
+from modules.azure_deadline_module import bind, wait_for
+from modules.azure_compute_catalog_module import DEFAULT_IMAGE
+from modules.azure_projection_module import get_projected
 import os
 
+# One entry per VM of a fleet; `error` is set and `vm` is None when its NIC or VM failed.
+VMFleetResult = namedtuple('VMFleetResult', ['vm_name', 'nic_id', 'vm', 'error'])
+
+
 class AzureVMModule:
-    def __init__(self, subscription_id):
-        """Initialize the AzureVMModule with Azure credentials and subscription ID."""
+    def __init__(self, subscription_id, timeout=300, credential=None, image=None, catalog=None, **client_kwargs):
+        """Initialize the AzureVMModule with Azure credentials and subscription ID.
+
+        `timeout` bounds each blocking LRO wait, and never extends past the current deadline.
+        VMs are created from `image` (DEFAULT_IMAGE if None). With an AzureComputeCatalog,
+        creates fail before submission on an unavailable size and 'latest' is pinned to a
+        concrete image version.
+        """
         self.subscription_id = subscription_id
+        self.timeout = timeout
+        self.image = dict(image or DEFAULT_IMAGE)
+        self.catalog = catalog
+        credential = credential or shared_credential()
         self.compute_client = ComputeManagementClient(
-            credential=DefaultAzureCredential(),
-            subscription_id=self.subscription_id
+            credential=credential,
+            subscription_id=self.subscription_id,
+            **client_kwargs
+        )
+        self.network_client = NetworkManagementClient(
+            credential=credential,
+            subscription_id=self.subscription_id,
+            **client_kwargs
         )
 
-    def create_vm(self, resource_group_name, vm_name, location, nic_id, vm_size='Standard_DS1_v2'):
-        """Create a new virtual machine (VM) in Azure."""
-        vm_params = {
+    def _vm_params(self, vm_name, location, nic_id, vm_size):
+        """Build the create_or_update parameters for a VM."""
+        return {
             'location': location,
             'hardware_profile': {
                 'vm_size': vm_size
             },
             'storage_profile': {
-                'image_reference': {
-                    'publisher': 'Canonical',
-                    'offer': 'UbuntuServer',
-                    'sku': '18.04-LTS',
-                    'version': 'latest'
-                }
+                'image_reference': dict(self.image)
             },
             'os_profile': {
                 'computer_name': vm_name,
@@ -39,62 +61,197 @@ class AzureVMModule:
                 }]
             }
         }
+
+    def create_vm(self, resource_group_name, vm_name, location, nic_id, vm_size='Standard_DS1_v2', tags=None, wait=True, continuation_token=None):
+        """Create a new virtual machine (VM) in Azure."""
+        vm_params = self._vm_params(vm_name, location, nic_id, vm_size)
+        if tags:
+            vm_params['tags'] = tags
         try:
+            if self.catalog is not None:
+                vm_params['storage_profile']['image_reference'] = self.catalog.resolve(location, vm_size, self.image)
+            lro_kwargs = {'continuation_token': continuation_token} if continuation_token else {}
             vm_poller = self.compute_client.virtual_machines.begin_create_or_update(
-                resource_group_name, vm_name, vm_params)
-            vm_result = vm_poller.result(timeout=timeout)  # Set timeout for polling
+                resource_group_name, vm_name, vm_params, **lro_kwargs)
+            if not wait:
+                print(f"Creation of VM '{vm_name}' started.")
+                return AzureOperation(vm_poller, f"Creation of VM '{vm_name}'")
+            vm_result = wait_for(vm_poller, self.timeout)
             print(f"VM '{vm_name}' created successfully.")
             return vm_result
         except AzureError as azure_err:
             print(f"Azure error occurred while creating VM '{vm_name}'. Error: {azure_err}")
+            record_failure(azure_err)
         except Exception as e:
             print(f"Failed to create VM '{vm_name}'. Error: {e}")
+            record_failure(e)
 
-    def delete_vm(self, resource_group_name, vm_name):
+    def delete_vm(self, resource_group_name, vm_name, wait=True):
         """Delete an existing virtual machine (VM) in Azure."""
         try:
             delete_poller = self.compute_client.virtual_machines.begin_delete(
                 resource_group_name, vm_name)
-            delete_poller.result(timeout=timeout)  # Set timeout for polling
+            if not wait:
+                print(f"Deletion of VM '{vm_name}' started.")
+                return AzureOperation(delete_poller, f"Deletion of VM '{vm_name}'")
+            wait_for(delete_poller, self.timeout)
             print(f"VM '{vm_name}' deleted successfully.")
         except AzureError as azure_err:
             print(f"Azure error occurred while deleting VM '{vm_name}'. Error: {azure_err}")
+            record_failure(azure_err)
         except Exception as e:
             print(f"Failed to delete VM '{vm_name}'. Error: {e}")
+            record_failure(e)
 
-    def start_vm(self, resource_group_name, vm_name):
+    def start_vm(self, resource_group_name, vm_name, wait=True):
         """Start a virtual machine (VM) in Azure."""
         try:
             start_poller = self.compute_client.virtual_machines.begin_start(
                 resource_group_name, vm_name)
-            start_poller.result(timeout=timeout)  # Set timeout for polling
+            if not wait:
+                print(f"Power-on of VM '{vm_name}' started.")
+                return AzureOperation(start_poller, f"Power-on of VM '{vm_name}'")
+            wait_for(start_poller, self.timeout)
             print(f"VM '{vm_name}' started successfully.")
         except AzureError as azure_err:
             print(f"Azure error occurred while starting VM '{vm_name}'. Error: {azure_err}")
+            record_failure(azure_err)
         except Exception as e:
             print(f"Failed to start VM '{vm_name}'. Error: {e}")
+            record_failure(e)
 
-    def stop_vm(self, resource_group_name, vm_name):
+    def stop_vm(self, resource_group_name, vm_name, wait=True):
         """Stop a virtual machine (VM) in Azure."""
         try:
             stop_poller = self.compute_client.virtual_machines.begin_power_off(
                 resource_group_name, vm_name)
-            stop_poller.result(timeout=timeout)  # Set timeout for polling
+            if not wait:
+                print(f"Power-off of VM '{vm_name}' started.")
+                return AzureOperation(stop_poller, f"Power-off of VM '{vm_name}'")
+            wait_for(stop_poller, self.timeout)
             print(f"VM '{vm_name}' stopped successfully.")
         except AzureError as azure_err:
             print(f"Azure error occurred while stopping VM '{vm_name}'. Error: {azure_err}")
+            record_failure(azure_err)
         except Exception as e:
             print(f"Failed to stop VM '{vm_name}'. Error: {e}")
+            record_failure(e)
 
-    def get_vm_details(self, resource_group_name, vm_name):
-        """Retrieve details of an existing virtual machine (VM) in Azure."""
+    def update_vm_tags(self, resource_group_name, vm_name, tags):
+        """Replace the tags of an existing virtual machine (VM) with a PATCH."""
         try:
-            vm_details = self.compute_client.virtual_machines.get(
-                resource_group_name, vm_name)
+            tag_poller = self.compute_client.virtual_machines.begin_update(
+                resource_group_name, vm_name, {'tags': tags})
+            vm_result = wait_for(tag_poller)
+            print(f"Updated tags for VM '{vm_name}' successfully.")
+            return vm_result
+        except AzureError as azure_err:
+            print(f"Azure error occurred while updating tags for VM '{vm_name}'. Error: {azure_err}")
+            record_failure(azure_err)
+        except Exception as e:
+            print(f"Failed to update tags for VM '{vm_name}'. Error: {e}")
+            record_failure(e)
+
+    def get_vm_details(self, resource_group_name, vm_name, fields=None):
+        """Retrieve details of an existing virtual machine (VM) in Azure, or just `fields` of it as a record."""
+        try:
+            if fields:
+                vm_details = get_projected(self.compute_client, self.subscription_id, 'vm', resource_group_name, vm_name,
+                                           fields)
+            else:
+                vm_details = self.compute_client.virtual_machines.get(resource_group_name, vm_name)
             print(f"Details of VM '{vm_name}' retrieved successfully.")
             return vm_details
         except AzureError as azure_err:
             print(f"Azure error occurred while retrieving details for VM '{vm_name}'. Error: {azure_err}")
+            record_failure(azure_err)
         except Exception as e:
             print(f"Failed to retrieve details for VM '{vm_name}'. Error: {e}")
-            
\ No newline at end of file
+            record_failure(e)
+            
+
+    def _nic_params(self, nic_name, location, subnet_id):
+        """Build the create_or_update parameters for a NIC."""
+        return {
+            'location': location,
+            'ip_configurations': [{
+                'name': nic_name + '-ipconfig',
+                'subnet': {
+                    'id': subnet_id
+                }
+            }]
+        }
+
+    def create_nic(self, resource_group_name, nic_name, location, subnet_id, wait=True):
+        """Create a network interface (NIC) in a subnet for a VM."""
+        nic_params = self._nic_params(nic_name, location, subnet_id)
+        try:
+            nic_poller = self.network_client.network_interfaces.begin_create_or_update(
+                resource_group_name, nic_name, nic_params)
+            if not wait:
+                print(f"Creation of NIC '{nic_name}' started.")
+                return AzureOperation(nic_poller, f"Creation of NIC '{nic_name}'")
+            nic_result = wait_for(nic_poller)
+            print(f"NIC '{nic_name}' created successfully.")
+            return nic_result
+        except AzureError as azure_err:
+            print(f"Azure error occurred while creating NIC '{nic_name}'. Error: {azure_err}")
+            record_failure(azure_err)
+        except Exception as e:
+            print(f"Failed to create NIC '{nic_name}'. Error: {e}")
+            record_failure(e)
+
+    def create_vm_fleet(self, resource_group_name, vm_names, location, subnet_id, vm_size='Standard_DS1_v2',
+                        max_concurrency=10):
+        """Create many VMs, pipelining NIC creation ahead of VM creation; yield a VMFleetResult per VM as it finishes.
+
+        NICs and VMs each run at most `max_concurrency` LROs at a time, and a VM is
+        submitted as soon as its own NIC exists rather than after the whole NIC stage.
+        """
+        template = self._vm_params(None, location, None, vm_size)
+        if self.catalog is not None:
+            # Resolved once, so every VM of the fleet gets the same image version.
+            try:
+                template['storage_profile']['image_reference'] = self.catalog.resolve(location, vm_size, self.image)
+            except Exception as e:
+                print(f"Failed to create VM fleet in location '{location}'. Error: {e}")
+                record_failure(e)
+                for vm_name in vm_names:
+                    yield VMFleetResult(vm_name, None, None, e)
+                return
+
+        def create_nic(vm_name):
+            nic_name = vm_name + '-nic'
+            return wait_for(self.network_client.network_interfaces.begin_create_or_update(
+                resource_group_name, nic_name, self._nic_params(nic_name, location, subnet_id))).id
+
+        def create_vm(vm_name, nic_id):
+            # Only the name and NIC differ per VM; every other section is shared with the template.
+            vm_params = dict(template)
+            vm_params['os_profile'] = dict(template['os_profile'], computer_name=vm_name)
+            vm_params['network_profile'] = {'network_interfaces': [{'id': nic_id, 'primary': True}]}
+            return wait_for(self.compute_client.virtual_machines.begin_create_or_update(
+                resource_group_name, vm_name, vm_params))
+
+        succeeded = failed = 0
+        with ThreadPoolExecutor(max_workers=max_concurrency, thread_name_prefix='nic') as nic_executor, \
+                ThreadPoolExecutor(max_workers=max_concurrency, thread_name_prefix='vm') as vm_executor:
+            pending = {nic_executor.submit(bind(create_nic), vm_name): ('nic', vm_name, None) for vm_name in vm_names}
+            while pending:
+                finished, _ = wait_futures(pending, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    stage, vm_name, nic_id = pending.pop(future)
+                    error = future.exception()
+                    if stage == 'nic' and error is None:
+                        nic_id = future.result()
+                        pending[vm_executor.submit(bind(create_vm), vm_name, nic_id)] = ('vm', vm_name, nic_id)
+                        continue
+                    if error is None:
+                        succeeded += 1
+                        print(f"VM '{vm_name}' created successfully.")
+                        yield VMFleetResult(vm_name, nic_id, future.result(), None)
+                    else:
+                        failed += 1
+                        print(f"Failed to create {stage.upper()} for VM '{vm_name}'. Error: {error}")
+                        yield VMFleetResult(vm_name, nic_id, None, error)
+        print(f"VM fleet finished: {succeeded} created, {failed} failed.")
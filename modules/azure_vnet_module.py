@@ -1,18 +1,24 @@
-from azure.identity import DefaultAzureCredential
 from azure.mgmt.network import NetworkManagementClient
+from azure.core.exceptions import AzureError
+from modules.azure_operation_module import AzureOperation, record_failure
+from modules.azure_credential_module import shared_credential
+from modules.azure_deadline_module import remaining_timeout, sleep, wait_for
+from modules.azure_projection_module import get_projected, iter_projected
 import os
+import time
 
 class AzureVNetModule:
-    def __init__(self, subscription_id):
+    def __init__(self, subscription_id, timeout=300, credential=None, **client_kwargs):
         """Initialize the AzureVNetModule with Azure credentials and subscription ID."""
         self.subscription_id = subscription_id
         self.network_client = NetworkManagementClient(
-            credential=DefaultAzureCredential(),
-            subscription_id=self.subscription_id
-        self.timeout = timeout
+            credential=credential or shared_credential(),
+            subscription_id=self.subscription_id,
+            **client_kwargs
         )
+        self.timeout = timeout
 
-    def create_vnet(self, resource_group_name, vnet_name, location, address_prefix):
+    def create_vnet(self, resource_group_name, vnet_name, location, address_prefix, tags=None, wait=True, continuation_token=None):
         """Create a new virtual network (VNet) in Azure with timeout handling."""
         params = {
             'location': location,
@@ -20,46 +26,63 @@ class AzureVNetModule:
                 'address_prefixes': [address_prefix]
             }
         }
+        if tags:
+            params['tags'] = tags
         try:
             start_time = time.time()
+            timeout = remaining_timeout(self.timeout)
+            lro_kwargs = {'continuation_token': continuation_token} if continuation_token else {}
             vnet_poller = self.network_client.virtual_networks.begin_create_or_update(
-                resource_group_name, vnet_name, params)
+                resource_group_name, vnet_name, params, **lro_kwargs)
+            if not wait:
+                print(f"Creation of VNet '{vnet_name}' started.")
+                return AzureOperation(vnet_poller, f"Creation of VNet '{vnet_name}'")
 
             while not vnet_poller.done():
-                if time.time() - start_time > self.timeout:
+                if time.time() - start_time > timeout:
                     raise TimeoutError(f"Operation timed out while creating VNet '{vnet_name}'.")
-                time.sleep(5)  # Check every 5 seconds
+                sleep(5)  # Check every 5 seconds; wakes early if the deadline is cancelled
 
-            vnet_result = vnet_poller.result()
+            vnet_result = wait_for(vnet_poller)
             print(f"VNet '{vnet_name}' created successfully.")
             return vnet_result
         except TimeoutError as te:
             print(te)
+            record_failure(te)
         except AzureError as e:
             print(f"Failed to create VNet '{vnet_name}'. Error: {e}")
+            record_failure(e)
         except Exception as e:
             print(f"An unexpected error occurred while creating VNet '{vnet_name}'. Error: {e}")
+            record_failure(e)
 
-    def delete_vnet(self, resource_group_name, vnet_name):
+    def delete_vnet(self, resource_group_name, vnet_name, wait=True):
         """Delete an existing virtual network (VNet) in Azure."""
         try:
             start_time = time.time()
+            timeout = remaining_timeout(self.timeout)
             delete_poller = self.network_client.virtual_networks.begin_delete(
                 resource_group_name, vnet_name)
+            if not wait:
+                print(f"Deletion of VNet '{vnet_name}' started.")
+                return AzureOperation(delete_poller, f"Deletion of VNet '{vnet_name}'")
 
             while not delete_poller.done():
-                if time.time() - start_time > self.timeout:
+                if time.time() - start_time > timeout:
                     raise TimeoutError(f"Operation timed out while deleting VNet '{vnet_name}'.")
-                time.sleep(5)
+                sleep(5)
 
-            delete_poller.result()
+            wait_for(delete_poller)
             print(f"VNet '{vnet_name}' deleted successfully.")
         except TimeoutError as te:
             print(te)
+            record_failure(te)
         except AzureError as e:
             print(f"Failed to delete VNet '{vnet_name}'. Error: {e}")
+            record_failure(e)
         except Exception as e:
             print(f"An unexpected error occurred while deleting VNet '{vnet_name}'. Error: {e}")
+            record_failure(e)
 
     def update_vnet(self, resource_group_name, vnet_name, address_prefix):
         """Update an existing virtual network (VNet) in Azure."""
@@ -70,44 +93,73 @@ class AzureVNetModule:
         }
         try:
             start_time = time.time()
+            timeout = remaining_timeout(self.timeout)
             update_poller = self.network_client.virtual_networks.begin_create_or_update(
                 resource_group_name, vnet_name, params)
 
             while not update_poller.done():
-                if time.time() - start_time > self.timeout:
+                if time.time() - start_time > timeout:
                     raise TimeoutError(f"Operation timed out while updating VNet '{vnet_name}'.")
-                time.sleep(5)
+                sleep(5)
 
-            update_result = update_poller.result()
+            update_result = wait_for(update_poller)
             print(f"VNet '{vnet_name}' updated successfully.")
             return update_result
         except TimeoutError as te:
             print(te)
+            record_failure(te)
         except AzureError as e:
             print(f"Failed to update VNet '{vnet_name}'. Error: {e}")
+            record_failure(e)
         except Exception as e:
             print(f"An unexpected error occurred while updating VNet '{vnet_name}'. Error: {e}")
+            record_failure(e)
+
+    def update_vnet_tags(self, resource_group_name, vnet_name, tags):
+        """Replace the tags of an existing virtual network (VNet) with a PATCH."""
+        try:
+            vnet_result = self.network_client.virtual_networks.update_tags(
+                resource_group_name, vnet_name, {'tags': tags})
+            print(f"Updated tags for VNet '{vnet_name}' successfully.")
+            return vnet_result
+        except AzureError as e:
+            print(f"Failed to update tags for VNet '{vnet_name}'. Error: {e}")
+            record_failure(e)
+        except Exception as e:
+            print(f"An unexpected error occurred while updating tags for VNet '{vnet_name}'. Error: {e}")
+            record_failure(e)
 
-    def list_vnets(self, resource_group_name):
-        """List all virtual networks (VNets) in a resource group in Azure."""
+    def list_vnets(self, resource_group_name, fields=None):
+        """List all virtual networks (VNets) in a resource group in Azure, as records of `fields` when given."""
         try:
-            vnets = self.network_client.virtual_networks.list(resource_group_name)
+            if fields:
+                vnets = iter_projected(self.network_client, self.subscription_id, 'vnet', resource_group_name, fields)
+            else:
+                vnets = self.network_client.virtual_networks.list(resource_group_name)
             vnet_list = list(vnets)
             print(f"Listed all VNets in resource group '{resource_group_name}'.")
             return vnet_list
         except AzureError as e:
             print(f"Failed to list VNets in resource group '{resource_group_name}'. Error: {e}")
+            record_failure(e)
         except Exception as e:
             print(f"An unexpected error occurred while listing VNets in resource group '{resource_group_name}'. Error: {e}")
+            record_failure(e)
 
-    def get_vnet_details(self, resource_group_name, vnet_name):
-        """Retrieve details of an existing virtual network (VNet) in Azure."""
+    def get_vnet_details(self, resource_group_name, vnet_name, fields=None):
+        """Retrieve details of an existing virtual network (VNet) in Azure, or just `fields` of it as a record."""
         try:
-            vnet_details = self.network_client.virtual_networks.get(resource_group_name, vnet_name)
+            if fields:
+                vnet_details = get_projected(self.network_client, self.subscription_id, 'vnet', resource_group_name, vnet_name,
+                                             fields)
+            else:
+                vnet_details = self.network_client.virtual_networks.get(resource_group_name, vnet_name)
             print(f"Details of VNet '{vnet_name}' retrieved successfully.")
             return vnet_details
         except AzureError as e:
             print(f"Failed to retrieve details for VNet '{vnet_name}'. Error: {e}")
+            record_failure(e)
         except Exception as e:
             print(f"An unexpected error occurred while retrieving details for VNet '{vnet_name}'. Error: {e}")
+            record_failure(e)
             
\ No newline at end of file
@@ -1,17 +1,76 @@
-from azure.identity import DefaultAzureCredential
 from azure.mgmt.network import NetworkManagementClient
+from azure.core.exceptions import ResourceNotFoundError
+from concurrent.futures import CancelledError, Future, ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from modules.azure_operation_module import AzureOperation, record_failure
+from modules.azure_subnet_module import vnet_write_lock
+from modules.azure_credential_module import shared_credential
+from modules.azure_deadline_module import bind, remaining_timeout, wait_for
+from modules.azure_projection_module import get_projected, iter_projected
 import os
+import threading
+
+GATEWAY_SUBNET_NAME = 'GatewaySubnet'
+
+
+class GatewayProvisioning:
+    """Tracks a gateway pipeline running in the background.
+
+    `dependencies_ready` is set once the GatewaySubnet and public IP exist, so callers
+    can schedule other writes to the same VNet after it; `operation` is the gateway
+    AzureOperation once its LRO has been submitted.
+    """
+
+    def __init__(self, vng_name, public_ip_name=None):
+        self.vng_name = vng_name
+        self.public_ip_name = public_ip_name
+        self.dependencies_ready = threading.Event()
+        self.subnet_id = None
+        self.public_ip_id = None
+        self.operation = None
+        self.future = Future()
+        self._cancelled = False
+        self._lock = threading.Lock()
+
+    def done(self):
+        return self.future.done()
+
+    def cancel(self):
+        """Stop the pipeline before it submits the gateway; return False if the gateway LRO was already submitted.
+
+        Dependencies being created keep running; wait on result() before deleting them.
+        """
+        with self._lock:
+            self._cancelled = True
+            return self.operation is None
+
+    def _submit(self, submit):
+        with self._lock:
+            if self._cancelled:
+                raise CancelledError(f"Virtual Network Gateway '{self.vng_name}' was cancelled before submission.")
+            self.operation = submit()
+            return self.operation
+
+    def result(self, timeout=None):
+        """Wait for the gateway and return it; raise TimeoutError if it is still provisioning."""
+        timeout = remaining_timeout(timeout)
+        try:
+            return self.future.result(timeout)
+        except FutureTimeoutError:
+            # A separate class from the builtin TimeoutError before Python 3.11.
+            raise TimeoutError(f"Virtual Network Gateway '{self.vng_name}' did not finish within {timeout} seconds.")
+
 
 class AzureVNGModule:
-    def __init__(self, subscription_id):
+    def __init__(self, subscription_id, credential=None, **client_kwargs):
         """Initialize the AzureVNGModule with Azure credentials and subscription ID."""
         self.subscription_id = subscription_id
         self.network_client = NetworkManagementClient(
-            credential=DefaultAzureCredential(),
-            subscription_id=self.subscription_id
+            credential=credential or shared_credential(),
+            subscription_id=self.subscription_id,
+            **client_kwargs
         )
 
-    def create_virtual_network_gateway(self, resource_group_name, vng_name, location, gateway_type, vpn_type, subnet_id, public_ip_id):
+    def create_virtual_network_gateway(self, resource_group_name, vng_name, location, gateway_type, vpn_type, subnet_id, public_ip_id, sku=None, tags=None, wait=True, continuation_token=None):
         """Create a new Virtual Network Gateway (VNG) in Azure."""
         vng_params = {
             'location': location,
@@ -27,24 +86,37 @@ class AzureVNGModule:
                 }
             }]
         }
+        if sku:
+            vng_params['sku'] = {'name': sku, 'tier': sku}
+        if tags:
+            vng_params['tags'] = tags
         try:
+            lro_kwargs = {'continuation_token': continuation_token} if continuation_token else {}
             vng_poller = self.network_client.virtual_network_gateways.begin_create_or_update(
-                resource_group_name, vng_name, vng_params)
-            vng_result = vng_poller.result()
+                resource_group_name, vng_name, vng_params, **lro_kwargs)
+            if not wait:
+                print(f"Creation of Virtual Network Gateway '{vng_name}' started.")
+                return AzureOperation(vng_poller, f"Creation of Virtual Network Gateway '{vng_name}'")
+            vng_result = wait_for(vng_poller)
             print(f"Virtual Network Gateway '{vng_name}' created successfully.")
             return vng_result
         except Exception as e:
             print(f"Failed to create Virtual Network Gateway '{vng_name}'. Error: {e}")
+            record_failure(e)
 
-    def delete_virtual_network_gateway(self, resource_group_name, vng_name):
+    def delete_virtual_network_gateway(self, resource_group_name, vng_name, wait=True):
         """Delete an existing Virtual Network Gateway (VNG) in Azure."""
         try:
             delete_poller = self.network_client.virtual_network_gateways.begin_delete(
                 resource_group_name, vng_name)
-            delete_poller.result()
+            if not wait:
+                print(f"Deletion of Virtual Network Gateway '{vng_name}' started.")
+                return AzureOperation(delete_poller, f"Deletion of Virtual Network Gateway '{vng_name}'")
+            wait_for(delete_poller)
             print(f"Virtual Network Gateway '{vng_name}' deleted successfully.")
         except Exception as e:
             print(f"Failed to delete Virtual Network Gateway '{vng_name}'. Error: {e}")
+            record_failure(e)
 
     def update_virtual_network_gateway(self, resource_group_name, vng_name, gateway_type=None, vpn_type=None):
         """Update an existing Virtual Network Gateway (VNG) in Azure."""
@@ -57,28 +129,160 @@ class AzureVNGModule:
         try:
             update_poller = self.network_client.virtual_network_gateways.begin_create_or_update(
                 resource_group_name, vng_name, vng_params)
-            update_result = update_poller.result()
+            update_result = wait_for(update_poller)
             print(f"Virtual Network Gateway '{vng_name}' updated successfully.")
             return update_result
         except Exception as e:
             print(f"Failed to update Virtual Network Gateway '{vng_name}'. Error: {e}")
+            record_failure(e)
+
+    def update_virtual_network_gateway_tags(self, resource_group_name, vng_name, tags):
+        """Replace the tags of an existing Virtual Network Gateway (VNG) with a PATCH."""
+        try:
+            tag_poller = self.network_client.virtual_network_gateways.begin_update_tags(
+                resource_group_name, vng_name, {'tags': tags})
+            vng_result = wait_for(tag_poller)
+            print(f"Updated tags for Virtual Network Gateway '{vng_name}' successfully.")
+            return vng_result
+        except Exception as e:
+            print(f"Failed to update tags for Virtual Network Gateway '{vng_name}'. Error: {e}")
+            record_failure(e)
 
-    def list_virtual_network_gateways(self, resource_group_name):
-        """List all Virtual Network Gateways (VNGs) in a resource group in Azure."""
+    def list_virtual_network_gateways(self, resource_group_name, fields=None):
+        """List all Virtual Network Gateways (VNGs) in a resource group, as records of `fields` when given."""
         try:
-            vngs = self.network_client.virtual_network_gateways.list(resource_group_name)
+            if fields:
+                vngs = iter_projected(self.network_client, self.subscription_id, 'vng', resource_group_name, fields)
+            else:
+                vngs = self.network_client.virtual_network_gateways.list(resource_group_name)
             vng_list = list(vngs)
             print(f"Listed all Virtual Network Gateways in resource group '{resource_group_name}'.")
             return vng_list
         except Exception as e:
             print(f"Failed to list Virtual Network Gateways in resource group '{resource_group_name}'. Error: {e}")
+            record_failure(e)
 
-    def get_virtual_network_gateway_details(self, resource_group_name, vng_name):
-        """Retrieve details of an existing Virtual Network Gateway (VNG) in Azure."""
+    def get_virtual_network_gateway_details(self, resource_group_name, vng_name, fields=None):
+        """Retrieve details of an existing Virtual Network Gateway (VNG), or just `fields` of it as a record."""
         try:
-            vng_details = self.network_client.virtual_network_gateways.get(resource_group_name, vng_name)
+            if fields:
+                vng_details = get_projected(self.network_client, self.subscription_id, 'vng', resource_group_name, vng_name,
+                                            fields)
+            else:
+                vng_details = self.network_client.virtual_network_gateways.get(resource_group_name, vng_name)
             print(f"Details of Virtual Network Gateway '{vng_name}' retrieved successfully.")
             return vng_details
         except Exception as e:
             print(f"Failed to retrieve details for Virtual Network Gateway '{vng_name}'. Error: {e}")
-            
\ No newline at end of file
+            record_failure(e)
+            
+
+    def create_public_ip(self, resource_group_name, public_ip_name, location, tags=None, wait=True):
+        """Create a static Standard SKU public IP address, as required by gateways."""
+        public_ip_params = {
+            'location': location,
+            'sku': {
+                'name': 'Standard'
+            },
+            'public_ip_allocation_method': 'Static'
+        }
+        if tags:
+            public_ip_params['tags'] = tags
+        try:
+            public_ip_poller = self.network_client.public_ip_addresses.begin_create_or_update(
+                resource_group_name, public_ip_name, public_ip_params)
+            if not wait:
+                print(f"Creation of public IP '{public_ip_name}' started.")
+                return AzureOperation(public_ip_poller, f"Creation of public IP '{public_ip_name}'")
+            public_ip_result = wait_for(public_ip_poller)
+            print(f"Public IP '{public_ip_name}' created successfully.")
+            return public_ip_result
+        except Exception as e:
+            print(f"Failed to create public IP '{public_ip_name}'. Error: {e}")
+            record_failure(e)
+
+    def delete_public_ip(self, resource_group_name, public_ip_name, wait=True):
+        """Delete a public IP address, e.g. the one a gateway used."""
+        try:
+            delete_poller = self.network_client.public_ip_addresses.begin_delete(resource_group_name, public_ip_name)
+            if not wait:
+                print(f"Deletion of public IP '{public_ip_name}' started.")
+                return AzureOperation(delete_poller, f"Deletion of public IP '{public_ip_name}'")
+            wait_for(delete_poller)
+            print(f"Public IP '{public_ip_name}' deleted successfully.")
+        except Exception as e:
+            print(f"Failed to delete public IP '{public_ip_name}'. Error: {e}")
+            record_failure(e)
+
+    def _ensure_gateway_subnet(self, resource_group_name, vnet_name, address_prefix):
+        """Return the ID of the VNet's GatewaySubnet, creating it when it does not exist."""
+        try:
+            subnet = self.network_client.subnets.get(resource_group_name, vnet_name, GATEWAY_SUBNET_NAME)
+        except ResourceNotFoundError:
+            subnet = None
+        if subnet is not None:
+            if address_prefix and subnet.address_prefix != address_prefix:
+                raise ValueError(f"Existing GatewaySubnet in VNet '{vnet_name}' uses '{subnet.address_prefix}', "
+                                 f"not '{address_prefix}'.")
+            print(f"Validated GatewaySubnet in VNet '{vnet_name}'.")
+            return subnet.id
+        if not address_prefix:
+            raise ValueError(f"VNet '{vnet_name}' has no GatewaySubnet and no address prefix was given.")
+        with vnet_write_lock(self.subscription_id, resource_group_name, vnet_name):
+            subnet = wait_for(self.network_client.subnets.begin_create_or_update(
+                resource_group_name, vnet_name, GATEWAY_SUBNET_NAME, {'address_prefix': address_prefix}))
+        print(f"GatewaySubnet created in VNet '{vnet_name}'.")
+        return subnet.id
+
+    def _ensure_public_ip(self, resource_group_name, public_ip_name, location, tags=None):
+        """Return the ID of the public IP, creating it when it does not exist."""
+        try:
+            return self.network_client.public_ip_addresses.get(resource_group_name, public_ip_name).id
+        except ResourceNotFoundError:
+            pass
+        public_ip = self.create_public_ip(resource_group_name, public_ip_name, location, tags=tags)
+        if public_ip is None:
+            raise RuntimeError(f"Failed to create public IP '{public_ip_name}'.")
+        return public_ip.id
+
+    def provision_gateway(self, resource_group_name, vng_name, location, vnet_name, gateway_subnet_prefix=None,
+                          gateway_type='Vpn', vpn_type='RouteBased', sku='VpnGw1', public_ip_name=None,
+                          tags=None, continuation_token=None, on_submitted=None):
+        """Provision a gateway and its dependencies in the background; return a GatewayProvisioning.
+
+        The GatewaySubnet and the public IP are created or validated concurrently, and
+        the gateway LRO is submitted as soon as both exist. `on_submitted(operation)` is
+        called right after submission, e.g. to journal the continuation token.
+        """
+        public_ip_name = public_ip_name or vng_name + '-pip'
+        provisioning = GatewayProvisioning(vng_name, public_ip_name)
+
+        def run():
+            try:
+                with ThreadPoolExecutor(max_workers=2) as executor:
+                    subnet_future = executor.submit(
+                        bind(self._ensure_gateway_subnet), resource_group_name, vnet_name, gateway_subnet_prefix)
+                    public_ip_future = executor.submit(
+                        bind(self._ensure_public_ip), resource_group_name, public_ip_name, location, tags)
+                    # The public IP first, so teardown still finds it when the GatewaySubnet failed
+                    provisioning.public_ip_id = public_ip_future.result()
+                    provisioning.subnet_id = subnet_future.result()
+                provisioning.dependencies_ready.set()
+                operation = provisioning._submit(lambda: self.create_virtual_network_gateway(
+                    resource_group_name, vng_name, location, gateway_type, vpn_type, provisioning.subnet_id,
+                    provisioning.public_ip_id, sku=sku, tags=tags, wait=False,
+                    continuation_token=continuation_token))
+                if operation is None:
+                    raise RuntimeError(f"Failed to submit Virtual Network Gateway '{vng_name}'.")
+                if on_submitted is not None:
+                    on_submitted(operation)
+                result = operation.result()
+                print(f"Virtual Network Gateway '{vng_name}' created successfully.")
+                provisioning.future.set_result(result)
+            except Exception as e:
+                print(f"Failed to provision Virtual Network Gateway '{vng_name}'. Error: {e}")
+                provisioning.dependencies_ready.set()
+                provisioning.future.set_exception(e)
+
+        threading.Thread(target=bind(run), name=f"gateway-{vng_name}", daemon=True).start()
+        return provisioning
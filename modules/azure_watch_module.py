@@ -0,0 +1,165 @@
+from azure.mgmt.network import NetworkManagementClient
+from azure.mgmt.compute import ComputeManagementClient
+from azure.core.exceptions import ResourceNotFoundError, ResourceNotModifiedError
+from collections import namedtuple
+from modules.azure_credential_module import shared_credential
+from modules.azure_provisioning_module import RESOURCE_LISTERS
+import hashlib
+import json
+import threading
+
+CREATED = 'created'
+UPDATED = 'updated'
+DELETED = 'deleted'
+
+# `resource` is the SDK model as listed or fetched, or the last seen model for deletions.
+WatchEvent = namedtuple('WatchEvent', ['kind', 'resource_type', 'resource_group_name', 'resource_name', 'resource'])
+
+
+def resource_digest(resource):
+    """Return a stable hash of a resource body, so re-listed but unchanged resources compare equal."""
+    body = resource.as_dict() if hasattr(resource, 'as_dict') else vars(resource)
+    return hashlib.blake2b(json.dumps(body, sort_keys=True, default=str).encode(), digest_size=16).hexdigest()
+
+
+class AzureWatchModule:
+    def __init__(self, subscription_id, interval=60, emit_initial=False, credential=None, **client_kwargs):
+        """Initialize the AzureWatchModule with Azure credentials and subscription ID.
+
+        The first poll of a selection only records a baseline unless `emit_initial` is
+        set, in which case every resource it finds is reported as created.
+        """
+        self.subscription_id = subscription_id
+        self.interval = interval
+        self.emit_initial = emit_initial
+        credential = credential or shared_credential()
+        self.network_client = NetworkManagementClient(
+            credential=credential,
+            subscription_id=self.subscription_id,
+            **client_kwargs
+        )
+        self.compute_client = ComputeManagementClient(
+            credential=credential,
+            subscription_id=self.subscription_id,
+            **client_kwargs
+        )
+        self._selections = []
+        self._state = {}
+        self._baselined = set()
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+
+    def watch(self, resource_group_name, resource_type, resource_name=None):
+        """Watch every resource of a type in a resource group, or a single named resource.
+
+        Whole types are read with one list call per poll; single resources with a GET
+        conditional on their last ETag. Subnets are named 'vnet_name/subnet_name'.
+        """
+        if resource_type not in RESOURCE_LISTERS:
+            raise ValueError(f"Unsupported resource type '{resource_type}'.")
+        with self._lock:
+            self._selections.append((resource_group_name, resource_type, resource_name))
+
+    def _list(self, resource_group_name, resource_type):
+        client_attribute, group = RESOURCE_LISTERS[resource_type]
+        operations = getattr(getattr(self, client_attribute), group)
+        resources = {}
+        for resource in operations.list(resource_group_name):
+            if resource_type == 'subnet':
+                for subnet in resource.subnets or []:
+                    resources[f"{resource.name}/{subnet.name}"] = subnet
+            else:
+                resources[resource.name] = resource
+        return resources
+
+    def _get(self, resource_group_name, resource_type, resource_name, etag):
+        """Return {name: resource}, {} if it is gone, or None if it is unchanged since `etag`."""
+        kwargs = {'headers': {'If-None-Match': etag}} if etag else {}
+        try:
+            if resource_type == 'subnet':
+                vnet_name, subnet_name = resource_name.split('/', 1)
+                resource = self.network_client.subnets.get(resource_group_name, vnet_name, subnet_name, **kwargs)
+            else:
+                client_attribute, group = RESOURCE_LISTERS[resource_type]
+                operations = getattr(getattr(self, client_attribute), group)
+                resource = operations.get(resource_group_name, resource_name, **kwargs)
+        except ResourceNotModifiedError:
+            return None
+        except ResourceNotFoundError:
+            return {}
+        return {resource_name: resource}
+
+    def _diff(self, resource_group_name, resource_type, resources, scope, emit):
+        """Compare fetched resources with the last snapshot and return the change events."""
+        events = []
+        for resource_name, resource in resources.items():
+            key = (resource_group_name, resource_type, resource_name)
+            previous = self._state.get(key)
+            etag = getattr(resource, 'etag', None)
+            if previous is not None and etag and previous[0] == etag:
+                continue  # Same ETag: unchanged without hashing the body
+            digest = resource_digest(resource)
+            self._state[key] = (etag, digest, resource)
+            if previous is None:
+                if emit:
+                    events.append(WatchEvent(CREATED, resource_type, resource_group_name, resource_name, resource))
+            elif previous[1] != digest:
+                events.append(WatchEvent(UPDATED, resource_type, resource_group_name, resource_name, resource))
+        for key in [key for key in self._state if key[:2] == (resource_group_name, resource_type)
+                    and key[2] in scope and key[2] not in resources]:
+            _, _, last_seen = self._state.pop(key)
+            events.append(WatchEvent(DELETED, resource_type, resource_group_name, key[2], last_seen))
+        return events
+
+    def poll_once(self):
+        """Poll every selection once and return the change events since the previous poll."""
+        events = []
+        with self._lock:
+            for selection in list(self._selections):
+                resource_group_name, resource_type, resource_name = selection
+                emit = selection in self._baselined or self.emit_initial
+                try:
+                    if resource_name is None:
+                        resources = self._list(resource_group_name, resource_type)
+                        scope = {key[2] for key in self._state if key[:2] == (resource_group_name, resource_type)}
+                    else:
+                        previous = self._state.get((resource_group_name, resource_type, resource_name))
+                        resources = self._get(resource_group_name, resource_type, resource_name,
+                                              previous[0] if previous else None)
+                        if resources is None:
+                            self._baselined.add(selection)
+                            continue
+                        scope = {resource_name}
+                except Exception as e:
+                    # Keep the snapshot; a failed read must not look like a mass deletion.
+                    print(f"Failed to poll {resource_type} in resource group '{resource_group_name}'. Error: {e}")
+                    continue
+                events += self._diff(resource_group_name, resource_type, resources, scope, emit)
+                self._baselined.add(selection)
+        return events
+
+    def events(self):
+        """Yield change events as they are detected, polling every `interval` seconds until stop()."""
+        while not self._stop.is_set():
+            for event in self.poll_once():
+                yield event
+            self._stop.wait(self.interval)
+
+    def run(self, callback):
+        """Call `callback(event)` for every change until stop() is called."""
+        for event in self.events():
+            try:
+                callback(event)
+            except Exception as e:
+                print(f"Watch callback failed for {event.resource_type} '{event.resource_name}'. Error: {e}")
+
+    def start(self, callback):
+        """Run the watch loop in a background thread and return the thread."""
+        self._stop.clear()
+        thread = threading.Thread(target=self.run, args=(callback,), name='azure-watch', daemon=True)
+        thread.start()
+        return thread
+
+    def stop(self):
+        """Stop the watch loop after the current poll."""
+        self._stop.set()
@@ -1,6 +1,5 @@
 import os
 import logging
-import time
 import requests
 from tenacity import retry, stop_after_attempt, wait_exponential, retry_if_exception_type
 from requests.exceptions import HTTPError
@@ -13,6 +12,14 @@ from modules.azure_subnet_module import AzureSubnetModule
 from modules.azure_vng_module import AzureVNGModule
 from modules.azure_route_table_module import AzureRouteTableModule
 from modules.azure_scale_set_module import AzureScaleSetModule
+from modules.azure_metrics_module import AzureMetricsModule
+from modules.azure_profiling_module import AzureProfilingModule
+from modules.azure_transport_module import AzureTransportModule
+from modules.azure_provisioning_module import AzureProvisioningWatcher, SUCCEEDED_STATES
+from modules.azure_journal_module import AzureOperationJournal, summarize_result
+from modules.azure_deadline_module import AzureDeadline, client_kwargs as deadline_client_kwargs
+from modules.azure_compute_catalog_module import AzureComputeCatalog
+from modules.azure_operation_module import capture_failures
 
 
 # Load environment variables from the .env file
@@ -46,40 +53,123 @@ def call_azure_api(func, *args, **kwargs):
     Wrapper function for Azure API calls with retry logic.
     """
     response = func(*args, **kwargs)
-    response.raise_for_status()  # Raise an exception for 4XX/5XX HTTP errors
+    if hasattr(response, 'raise_for_status'):
+        response.raise_for_status()  # Raise an exception for 4XX/5XX HTTP errors
     return response
 
-def wait_for_provisioning(module, resource_group, resource_name, timeout=300, interval=10):
+def wait_for_provisioning(watcher, resource_type, resource_name, timeout=300, result=None):
     """
-    Polls the Azure resource to check its provisioning state until it's "Succeeded" or a timeout occurs.
+    Waits until the resource's provisioning state is "Succeeded" or a timeout occurs.
+    All pending resources in the resource group share one batched poll per interval.
+    Returns at once when `result`, the finished operation's result, already reports "Succeeded".
     """
-    start_time = time.time()
-    while time.time() - start_time < timeout:
-        provisioning_state = module.get_provisioning_state(resource_group, resource_name)
-        if provisioning_state == 'Succeeded':
-            logger.info(f"{resource_name} is fully provisioned.")
-            return True
-        elif provisioning_state in ['Failed', 'Canceled']:
-            logger.error(f"{resource_name} provisioning failed with state: {provisioning_state}.")
-            return False
-        logger.info(f"Waiting for {resource_name} to be provisioned... Current state: {provisioning_state}")
-        time.sleep(interval)
-    logger.error(f"Timeout occurred while waiting for {resource_name} provisioning.")
+    state = result.get('provisioning_state') if isinstance(result, dict) else getattr(result, 'provisioning_state', None)
+    if state in SUCCEEDED_STATES:
+        logger.info(f"{resource_name} is fully provisioned.")
+        return True
+    waiter = watcher.wait_for(resource_type, resource_name, timeout)
+    if waiter.succeeded:
+        logger.info(f"{resource_name} is fully provisioned.")
+        return True
+    if waiter.event.is_set():
+        logger.error(f"{resource_name} provisioning failed with state: {waiter.state}.")
+        return False
+    logger.error(f"Timeout occurred while waiting for {resource_name} provisioning. Last state: {waiter.state}")
     return False
 
+def delete_resource(journal, step, description, delete, *args):
+    """
+    Deletes a resource and forgets its journal step, but only when the delete reported no failure,
+    so a resumed run still knows about a resource that could not be deleted. `step` may be None
+    for resources that have no journal step of their own.
+    """
+    try:
+        with capture_failures() as failures:
+            call_azure_api(delete, *args)
+    except Exception as e:
+        failures = [e]
+    if failures:
+        logger.error(f"Failed to delete {description}: {failures[-1]}")
+        return False
+    logger.info(f"{description} deleted successfully")
+    if step is not None:
+        journal.forget(step)
+    return True
+
+def settle_gateway(gateway, timeout):
+    """
+    Stops a background gateway pipeline before teardown deletes what it depends on: cancels it
+    if the gateway LRO was not submitted yet, then waits for it to finish either way.
+    Returns False if the gateway is still provisioning when `timeout` (or the teardown budget) runs out.
+    """
+    if not gateway.done() and gateway.cancel():
+        logger.info(f"Virtual Network Gateway '{gateway.vng_name}' cancelled before submission")
+    try:
+        gateway.result(timeout)
+    except TimeoutError:
+        logger.error(f"Virtual Network Gateway '{gateway.vng_name}' is still provisioning; "
+                     f"left in the journal for the next run")
+        return False
+    except Exception:
+        pass  # Failures were reported by the pipeline; teardown still removes what it created
+    return True
+
 def main():
     logger.info("Starting the Azure resource creation process")
 
     timeout = 300  # Timeout for resource provisioning
+    vng_timeout = int(os.getenv('AZURE_VNG_TIMEOUT', '2700'))  # Gateways take 30-45 minutes
+
+    # The whole run shares one budget: every step's wait, LRO and HTTP request is cut off when it runs out.
+    # Each step also gets its own child budget, so one slow step cannot use up the rest of the run.
+    run_deadline = AzureDeadline(float(os.getenv('AZURE_RUN_BUDGET', '3600')), name='run')
+    teardown_budget = float(os.getenv('AZURE_TEARDOWN_BUDGET', '900'))
+
+    # Metrics are opt-in: set AZURE_METRICS_FILE to export them in Prometheus text format
+    metrics_file = os.getenv('AZURE_METRICS_FILE')
+    metrics = AzureMetricsModule() if metrics_file else None
+    client_kwargs = metrics.client_kwargs() if metrics else {}
+
+    # Every client shares one keep-alive connection pool, sized for the concurrent work below
+    transport = AzureTransportModule(max_concurrency=int(os.getenv('AZURE_HTTP_POOL_SIZE', '32')))
+    client_kwargs.update(transport.client_kwargs())
+    client_kwargs = deadline_client_kwargs(client_kwargs)
+
+    # Profiling is opt-in: set AZURE_PROFILE_FILE to write a per-phase CPU/network/sleep and memory report
+    profile_file = os.getenv('AZURE_PROFILE_FILE')
+    profiler = AzureProfilingModule(mode=os.getenv('AZURE_PROFILE_MODE', 'cprofile'), enabled=bool(profile_file),
+                                    stats_dir=os.getenv('AZURE_PROFILE_STATS_DIR'))
+    client_kwargs = profiler.client_kwargs(client_kwargs)
+    profiler.mark('setup')
+
+    # VM sizes and image versions are looked up once per location and reused for AZURE_CATALOG_TTL seconds
+    catalog = AzureComputeCatalog(subscription_id, ttl=float(os.getenv('AZURE_CATALOG_TTL', '3600')), **client_kwargs)
 
     # Create instances of each Azure module class
-    vnet_module = AzureVNetModule(subscription_id)
-    vm_module = AzureVMModule(subscription_id)
-    nsg_module = AzureNSGModule(subscription_id)
-    subnet_module = AzureSubnetModule(subscription_id)
-    vng_module = AzureVNGModule(subscription_id)
-    route_table_module = AzureRouteTableModule(subscription_id)
-    scale_set_module = AzureScaleSetModule(subscription_id)
+    vnet_module = AzureVNetModule(subscription_id, **client_kwargs)
+    vm_module = AzureVMModule(subscription_id, catalog=catalog, **client_kwargs)
+    nsg_module = AzureNSGModule(subscription_id, **client_kwargs)
+    subnet_module = AzureSubnetModule(subscription_id, **client_kwargs)
+    vng_module = AzureVNGModule(subscription_id, **client_kwargs)
+    route_table_module = AzureRouteTableModule(subscription_id, **client_kwargs)
+    scale_set_module = AzureScaleSetModule(subscription_id, catalog=catalog, **client_kwargs)
+    watcher = AzureProvisioningWatcher(subscription_id, resource_group, **client_kwargs)
+
+    # Completed steps are skipped and in-flight LROs reattached when a previous run died midway
+    journal = AzureOperationJournal(os.getenv('AZURE_JOURNAL_PATH', 'azure_journal.sqlite'))
+
+    if metrics:
+        metrics.instrument(vnet_module, 'vnet')
+        metrics.instrument(vm_module, 'vm')
+        metrics.instrument(nsg_module, 'nsg')
+        metrics.instrument(subnet_module, 'subnet')
+        metrics.instrument(vng_module, 'vng')
+        metrics.instrument(route_table_module, 'route_table')
+        metrics.instrument(scale_set_module, 'scale_set')
+    for name, module in (('vnet', vnet_module), ('vm', vm_module), ('nsg', nsg_module), ('subnet', subnet_module),
+                         ('vng', vng_module), ('route_table', route_table_module), ('scale_set', scale_set_module),
+                         ('watcher', watcher)):
+        profiler.instrument(module, name)
 
     resources_created = {
         'vnet': False,
@@ -91,94 +181,169 @@ def main():
         'vm': False
     }
 
+    gateway = None
     try:
-        # Create VNet
-        vnet_name = os.getenv('AZURE_VNET_NAME', 'test-vnet')
-        call_azure_api(vnet_module.create_vnet, resource_group, vnet_name, location, "10.0.0.0/16", tags)
-        if wait_for_provisioning(vnet_module, resource_group, vnet_name, timeout):
-            resources_created['vnet'] = True
-        else:
-            raise Exception(f"VNet '{vnet_name}' failed to provision")
-
-        # Create Subnet (depends on VNet)
-        subnet_name = os.getenv('AZURE_SUBNET_NAME', 'test-subnet')
-        call_azure_api(subnet_module.create_subnet, resource_group, vnet_name, subnet_name, "10.0.1.0/24", tags)
-        if wait_for_provisioning(subnet_module, resource_group, subnet_name, timeout):
-            resources_created['subnet'] = True
-        else:
-            raise Exception(f"Subnet '{subnet_name}' failed to provision")
-
-        # Create NSG
-        nsg_name = os.getenv('AZURE_NSG_NAME', 'test-nsg')
-        call_azure_api(nsg_module.create_nsg, resource_group, nsg_name, location, tags)
-        if wait_for_provisioning(nsg_module, resource_group, nsg_name, timeout):
-            resources_created['nsg'] = True
-        else:
-            raise Exception(f"NSG '{nsg_name}' failed to provision")
-
-        # Create Virtual Network Gateway (depends on VNet)
-        vng_name = os.getenv('AZURE_VNG_NAME', 'test-vng')
-        call_azure_api(vng_module.create_virtual_network_gateway, resource_group, vng_name, location, "Vpn", "RouteBased", "subnet_id", "public_ip_id", tags)
-        if wait_for_provisioning(vng_module, resource_group, vng_name, timeout):
-            resources_created['vng'] = True
-        else:
-            raise Exception(f"Virtual Network Gateway '{vng_name}' failed to provision")
-
-        # Create Route Table (can be independent but might be used with Subnet)
-        rt_name = os.getenv('AZURE_RT_NAME', 'test-rt')
-        call_azure_api(route_table_module.create_route_table, resource_group, rt_name, location, tags)
-        if wait_for_provisioning(route_table_module, resource_group, rt_name, timeout):
-            resources_created['route_table'] = True
-        else:
-            raise Exception(f"Route Table '{rt_name}' failed to provision")
-
-        # Create Scale Set (can depend on Subnet)
-        scale_set_name = os.getenv('AZURE_SCALE_SET_NAME', 'test-scale-set')
-        call_azure_api(scale_set_module.create_scale_set, resource_group, scale_set_name, location, "Standard_DS1_v2", 2, "subnet_id", tags)
-        if wait_for_provisioning(scale_set_module, resource_group, scale_set_name, timeout):
-            resources_created['scale_set'] = True
-        else:
-            raise Exception(f"Scale Set '{scale_set_name}' failed to provision")
-
-        # Create VM (depends on Scale Set and Subnet)
-        vm_name = os.getenv('AZURE_VM_NAME', 'test-vm')
-        call_azure_api(vm_module.create_vm, resource_group, vm_name, location, "nic_id", "Standard_DS1_v2", tags)
-        if wait_for_provisioning(vm_module, resource_group, vm_name, timeout):
-            resources_created['vm'] = True
-        else:
-            raise Exception(f"VM '{vm_name}' failed to provision")
+        with run_deadline:
+            profiler.mark('vnet')
+            # Create VNet
+            with run_deadline.child(timeout, name='vnet'):
+                vnet_name = os.getenv('AZURE_VNET_NAME', 'test-vnet')
+                step_result, _ = journal.run_step('vnet', 'vnet', vnet_name, lambda token: vnet_module.create_vnet(
+                    resource_group, vnet_name, location, "10.0.0.0/16", tags=tags, wait=False,
+                    continuation_token=token), timeout)
+                if wait_for_provisioning(watcher, 'vnet', vnet_name, timeout, step_result):
+                    resources_created['vnet'] = True
+                else:
+                    raise Exception(f"VNet '{vnet_name}' failed to provision")
+
+            profiler.mark('vng')
+            # Start the Virtual Network Gateway pipeline next (depends on VNet). It is the longest
+            # operation, so its GatewaySubnet, public IP and LRO run in the background while the
+            # rest of the topology is built.
+            with run_deadline.child(vng_timeout, name='vng'):
+                vng_name = os.getenv('AZURE_VNG_NAME', 'test-vng')
+                if journal.is_completed('vng'):
+                    resources_created['vng'] = True
+                else:
+                    gateway = vng_module.provision_gateway(
+                        resource_group, vng_name, location, vnet_name,
+                        os.getenv('AZURE_GATEWAY_SUBNET_PREFIX', '10.0.255.0/27'), tags=tags,
+                        continuation_token=journal.pending_token('vng'),
+                        on_submitted=lambda operation: journal.record_operation('vng', 'vng', vng_name, operation))
+
+            profiler.mark('nsg')
+            # Create NSG
+            with run_deadline.child(timeout, name='nsg'):
+                nsg_name = os.getenv('AZURE_NSG_NAME', 'test-nsg')
+                step_result, _ = journal.run_step('nsg', 'nsg', nsg_name, lambda token: nsg_module.create_nsg(
+                    resource_group, nsg_name, location, tags=tags, wait=False, continuation_token=token), timeout)
+                if wait_for_provisioning(watcher, 'nsg', nsg_name, timeout, step_result):
+                    resources_created['nsg'] = True
+                else:
+                    raise Exception(f"NSG '{nsg_name}' failed to provision")
+
+            profiler.mark('route_table')
+            # Create Route Table (can be independent but might be used with Subnet)
+            with run_deadline.child(timeout, name='route_table'):
+                rt_name = os.getenv('AZURE_RT_NAME', 'test-rt')
+                step_result, _ = journal.run_step(
+                    'route_table', 'route_table', rt_name, lambda token: route_table_module.create_route_table(
+                        resource_group, rt_name, location, tags=tags, wait=False, continuation_token=token), timeout)
+                if wait_for_provisioning(watcher, 'route_table', rt_name, timeout, step_result):
+                    resources_created['route_table'] = True
+                else:
+                    raise Exception(f"Route Table '{rt_name}' failed to provision")
+
+            profiler.mark('subnet')
+            # Create Subnet (depends on VNet). Subnet writes queue on their VNet; wait so the GatewaySubnet goes first.
+            with run_deadline.child(timeout, name='subnet'):
+                if gateway is not None:
+                    gateway.dependencies_ready.wait(timeout)
+                subnet_name = os.getenv('AZURE_SUBNET_NAME', 'test-subnet')
+                step_result, _ = journal.run_step(
+                    'subnet', 'subnet', subnet_name, lambda token: subnet_module.create_subnet(
+                        resource_group, vnet_name, subnet_name, "10.0.1.0/24", wait=False, continuation_token=token),
+                    timeout)
+                if wait_for_provisioning(watcher, 'subnet', f"{vnet_name}/{subnet_name}", timeout, step_result):
+                    resources_created['subnet'] = True
+                else:
+                    raise Exception(f"Subnet '{subnet_name}' failed to provision")
+
+            profiler.mark('scale_set')
+            # Create Scale Set (can depend on Subnet)
+            with run_deadline.child(timeout, name='scale_set'):
+                scale_set_name = os.getenv('AZURE_SCALE_SET_NAME', 'test-scale-set')
+                step_result, _ = journal.run_step(
+                    'scale_set', 'scale_set', scale_set_name, lambda token: scale_set_module.create_scale_set(
+                        resource_group, scale_set_name, location, "Standard_DS1_v2", 2, "subnet_id", tags=tags,
+                        wait=False, continuation_token=token), timeout)
+                if wait_for_provisioning(watcher, 'scale_set', scale_set_name, timeout, step_result):
+                    resources_created['scale_set'] = True
+                else:
+                    raise Exception(f"Scale Set '{scale_set_name}' failed to provision")
+
+            profiler.mark('vm')
+            # Create VM (depends on Scale Set and Subnet)
+            with run_deadline.child(timeout, name='vm'):
+                vm_name = os.getenv('AZURE_VM_NAME', 'test-vm')
+                step_result, _ = journal.run_step('vm', 'vm', vm_name, lambda token: vm_module.create_vm(
+                    resource_group, vm_name, location, "nic_id", "Standard_DS1_v2", tags=tags, wait=False,
+                    continuation_token=token), timeout)
+                if wait_for_provisioning(watcher, 'vm', vm_name, timeout, step_result):
+                    resources_created['vm'] = True
+                else:
+                    raise Exception(f"VM '{vm_name}' failed to provision")
+
+            profiler.mark('vng_wait')
+            # Collect the Virtual Network Gateway, which kept provisioning in the background
+            with run_deadline.child(vng_timeout, name='vng_wait'):
+                if gateway is not None:
+                    try:
+                        vng_result = gateway.result(vng_timeout)
+                    except TimeoutError:
+                        raise  # Left as submitted in the journal; the next run reattaches to it
+                    except Exception as e:
+                        journal.record_failed('vng', e)
+                        raise Exception(f"Virtual Network Gateway '{vng_name}' failed to provision: {e}")
+                    journal.record_succeeded('vng', summarize_result(vng_result))
+                    resources_created['vng'] = True
 
     except Exception as e:
         logger.error(f"An error occurred during resource creation or deletion: {e}")
     finally:
-        # Cleanup logic here
-        if resources_created['vm']:
-            try:
-                call_azure_api(vm_module.delete_vm, resource_group, vm_name)
-                logger.info(f"VM '{vm_name}' deleted successfully")
-            except Exception as e:
-                logger.error(f"Failed to delete VM '{vm_name}': {e}")
-        
-        if resources_created['scale_set']:
-            try:
-                call_azure_api(scale_set_module.delete_scale_set, resource_group, scale_set_name)
-                logger.info(f"Scale Set '{scale_set_name}' deleted successfully")
-            except Exception as e:
-                logger.error(f"Failed to delete Scale Set '{scale_set_name}': {e}")
-        
-        if resources_created['subnet']:
-            try:
-                call_azure_api(subnet_module.delete_subnet, resource_group, vnet_name, subnet_name)
-                logger.info(f"Subnet '{subnet_name}' deleted successfully")
-            except Exception as e:
-                logger.error(f"Failed to delete Subnet '{subnet_name}': {e}")
-        
-        if resources_created['vnet']:
-            try:
-                call_azure_api(vnet_module.delete_vnet, resource_group, vnet_name)
-                logger.info(f"VNet '{vnet_name}' deleted successfully")
-            except Exception as e:
-                logger.error(f"Failed to delete VNet '{vnet_name}': {e}")
+        profiler.mark('teardown')
+        # Teardown gets its own budget, so it still runs after the run's deadline has ended
+        with AzureDeadline(teardown_budget, name='teardown'):
+            # Cleanup logic here
+            if resources_created['vm']:
+                delete_resource(journal, 'vm', f"VM '{vm_name}'", vm_module.delete_vm, resource_group, vm_name)
+
+            if resources_created['scale_set']:
+                delete_resource(journal, 'scale_set', f"Scale Set '{scale_set_name}'",
+                                scale_set_module.delete_scale_set, resource_group, scale_set_name)
+
+            # The gateway pipeline writes into the VNet, and the VNet cannot be deleted while a gateway is in it
+            gateway_settled = gateway is None or settle_gateway(gateway, vng_timeout)
+            if gateway_settled and (resources_created['vng'] or (gateway is not None and gateway.operation is not None)):
+                delete_resource(journal, 'vng', f"Virtual Network Gateway '{vng_name}'",
+                                vng_module.delete_virtual_network_gateway, resource_group, vng_name)
+
+            if gateway_settled and (resources_created['vng'] or (gateway is not None and gateway.public_ip_id)):
+                public_ip_name = gateway.public_ip_name if gateway is not None else vng_name + '-pip'
+                delete_resource(journal, None, f"Public IP '{public_ip_name}'", vng_module.delete_public_ip,
+                                resource_group, public_ip_name)
+
+            if resources_created['subnet']:
+                delete_resource(journal, 'subnet', f"Subnet '{subnet_name}'", subnet_module.delete_subnet,
+                                resource_group, vnet_name, subnet_name)
+
+            if resources_created['nsg']:
+                delete_resource(journal, 'nsg', f"NSG '{nsg_name}'", nsg_module.delete_nsg, resource_group, nsg_name)
+
+            if resources_created['route_table']:
+                delete_resource(journal, 'route_table', f"Route Table '{rt_name}'",
+                                route_table_module.delete_route_table, resource_group, rt_name)
+
+            if resources_created['vnet'] and gateway_settled:
+                delete_resource(journal, 'vnet', f"VNet '{vnet_name}'", vnet_module.delete_vnet, resource_group,
+                                vnet_name)
+
+        if metrics:
+            pool_stats = transport.pool_stats()
+            metrics.set_gauge('azure_http_pool_hits', pool_stats['pool_hits'])
+            metrics.set_gauge('azure_http_pool_misses', pool_stats['pool_misses'])
+            with open(metrics_file, 'w') as f:
+                f.write(metrics.render_prometheus())
+            logger.info(f"Metrics written to '{metrics_file}'")
+        if profile_file:
+            profiler.write_report(profile_file)
+        run_deadline.close()
+        journal.close()
+        transport.close()
 
 if __name__ == "__main__":
-    main()
+    if os.getenv('AZURE_MODE') == 'worker':
+        from modules.azure_job_queue_module import main as run_worker
+        run_worker()
+    else:
+        main()
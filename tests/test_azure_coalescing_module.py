@@ -0,0 +1,97 @@
+import threading
+import time
+import unittest
+from modules.azure_coalescing_module import AzureCoalescingModule
+from modules.azure_nsg_module import AzureNSGModule
+from unittest.mock import MagicMock
+
+
+class TestAzureCoalescingModule(unittest.TestCase):
+    def run_concurrently(self, count, target):
+        results = [None] * count
+
+        def run(index):
+            try:
+                results[index] = target()
+            except Exception as e:
+                results[index] = e
+
+        threads = [threading.Thread(target=run, args=(index,)) for index in range(count)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return results
+
+    def make_nsg_module(self, coalescer, delay=0.05):
+        module = AzureNSGModule('sub-1', credential=MagicMock())
+        module.network_client = MagicMock()
+
+        def get(resource_group_name, nsg_name):
+            time.sleep(delay)
+            return MagicMock(name=nsg_name)
+
+        module.network_client.network_security_groups.get.side_effect = get
+        return coalescer.coalesce(module, 'nsg')
+
+    def test_concurrent_identical_reads_share_one_request(self):
+        coalescer = AzureCoalescingModule()
+        module = self.make_nsg_module(coalescer)
+
+        results = self.run_concurrently(10, lambda: module.get_nsg('rg', 'web'))
+
+        self.assertEqual(module.network_client.network_security_groups.get.call_count, 1)
+        self.assertTrue(all(result is results[0] for result in results))
+        self.assertEqual(coalescer.stats()['coalesced'], 9)
+        module.get_nsg('rg', 'web')
+        self.assertEqual(module.network_client.network_security_groups.get.call_count, 2)
+
+    def test_different_arguments_are_not_shared(self):
+        module = self.make_nsg_module(AzureCoalescingModule(), delay=0)
+
+        module.get_nsg('rg', 'web')
+        module.get_nsg('rg', 'db')
+
+        self.assertEqual(module.network_client.network_security_groups.get.call_count, 2)
+
+    def test_errors_reach_every_waiter(self):
+        coalescer = AzureCoalescingModule()
+        calls = []
+
+        def read():
+            calls.append(1)
+            time.sleep(0.05)
+            raise RuntimeError('throttled')
+
+        results = self.run_concurrently(5, lambda: coalescer.call(('nsg', 'read'), read))
+
+        self.assertEqual(len(calls), 1)
+        self.assertTrue(all(isinstance(result, RuntimeError) for result in results))
+
+    def test_ttl_reuse_and_write_invalidation(self):
+        coalescer = AzureCoalescingModule(ttl=60)
+        module = self.make_nsg_module(coalescer, delay=0)
+        get = module.network_client.network_security_groups.get
+
+        module.get_nsg('rg', 'web')
+        module.get_nsg('rg', 'web')
+        self.assertEqual(get.call_count, 1)
+        self.assertEqual(coalescer.stats()['cache_hits'], 1)
+
+        module.delete_nsg_rule('rg', 'web', 'allow-https')
+        module.get_nsg('rg', 'web')
+        self.assertEqual(get.call_count, 2)
+
+    def test_failed_reads_are_not_cached(self):
+        coalescer = AzureCoalescingModule(ttl=60)
+        module = self.make_nsg_module(coalescer, delay=0)
+        module.network_client.network_security_groups.get.side_effect = Exception('boom')
+
+        self.assertIsNone(module.get_nsg('rg', 'web'))
+        self.assertIsNone(module.get_nsg('rg', 'web'))
+
+        self.assertEqual(module.network_client.network_security_groups.get.call_count, 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,128 @@
+import threading
+import time
+import unittest
+from types import SimpleNamespace
+from azure.core.exceptions import HttpResponseError
+from modules.azure_compute_catalog_module import AzureComputeCatalog, ComputeNotAvailableError
+from modules.azure_vm_module import AzureVMModule
+from unittest.mock import MagicMock
+
+
+def make_sku(name, zones=('1', '2', '3'), restrictions=(), resource_type='virtualMachines'):
+    return SimpleNamespace(
+        name=name, resource_type=resource_type,
+        location_info=[SimpleNamespace(location='switzerlandnorth', zones=list(zones))],
+        restrictions=list(restrictions))
+
+
+def location_restriction(reason='NotAvailableForSubscription'):
+    return SimpleNamespace(type='Location', reason_code=reason,
+                           restriction_info=SimpleNamespace(locations=['switzerlandnorth'], zones=None))
+
+
+def make_catalog(ttl=3600):
+    catalog = AzureComputeCatalog('sub-1', credential=MagicMock(), ttl=ttl)
+    catalog.compute_client = MagicMock()
+    catalog.compute_client.resource_skus.list.return_value = [
+        make_sku('Standard_DS1_v2'),
+        make_sku('Standard_D2s_v5', zones=('1', '2')),
+        make_sku('Standard_NC6', restrictions=[location_restriction()]),
+        make_sku('Premium_LRS', resource_type='disks'),
+    ]
+    catalog.compute_client.virtual_machine_images.list.return_value = [
+        SimpleNamespace(name=version) for version in ('18.04.202401161', '18.04.202309080', '18.04.202401091')
+    ]
+    return catalog
+
+
+class TestAzureComputeCatalog(unittest.TestCase):
+    def test_check_size(self):
+        catalog = make_catalog()
+
+        self.assertEqual(catalog.check_size('SwitzerlandNorth', 'standard_ds1_v2').name, 'Standard_DS1_v2')
+        self.assertRaises(ComputeNotAvailableError, catalog.check_size, 'switzerlandnorth', 'Standard_M416ms_v2')
+        self.assertRaises(ComputeNotAvailableError, catalog.check_size, 'switzerlandnorth', 'Standard_NC6')
+        self.assertRaises(ComputeNotAvailableError, catalog.check_size, 'switzerlandnorth', 'Premium_LRS')
+        catalog.check_size('switzerlandnorth', 'Standard_D2s_v5', zones=['2'])
+        self.assertRaises(ComputeNotAvailableError, catalog.check_size, 'switzerlandnorth', 'Standard_D2s_v5',
+                          zones=[3])
+        catalog.compute_client.resource_skus.list.assert_called_once_with(filter="location eq 'switzerlandnorth'")
+
+    def test_latest_resolves_once_for_concurrent_callers(self):
+        catalog = make_catalog()
+        images = catalog.compute_client.virtual_machine_images
+        listed = images.list.return_value
+        images.list.side_effect = lambda *args: time.sleep(0.05) or listed
+        resolved = []
+
+        threads = [threading.Thread(target=lambda: resolved.append(catalog.resolve_image('switzerlandnorth')))
+                   for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual({image['version'] for image in resolved}, {'18.04.202401161'})
+        images.list.assert_called_once_with('switzerlandnorth', 'Canonical', 'UbuntuServer', '18.04-LTS')
+        pinned = {'publisher': 'Canonical', 'offer': 'UbuntuServer', 'sku': '18.04-LTS', 'version': '18.04.1'}
+        self.assertEqual(catalog.resolve_image('switzerlandnorth', pinned), pinned)
+        self.assertEqual(images.list.call_count, 1)
+
+    def test_failed_refresh_serves_cached_entry(self):
+        catalog = make_catalog(ttl=0)
+        catalog.check_size('switzerlandnorth', 'Standard_DS1_v2')
+        catalog.compute_client.resource_skus.list.side_effect = HttpResponseError(message="Throttled")
+
+        self.assertEqual(catalog.check_size('switzerlandnorth', 'Standard_DS1_v2').name, 'Standard_DS1_v2')
+        catalog.refresh()
+        self.assertEqual(catalog.compute_client.resource_skus.list.call_count, 3)
+
+    def test_lookup_failures_fail_open(self):
+        catalog = make_catalog()
+        catalog.compute_client.resource_skus.list.side_effect = HttpResponseError(message="Throttled")
+        catalog.compute_client.virtual_machine_images.list.side_effect = HttpResponseError(message="Throttled")
+
+        image = catalog.resolve('switzerlandnorth', 'Standard_DS1_v2')
+
+        self.assertEqual(image['version'], 'latest')
+        catalog.compute_client.virtual_machine_images.list.side_effect = None
+        catalog.compute_client.virtual_machine_images.list.return_value = []
+        self.assertRaises(ComputeNotAvailableError, catalog.resolve_image, 'westeurope')
+
+    def test_background_refresh(self):
+        catalog = make_catalog()
+        catalog.vm_sizes('switzerlandnorth')
+
+        catalog.start(interval=0.01)
+        time.sleep(0.1)
+        catalog.stop()
+
+        self.assertGreater(catalog.compute_client.resource_skus.list.call_count, 1)
+
+    def test_vm_creates_fail_fast_and_share_one_version(self):
+        catalog = make_catalog()
+        vm_module = AzureVMModule('sub-1', credential=MagicMock(), catalog=catalog)
+        vm_module.compute_client = MagicMock()
+        vm_module.network_client = MagicMock()
+        virtual_machines = vm_module.compute_client.virtual_machines
+
+        self.assertIsNone(vm_module.create_vm('rg', 'vm-0', 'switzerlandnorth', 'nic-0', vm_size='Standard_NC6'))
+        virtual_machines.begin_create_or_update.assert_not_called()
+
+        vm_module.network_client.network_interfaces.begin_create_or_update.return_value.result.return_value.id = 'nic'
+        virtual_machines.begin_create_or_update.side_effect = \
+            lambda rg, name, params: MagicMock(**{'result.return_value': params})
+        results = list(vm_module.create_vm_fleet('rg', ['vm-%d' % i for i in range(4)], 'switzerlandnorth',
+                                                 'subnet'))
+
+        self.assertEqual({result.vm['storage_profile']['image_reference']['version'] for result in results},
+                         {'18.04.202401161'})
+        self.assertEqual(vm_module.image['version'], 'latest')
+        catalog.compute_client.virtual_machine_images.list.assert_called_once()
+
+        failed = list(vm_module.create_vm_fleet('rg', ['vm-4'], 'switzerlandnorth', 'subnet', vm_size='Standard_NC6'))
+        self.assertIsInstance(failed[0].error, ComputeNotAvailableError)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,88 @@
+import tempfile
+import time
+import unittest
+from azure.core.credentials import AccessToken
+from azure.identity import CredentialUnavailableError
+from modules import azure_credential_module
+from modules.azure_credential_module import AzureCredentialModule
+from unittest.mock import MagicMock, patch
+
+
+def unavailable():
+    credential = MagicMock()
+    credential.get_token.side_effect = CredentialUnavailableError('not configured')
+    return credential
+
+
+def working(expires_in=3600):
+    credential = MagicMock()
+    credential.get_token.return_value = AccessToken('token', int(time.time()) + expires_in)
+    return credential
+
+
+class TestAzureCredentialModule(unittest.TestCase):
+    def setUp(self):
+        self.cache_dir = tempfile.mkdtemp()
+        self.probe = unavailable()
+        self.cli = working()
+        self.credential_types = {
+            'managed_identity': MagicMock(return_value=self.probe),
+            'azure_cli': MagicMock(return_value=self.cli),
+        }
+        patcher = patch.dict(azure_credential_module.CREDENTIAL_TYPES, self.credential_types, clear=True)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_detects_credential_once_and_caches_token(self):
+        credential = AzureCredentialModule(cache_dir=self.cache_dir)
+
+        credential.get_token('https://management.azure.com/.default')
+        credential.get_token('https://management.azure.com/.default')
+
+        self.assertEqual(credential.credential_type, 'azure_cli')
+        self.probe.get_token.assert_called_once()
+        self.cli.get_token.assert_called_once()
+
+    def test_later_process_skips_detection(self):
+        AzureCredentialModule(cache_dir=self.cache_dir).get_token('scope')
+        self.credential_types['managed_identity'].reset_mock()
+
+        credential = AzureCredentialModule(cache_dir=self.cache_dir)
+        credential.get_token('scope')
+
+        self.credential_types['managed_identity'].assert_not_called()
+        self.assertEqual(credential.credential_type, 'azure_cli')
+
+    def test_refreshes_token_near_expiry(self):
+        self.cli.get_token.return_value = AccessToken('old', int(time.time()) + 60)
+        credential = AzureCredentialModule(cache_dir=self.cache_dir, refresh_margin=300)
+
+        credential.get_token('scope')
+        self.cli.get_token.return_value = AccessToken('new', int(time.time()) + 3600)
+
+        self.assertEqual(credential.get_token('scope').token, 'new')
+
+    def test_stale_choice_is_detected_again(self):
+        AzureCredentialModule(cache_dir=self.cache_dir).get_token('scope')
+        self.cli.get_token.side_effect = CredentialUnavailableError('logged out')
+        self.credential_types['managed_identity'].return_value = working()
+
+        credential = AzureCredentialModule(cache_dir=self.cache_dir)
+        credential.get_token('scope')
+
+        self.assertEqual(credential.credential_type, 'managed_identity')
+
+    def test_persists_tokens_for_other_processes(self):
+        persisted = {}
+        persistence = MagicMock()
+        persistence.save.side_effect = lambda data: persisted.update(data=data)
+        persistence.load.side_effect = lambda: persisted.get('data')
+        with patch.object(azure_credential_module, 'build_encrypted_persistence', return_value=persistence):
+            AzureCredentialModule(cache_dir=self.cache_dir).get_token('scope')
+            token = AzureCredentialModule(cache_dir=self.cache_dir).get_token('scope')
+
+        self.assertEqual(token.token, 'token')
+        self.cli.get_token.assert_called_once()
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,114 @@
+import threading
+import time
+import unittest
+from modules.azure_deadline_module import (AzureDeadline, DeadlineExceeded, _DeadlineCallPolicy, _DeadlineRetryPolicy,
+                                           bind, client_kwargs, current_deadline, remaining_timeout, wait_for)
+from modules.azure_operation_module import AzureOperation
+from types import SimpleNamespace
+from unittest.mock import MagicMock
+
+
+def make_poller(done=False, result=None):
+    poller = MagicMock()
+    poller.done.return_value = done
+    poller.result.return_value = result
+    poller.wait.side_effect = lambda timeout=None: time.sleep(min(timeout or 0, 0.01))
+    return poller
+
+
+def make_request(**options):
+    return SimpleNamespace(context=SimpleNamespace(options=dict(options)))
+
+
+class TestAzureDeadline(unittest.TestCase):
+    def test_remaining_timeout_is_capped_inside_a_deadline(self):
+        self.assertEqual(remaining_timeout(300), 300)
+        self.assertIsNone(remaining_timeout())
+        with AzureDeadline(10):
+            self.assertLessEqual(remaining_timeout(300), 10)
+            self.assertLessEqual(remaining_timeout(), 10)
+            self.assertEqual(remaining_timeout(1), 1)
+        self.assertIsNone(current_deadline())
+
+    def test_child_never_outlives_parent(self):
+        run = AzureDeadline(5)
+        step = run.child(300, name='vnet')
+        share = run.child(share=0.5)
+
+        self.assertLessEqual(step.remaining(), 5)
+        self.assertLessEqual(share.remaining(), 2.5)
+        run.cancel()
+        self.assertTrue(step.expired())
+        self.assertRaises(DeadlineExceeded, share.check)
+
+    def test_wait_for_stops_at_the_deadline(self):
+        self.assertEqual(wait_for(make_poller(done=True, result='vnet'), 1), 'vnet')
+        with AzureDeadline(0.05):
+            start = time.monotonic()
+            with self.assertRaises(DeadlineExceeded):
+                wait_for(make_poller(done=False), 300)
+        self.assertLess(time.monotonic() - start, 1)
+
+    def test_expiry_detaches_pending_operations(self):
+        with AzureDeadline(0.05) as deadline:
+            running = AzureOperation(make_poller(done=False), "Creation of VNG 'vng'")
+            finished = AzureOperation(make_poller(done=True), "Creation of NSG 'nsg'")
+        time.sleep(0.2)
+
+        self.assertEqual(deadline.reason, 'expired')
+        self.assertTrue(running.cancelled())
+        self.assertFalse(finished.cancelled())
+
+    def test_expired_deadline_bounds_operation_result(self):
+        poller = make_poller(done=False)
+        poller.result.side_effect = lambda: time.sleep(3)
+        with AzureDeadline(0.2):
+            operation = AzureOperation(poller, "Creation of VNG 'vng'")
+            start = time.monotonic()
+            with self.assertRaises(DeadlineExceeded):
+                operation.result(None)
+        self.assertLess(time.monotonic() - start, 1)
+        # Once detached, later calls fail the same way, so journaled steps stay resumable.
+        self.assertRaises(DeadlineExceeded, operation.result)
+        poller.result.assert_not_called()
+
+    def test_cancel_wakes_waiters(self):
+        deadline = AzureDeadline(300)
+        threading.Timer(0.05, deadline.cancel).start()
+
+        start = time.monotonic()
+        self.assertTrue(deadline.wait(10))
+        self.assertLess(time.monotonic() - start, 1)
+
+    def test_bound_threads_see_the_deadline(self):
+        seen = []
+        with AzureDeadline(10) as deadline:
+            thread = threading.Thread(target=bind(lambda: seen.append(current_deadline())))
+        thread.start()
+        thread.join()
+
+        self.assertEqual(seen, [deadline])
+
+    def test_policies_bound_requests(self):
+        kwargs = client_kwargs({'per_call_policies': ['metrics']})
+        self.assertEqual(kwargs['per_call_policies'][0], 'metrics')
+        self.assertEqual(len(kwargs['per_retry_policies']), 1)
+
+        request = make_request(read_timeout=300)
+        _DeadlineCallPolicy().on_request(request)
+        self.assertEqual(request.context.options, {'read_timeout': 300})
+        with AzureDeadline(5):
+            _DeadlineCallPolicy().on_request(request)
+            _DeadlineRetryPolicy().on_request(request)
+        self.assertLessEqual(request.context.options['timeout'], 5)
+        self.assertLessEqual(request.context.options['read_timeout'], 5)
+        self.assertLessEqual(request.context.options['connection_timeout'], 5)
+
+        deadline = AzureDeadline(5)
+        deadline.cancel()
+        with deadline:
+            self.assertRaises(DeadlineExceeded, _DeadlineCallPolicy().on_request, make_request())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,66 @@
+import os
+import tempfile
+import unittest
+from types import SimpleNamespace
+from unittest.mock import MagicMock
+from modules.azure_export_module import AzureExportModule, pyarrow
+
+
+def vnet(name, subnets):
+    return SimpleNamespace(
+        id=f'/vnets/{name}', name=name, location='switzerlandnorth', provisioning_state='Succeeded', etag='1',
+        tags={'env': 'test'}, address_space=SimpleNamespace(address_prefixes=['10.0.0.0/16']),
+        subnets=[SimpleNamespace(id=f'/vnets/{name}/subnets/{subnet}', name=subnet, address_prefix=prefix,
+                                 network_security_group=None, route_table=SimpleNamespace(id='/rt'))
+                 for subnet, prefix in subnets],
+    )
+
+
+class TestAzureExportModule(unittest.TestCase):
+    def setUp(self):
+        self.export_module = AzureExportModule('test_subscription_id', batch_size=2)
+        self.export_module.network_client = MagicMock()
+        self.export_module.compute_client = MagicMock()
+        self.export_module.network_client.virtual_networks.list.return_value = iter([
+            vnet('hub', [('app', '10.0.1.0/24'), ('db', '10.0.2.0/24'), ('web', '10.0.3.0/24')]),
+        ])
+
+    def test_rows_flatten_child_resources(self):
+        rows = list(self.export_module.rows('test_rg', 'subnet'))
+
+        self.assertEqual([row['name'] for row in rows], ['app', 'db', 'web'])
+        self.assertEqual(rows[0]['vnet_name'], 'hub')
+        self.assertEqual(rows[0]['address_prefixes'], ['10.0.1.0/24'])
+        self.assertEqual(rows[0]['route_table_id'], '/rt')
+        self.assertEqual(rows[0]['location'], 'switzerlandnorth')
+
+    def test_unsupported_type(self):
+        with self.assertRaises(ValueError):
+            list(self.export_module.rows('test_rg', 'bastion'))
+
+    @unittest.skipIf(pyarrow is None, 'pyarrow is not installed')
+    def test_export_writes_partitioned_parquet_with_one_listing(self):
+        import pyarrow.parquet as parquet
+
+        with tempfile.TemporaryDirectory() as root:
+            result = self.export_module.export(root, ['test_rg'], ['vnet', 'subnet'])
+
+            self.export_module.network_client.virtual_networks.list.assert_called_once_with('test_rg')
+            self.assertEqual(result.rows, {'vnet': 1, 'subnet': 3})
+            path = os.path.join(root, 'subscription_id=test_subscription_id', 'resource_group=test_rg',
+                                'type=subnet', 'part-00000.parquet')
+            self.assertIn(path, result.files)
+            parquet_file = parquet.ParquetFile(path)
+            self.assertEqual(parquet_file.metadata.num_row_groups, 2)
+            self.assertEqual(parquet_file.read().column('name').to_pylist(), ['app', 'db', 'web'])
+
+    @unittest.skipIf(pyarrow is None, 'pyarrow is not installed')
+    def test_record_batches(self):
+        batches = list(self.export_module.record_batches('test_rg', 'vnet'))
+
+        self.assertEqual(batches[0].num_rows, 1)
+        self.assertEqual(batches[0].column('tags').to_pylist(), [[('env', 'test')]])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,224 @@
+import inspect
+import json
+import os
+import tempfile
+import time
+import unittest
+from azure.core.exceptions import HttpResponseError
+from modules.azure_job_queue_module import AzureJobQueue, AzureJobWorker, AzureRedisJobQueue, ModuleJobHandler
+from azure.mgmt.network.models import VirtualNetwork
+from modules.azure_scale_set_module import AzureScaleSetModule
+from modules.azure_vnet_module import AzureVNetModule
+from types import SimpleNamespace
+from unittest.mock import MagicMock
+
+try:
+    import fakeredis
+except ImportError:
+    fakeredis = None
+
+
+class JobQueueTests:
+    """Behavior shared by every queue backend; subclasses provide make_queue."""
+
+    def test_enqueue_is_idempotent(self):
+        queue = self.make_queue()
+        first = queue.enqueue('provision', 'sub-1', {'vnet': 'a'}, idempotency_key='vnet-a')
+        second = queue.enqueue('provision', 'sub-1', {'vnet': 'a'}, idempotency_key='vnet-a')
+
+        self.assertEqual(first, second)
+        self.assertEqual(queue.counts(), {'pending': 1})
+
+    def test_lease_respects_subscription_limit(self):
+        queue = self.make_queue(subscription_limits={'sub-1': 1})
+        queue.enqueue('provision', 'sub-1', {'n': 1})
+        queue.enqueue('provision', 'sub-1', {'n': 2})
+        queue.enqueue('sync', 'sub-2', {'n': 3})
+
+        first = queue.lease('worker-a')
+        second = queue.lease('worker-b')
+
+        self.assertEqual(first.payload, {'n': 1})
+        self.assertEqual(second.payload, {'n': 3})
+        self.assertIsNone(queue.lease('worker-c'))
+        queue.complete(first.job_id, first.lease_token)
+        self.assertEqual(queue.lease('worker-c').payload, {'n': 2})
+
+    def test_expired_lease_is_fenced(self):
+        queue = self.make_queue(lease_seconds=0.05)
+        queue.enqueue('teardown', 'sub-1', {})
+        stale = queue.lease('worker-a')
+        time.sleep(0.1)
+
+        fresh = queue.lease('worker-b')
+
+        self.assertEqual(fresh.job_id, stale.job_id)
+        self.assertEqual(fresh.attempts, 2)
+        self.assertFalse(queue.complete(stale.job_id, stale.lease_token))
+        self.assertFalse(queue.heartbeat(stale.job_id, stale.lease_token))
+        self.assertTrue(queue.complete(fresh.job_id, fresh.lease_token, {'ok': True}))
+        self.assertEqual(queue.get(fresh.job_id).result, {'ok': True})
+
+    def test_failed_job_retries_then_fails(self):
+        queue = self.make_queue(max_attempts=2, retry_delay=0)
+        job_id = queue.enqueue('provision', 'sub-1', {})
+
+        job = queue.lease('worker-a')
+        queue.checkpoint(job.job_id, job.lease_token, {'continuation_token': 't'})
+        queue.fail(job.job_id, job.lease_token, 'throttled')
+        job = queue.lease('worker-a')
+        self.assertEqual(job.checkpoint, {'continuation_token': 't'})
+        queue.fail(job.job_id, job.lease_token, 'throttled again')
+
+        self.assertIsNone(queue.lease('worker-a'))
+        self.assertEqual(queue.get(job_id).status, 'failed')
+        self.assertEqual(queue.get(job_id).error, 'throttled again')
+
+    def test_worker_runs_handler_and_checkpoints(self):
+        queue = self.make_queue()
+        job_id = queue.enqueue('sync', 'sub-1', {'rg': 'rg'})
+
+        def handler(job, checkpoint):
+            checkpoint({'step': 1})
+            return {'synced': job.payload['rg']}
+
+        worker = AzureJobWorker(queue, {'sync': handler}, worker_id='worker-a', heartbeat_interval=0.01)
+        self.assertEqual(worker.run(max_jobs=1), 1)
+
+        job = queue.get(job_id)
+        self.assertEqual(job.status, 'succeeded')
+        self.assertEqual(job.result, {'synced': 'rg'})
+        self.assertEqual(job.checkpoint, {'step': 1})
+
+    def test_unserializable_result_fails_the_job(self):
+        queue = self.make_queue()
+        job_id = queue.enqueue('sync', 'sub-1', {})
+
+        worker = AzureJobWorker(queue, {'sync': lambda job, checkpoint: object()}, worker_id='worker-a')
+        self.assertEqual(worker.run(max_jobs=1), 1)
+
+        job = queue.get(job_id)
+        self.assertEqual(job.status, 'failed')
+        self.assertIn('not JSON serializable', job.error)
+
+
+class TestAzureJobQueue(JobQueueTests, unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.queues = []
+
+    def tearDown(self):
+        for queue in self.queues:
+            queue.close()
+        self.directory.cleanup()
+
+    def make_queue(self, **kwargs):
+        queue = AzureJobQueue(os.path.join(self.directory.name, 'jobs.sqlite'), **kwargs)
+        self.queues.append(queue)
+        return queue
+
+    def test_jobs_survive_restart(self):
+        job_id = self.make_queue().enqueue('provision', 'sub-1', {'vnet': 'a'})
+
+        job = self.make_queue().lease('worker-a')
+
+        self.assertEqual(job.job_id, job_id)
+        self.assertEqual(job.payload, {'vnet': 'a'})
+
+
+@unittest.skipIf(fakeredis is None, "fakeredis is not installed")
+class TestAzureRedisJobQueue(JobQueueTests, unittest.TestCase):
+    def setUp(self):
+        self.client = fakeredis.FakeRedis()
+
+    def make_queue(self, **kwargs):
+        return AzureRedisJobQueue(self.client, **kwargs)
+
+
+class TestModuleJobHandler(unittest.TestCase):
+    def make_job(self, checkpoint=None):
+        payload = {'module': 'vnet', 'method': 'create_vnet', 'args': ['rg', 'vnet', 'eastus', '10.0.0.0/16']}
+        return SimpleNamespace(subscription_id='sub-1', payload=payload, checkpoint=checkpoint)
+
+    def make_handler(self):
+        def create_vnet(resource_group_name, vnet_name, location, address_prefix, wait=True, continuation_token=None):
+            return operation
+
+        operation = MagicMock()
+        operation.poller.continuation_token.return_value = 'token-1'
+        operation.result.return_value = SimpleNamespace(id='/subscriptions/sub-1/vnet', name='vnet')
+        module = SimpleNamespace(create_vnet=MagicMock(wraps=create_vnet))
+        module.create_vnet.__signature__ = inspect.signature(create_vnet)
+        handler = ModuleJobHandler(timeout=10)
+        handler.modules[('vnet', 'sub-1')] = module
+        return handler, module
+
+    def test_checkpoints_continuation_token(self):
+        handler, module = self.make_handler()
+        checkpoint = MagicMock()
+
+        result = handler(self.make_job(), checkpoint)
+
+        self.assertEqual(result, {'id': '/subscriptions/sub-1/vnet', 'name': 'vnet'})
+        module.create_vnet.assert_called_once_with('rg', 'vnet', 'eastus', '10.0.0.0/16', wait=False)
+        checkpoint.assert_called_once_with({'continuation_token': 'token-1'})
+
+    def test_retry_reattaches_to_operation(self):
+        handler, module = self.make_handler()
+        checkpoint = MagicMock()
+
+        handler(self.make_job({'continuation_token': 'token-1'}), checkpoint)
+
+        module.create_vnet.assert_called_once_with('rg', 'vnet', 'eastus', '10.0.0.0/16', wait=False,
+                                                   continuation_token='token-1')
+        checkpoint.assert_not_called()
+
+    def test_failed_operation_clears_continuation_token(self):
+        handler, module = self.make_handler()
+        operation = module.create_vnet('rg', 'vnet', 'eastus', '10.0.0.0/16')
+        operation.result.side_effect = HttpResponseError(message="InternalServerError")
+        checkpoint = MagicMock()
+
+        self.assertRaises(HttpResponseError, handler, self.make_job({'continuation_token': 'token-1'}), checkpoint)
+        checkpoint.assert_called_once_with({})
+
+        operation.result.side_effect = TimeoutError()
+        checkpoint.reset_mock()
+        self.assertRaises(TimeoutError, handler, self.make_job({'continuation_token': 'token-1'}), checkpoint)
+        checkpoint.assert_not_called()
+
+    def test_list_results_are_serialized_per_item(self):
+        vnet = AzureVNetModule('sub-1', credential=MagicMock())
+        vnet.network_client = MagicMock()
+        vnet.network_client.virtual_networks.list.return_value = [
+            VirtualNetwork(id='/subscriptions/sub-1/hub', location='eastus'),
+            VirtualNetwork(id='/subscriptions/sub-1/spoke', location='westus')]
+        handler = ModuleJobHandler(timeout=10)
+        handler.modules[('vnet', 'sub-1')] = vnet
+        job = SimpleNamespace(subscription_id='sub-1', checkpoint=None,
+                              payload={'module': 'vnet', 'method': 'list_vnets', 'args': ['rg']})
+
+        result = handler(job, MagicMock())
+
+        self.assertEqual(json.loads(json.dumps(result)),
+                         [{'id': '/subscriptions/sub-1/hub'}, {'id': '/subscriptions/sub-1/spoke'}])
+
+    def test_methods_without_wait_fail_only_on_reported_errors(self):
+        scale_set = AzureScaleSetModule('sub-1', credential=MagicMock())
+        scale_set.compute_client = MagicMock()
+        scale_set.compute_client.virtual_machine_scale_sets.begin_create_or_update.return_value.result.return_value = \
+            None
+        handler = ModuleJobHandler(timeout=10)
+        handler.modules[('scale_set', 'sub-1')] = scale_set
+        job = SimpleNamespace(subscription_id='sub-1', checkpoint=None,
+                              payload={'module': 'scale_set', 'method': 'scale_set', 'args': ['rg', 'ss', 3]})
+
+        self.assertIsNone(handler(job, MagicMock()))
+
+        scale_set.compute_client.virtual_machine_scale_sets.begin_create_or_update.side_effect = \
+            HttpResponseError(message="QuotaExceeded")
+        self.assertRaises(HttpResponseError, handler, job, MagicMock())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,83 @@
+import os
+import tempfile
+import unittest
+from modules.azure_journal_module import AzureOperationJournal
+from unittest.mock import MagicMock
+
+
+class TestAzureOperationJournal(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, 'journal.sqlite')
+        self.journal = AzureOperationJournal(self.path)
+
+    def tearDown(self):
+        self.journal.close()
+        self.directory.cleanup()
+
+    def make_operation(self, token='token-1'):
+        operation = MagicMock()
+        operation.poller.continuation_token.return_value = token
+        operation.result.return_value = MagicMock(id='/subscriptions/s/vng', provisioning_state='Succeeded')
+        operation.result.return_value.name = 'test_vng'
+        return operation
+
+    def test_run_step_records_success(self):
+        operation = self.make_operation()
+        submit = MagicMock(return_value=operation)
+
+        _, resumed = self.journal.run_step('vng', 'vng', 'test_vng', submit, timeout=10)
+
+        self.assertFalse(resumed)
+        submit.assert_called_once_with(None)
+        entry = self.journal.get('vng')
+        self.assertEqual(entry['status'], 'succeeded')
+        self.assertEqual(entry['continuation_token'], 'token-1')
+        self.assertEqual(entry['result']['name'], 'test_vng')
+
+    def test_completed_step_is_skipped_after_restart(self):
+        self.journal.run_step('vng', 'vng', 'test_vng', MagicMock(return_value=self.make_operation()))
+        self.journal.close()
+
+        self.journal = AzureOperationJournal(self.path)
+        submit = MagicMock()
+        result, resumed = self.journal.run_step('vng', 'vng', 'test_vng', submit)
+
+        submit.assert_not_called()
+        self.assertTrue(resumed)
+        self.assertEqual(result['provisioning_state'], 'Succeeded')
+
+    def test_in_flight_step_reattaches_with_continuation_token(self):
+        operation = self.make_operation()
+        operation.result.side_effect = TimeoutError("still provisioning")
+        with self.assertRaises(TimeoutError):
+            self.journal.run_step('vng', 'vng', 'test_vng', MagicMock(return_value=operation), timeout=1)
+        self.assertEqual(self.journal.get('vng')['status'], 'submitted')
+
+        submit = MagicMock(return_value=self.make_operation())
+        _, resumed = self.journal.run_step('vng', 'vng', 'test_vng', submit)
+
+        submit.assert_called_once_with('token-1')
+        self.assertTrue(resumed)
+        self.assertEqual(self.journal.get('vng')['status'], 'succeeded')
+
+    def test_failed_step_is_resubmitted(self):
+        operation = self.make_operation()
+        operation.result.side_effect = Exception("Conflict")
+        with self.assertRaises(Exception):
+            self.journal.run_step('vm', 'vm', 'test_vm', MagicMock(return_value=operation))
+        self.assertEqual(self.journal.get('vm')['status'], 'failed')
+
+        submit = MagicMock(return_value=self.make_operation(token='token-2'))
+        self.journal.run_step('vm', 'vm', 'test_vm', submit)
+        submit.assert_called_once_with(None)
+
+    def test_forget(self):
+        self.journal.run_step('vnet', 'vnet', 'test_vnet', MagicMock(return_value=self.make_operation()))
+        self.journal.forget('vnet')
+        self.assertIsNone(self.journal.get('vnet'))
+        self.assertEqual(self.journal.entries(), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,123 @@
+import time
+import unittest
+from modules.azure_metrics_module import AzureMetricsModule, LRO_TRACKING_SECONDS
+from modules.azure_nsg_module import AzureNSGModule
+from unittest.mock import MagicMock
+from azure.core.pipeline import PipelineRequest, PipelineResponse, PipelineContext
+from azure.core.rest import HttpRequest
+
+
+class TestAzureMetricsModule(unittest.TestCase):
+    def setUp(self):
+        self.metrics = AzureMetricsModule(tracer=False)
+        self.nsg_module = AzureNSGModule('test_subscription_id')
+        self.nsg_module.network_client = MagicMock()
+        self.metrics.instrument(self.nsg_module, 'nsg')
+
+    def test_instrument_records_success(self):
+        self.nsg_module.create_nsg('test_rg', 'test_nsg', 'switzerlandnorth')
+
+        self.assertEqual(self.metrics.histogram_count('azure_operation_duration_seconds', operation='create_nsg',
+                                                      resource_type='nsg', result='success'), 1)
+        self.assertEqual(self.metrics.histogram_count('azure_lro_duration_seconds',
+                                                      operation='begin_create_or_update',
+                                                      resource_type='nsg', result='success'), 1)
+
+    def test_instrument_records_swallowed_failure(self):
+        poller = MagicMock()
+        poller.result.side_effect = Exception("Conflict")
+        self.nsg_module.network_client._client.network_security_groups.begin_delete.return_value = poller
+
+        self.nsg_module.delete_nsg('test_rg', 'test_nsg')
+
+        self.assertEqual(self.metrics.counter_value('azure_operations_total', operation='delete_nsg',
+                                                    resource_type='nsg', result='failure'), 1)
+
+    def _pipeline_exchange(self, method, url, status_code, headers=None, context=None):
+        request = PipelineRequest(HttpRequest(method, url), context or PipelineContext(None))
+        http_response = MagicMock(status_code=status_code, headers=headers or {})
+        http_response.text.return_value = '{}'
+        return request, PipelineResponse(request.http_request, http_response, request.context)
+
+    def test_policies_count_retries_throttles_polls_and_quota(self):
+        call_policy, retry_policy = (self.metrics.client_kwargs()['per_call_policies'][0],
+                                     self.metrics.client_kwargs()['per_retry_policies'][0])
+        url = ('https://management.azure.com/subscriptions/s/resourceGroups/rg/providers/'
+               'Microsoft.Network/networkSecurityGroups/nsg?api-version=2023-09-01')
+        request, throttled = self._pipeline_exchange('PUT', url, 429)
+        retry_policy.on_request(request)
+        retry_policy.on_response(request, throttled)
+        _, accepted = self._pipeline_exchange('PUT', url, 201, headers={
+            'azure-asyncoperation': 'https://management.azure.com/operations/1',
+            'x-ms-ratelimit-remaining-subscription-writes': '1199',
+        }, context=request.context)
+        retry_policy.on_request(request)
+        retry_policy.on_response(request, accepted)
+        call_policy.on_response(request, accepted)
+
+        poll_request, _ = self._pipeline_exchange('GET', 'https://management.azure.com/operations/1', 200)
+        retry_policy.on_request(poll_request)
+
+        self.assertEqual(self.metrics.counter_value('azure_throttled_requests_total',
+                                                    resource_type='networkSecurityGroups'), 1)
+        self.assertEqual(self.metrics.counter_value('azure_retries_total',
+                                                    resource_type='networkSecurityGroups'), 1)
+        self.assertEqual(self.metrics.counter_value('azure_poll_requests_total',
+                                                    resource_type='networkSecurityGroups'), 1)
+        self.assertEqual(self.metrics.gauge_value('azure_ratelimit_remaining', header='subscription-writes'), 1199)
+
+    def test_pending_lros_are_dropped_on_failed_polls_and_age(self):
+        call_policy, retry_policy = (self.metrics.client_kwargs()['per_call_policies'][0],
+                                     self.metrics.client_kwargs()['per_retry_policies'][0])
+        url = ('https://management.azure.com/subscriptions/s/resourceGroups/rg/providers/'
+               'Microsoft.Network/networkSecurityGroups/nsg?api-version=2023-09-01')
+        for index in range(2):
+            request, accepted = self._pipeline_exchange('PUT', url, 201, headers={
+                'azure-asyncoperation': f'https://management.azure.com/operations/{index}'})
+            retry_policy.on_request(request)
+            retry_policy.on_response(request, accepted)
+        self.assertEqual(len(self.metrics._pending_lros), 2)
+
+        poll_request, _ = self._pipeline_exchange('GET', 'https://management.azure.com/operations/0', 200)
+        call_policy.on_exception(poll_request)
+        self.assertEqual(list(self.metrics._pending_lros), ['https://management.azure.com/operations/1'])
+
+        self.metrics._pending_lros['https://management.azure.com/operations/1']['started'] -= \
+            LRO_TRACKING_SECONDS + 1
+        request, accepted = self._pipeline_exchange('PUT', url, 201, headers={
+            'azure-asyncoperation': 'https://management.azure.com/operations/2'})
+        retry_policy.on_request(request)
+        retry_policy.on_response(request, accepted)
+        self.assertEqual(list(self.metrics._pending_lros), ['https://management.azure.com/operations/2'])
+
+    def test_generator_operations_are_timed_over_iteration(self):
+        class Fleet:
+            def create_fleet(self, count):
+                for index in range(count):
+                    time.sleep(0.02)
+                    yield index
+
+        fleet = self.metrics.instrument(Fleet(), 'vm')
+        results = fleet.create_fleet(3)
+        self.assertEqual(self.metrics.histogram_count('azure_operation_duration_seconds', operation='create_fleet',
+                                                      resource_type='vm', result='success'), 0)
+
+        self.assertEqual(list(results), [0, 1, 2])
+        self.assertEqual(self.metrics.histogram_count('azure_operation_duration_seconds', operation='create_fleet',
+                                                      resource_type='vm', result='success'), 1)
+        histogram = self.metrics._histograms[('azure_operation_duration_seconds', (
+            ('operation', 'create_fleet'), ('resource_type', 'vm'), ('result', 'success')))]
+        self.assertGreaterEqual(histogram.sum, 0.05)
+
+    def test_render_prometheus(self):
+        self.nsg_module.get_nsg('test_rg', 'test_nsg')
+
+        output = self.metrics.render_prometheus()
+        self.assertIn('# TYPE azure_operation_duration_seconds histogram', output)
+        self.assertIn('azure_operation_duration_seconds_count{operation="get_nsg",resource_type="nsg",'
+                      'result="success"} 1', output)
+        self.assertIn('le="+Inf"', output)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,51 @@
+import unittest
+from modules.azure_nsg_compaction_module import compact_rules, compaction_report, security_rule_params
+
+
+def rule(name, priority, access, destination='*', port='*', source='*', direction='Inbound'):
+    return {
+        'name': name, 'priority': priority, 'direction': direction, 'access': access, 'protocol': 'Tcp',
+        'source_address_prefix': source, 'destination_address_prefix': destination,
+        'source_port_range': '*', 'destination_port_range': port,
+    }
+
+
+class TestAzureNSGCompactionModule(unittest.TestCase):
+    def test_security_rule_params_defaults_unset_sides_to_any(self):
+        params = security_rule_params('Tcp', 'Allow', 'Inbound', 100, destination_port_ranges=['443'])
+
+        self.assertEqual(params['source_address_prefix'], '*')
+        self.assertEqual(params['destination_port_ranges'], ['443'])
+        self.assertNotIn('destination_port_range', params)
+
+    def test_merges_across_dimensions(self):
+        rules = [rule(f'r{index}', 100 + index, 'Allow', destination, port)
+                 for index, (destination, port) in enumerate(
+                     [('10.0.1.0/24', '80'), ('10.0.1.0/24', '443'), ('10.0.2.0/24', '80'), ('10.0.2.0/24', '443')])]
+
+        compacted, = compact_rules(rules)
+
+        self.assertEqual((compacted['name'], compacted['priority']), ('r0', 100))
+        self.assertEqual(compacted['destination_address_prefixes'], ['10.0.1.0/24', '10.0.2.0/24'])
+        self.assertEqual(compacted['destination_port_ranges'], ['443', '80'])
+
+    def test_does_not_merge_over_opposite_overlapping_rule(self):
+        rules = [rule('allow-a', 100, 'Allow', '10.0.1.0/24', '22'),
+                 rule('deny-ssh', 110, 'Deny', '*', '22', source='203.0.113.0/24'),
+                 rule('allow-b', 120, 'Allow', '10.0.2.0/24', '22')]
+
+        self.assertEqual(len(compact_rules(rules)), 3)
+
+    def test_merges_over_non_overlapping_rule(self):
+        rules = [rule('allow-a', 100, 'Allow', '10.0.1.0/24', '22'),
+                 rule('deny-rdp', 110, 'Deny', '*', '3389'),
+                 rule('allow-b', 120, 'Allow', '10.0.2.0/24', '22')]
+
+        report = compaction_report(rules)
+
+        self.assertEqual(report.removed, ['allow-b'])
+        self.assertEqual([params['name'] for params in report.compacted], ['allow-a', 'deny-rdp'])
+
+
+if __name__ == '__main__':
+    unittest.main()
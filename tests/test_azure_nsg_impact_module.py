@@ -0,0 +1,66 @@
+import unittest
+from modules.azure_nsg_impact_module import AzureNSGImpactModule, Flow, normalize_rule, parse_ports
+
+
+def rule(name, priority, access, destination='*', port='*', direction='Inbound', source='*'):
+    return {
+        'name': name, 'priority': priority, 'direction': direction, 'access': access, 'protocol': 'Tcp',
+        'source_address_prefix': source, 'destination_address_prefix': destination,
+        'source_port_range': '*', 'destination_port_range': port,
+    }
+
+
+def flow(destination, port, source='203.0.113.7', direction='Inbound'):
+    return Flow(direction, 'Tcp', source, 50000, destination, port)
+
+
+class TestAzureNSGImpactModule(unittest.TestCase):
+    def setUp(self):
+        self.analyzer = AzureNSGImpactModule([
+            rule('allow-web', 100, 'Allow', '10.0.1.0/24', '443'),
+            rule('allow-ssh', 110, 'Allow', '10.0.2.0/24', '22'),
+        ])
+        self.analyzer.record_flows([
+            flow('10.0.1.5', 443),
+            flow('10.0.2.5', 22),
+            flow('10.0.2.6', 22, source='198.51.100.1'),
+            flow('10.9.0.1', 8080),
+        ])
+
+    def test_parse_ports(self):
+        self.assertEqual(parse_ports(['80', '1000-2000']), ((80, 80), (1000, 2000)))
+        self.assertEqual(parse_ports(['*']), ((0, 65535),))
+
+    def test_evaluate_uses_priority_order(self):
+        self.assertEqual(self.analyzer.evaluate(flow('10.0.1.5', 443)), ('Allow', 'allow-web'))
+        self.assertEqual(self.analyzer.evaluate(flow('10.9.0.1', 8080)), ('Deny', 'DenyAll'))
+
+    def test_added_rule_only_evaluates_overlapping_flows(self):
+        report = self.analyzer.analyze(add=[rule('deny-ssh', 105, 'Deny', '10.0.2.0/24', '22', source='198.51.100.0/24')])
+
+        self.assertEqual(report.evaluated, 1)
+        self.assertEqual([(impact.flow.source_ip, impact.old_access, impact.new_access, impact.new_rule)
+                          for impact in report.changed],
+                         [('198.51.100.1', 'Allow', 'Deny', 'deny-ssh')])
+
+    def test_removed_rule_falls_through_to_deny(self):
+        report = self.analyzer.analyze(remove=['allow-web'])
+
+        self.assertEqual([(impact.old_rule, impact.new_rule) for impact in report.changed],
+                         [('allow-web', 'DenyAll')])
+
+    def test_apply_commits_change(self):
+        self.analyzer.apply(remove=['allow-web'])
+
+        self.assertEqual(self.analyzer.evaluate(flow('10.0.1.5', 443)), ('Deny', 'DenyAll'))
+        self.assertEqual(self.analyzer.analyze(remove=['allow-web']).changed, [])
+
+    def test_unresolved_service_tags_are_reported(self):
+        report = self.analyzer.analyze(add=[rule('vnet', 90, 'Deny', 'VirtualNetwork')])
+
+        self.assertEqual(report.unresolved_tags, ['VirtualNetwork'])
+        resolved = normalize_rule(rule('vnet', 90, 'Deny', 'VirtualNetwork'), {'VirtualNetwork': ['10.0.0.0/16']})
+        self.assertEqual(len(resolved.destinations), 1)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,6 +1,7 @@
 import unittest
 from modules.azure_nsg_module import AzureNSGModule
 from unittest.mock import MagicMock
+from azure.mgmt.network.models import SecurityRule
 
 class TestAzureNSGModule(unittest.TestCase):
     def setUp(self):
@@ -16,6 +17,16 @@ class TestAzureNSGModule(unittest.TestCase):
         self.nsg_module.create_nsg(resource_group_name, nsg_name, location)
         self.nsg_module.network_client.network_security_groups.begin_create_or_update.assert_called_once()
 
+    def test_create_nsg_without_waiting(self):
+        resource_group_name = 'test_rg'
+        nsg_name = 'test_nsg'
+        location = 'switzerlandnorth'
+
+        operation = self.nsg_module.create_nsg(resource_group_name, nsg_name, location, wait=False)
+        poller = self.nsg_module.network_client.network_security_groups.begin_create_or_update.return_value
+        self.assertIs(operation.poller, poller)
+        poller.result.assert_not_called()
+
     def test_delete_nsg(self):
         resource_group_name = 'test_rg'
         nsg_name = 'test_nsg'
@@ -59,5 +70,54 @@ class TestAzureNSGModule(unittest.TestCase):
         self.nsg_module.update_nsg_tags(resource_group_name, nsg_name, tags)
         self.nsg_module.network_client.network_security_groups.begin_create_or_update.assert_called_once()
 
+    def test_add_nsg_rule_with_plural_fields(self):
+        self.nsg_module.add_nsg_rule('test_rg', 'test_nsg', 'web', 100, 'Inbound', 'Allow', 'Tcp',
+                                     source_address_prefixes=['10.0.1.0/24', '10.0.0.0/24'],
+                                     destination_port_ranges=['443', '80'],
+                                     destination_application_security_groups=['/asg/web'])
+
+        self.nsg_module.network_client.security_rules.begin_create_or_update.assert_called_once_with(
+            'test_rg', 'test_nsg', 'web', {
+                'protocol': 'Tcp', 'access': 'Allow', 'direction': 'Inbound', 'priority': 100,
+                'source_address_prefixes': ['10.0.0.0/24', '10.0.1.0/24'],
+                'destination_application_security_groups': [{'id': '/asg/web'}],
+                'source_port_range': '*',
+                'destination_port_ranges': ['443', '80'],
+            })
+
+    def test_compact_nsg_rules(self):
+        nsg = MagicMock()
+        nsg.security_rules = [
+            SecurityRule(name=f'web-{port}', priority=100 + index, direction='Inbound', access='Allow', protocol='Tcp',
+                         source_address_prefix='*', source_port_range='*', destination_address_prefix='10.0.1.0/24',
+                         destination_port_range=port, description='web')
+            for index, port in enumerate(['80', '443'])
+        ]
+        self.nsg_module.network_client.network_security_groups.get.return_value = nsg
+
+        report = self.nsg_module.compact_nsg_rules('test_rg', 'test_nsg')
+
+        self.assertEqual(report.merged, {'web-80': ['web-443']})
+        self.nsg_module.network_client.network_security_groups.begin_create_or_update.assert_called_once_with(
+            'test_rg', 'test_nsg', nsg)
+        rule, = nsg.security_rules
+        self.assertEqual((rule.destination_port_range, rule.destination_port_ranges, rule.description),
+                         (None, ['443', '80'], 'web'))
+
+    def test_insert_nsg_rules_allocates_and_guards_with_etag(self):
+        nsg = MagicMock(etag='W/"1"')
+        nsg.security_rules = [SecurityRule(name='allow-web', priority=100, direction='Inbound', access='Allow', protocol='Tcp')]
+        self.nsg_module.network_client.network_security_groups.get.return_value = nsg
+
+        allocation = self.nsg_module.insert_nsg_rules('test_rg', 'test_nsg', 'Inbound', [
+            {'name': 'allow-ssh', 'access': 'Allow', 'protocol': 'Tcp', 'destination_port_range': '22'},
+        ], after='allow-web')
+
+        self.assertEqual(allocation.priorities, [2099])
+        self.nsg_module.network_client.network_security_groups.begin_create_or_update.assert_called_once_with(
+            'test_rg', 'test_nsg', nsg, headers={'If-Match': 'W/"1"'})
+        self.assertEqual([(rule.name, rule.priority) for rule in nsg.security_rules],
+                         [('allow-web', 100), ('allow-ssh', 2099)])
+
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,60 @@
+import unittest
+from modules.azure_nsg_priority_module import AzureNSGPriorityModule
+
+
+def rule(name, priority, direction='Inbound'):
+    return {'name': name, 'priority': priority, 'direction': direction}
+
+
+class TestAzureNSGPriorityModule(unittest.TestCase):
+    def setUp(self):
+        self.allocator = AzureNSGPriorityModule([rule('a', 100), rule('b', 200), rule('c', 201), rule('out', 100, 'Outbound')])
+
+    def test_append_uses_spacing_per_direction(self):
+        self.assertEqual(self.allocator.allocate('Inbound', 2).priorities, [211, 221])
+        self.assertEqual(self.allocator.allocate('Outbound').priorities, [110])
+
+    def test_insert_after_spreads_in_the_gap(self):
+        allocation = self.allocator.allocate('Inbound', 3, after='a', names=['x', 'y', 'z'])
+
+        self.assertEqual(allocation.priorities, [125, 150, 175])
+        self.assertEqual(allocation.moves, [])
+        self.assertEqual(self.allocator.allocate('Inbound', before='y').priorities, [138])
+
+    def test_full_gap_renumbers_fewest_rules(self):
+        allocation = self.allocator.allocate('Inbound', 2, after='b', names=['x', 'y'])
+
+        self.assertEqual(allocation.priorities, [201, 202])
+        self.assertEqual(allocation.moves, [('c', 201, 203)])
+        self.assertEqual(self.allocator.priority_of('c'), 203)
+
+    def test_full_range_takes_room_from_both_sides(self):
+        gaps = {103, 108, 125, 128}
+        allocator = AzureNSGPriorityModule([rule(f'r{priority}', priority) for priority in range(100, 131)
+                                            if priority not in gaps], max_priority=130)
+
+        allocation = allocator.allocate('Inbound', 4, after='r114')
+
+        self.assertEqual(allocation.priorities, [113, 114, 115, 116])
+        self.assertEqual(len(allocation.moves), 22)
+        self.assertEqual((allocator.priority_of('r114'), allocator.priority_of('r115')), (112, 117))
+        self.assertEqual(allocator.free_count('Inbound'), 0)
+        with self.assertRaises(ValueError):
+            allocator.allocate('Inbound', after='r114')
+
+    def test_unknown_or_misordered_constraints(self):
+        with self.assertRaises(ValueError):
+            self.allocator.allocate('Inbound', after='out')
+        with self.assertRaises(ValueError):
+            self.allocator.allocate('Inbound', after='c', before='a')
+
+    def test_release_frees_priorities(self):
+        free = self.allocator.free_count('Inbound')
+        allocation = self.allocator.allocate('Inbound', 5)
+        self.allocator.release('Inbound', allocation.priorities)
+
+        self.assertEqual(self.allocator.free_count('Inbound'), free)
+
+
+if __name__ == '__main__':
+    unittest.main()
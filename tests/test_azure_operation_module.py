@@ -0,0 +1,68 @@
+import unittest
+from concurrent.futures import CancelledError, FIRST_COMPLETED
+from modules.azure_operation_module import AzureOperation, wait_all
+from unittest.mock import MagicMock
+
+
+def make_poller(done=False, result=None):
+    poller = MagicMock()
+    poller.done.return_value = done
+    poller.status.return_value = 'Succeeded' if done else 'InProgress'
+    poller.result.return_value = result
+    return poller
+
+
+class TestAzureOperationModule(unittest.TestCase):
+    def test_status_and_result(self):
+        poller = make_poller(done=True, result='NSG Created')
+        operation = AzureOperation(poller, "Creation of NSG 'test_nsg'")
+
+        self.assertTrue(operation.done())
+        self.assertEqual(operation.status(), 'Succeeded')
+        self.assertEqual(operation.result(timeout=1), 'NSG Created')
+
+    def test_result_times_out(self):
+        operation = AzureOperation(make_poller(done=False), "Creation of VNG 'test_vng'")
+
+        with self.assertRaises(TimeoutError):
+            operation.result(timeout=0)
+
+    def test_done_callback_runs_on_completion(self):
+        poller = make_poller(done=False)
+        operation = AzureOperation(poller, "Deletion of VM 'test_vm'")
+        callback = MagicMock()
+        operation.add_done_callback(callback)
+
+        # The SDK poller invokes its done callbacks from its polling thread.
+        poller.add_done_callback.call_args[0][0](poller.polling_method())
+
+        callback.assert_called_once_with(operation)
+        self.assertTrue(operation.done())
+
+    def test_cancel_detaches_and_runs_cancel_func(self):
+        cancel_func = MagicMock()
+        operation = AzureOperation(make_poller(done=False), "Creation of VM 'test_vm'", cancel_func)
+        callback = MagicMock()
+        operation.add_done_callback(callback)
+
+        self.assertTrue(operation.cancel())
+        cancel_func.assert_called_once()
+        self.assertEqual(operation.status(), 'Cancelled')
+        with self.assertRaises(CancelledError):
+            operation.result()
+        callback.assert_not_called()
+
+    def test_wait_all(self):
+        finished = AzureOperation(make_poller(done=True), "Creation of NSG 'a'")
+        running = AzureOperation(make_poller(done=False), "Creation of VNG 'b'")
+
+        done, not_done = wait_all([finished, running], timeout=0.05, poll_interval=0.01)
+        self.assertEqual(done, {finished})
+        self.assertEqual(not_done, {running})
+
+        done, not_done = wait_all([finished, running], return_when=FIRST_COMPLETED)
+        self.assertEqual(done, {finished})
+
+
+if __name__ == '__main__':
+    unittest.main()
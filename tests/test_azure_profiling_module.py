@@ -0,0 +1,114 @@
+import json
+import os
+import tempfile
+import time
+import unittest
+from modules.azure_profiling_module import AzureProfilingModule, package_group
+from unittest.mock import MagicMock
+
+
+def busy(seconds):
+    end = time.process_time() + seconds
+    total = 0
+    while time.process_time() < end:
+        total += 1
+    return total
+
+
+class FakeModule:
+    def list_items(self, count):
+        return [{'id': f'item-{index}', 'tags': {'env': 'dev'}} for index in range(count)]
+
+    def create_item(self, name):
+        return name
+
+
+class TestAzureProfilingModule(unittest.TestCase):
+    def test_phases_split_cpu_and_sleep(self):
+        profiler = AzureProfilingModule()
+        transport = MagicMock()
+        transport.sleep.side_effect = time.sleep
+        timed = profiler.client_kwargs({'transport': transport})['transport']
+
+        with profiler.phase('provision'):
+            busy(0.05)
+            with profiler.phase('wait'):
+                timed.sleep(0.05)
+                timed.send('request')
+        report = profiler.report()
+
+        wait, provision = report['phases']
+        self.assertEqual([wait['name'], provision['name']], ['wait', 'provision'])
+        self.assertGreaterEqual(provision['cpu_seconds'], 0.04)
+        self.assertGreaterEqual(wait['sleep_seconds'], 0.04)
+        self.assertEqual(wait['requests'], 1)
+        self.assertEqual(report['requests'], 1)
+        self.assertTrue(any('busy' in entry['function'] for entry in provision['top_functions']))
+        self.assertFalse(any('busy' in entry['function'] for entry in wait['top_functions']))
+        transport.send.assert_called_once_with('request')
+
+    def test_marks_are_consecutive_phases(self):
+        profiler = AzureProfilingModule()
+        profiler.mark('vnet')
+        profiler.mark('nsg')
+        profiler.stop()
+
+        self.assertEqual([phase['name'] for phase in profiler.report()['phases']], ['vnet', 'nsg'])
+
+    def test_sampling_mode_sees_worker_code(self):
+        profiler = AzureProfilingModule(mode='sampling', sample_interval=0.001)
+        with profiler.phase('crawl'):
+            busy(0.1)
+        profiler.stop()
+
+        phase = profiler.report()['phases'][0]
+        self.assertGreater(phase['samples'], 0)
+        self.assertTrue(any('busy' in entry['function'] for entry in phase['top_functions']))
+
+    def test_list_operations_are_memory_traced(self):
+        profiler = AzureProfilingModule()
+        module = profiler.instrument(FakeModule(), 'item')
+
+        self.assertEqual(len(module.list_items(5000)), 5000)
+        module.create_item('web')
+
+        memory = profiler.report()['memory']
+        self.assertEqual(list(memory), ['item.list_items'])
+        self.assertGreater(memory['item.list_items']['retained_bytes'], 5000 * 100)
+        self.assertTrue(memory['item.list_items']['top'])
+
+    def test_report_is_written_as_json(self):
+        profiler = AzureProfilingModule()
+        with tempfile.TemporaryDirectory() as directory:
+            profiler.stats_dir = os.path.join(directory, 'stats')
+            profiler.mark('setup')
+            path = os.path.join(directory, 'profile.json')
+            profiler.write_report(path)
+            with open(path) as f:
+                report = json.load(f)
+            self.assertEqual(os.listdir(profiler.stats_dir), ['00-setup.pstats'])
+        self.assertEqual(report['mode'], 'cprofile')
+        self.assertEqual(report['phases'][0]['name'], 'setup')
+
+    def test_disabled_profiler_changes_nothing(self):
+        profiler = AzureProfilingModule(enabled=False)
+        module = FakeModule()
+        list_items = module.list_items
+
+        self.assertEqual(profiler.client_kwargs({'transport': 'shared'}), {'transport': 'shared'})
+        self.assertEqual(profiler.instrument(module, 'item').list_items, list_items)
+        with profiler.phase('noop'):
+            profiler.mark('noop')
+        self.assertEqual(profiler.report()['phases'], [])
+        self.assertRaises(ValueError, AzureProfilingModule, mode='perf')
+
+    def test_package_groups(self):
+        self.assertEqual(package_group(os.path.join(os.sep, 'app', 'modules', 'azure_vm_module.py')), 'modules')
+        self.assertEqual(package_group(os.path.join(os.sep, 'site', 'azure', 'mgmt', 'network', 'models.py')),
+                         'sdk_models')
+        self.assertEqual(package_group(os.path.join(os.sep, 'site', 'urllib3', 'connection.py')), 'http')
+        self.assertEqual(package_group('<string>'), 'other')
+
+
+if __name__ == '__main__':
+    unittest.main()
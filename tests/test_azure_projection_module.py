@@ -0,0 +1,107 @@
+import json
+import unittest
+from azure.core.exceptions import HttpResponseError, ResourceNotFoundError
+from modules.azure_metrics_module import AzureMetricsModule
+from modules.azure_nsg_module import AzureNSGModule
+from modules.azure_projection_module import get_projected, json_path, list_projected, project, resource_url
+from unittest.mock import MagicMock
+
+
+def make_response(status_code=200, body=None):
+    response = MagicMock()
+    response.status_code = status_code
+    response.content = json.dumps(body or {}).encode()
+    if status_code >= 400:
+        response.raise_for_status.side_effect = HttpResponseError(message=f"HTTP {status_code}")
+    return response
+
+
+def make_rule(name, priority):
+    return {
+        'id': f'/subscriptions/sub-1/resourceGroups/rg/providers/Microsoft.Network/networkSecurityGroups/web'
+              f'/securityRules/{name}',
+        'name': name,
+        'etag': 'W/"1"',
+        'properties': {
+            'provisioningState': 'Succeeded',
+            'priority': priority,
+            'access': 'Allow',
+            'direction': 'Inbound',
+            'destinationPortRange': '443',
+            'sourceAddressPrefixes': [f'10.0.{priority}.0/24'],
+        },
+    }
+
+
+class TestAzureProjectionModule(unittest.TestCase):
+    def test_json_paths(self):
+        self.assertEqual(json_path('name'), ['name'])
+        self.assertEqual(json_path('sku.name'), ['sku', 'name'])
+        self.assertEqual(json_path('provisioning_state'), ['properties', 'provisioningState'])
+        self.assertEqual(json_path('address_space.address_prefixes'),
+                         ['properties', 'addressSpace', 'addressPrefixes'])
+
+    def test_project_builds_records(self):
+        record = project('nsg_rule', make_rule('https', 100),
+                         ('name', 'priority', 'source_address_prefixes', 'description', 'sku.name'))
+
+        self.assertEqual(type(record).__name__, 'NsgRuleRecord')
+        self.assertEqual(record.name, 'https')
+        self.assertEqual(record.priority, 100)
+        self.assertEqual(record.source_address_prefixes, ['10.0.100.0/24'])
+        self.assertIsNone(record.description)
+        self.assertIsNone(record.sku_name)
+        self.assertRaises(ValueError, project, 'disk', {}, ('name',))
+
+    def test_list_follows_next_link(self):
+        client = MagicMock()
+        next_link = 'https://management.azure.com/next?api-version=2023-09-01&$skiptoken=abc'
+        client.send_request.side_effect = [
+            make_response(body={'value': [make_rule('https', 100)], 'nextLink': next_link}),
+            make_response(body={'value': [make_rule('ssh', 200)]}),
+        ]
+
+        rules = list_projected(client, 'sub-1', 'nsg_rule', 'rg', ['name', 'priority'], parent_name='web')
+
+        self.assertEqual([(rule.name, rule.priority) for rule in rules], [('https', 100), ('ssh', 200)])
+        first, second = [call.args[0] for call in client.send_request.call_args_list]
+        self.assertEqual(first.url.split('?')[0], resource_url('sub-1', 'rg', 'nsg_rule', parent_name='web'))
+        self.assertTrue(first.url.endswith('/networkSecurityGroups/web/securityRules?api-version=2023-09-01'))
+        self.assertEqual(second.url, next_link)
+
+    def test_get_errors(self):
+        client = MagicMock()
+        client.send_request.return_value = make_response(404)
+        self.assertRaises(ResourceNotFoundError, get_projected, client, 'sub-1', 'vnet', 'rg', 'missing', ['id'])
+
+        client.send_request.return_value = make_response(429)
+        self.assertRaises(HttpResponseError, get_projected, client, 'sub-1', 'vnet', 'rg', 'busy', ['id'])
+        self.assertRaises(ValueError, resource_url, 'sub-1', 'rg', 'subnet', 'default')
+
+    def test_module_reads_skip_sdk_models(self):
+        module = AzureNSGModule('sub-1', credential=MagicMock())
+        module.network_client = MagicMock()
+        module.network_client.send_request.return_value = make_response(body={'value': [make_rule('https', 100)]})
+
+        rules = module.list_nsg_rules('rg', 'web', fields=('name', 'access'))
+
+        self.assertEqual(rules[0].access, 'Allow')
+        module.network_client.security_rules.list.assert_not_called()
+        module.list_nsg_rules('rg', 'web')
+        module.network_client.security_rules.list.assert_called_once_with('rg', 'web')
+
+        module.network_client.send_request.return_value = make_response(404)
+        self.assertIsNone(module.get_nsg('rg', 'missing', fields=('id',)))
+
+    def test_instrumented_clients_pass_raw_requests_through(self):
+        module = AzureNSGModule('sub-1', credential=MagicMock())
+        module.network_client = MagicMock()
+        module.network_client.send_request.return_value = make_response(body={'value': []})
+        AzureMetricsModule().instrument(module, 'nsg')
+
+        self.assertEqual(module.list_nsgs('rg', fields=('name',)), [])
+        module.network_client._client.send_request.assert_called_once()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,75 @@
+import time
+import unittest
+from modules.azure_provisioning_module import AzureProvisioningWatcher
+from unittest.mock import MagicMock
+
+
+def resource(name, provisioning_state, subnets=None):
+    item = MagicMock(provisioning_state=provisioning_state, subnets=subnets or [])
+    item.name = name
+    return item
+
+
+class TestAzureProvisioningWatcher(unittest.TestCase):
+    def setUp(self):
+        self.subscription_id = 'test_subscription_id'
+        self.watcher = AzureProvisioningWatcher(self.subscription_id, 'test_rg', interval=0.01)
+        self.watcher.network_client = MagicMock()
+        self.watcher.compute_client = MagicMock()
+
+    def test_poll_once_lists_each_type_once(self):
+        self.watcher.network_client.network_security_groups.list.return_value = [
+            resource('nsg-%d' % i, 'Succeeded') for i in range(50)]
+        waiters = [self.watcher.watch('nsg', 'nsg-%d' % i) for i in range(50)]
+
+        self.assertEqual(self.watcher.poll_once(), 1)
+        self.watcher.network_client.network_security_groups.list.assert_called_once_with('test_rg')
+        self.assertTrue(all(waiter.succeeded for waiter in waiters))
+
+    def test_vnet_list_covers_subnets(self):
+        subnet = resource('test_subnet', 'Updating')
+        self.watcher.network_client.virtual_networks.list.return_value = [
+            resource('test_vnet', 'Succeeded', subnets=[subnet])]
+        vnet_waiter = self.watcher.watch('vnet', 'test_vnet')
+        subnet_waiter = self.watcher.watch('subnet', 'test_vnet/test_subnet')
+
+        self.watcher.poll_once()
+
+        self.watcher.network_client.virtual_networks.list.assert_called_once_with('test_rg')
+        self.assertTrue(vnet_waiter.succeeded)
+        self.assertEqual(subnet_waiter.state, 'Updating')
+        self.assertFalse(subnet_waiter.event.is_set())
+
+    def test_wait_for_failed_state(self):
+        self.watcher.compute_client.virtual_machines.list.return_value = [resource('test_vm', 'Failed')]
+
+        waiter = self.watcher.wait_for('vm', 'test_vm', timeout=1)
+        self.assertTrue(waiter.event.is_set())
+        self.assertFalse(waiter.succeeded)
+
+    def test_wait_for_timeout(self):
+        self.watcher.network_client.virtual_network_gateways.list.return_value = [resource('test_vng', 'Updating')]
+
+        waiter = self.watcher.wait_for('vng', 'test_vng', timeout=0.05)
+        self.assertFalse(waiter.event.is_set())
+        self.assertEqual(waiter.state, 'Updating')
+
+    def test_new_waiter_polls_without_waiting_an_interval(self):
+        self.watcher.interval = 10
+        self.watcher.network_client.network_security_groups.list.return_value = [resource('nsg-0', 'Succeeded')]
+        self.watcher.wait_for('nsg', 'nsg-0', timeout=1)
+        self.watcher.network_client.route_tables.list.return_value = [resource('rt-0', 'Succeeded')]
+
+        start = time.monotonic()
+        waiter = self.watcher.wait_for('route_table', 'rt-0', timeout=None)
+
+        self.assertTrue(waiter.succeeded)
+        self.assertLess(time.monotonic() - start, 1)
+
+    def test_unsupported_type(self):
+        with self.assertRaises(ValueError):
+            self.watcher.watch('load_balancer', 'test_lb')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,99 @@
+import unittest
+from types import SimpleNamespace
+from modules.azure_reachability_module import AzureReachabilityModule, Query
+
+SUB = '/subscriptions/s/resourceGroups/rg/providers/Microsoft.Network'
+
+
+def rule(name, priority, access, direction, destination='*', port='*', source='*'):
+    return {
+        'name': name, 'priority': priority, 'direction': direction, 'access': access, 'protocol': 'Tcp',
+        'source_address_prefix': source, 'destination_address_prefix': destination,
+        'source_port_range': '*', 'destination_port_range': port,
+    }
+
+
+def subnet(name, prefix, nsg=None, route_table=None):
+    return SimpleNamespace(
+        id=f'{SUB}/virtualNetworks/hub/subnets/{name}', address_prefix=prefix,
+        network_security_group=SimpleNamespace(id=f'{SUB}/networkSecurityGroups/{nsg}') if nsg else None,
+        route_table=SimpleNamespace(id=f'{SUB}/routeTables/{route_table}') if route_table else None,
+    )
+
+
+def route(name, prefix, next_hop_type, next_hop_ip=None):
+    return SimpleNamespace(name=name, address_prefix=prefix, next_hop_type=next_hop_type, next_hop_ip_address=next_hop_ip)
+
+
+class TestAzureReachabilityModule(unittest.TestCase):
+    def setUp(self):
+        vnet = SimpleNamespace(
+            id=f'{SUB}/virtualNetworks/hub',
+            address_space=SimpleNamespace(address_prefixes=['10.0.0.0/16']),
+            virtual_network_peerings=[],
+            subnets=[
+                subnet('app', '10.0.1.0/24', route_table='app-routes'),
+                subnet('db', '10.0.2.0/24', nsg='db-nsg'),
+                subnet('fw', '10.0.3.0/24'),
+            ],
+        )
+        nsg = SimpleNamespace(
+            id=f'{SUB}/networkSecurityGroups/db-nsg',
+            security_rules=[rule('allow-sql', 100, 'Allow', 'Inbound', '10.0.2.0/24', '1433')],
+            default_security_rules=[rule('AllowVnetOutBound', 65000, 'Allow', 'Outbound')],
+        )
+        routes = SimpleNamespace(id=f'{SUB}/routeTables/app-routes', routes=[route('internet', '0.0.0.0/0', 'None')])
+        self.graph = AzureReachabilityModule([vnet], [routes], [nsg])
+        self.nsg_id = nsg.id
+        self.route_table_id = routes.id
+
+    def test_reachable_path_within_vnet(self):
+        result = self.graph.reach('10.0.1.4', '10.0.2.4', 1433)
+
+        self.assertTrue(result.reachable)
+        self.assertEqual([hop.kind for hop in result.path], ['subnet', 'route', 'subnet', 'nsg'])
+        self.assertIn("Allow by 'allow-sql'", result.path[-1].detail)
+
+    def test_denied_and_dropped_queries(self):
+        denied, dropped = self.graph.reach_many([
+            Query('10.0.1.4', '10.0.2.4', 22),
+            Query('10.0.1.4', '8.8.8.8', 443),
+        ])
+
+        self.assertFalse(denied.reachable)
+        self.assertEqual(denied.reason, 'Denied by inbound NSG rule.')
+        self.assertFalse(dropped.reachable)
+        self.assertIn('next hop None', dropped.reason)
+
+    def test_virtual_appliance_hop(self):
+        self.graph.update_route(self.route_table_id, route('via-fw', '10.0.2.0/24', 'VirtualAppliance', '10.0.3.4'))
+
+        result = self.graph.reach('10.0.1.4', '10.0.2.4', 1433)
+
+        self.assertTrue(result.reachable)
+        self.assertEqual([hop.detail for hop in result.path if hop.kind == 'subnet'],
+                         ['egress', 'appliance', 'egress', 'ingress'])
+
+    def test_route_change_invalidates_only_covered_destinations(self):
+        self.graph.reach_many([Query('10.0.1.4', '10.0.2.4', 1433), Query('10.0.1.4', '10.0.3.4', 80)])
+
+        invalidated = self.graph.update_route(self.route_table_id, route('blackhole-db', '10.0.2.0/24', 'None'))
+
+        self.assertEqual(invalidated, 1)
+        self.assertEqual(self.graph.cache_size(), 1)
+        self.assertFalse(self.graph.reach('10.0.1.4', '10.0.2.4', 1433).reachable)
+
+    def test_rule_change_invalidates_only_matching_flows(self):
+        self.graph.reach_many([Query('10.0.1.4', '10.0.2.4', 1433), Query('10.0.1.4', '10.0.2.4', 22)])
+
+        invalidated = self.graph.update_security_rule(
+            self.nsg_id, rule('allow-ssh', 110, 'Allow', 'Inbound', '10.0.2.0/24', '22'))
+
+        self.assertEqual(invalidated, 1)
+        self.assertTrue(self.graph.reach('10.0.1.4', '10.0.2.4', 22).reachable)
+        self.assertEqual(self.graph.remove_security_rule(self.nsg_id, 'allow-sql'), 1)
+        self.assertFalse(self.graph.reach('10.0.1.4', '10.0.2.4', 1433).reachable)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,65 @@
+import unittest
+from modules.azure_route_compaction_module import (RouteSpec, compact_routes, compaction_report, find_difference,
+                                                   system_routes)
+
+FIREWALL = ('VirtualAppliance', '10.0.0.4')
+
+
+def route(name, prefix, next_hop_type='VirtualAppliance', next_hop_ip='10.0.0.4'):
+    return RouteSpec(name, prefix, next_hop_type, next_hop_ip)
+
+
+class TestAzureRouteCompactionModule(unittest.TestCase):
+    def test_contained_route_with_same_next_hop_is_dropped(self):
+        routes = [route('spokes', '10.1.0.0/16'), route('spoke-a', '10.1.4.0/24'),
+                  route('blackhole', '10.1.5.0/24', 'None', None)]
+
+        self.assertEqual([spec.name for spec in compact_routes(routes)], ['spokes', 'blackhole'])
+
+    def test_contained_route_overriding_a_system_route_is_kept(self):
+        routes = [route('private', '10.0.0.0/8'), route('app', '10.0.1.0/24')]
+        system = system_routes(['10.0.0.0/16'])
+
+        compacted = compact_routes(routes, system)
+
+        self.assertEqual([spec.name for spec in compacted], ['private', 'app'])
+        self.assertIsNone(find_difference(routes, compacted, system))
+        self.assertEqual(find_difference(routes, routes[:1], system),
+                         ('10.0.1.0', ('virtualappliance', '10.0.0.4'), ('vnetlocal', None)))
+        self.assertIsNone(find_difference(routes, routes[:1]))
+
+    def test_siblings_overriding_a_system_route_do_not_merge(self):
+        routes = [route('low', '10.6.0.0/17'), route('high', '10.6.128.0/17')]
+
+        self.assertEqual(compact_routes(routes, system_routes(['10.6.0.0/17'])), routes)
+        self.assertEqual(compact_routes(routes, system_routes(['10.6.0.0/16'])), [route('low', '10.6.0.0/16')])
+
+    def test_siblings_merge_up_to_the_largest_block(self):
+        routes = [route(f'r{index}', f'10.2.{index}.0/24') for index in range(4)]
+
+        compacted = compact_routes(routes)
+
+        self.assertEqual(compacted, [route('r0', '10.2.0.0/22')])
+        self.assertIsNone(find_difference(routes, compacted))
+
+    def test_siblings_do_not_merge_over_an_existing_block(self):
+        routes = [route('low', '10.3.0.0/25'), route('high', '10.3.0.128/25'),
+                  route('block', '10.3.0.0/24', 'Internet', None)]
+
+        self.assertEqual(len(compact_routes(routes)), 3)
+
+    def test_find_difference_reports_first_changed_address(self):
+        original = [route('a', '10.4.0.0/24'), route('b', '10.4.1.0/24', 'Internet', None)]
+
+        self.assertEqual(find_difference(original, original[:1]), ('10.4.1.0', ('internet', None), None))
+
+    def test_report_lists_removed_and_widened_routes(self):
+        report = compaction_report([route('a', '10.5.0.0/25'), route('b', '10.5.0.128/25'), route('tag', 'AzureCloud')])
+
+        self.assertEqual(report.removed, ['b'])
+        self.assertEqual(report.added, [route('a', '10.5.0.0/24')])
+        self.assertIn(route('tag', 'AzureCloud'), report.compacted)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,6 +1,7 @@
 import unittest
 from modules.azure_route_table_module import AzureRouteTableModule
 from unittest.mock import MagicMock
+from types import SimpleNamespace
 
 class TestAzureRouteTableModule(unittest.TestCase):
     def setUp(self):
@@ -79,5 +80,37 @@ class TestAzureRouteTableModule(unittest.TestCase):
             resource_group_name, route_table_name, {'tags': tags}
         )
 
+    def test_compact_route_table(self):
+        routes = [SimpleNamespace(name=f'r{index}', address_prefix=f'10.0.{index}.0/24',
+                                  next_hop_type='VirtualAppliance', next_hop_ip_address='10.255.0.4')
+                  for index in range(2)]
+        route_table = SimpleNamespace(routes=routes)
+        self.route_table_module.network_client.route_tables.get.return_value = route_table
+
+        report = self.route_table_module.compact_route_table('test_rg', 'test_route_table')
+
+        self.assertEqual(report.removed, ['r1'])
+        self.route_table_module.network_client.route_tables.begin_create_or_update.assert_called_once_with(
+            'test_rg', 'test_route_table', route_table)
+        self.assertEqual([route.address_prefix for route in route_table.routes], ['10.0.0.0/23'])
+
+    def test_compact_route_table_keeps_routes_overriding_vnet_routes(self):
+        routes = [SimpleNamespace(name='private', address_prefix='10.0.0.0/8', next_hop_type='VirtualAppliance',
+                                  next_hop_ip_address='10.255.0.4'),
+                  SimpleNamespace(name='app', address_prefix='10.0.1.0/24', next_hop_type='VirtualAppliance',
+                                  next_hop_ip_address='10.255.0.4')]
+        subnet_id = ('/subscriptions/sub/resourceGroups/spoke_rg/providers/Microsoft.Network/'
+                     'virtualNetworks/spoke/subnets/app')
+        route_table = SimpleNamespace(routes=routes, subnets=[SimpleNamespace(id=subnet_id)])
+        client = self.route_table_module.network_client
+        client.route_tables.get.return_value = route_table
+        client.virtual_networks.get.return_value.address_space.address_prefixes = ['10.0.0.0/16']
+
+        report = self.route_table_module.compact_route_table('test_rg', 'test_route_table')
+
+        client.virtual_networks.get.assert_called_once_with('spoke_rg', 'spoke')
+        self.assertEqual(report.removed, [])
+        client.route_tables.begin_create_or_update.assert_not_called()
+
 if __name__ == '__main__':
     unittest.main()
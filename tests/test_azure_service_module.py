@@ -0,0 +1,143 @@
+import json
+import os
+import threading
+import unittest
+import urllib.error
+import urllib.request
+from modules.azure_nsg_module import AzureNSGModule
+from azure.core.exceptions import HttpResponseError
+from modules.azure_operation_module import AzureOperation
+from modules.azure_scale_set_module import AzureScaleSetModule
+from modules.azure_service_module import AzureServiceModule
+from modules.azure_subnet_module import AzureSubnetModule
+from modules.azure_vnet_module import AzureVNetModule
+from types import SimpleNamespace
+from unittest.mock import MagicMock, create_autospec, patch
+
+
+class TestAzureServiceModule(unittest.TestCase):
+    def setUp(self):
+        self.transport = MagicMock()
+        self.transport.client_kwargs.return_value = {}
+        self.transport.pool_stats.return_value = {'pool_hits': 0, 'pool_misses': 0}
+        self.service = AzureServiceModule('sub-1', credential=MagicMock(), transport=self.transport)
+        self.vnet = create_autospec(AzureVNetModule, instance=True)
+        self.subnet = create_autospec(AzureSubnetModule, instance=True)
+        self.nsg = create_autospec(AzureNSGModule, instance=True)
+        self.service.modules.update(vnet=self.vnet, subnet=self.subnet, nsg=self.nsg)
+
+    def make_operation(self, done=False):
+        poller = MagicMock()
+        poller.done.return_value = done
+        poller.status.return_value = 'Succeeded' if done else 'InProgress'
+        poller.result.return_value = SimpleNamespace(id='/subscriptions/sub-1/vnet', name='hub')
+        return AzureOperation(poller, "Creation of VNet 'hub'")
+
+    def test_list_and_get(self):
+        self.vnet.list_vnets.return_value = [SimpleNamespace(as_dict=lambda: {'name': 'hub'})]
+        self.vnet.get_vnet_details.return_value = None
+
+        self.assertEqual(self.service.handle('GET', '/resource_groups/rg/vnets'), (200, [{'name': 'hub'}]))
+        status, _ = self.service.handle('GET', '/resource_groups/rg/vnets/missing')
+        self.assertEqual(status, 404)
+
+    def test_create_returns_operation_id(self):
+        operation = self.make_operation()
+        self.vnet.create_vnet.return_value = operation
+
+        status, payload = self.service.handle('PUT', '/resource_groups/rg/vnets/hub',
+                                              {'location': 'eastus', 'address_prefix': '10.0.0.0/16'})
+
+        self.assertEqual(status, 202)
+        self.vnet.create_vnet.assert_called_once_with('rg', 'hub', location='eastus', address_prefix='10.0.0.0/16',
+                                                      wait=False)
+        status, state = self.service.handle('GET', f"/operations/{payload['operation_id']}")
+        self.assertEqual((status, state['status']), (200, 'InProgress'))
+        operation.poller.done.return_value = True
+        operation.poller.status.return_value = 'Succeeded'
+        _, state = self.service.handle('GET', f"/operations/{payload['operation_id']}")
+        self.assertEqual(state['result'], {'id': '/subscriptions/sub-1/vnet', 'name': 'hub'})
+
+    def test_subnet_routes_and_actions(self):
+        self.subnet.delete_subnet.return_value = self.make_operation()
+        self.nsg.add_nsg_rule.return_value = SimpleNamespace(as_dict=lambda: {'name': 'allow-https'})
+
+        status, _ = self.service.handle('DELETE', '/resource_groups/rg/vnets/hub/subnets/app')
+        self.assertEqual(status, 202)
+        self.subnet.delete_subnet.assert_called_once_with('rg', 'hub', 'app', wait=False)
+
+        rule = {'rule_name': 'allow-https', 'priority': 100, 'direction': 'Inbound', 'access': 'Allow',
+                'protocol': 'Tcp', 'destination_port_range': '443'}
+        status, payload = self.service.handle('POST', '/resource_groups/rg/nsgs/web/rules', rule)
+        self.assertEqual((status, payload), (200, {'name': 'allow-https'}))
+
+    def test_bad_arguments_and_routes(self):
+        status, payload = self.service.handle('PUT', '/resource_groups/rg/vnets/hub', {'location': 'eastus'})
+        self.assertEqual(status, 400)
+        self.assertIn('address_prefix', payload['error'])
+        self.vnet.create_vnet.assert_not_called()
+        self.assertEqual(self.service.handle('GET', '/resource_groups/rg/unknown')[0], 404)
+        self.assertEqual(self.service.handle('POST', '/resource_groups/rg/vnets')[0], 405)
+
+    def test_actions_fail_only_on_reported_errors(self):
+        scale_set = AzureScaleSetModule('sub-1', credential=MagicMock())
+        scale_set.compute_client = MagicMock()
+        scale_sets = scale_set.compute_client.virtual_machine_scale_sets
+        scale_sets.begin_create_or_update.return_value.result.return_value = \
+            SimpleNamespace(as_dict=lambda: {'name': 'ss'})
+        self.service.modules['scale_set'] = scale_set
+
+        self.assertEqual(self.service.handle('POST', '/resource_groups/rg/scale_sets/ss/scale', {'new_capacity': 3}),
+                         (200, {'name': 'ss'}))
+        self.assertEqual(self.service.handle('POST', '/resource_groups/rg/scale_sets/ss/tags', {'tags': {'env': 'dev'}}),
+                         (200, {'name': 'ss'}))
+
+        self.nsg.update_nsg_tags.return_value = None
+        self.assertEqual(self.service.handle('POST', '/resource_groups/rg/nsgs/web/tags', {'tags': {}}), (200, None))
+
+        scale_sets.begin_create_or_update.side_effect = HttpResponseError(message="QuotaExceeded")
+        status, payload = self.service.handle('POST', '/resource_groups/rg/scale_sets/ss/scale', {'new_capacity': 300})
+        self.assertEqual(status, 502)
+        self.assertIn('QuotaExceeded', payload['error'])
+
+    def test_http_server_round_trip(self):
+        self.nsg.list_nsgs.return_value = [SimpleNamespace(as_dict=lambda: {'name': 'web'})]
+        server = self.service.make_server('127.0.0.1', 0, token='secret')
+        thread = threading.Thread(target=server.serve_forever, daemon=True)
+        thread.start()
+        try:
+            url = f"http://127.0.0.1:{server.server_address[1]}"
+            request = urllib.request.Request(f"{url}/resource_groups/rg/nsgs",
+                                             headers={'Authorization': 'Bearer secret'})
+            with urllib.request.urlopen(request) as response:
+                self.assertEqual(json.loads(response.read()), [{'name': 'web'}])
+            request = urllib.request.Request(f"{url}/health", headers={'X-API-Key': 'secret'})
+            with urllib.request.urlopen(request) as response:
+                self.assertEqual(json.loads(response.read())['modules'], ['nsg', 'subnet', 'vnet'])
+        finally:
+            server.shutdown()
+            server.server_close()
+
+    def test_http_server_requires_token(self):
+        server = self.service.make_server('127.0.0.1', 0, token='secret')
+        thread = threading.Thread(target=server.serve_forever, daemon=True)
+        thread.start()
+        try:
+            url = f"http://127.0.0.1:{server.server_address[1]}"
+            for headers in ({}, {'Authorization': 'Bearer wrong'}, {'X-API-Key': 'wrong'}):
+                request = urllib.request.Request(f"{url}/resource_groups/rg/vnets/hub", data=b'{}', method='DELETE',
+                                                 headers=headers)
+                with self.assertRaises(urllib.error.HTTPError) as raised:
+                    urllib.request.urlopen(request)
+                self.assertEqual(raised.exception.code, 401)
+                raised.exception.close()
+            self.vnet.delete_vnet.assert_not_called()
+        finally:
+            server.shutdown()
+            server.server_close()
+        with patch.dict(os.environ, {'AZURE_SERVICE_TOKEN': ''}):
+            self.assertRaises(ValueError, self.service.make_server, '127.0.0.1', 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,5 +1,6 @@
 import unittest
-from modules.azure_subnet_module import AzureSubnetModule
+from modules.azure_subnet_module import AzureSubnetModule, vnet_write_lock
+from azure.mgmt.network.models import NetworkSecurityGroup, Subnet, VirtualNetwork
 from unittest.mock import MagicMock
 
 class TestAzureSubnetModule(unittest.TestCase):
@@ -55,5 +56,74 @@ class TestAzureSubnetModule(unittest.TestCase):
             resource_group_name, vnet_name, subnet_name, {'address_prefix': new_address_prefix}
         )
 
+    def test_create_subnets_single_vnet_put(self):
+        resource_group_name = 'test_rg'
+        vnet_name = 'test_vnet'
+        existing = Subnet(name='existing', address_prefix='10.0.0.0/24',
+                          network_security_group={'id': 'nsg_id'})
+        vnet = VirtualNetwork(location='westeurope', subnets=[existing])
+        self.subnet_module.network_client.virtual_networks.get.return_value = vnet
+
+        self.subnet_module.create_subnets(resource_group_name, vnet_name, {
+            'existing': '10.0.0.0/24',
+            'app': '10.0.1.0/24',
+            'db': {'address_prefix': '10.0.2.0/24'},
+        })
+
+        self.subnet_module.network_client.subnets.begin_create_or_update.assert_not_called()
+        put = self.subnet_module.network_client.virtual_networks.begin_create_or_update
+        put.assert_called_once_with(resource_group_name, vnet_name, vnet)
+        self.assertEqual([subnet.name for subnet in vnet.subnets], ['existing', 'app', 'db'])
+        self.assertIs(vnet.subnets[0], existing)
+        self.assertEqual(vnet.subnets[2].address_prefix, '10.0.2.0/24')
+
+    def test_create_subnets_skips_put_when_unchanged(self):
+        vnet = VirtualNetwork(subnets=[Subnet(name='app', address_prefix='10.0.1.0/24')])
+        self.subnet_module.network_client.virtual_networks.get.return_value = vnet
+
+        result = self.subnet_module.create_subnets('test_rg', 'test_vnet', {'app': '10.0.1.0/24'})
+
+        self.assertIs(result, vnet)
+        self.subnet_module.network_client.virtual_networks.begin_create_or_update.assert_not_called()
+
+    def test_create_subnets_skips_put_for_unchanged_associations(self):
+        nsg_id = '/subscriptions/sub/resourceGroups/test_rg/providers/Microsoft.Network/networkSecurityGroups/web'
+        vnet = VirtualNetwork(subnets=[Subnet(name='app', address_prefix='10.0.1.0/24',
+                                              network_security_group=NetworkSecurityGroup(id=nsg_id))])
+        self.subnet_module.network_client.virtual_networks.get.return_value = vnet
+
+        self.subnet_module.create_subnets('test_rg', 'test_vnet', {
+            'app': {'address_prefix': '10.0.1.0/24', 'network_security_group': {'id': nsg_id.lower()}}})
+        self.subnet_module.network_client.virtual_networks.begin_create_or_update.assert_not_called()
+
+        self.subnet_module.create_subnets('test_rg', 'test_vnet', {
+            'app': {'address_prefix': '10.0.1.0/24', 'network_security_group': {'id': nsg_id + '-2'}}})
+        self.subnet_module.network_client.virtual_networks.begin_create_or_update.assert_called_once()
+
+    def test_subnet_writes_release_vnet_lock(self):
+        self.subnet_module.network_client.subnets.begin_create_or_update.side_effect = Exception('conflict')
+
+        self.subnet_module.create_subnet('test_rg', 'test_vnet', 'test_subnet', '10.0.1.0/24')
+
+        lock = vnet_write_lock(self.subscription_id, 'test_rg', 'test_vnet')
+        self.assertTrue(lock.acquire(blocking=False))
+        lock.release()
+
+    def test_create_subnets_without_wait_holds_vnet_lock_until_done(self):
+        self.subnet_module.network_client.virtual_networks.get.return_value = VirtualNetwork(subnets=[])
+        poller = self.subnet_module.network_client.virtual_networks.begin_create_or_update.return_value
+
+        self.subnet_module.create_subnets('test_rg', 'test_vnet', {'app': '10.0.1.0/24'}, wait=False)
+
+        lock = vnet_write_lock(self.subscription_id, 'test_rg', 'test_vnet')
+        held = not lock.acquire(blocking=False)
+        if not held:
+            lock.release()
+        self.assertTrue(held)
+        for call in poller.add_done_callback.call_args_list:
+            call[0][0](poller)
+        self.assertTrue(lock.acquire(blocking=False))
+        lock.release()
+
 if __name__ == '__main__':
     unittest.main()
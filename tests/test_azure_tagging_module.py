@@ -0,0 +1,71 @@
+import unittest
+from modules.azure_tagging_module import AzureTaggingModule, merge_tags
+from azure.core.exceptions import HttpResponseError
+from unittest.mock import MagicMock, patch
+
+
+def resource(name, tags=None):
+    item = MagicMock(tags=tags)
+    item.name = name
+    return item
+
+
+class TestAzureTaggingModule(unittest.TestCase):
+    def setUp(self):
+        self.subscription_id = 'test_subscription_id'
+        self.tagging_module = AzureTaggingModule(self.subscription_id, writes_per_second=0)
+        self.tagging_module.network_client = MagicMock()
+        self.tagging_module.compute_client = MagicMock()
+
+    def test_merge_tags(self):
+        self.assertEqual(merge_tags({'a': '1', 'b': '2'}, {'b': None, 'c': '3'}), {'a': '1', 'c': '3'})
+
+    def test_apply_tags_skips_matching_resources(self):
+        nsgs = self.tagging_module.network_client.network_security_groups
+        nsgs.list.return_value = [
+            resource('prod-nsg-1', {'CostCenter': '42'}),
+            resource('prod-nsg-2', {'CostCenter': '7'}),
+            resource('dev-nsg', None),
+        ]
+
+        result = self.tagging_module.apply_tags('test_rg', {'CostCenter': '42'}, ['nsg'], name_pattern='PROD-*')
+
+        self.assertEqual((result.matched, result.unchanged, result.updated, result.failed), (2, 1, 1, []))
+        nsgs.update_tags.assert_called_once_with('test_rg', 'prod-nsg-2', {'tags': {'CostCenter': '42'}})
+
+    def test_apply_tags_uses_cached_tags(self):
+        route_tables = self.tagging_module.network_client.route_tables
+        route_tables.list.return_value = [resource('rt', {})]
+
+        self.tagging_module.apply_tags('test_rg', {'Owner': 'net'}, ['route_table'])
+        result = self.tagging_module.apply_tags('test_rg', {'Owner': 'net'}, ['route_table'])
+
+        route_tables.list.assert_called_once_with('test_rg')
+        route_tables.update_tags.assert_called_once()
+        self.assertEqual(result.unchanged, 1)
+
+    def test_apply_tags_waits_for_lro_patches(self):
+        vms = self.tagging_module.compute_client.virtual_machines
+        vms.list.return_value = [resource('vm-1'), resource('vm-2')]
+
+        result = self.tagging_module.apply_tags('test_rg', {'Owner': 'net'}, ['vm'])
+
+        self.assertEqual(result.updated, 2)
+        self.assertEqual(vms.begin_update.call_count, 2)
+        self.assertEqual(vms.begin_update.return_value.result.call_count, 2)
+
+    @patch('modules.azure_tagging_module.time.sleep')
+    def test_apply_tags_retries_throttled_patch(self, mock_sleep):
+        nsgs = self.tagging_module.network_client.network_security_groups
+        nsgs.list.return_value = [resource('nsg')]
+        throttled = HttpResponseError(response=MagicMock(status_code=429, headers={'Retry-After': '3'}))
+        nsgs.update_tags.side_effect = [throttled, MagicMock()]
+
+        result = self.tagging_module.apply_tags('test_rg', {'Owner': 'net'}, ['nsg'])
+
+        self.assertEqual(result.updated, 1)
+        self.assertEqual(nsgs.update_tags.call_count, 2)
+        self.assertGreater(mock_sleep.call_args[0][0], 2)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,53 @@
+import threading
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from modules.azure_transport_module import AzureTransportModule
+
+
+class KeepAliveHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        self.send_response(200)
+        self.send_header('Content-Length', '2')
+        self.end_headers()
+        self.wfile.write(b'{}')
+
+    def log_message(self, *args):
+        pass
+
+
+class TestAzureTransportModule(unittest.TestCase):
+    def setUp(self):
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), KeepAliveHandler)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.url = f'http://127.0.0.1:{self.server.server_address[1]}/'
+        self.transport_module = AzureTransportModule(max_concurrency=4, pool_block=True)
+
+    def tearDown(self):
+        self.transport_module.close()
+        self.server.shutdown()
+        self.server.server_close()
+
+    def test_client_kwargs_share_session(self):
+        first = self.transport_module.client_kwargs()['transport']
+        second = self.transport_module.client_kwargs()['transport']
+
+        self.assertIs(first.session, self.transport_module.session)
+        self.assertIs(second.session, self.transport_module.session)
+        first.close()
+        self.assertIsNotNone(second.session)
+
+    def test_pool_reuses_connections_across_threads(self):
+        with ThreadPoolExecutor(max_workers=16) as executor:
+            statuses = list(executor.map(lambda _: self.transport_module.session.get(self.url).status_code, range(100)))
+
+        stats = self.transport_module.pool_stats()
+        self.assertEqual(set(statuses), {200})
+        self.assertEqual(stats['requests'], 100)
+        self.assertLessEqual(stats['pool_misses'], 4)
+        self.assertEqual(stats['pool_hits'] + stats['pool_misses'], 100)
+
+if __name__ == '__main__':
+    unittest.main()
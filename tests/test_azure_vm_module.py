@@ -1,6 +1,6 @@
 import unittest
 from modules.azure_vm_module import AzureVMModule
-from unittest.mock import MagicMock
+from unittest.mock import MagicMock, patch
 from azure.core.exceptions import AzureError
 
 class TestAzureVMModule(unittest.TestCase):
@@ -8,6 +8,7 @@ class TestAzureVMModule(unittest.TestCase):
         self.subscription_id = 'test_subscription_id'
         self.vm_module = AzureVMModule(self.subscription_id)
         self.vm_module.compute_client = MagicMock()
+        self.vm_module.network_client = MagicMock()
 
     def test_create_vm(self):
         resource_group_name = 'test_rg'
@@ -37,10 +38,10 @@ class TestAzureVMModule(unittest.TestCase):
         mock_poller.result.side_effect = AzureError("Timeout occurred")
         self.vm_module.compute_client.virtual_machines.begin_create_or_update.return_value = mock_poller
 
-        with self.assertLogs(level='ERROR') as log:
+        with patch('builtins.print') as mock_print:
             result = self.vm_module.create_vm(resource_group_name, vm_name, location, nic_id, vm_size)
             self.assertIsNone(result)  # Ensure no result is returned on failure
-            self.assertIn("Azure error occurred while creating VM", log.output[0])  # Check for the log message
+            self.assertIn("Azure error occurred while creating VM", mock_print.call_args[0][0])  # Check for the message
 
     def test_delete_vm(self):
         resource_group_name = 'test_rg'
@@ -63,9 +64,9 @@ class TestAzureVMModule(unittest.TestCase):
         mock_poller.result.side_effect = AzureError("Timeout occurred")
         self.vm_module.compute_client.virtual_machines.begin_delete.return_value = mock_poller
 
-        with self.assertLogs(level='ERROR') as log:
+        with patch('builtins.print') as mock_print:
             self.vm_module.delete_vm(resource_group_name, vm_name)
-            self.assertIn("Azure error occurred while deleting VM", log.output[0])  # Check for the log message
+            self.assertIn("Azure error occurred while deleting VM", mock_print.call_args[0][0])  # Check for the message
 
     def test_stop_vm(self):
         resource_group_name = 'test_rg'
@@ -94,6 +95,41 @@ class TestAzureVMModule(unittest.TestCase):
         self.vm_module.compute_client.virtual_machines.get.assert_called_once_with(
             resource_group_name, vm_name
         )
+    def test_create_vm_fleet(self):
+        resource_group_name = 'test_rg'
+        vm_names = ['vm-%d' % i for i in range(5)]
+        location = 'switzerlandnorth'
+        subnet_id = 'test_subnet_id'
+
+        nic_poller = MagicMock()
+        nic_poller.result.return_value.id = 'test_nic_id'
+        self.vm_module.network_client.network_interfaces.begin_create_or_update.return_value = nic_poller
+        self.vm_module.compute_client.virtual_machines.begin_create_or_update.side_effect = \
+            lambda rg, name, params: MagicMock(**{'result.return_value': params})
+
+        results = list(self.vm_module.create_vm_fleet(resource_group_name, vm_names, location, subnet_id,
+                                                      max_concurrency=2))
+
+        self.assertEqual(sorted(result.vm_name for result in results), vm_names)
+        self.assertTrue(all(result.error is None for result in results))
+        for result in results:
+            self.assertEqual(result.vm['os_profile']['computer_name'], result.vm_name)
+            self.assertEqual(result.vm['network_profile']['network_interfaces'][0]['id'], 'test_nic_id')
+        # The shared template is never mutated per VM.
+        storage_profiles = {id(result.vm['storage_profile']) for result in results}
+        self.assertEqual(len(storage_profiles), 1)
+
+    def test_create_vm_fleet_reports_nic_failure(self):
+        nic_poller = MagicMock()
+        nic_poller.result.side_effect = AzureError("SubnetIsFull")
+        self.vm_module.network_client.network_interfaces.begin_create_or_update.return_value = nic_poller
+
+        results = list(self.vm_module.create_vm_fleet('test_rg', ['vm-0'], 'switzerlandnorth', 'test_subnet_id'))
+
+        self.assertEqual(len(results), 1)
+        self.assertIsNone(results[0].vm)
+        self.assertIsInstance(results[0].error, AzureError)
+        self.vm_module.compute_client.virtual_machines.begin_create_or_update.assert_not_called()
 
 if __name__ == '__main__':
     unittest.main()
@@ -1,6 +1,6 @@
 import unittest
 from modules.azure_vnet_module import AzureVNetModule
-from unittest.mock import MagicMock
+from unittest.mock import MagicMock, patch
 
 class TestAzureVNetModule(unittest.TestCase):
     def setUp(self):
@@ -9,7 +9,7 @@ class TestAzureVNetModule(unittest.TestCase):
         self.vnet_module.network_client = MagicMock()
 
     @patch('time.sleep', return_value=None)  # Mocking time.sleep to avoid waiting in tests
-    def test_create_vnet(self):
+    def test_create_vnet(self, mock_sleep):
         resource_group_name = 'test_rg'
         vnet_name = 'test_vnet'
         location = 'switzerlandnorth'
@@ -28,7 +28,7 @@ class TestAzureVNetModule(unittest.TestCase):
         self.assertEqual(result['name'], vnet_name)
 
     @patch('time.sleep', return_value=None)
-    def test_delete_vnet(self):
+    def test_delete_vnet(self, mock_sleep):
         resource_group_name = 'test_rg'
         vnet_name = 'test_vnet'
 
@@ -55,6 +55,16 @@ class TestAzureVNetModule(unittest.TestCase):
             resource_group_name, vnet_name, {'address_space': {'address_prefixes': [address_prefix]}}
         )
 
+    def test_update_vnet_tags(self):
+        resource_group_name = 'test_rg'
+        vnet_name = 'test_vnet'
+        tags = {'environment': 'production'}
+
+        self.vnet_module.update_vnet_tags(resource_group_name, vnet_name, tags)
+        self.vnet_module.network_client.virtual_networks.update_tags.assert_called_once_with(
+            resource_group_name, vnet_name, {'tags': tags}
+        )
+
     def test_list_vnets(self):
         resource_group_name = 'test_rg'
 
@@ -1,6 +1,9 @@
+import threading
 import unittest
-from modules.azure_vng_module import AzureVNGModule
+from concurrent.futures import CancelledError
+from modules.azure_vng_module import AzureVNGModule, GatewayProvisioning
 from unittest.mock import MagicMock
+from azure.core.exceptions import ResourceNotFoundError
 
 class TestAzureVNGModule(unittest.TestCase):
     def setUp(self):
@@ -53,6 +56,68 @@ class TestAzureVNGModule(unittest.TestCase):
         self.vng_module.network_client.virtual_network_gateways.get.assert_called_once_with(
             resource_group_name, vng_name
         )
+    def test_provision_gateway_creates_dependencies_then_gateway(self):
+        resource_group_name = 'test_rg'
+        vng_name = 'test_vng'
+        location = 'switzerlandnorth'
+        client = self.vng_module.network_client
+        client.subnets.get.side_effect = ResourceNotFoundError("not found")
+        client.subnets.begin_create_or_update.return_value.result.return_value.id = 'gateway_subnet_id'
+        client.public_ip_addresses.get.return_value.id = 'public_ip_id'
+        client.virtual_network_gateways.begin_create_or_update.return_value.result.return_value = "VNG Created"
+        on_submitted = MagicMock()
+
+        provisioning = self.vng_module.provision_gateway(
+            resource_group_name, vng_name, location, 'test_vnet', '10.0.255.0/27', on_submitted=on_submitted)
+
+        self.assertEqual(provisioning.result(timeout=5), "VNG Created")
+        self.assertTrue(provisioning.dependencies_ready.is_set())
+        client.subnets.begin_create_or_update.assert_called_once_with(
+            resource_group_name, 'test_vnet', 'GatewaySubnet', {'address_prefix': '10.0.255.0/27'})
+        client.public_ip_addresses.begin_create_or_update.assert_not_called()
+        params = client.virtual_network_gateways.begin_create_or_update.call_args[0][2]
+        self.assertEqual(params['ip_configurations'][0]['subnet']['id'], 'gateway_subnet_id')
+        self.assertEqual(params['ip_configurations'][0]['public_ip_address']['id'], 'public_ip_id')
+        on_submitted.assert_called_once_with(provisioning.operation)
+
+    def test_provision_gateway_rejects_mismatched_gateway_subnet(self):
+        client = self.vng_module.network_client
+        client.subnets.get.return_value.address_prefix = '10.0.254.0/27'
+
+        provisioning = self.vng_module.provision_gateway(
+            'test_rg', 'test_vng', 'switzerlandnorth', 'test_vnet', '10.0.255.0/27')
+
+        with self.assertRaises(ValueError):
+            provisioning.result(timeout=5)
+        client.virtual_network_gateways.begin_create_or_update.assert_not_called()
+
+    def test_provision_gateway_cancelled_before_submission(self):
+        client = self.vng_module.network_client
+        client.subnets.get.return_value.address_prefix = '10.0.255.0/27'
+        release = threading.Event()
+        client.public_ip_addresses.get.side_effect = lambda *args: release.wait(5) and MagicMock(id='public_ip_id')
+
+        provisioning = self.vng_module.provision_gateway(
+            'test_rg', 'test_vng', 'switzerlandnorth', 'test_vnet', '10.0.255.0/27')
+        self.assertTrue(provisioning.cancel())
+        release.set()
+
+        with self.assertRaises(CancelledError):
+            provisioning.result(timeout=5)
+        self.assertEqual(provisioning.public_ip_id, 'public_ip_id')
+        self.assertEqual(provisioning.public_ip_name, 'test_vng-pip')
+        client.virtual_network_gateways.begin_create_or_update.assert_not_called()
+
+    def test_gateway_result_timeout_raises_builtin_timeout_error(self):
+        provisioning = GatewayProvisioning('test_vng')
+
+        with self.assertRaises(TimeoutError):
+            provisioning.result(timeout=0.01)
+
+    def test_delete_public_ip(self):
+        self.vng_module.delete_public_ip('test_rg', 'test_vng-pip')
+        self.vng_module.network_client.public_ip_addresses.begin_delete.assert_called_once_with(
+            'test_rg', 'test_vng-pip')
 
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,79 @@
+import unittest
+from azure.core.exceptions import ResourceNotFoundError, ResourceNotModifiedError
+from modules.azure_watch_module import AzureWatchModule, CREATED, DELETED, UPDATED
+from unittest.mock import MagicMock
+
+
+def resource(name, etag, **body):
+    item = MagicMock(etag=etag)
+    item.name = name
+    item.as_dict.return_value = dict(body, name=name, etag=etag)
+    return item
+
+
+class TestAzureWatchModule(unittest.TestCase):
+    def setUp(self):
+        self.subscription_id = 'test_subscription_id'
+        self.watch_module = AzureWatchModule(self.subscription_id, interval=0)
+        self.watch_module.network_client = MagicMock()
+        self.watch_module.compute_client = MagicMock()
+
+    def test_first_poll_is_a_silent_baseline(self):
+        self.watch_module.network_client.network_security_groups.list.return_value = [resource('nsg', '1')]
+        self.watch_module.watch('test_rg', 'nsg')
+
+        self.assertEqual(self.watch_module.poll_once(), [])
+
+    def test_list_changes_become_events(self):
+        nsgs = self.watch_module.network_client.network_security_groups
+        unchanged = resource('kept', '1')
+        nsgs.list.return_value = [unchanged, resource('changed', '1', rules=1), resource('removed', '1')]
+        self.watch_module.watch('test_rg', 'nsg')
+        self.watch_module.poll_once()
+
+        unchanged.as_dict.reset_mock()
+        nsgs.list.return_value = [unchanged, resource('changed', '2', rules=2), resource('added', '1')]
+        events = self.watch_module.poll_once()
+
+        self.assertEqual(sorted((event.kind, event.resource_name) for event in events),
+                         [(CREATED, 'added'), (DELETED, 'removed'), (UPDATED, 'changed')])
+        unchanged.as_dict.assert_not_called()
+
+    def test_same_body_with_new_etag_is_not_an_update(self):
+        route_tables = self.watch_module.network_client.route_tables
+        route_tables.list.return_value = [resource('rt', '1')]
+        self.watch_module.watch('test_rg', 'route_table')
+        self.watch_module.poll_once()
+
+        item = resource('rt', '2')
+        item.as_dict.return_value = {'name': 'rt', 'etag': '1'}
+        route_tables.list.return_value = [item]
+
+        self.assertEqual(self.watch_module.poll_once(), [])
+
+    def test_single_resource_uses_conditional_get(self):
+        vnets = self.watch_module.network_client.virtual_networks
+        vnets.get.return_value = resource('vnet', '7')
+        self.watch_module.watch('test_rg', 'vnet', 'vnet')
+        self.watch_module.poll_once()
+
+        vnets.get.side_effect = ResourceNotModifiedError()
+        self.assertEqual(self.watch_module.poll_once(), [])
+        vnets.get.assert_called_with('test_rg', 'vnet', headers={'If-None-Match': '7'})
+
+        vnets.get.side_effect = ResourceNotFoundError()
+        events = self.watch_module.poll_once()
+        self.assertEqual([(event.kind, event.resource_name) for event in events], [(DELETED, 'vnet')])
+
+    def test_failed_list_does_not_report_deletions(self):
+        nsgs = self.watch_module.network_client.network_security_groups
+        nsgs.list.return_value = [resource('nsg', '1')]
+        self.watch_module.watch('test_rg', 'nsg')
+        self.watch_module.poll_once()
+
+        nsgs.list.side_effect = Exception('throttled')
+
+        self.assertEqual(self.watch_module.poll_once(), [])
+
+if __name__ == '__main__':
+    unittest.main()